@@ -0,0 +1,60 @@
+"""add index generations for shadow rebuilds
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('index_generations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('activated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_index_generations_id'), 'index_generations', ['id'], unique=False)
+    op.create_index(op.f('ix_index_generations_status'), 'index_generations', ['status'], unique=False)
+
+    # Existing rows become generation 1, which serves queries
+    op.execute("INSERT INTO index_generations (id, status, activated_at) VALUES (1, 'serving', now())")
+    op.execute("SELECT setval(pg_get_serial_sequence('index_generations', 'id'), 1)")
+
+    op.add_column('documents', sa.Column('generation', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('document_chunks', sa.Column('generation', sa.Integer(), server_default='1', nullable=False))
+    op.create_index(op.f('ix_documents_generation'), 'documents', ['generation'], unique=False)
+    op.create_index(op.f('ix_document_chunks_generation'), 'document_chunks', ['generation'], unique=False)
+
+    # file_path is only unique within a generation
+    op.drop_index(op.f('ix_documents_file_path'), table_name='documents')
+    op.create_index(op.f('ix_documents_file_path'), 'documents', ['file_path'], unique=False)
+    op.create_unique_constraint('uq_documents_file_path_generation', 'documents', ['file_path', 'generation'])
+
+
+def downgrade():
+    op.execute("DELETE FROM document_chunks WHERE generation NOT IN (SELECT id FROM index_generations WHERE status = 'serving')")
+    op.execute("DELETE FROM documents WHERE generation NOT IN (SELECT id FROM index_generations WHERE status = 'serving')")
+
+    op.drop_constraint('uq_documents_file_path_generation', 'documents', type_='unique')
+    op.drop_index(op.f('ix_documents_file_path'), table_name='documents')
+    op.create_index(op.f('ix_documents_file_path'), 'documents', ['file_path'], unique=True)
+
+    op.drop_index(op.f('ix_document_chunks_generation'), table_name='document_chunks')
+    op.drop_index(op.f('ix_documents_generation'), table_name='documents')
+    op.drop_column('document_chunks', 'generation')
+    op.drop_column('documents', 'generation')
+
+    op.drop_index(op.f('ix_index_generations_status'), table_name='index_generations')
+    op.drop_index(op.f('ix_index_generations_id'), table_name='index_generations')
+    op.drop_table('index_generations')
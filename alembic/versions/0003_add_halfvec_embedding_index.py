@@ -0,0 +1,30 @@
+"""add half-precision embedding index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Expression index used when EMBEDDING_STORAGE=halfvec: candidates are found
+    # on float16 copies (half the index size), then re-ranked with the stored
+    # float32 vectors. Requires pgvector >= 0.7.0.
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS document_chunks_embedding_half_idx "
+        "ON document_chunks USING hnsw ((embedding::halfvec(1536)) halfvec_cosine_ops)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS document_chunks_embedding_half_idx")
@@ -0,0 +1,55 @@
+"""add coarse embeddings and configurable embedding dimensions
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+COARSE_EMBEDDING_DIMENSIONS = int(os.getenv("COARSE_EMBEDDING_DIMENSIONS", "256"))
+
+
+def upgrade():
+    # text-embedding-3 vectors are Matryoshka embeddings: a re-normalised prefix
+    # is the shortened embedding, so existing rows can be shrunk without
+    # re-embedding. Needs pgvector >= 0.7.0 for subvector/l2_normalize.
+    if EMBEDDING_DIMENSIONS != 1536:
+        op.execute("DROP INDEX IF EXISTS document_chunks_embedding_half_idx")
+        op.execute(
+            f"ALTER TABLE document_chunks ALTER COLUMN embedding TYPE vector({EMBEDDING_DIMENSIONS}) "
+            f"USING l2_normalize(subvector(embedding, 1, {EMBEDDING_DIMENSIONS}))::vector({EMBEDDING_DIMENSIONS})"
+        )
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS document_chunks_embedding_half_idx ON document_chunks "
+            f"USING hnsw ((embedding::halfvec({EMBEDDING_DIMENSIONS})) halfvec_cosine_ops)"
+        )
+
+    op.add_column('document_chunks', sa.Column('embedding_coarse', Vector(COARSE_EMBEDDING_DIMENSIONS), nullable=True))
+    op.execute(
+        "UPDATE document_chunks SET embedding_coarse = "
+        f"l2_normalize(subvector(embedding, 1, {COARSE_EMBEDDING_DIMENSIONS}))::vector({COARSE_EMBEDDING_DIMENSIONS}) "
+        "WHERE embedding IS NOT NULL"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS document_chunks_embedding_coarse_idx "
+        "ON document_chunks USING hnsw (embedding_coarse vector_cosine_ops)"
+    )
+
+
+def downgrade():
+    # Shortened embeddings cannot be restored to full length; rebuild instead.
+    op.execute("DROP INDEX IF EXISTS document_chunks_embedding_coarse_idx")
+    op.drop_column('document_chunks', 'embedding_coarse')
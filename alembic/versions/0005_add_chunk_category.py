@@ -0,0 +1,45 @@
+"""add chunk category for metadata pre-filtering
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('document_chunks', sa.Column('category', sa.String(), server_default='General', nullable=False))
+
+    # Category is the top-level folder under knowledge_base/ (Services, FAQ, ...)
+    op.execute(
+        "UPDATE document_chunks SET category = COALESCE("
+        "substring(chunk_metadata->>'file_path' from '[\\\\/]knowledge_base[\\\\/]([^\\\\/]+)[\\\\/]'), 'General')"
+    )
+    op.execute(
+        "UPDATE document_chunks SET chunk_metadata = "
+        "jsonb_set(chunk_metadata::jsonb, '{category}', to_jsonb(category))::json "
+        "WHERE chunk_metadata IS NOT NULL"
+    )
+
+    op.create_index('document_chunks_generation_category_idx', 'document_chunks', ['generation', 'category'], unique=False)
+    # Customer-facing searches always exclude internal material, so give them
+    # a vector index that never contains it
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS document_chunks_embedding_public_idx ON document_chunks "
+        "USING hnsw (embedding vector_cosine_ops) WHERE category <> 'Internal_Resources'"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS document_chunks_embedding_public_idx")
+    op.drop_index('document_chunks_generation_category_idx', table_name='document_chunks')
+    op.drop_column('document_chunks', 'category')
@@ -0,0 +1,26 @@
+"""add chunk content simhash for near-duplicate collapsing
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled in at ingestion. Rows from earlier builds stay NULL until the
+    # next rebuild; search computes their SimHash from the content meanwhile.
+    op.add_column('document_chunks', sa.Column('content_simhash', sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('document_chunks', 'content_simhash')
@@ -0,0 +1,33 @@
+"""add conversation states for multi-turn chat memory
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('conversation_states',
+    sa.Column('session_id', sa.String(), nullable=False),
+    sa.Column('summary', sa.Text(), nullable=True),
+    sa.Column('turns', sa.Text(), nullable=True),
+    sa.Column('summarized_turns', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('session_id')
+    )
+    op.create_index(op.f('ix_conversation_states_session_id'), 'conversation_states', ['session_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_conversation_states_session_id'), table_name='conversation_states')
+    op.drop_table('conversation_states')
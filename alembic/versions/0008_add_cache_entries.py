@@ -0,0 +1,32 @@
+"""add unlogged cache_entries table for the shared cache layer
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # UNLOGGED: no WAL writes and emptied after a crash, which suits a cache
+    op.execute("""
+        CREATE UNLOGGED TABLE cache_entries (
+            key text PRIMARY KEY,
+            value bytea NOT NULL,
+            expires_at timestamptz NOT NULL
+        )
+    """)
+    op.create_index('ix_cache_entries_expires_at', 'cache_entries', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_cache_entries_expires_at', table_name='cache_entries')
+    op.drop_table('cache_entries')
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from backend.services.calendar_service import calendar_service
-from backend.db.database import get_db
+from backend.db.database import get_db, get_async_db
 from backend.db.models import Lead
 from backend.services.hubspot_service import upsert_contact_and_add_note
 
@@ -68,17 +71,16 @@ async def calendar_callback(code: str = Query(..., description="Authorization co
 async def calendar_freebusy(start: str = Query(..., description="Start time in ISO format"),
                             end: str = Query(..., description="End time in ISO format"),
                             calendar_id: str = Query("primary", description="Calendar ID"),
-                            timezone: str = Query("UTC", description="Timezone"),
-                            db: Session = Depends(get_db)):
+                            timezone: str = Query("UTC", description="Timezone")):
     """Get free/busy information."""
     try:
-        result = calendar_service.get_freebusy(db, start, end, calendar_id, timezone)
+        result = await run_in_threadpool(calendar_service.get_freebusy, start, end, calendar_id, timezone)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Freebusy query failed: {str(e)}")
 
 @router.post("/calendar/create")
-async def calendar_create_event(event_data: dict, db: Session = Depends(get_db)):
+async def calendar_create_event(event_data: dict):
     """Create a calendar event."""
     try:
         summary = event_data.get("summary")
@@ -92,13 +94,15 @@ async def calendar_create_event(event_data: dict, db: Session = Depends(get_db))
         if not summary or not start or not end:
             raise HTTPException(status_code=400, detail="Missing required fields: summary, start, end")
 
-        event_id = calendar_service.create_event(db, summary, start, end, timezone, description, attendees, calendar_id)
+        event_id = await run_in_threadpool(
+            calendar_service.create_event, summary, start, end, timezone, description, attendees, calendar_id
+        )
         return {"event_id": event_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Event creation failed: {str(e)}")
 
 @router.post("/schedule-check", response_model=ScheduleCheckResponse)
-async def schedule_check(request: ScheduleCheckRequest, db: Session = Depends(get_db)):
+async def schedule_check(request: ScheduleCheckRequest):
     """
     Check if a booking can be made at the specified time and duration.
 
@@ -110,8 +114,8 @@ async def schedule_check(request: ScheduleCheckRequest, db: Session = Depends(ge
     """
     try:
         # Check booking rules
-        check_result = calendar_service.check_booking_rules(
-            db,
+        check_result = await run_in_threadpool(
+            calendar_service.check_booking_rules,
             request.calendar_id,
             request.start,
             request.duration
@@ -120,8 +124,8 @@ async def schedule_check(request: ScheduleCheckRequest, db: Session = Depends(ge
         # If not allowed, suggest next slot
         suggested_slot = None
         if not check_result["allowed"]:
-            suggestion = calendar_service.suggest_next_slot(
-                db,
+            suggestion = await run_in_threadpool(
+                calendar_service.suggest_next_slot,
                 request.calendar_id,
                 request.start,
                 request.duration
@@ -140,7 +144,7 @@ async def schedule_check(request: ScheduleCheckRequest, db: Session = Depends(ge
         raise HTTPException(status_code=500, detail=f"Schedule check failed: {str(e)}")
 
 @router.post("/create-booking", response_model=CreateBookingResponse)
-async def create_booking(request: CreateBookingRequest, db: Session = Depends(get_db)):
+async def create_booking(request: CreateBookingRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Create a calendar booking after checking rules, with optional HubSpot integration.
 
@@ -152,8 +156,8 @@ async def create_booking(request: CreateBookingRequest, db: Session = Depends(ge
     """
     try:
         # First check if booking is allowed
-        check_result = calendar_service.check_booking_rules(
-            db,
+        check_result = await run_in_threadpool(
+            calendar_service.check_booking_rules,
             request.calendar_id,
             request.start,
             request.duration
@@ -172,8 +176,8 @@ async def create_booking(request: CreateBookingRequest, db: Session = Depends(ge
         end_iso = end_dt.isoformat().replace('+00:00', 'Z')
 
         # Create the event
-        event_id = calendar_service.create_event(
-            db,
+        event_id = await run_in_threadpool(
+            calendar_service.create_event,
             summary=request.summary,
             start=request.start,
             end=end_iso,
@@ -188,7 +192,8 @@ async def create_booking(request: CreateBookingRequest, db: Session = Depends(ge
         hubspot_status = None
         if request.hubspot_data:
             try:
-                hubspot_result = upsert_contact_and_add_note(
+                hubspot_result = await run_in_threadpool(
+                    upsert_contact_and_add_note,
                     name=request.hubspot_data.get("name"),
                     email=request.hubspot_data.get("email"),
                     company=request.hubspot_data.get("company"),
@@ -199,7 +204,8 @@ async def create_booking(request: CreateBookingRequest, db: Session = Depends(ge
                 hubspot_status = hubspot_result["action"]
 
                 # Link to lead in database
-                lead = db.query(Lead).filter(Lead.email == request.hubspot_data.get("email")).first()
+                result = await db.execute(select(Lead).where(Lead.email == request.hubspot_data.get("email")))
+                lead = result.scalars().first()
                 if lead:
                     lead.hubspot_id = hubspot_contact_id
                     lead.session_id = request.hubspot_data.get("session_id", f"booking_{event_id}")
@@ -211,7 +217,7 @@ async def create_booking(request: CreateBookingRequest, db: Session = Depends(ge
                         name=request.hubspot_data.get("name")
                     )
                     db.add(lead)
-                db.commit()
+                await db.commit()
 
             except Exception as e:
                 print(f"HubSpot integration failed: {e}")
@@ -2,26 +2,38 @@
 Chat API endpoint for processing user messages.
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, BackgroundTasks, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
-import os
+from backend.services.conversation_memory import conversation_memory
 from backend.services.rag_service import RAGService
-from .intent import intent_hint, IntentHintRequest
+from backend.services.session_ids import session_ids
+from backend.services.metrics import STAGE_LATENCY, record_openai_usage
+from backend.services.openai_gateway import openai_gateway
+from backend.services.query_log import normalize_query
+from backend.services.single_flight import COALESCE_REQUESTS, SingleFlight
+from backend.services.tracing import tracer, traced
+from .intent import upsells_for
 
 router = APIRouter()
 
 # Initialize RAG service
 rag_service = RAGService()
 
+# Visitors sending the same message at once share one classification
+intent_flights = SingleFlight("detect_intent", enabled=COALESCE_REQUESTS)
+
+@STAGE_LATENCY.time(stage="detect_intent")
+@traced("chat.detect_intent")
 async def detect_intent(message: str) -> str:
     """Detect user intent from message using LLM."""
-    try:
-        from openai import OpenAI
-        client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return await intent_flights.run(normalize_query(message), lambda: _classify_intent(message))
 
-        response = client.chat.completions.create(
+async def _classify_intent(message: str) -> str:
+    try:
+        response = await openai_gateway.achat_completion(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You are an intent classifier. Classify the user's message into one of these intents: web-development, seo, graphic-design, or 'none' if it doesn't match any. Return only the intent name in lowercase."},
@@ -30,6 +42,7 @@ async def detect_intent(message: str) -> str:
             max_tokens=10,
             temperature=0.1
         )
+        record_openai_usage(response, "gpt-3.5-turbo")
 
         intent = response.choices[0].message.content.strip().lower()
         # Validate intent
@@ -50,17 +63,37 @@ class ChatResponse(BaseModel):
     upsell: Optional[List[dict]] = None
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(message: ChatMessage):
+@STAGE_LATENCY.time(stage="chat_request")
+@traced("chat.handle_message")
+async def chat_endpoint(message: ChatMessage, background_tasks: BackgroundTasks):
     """
     Main chat endpoint for processing user messages using RAG.
+
+    With a session_id (as issued by /ws/chat), follow-ups are searched
+    with a standalone rewrite of the question and answered with the
+    session's conversation memory. Other session ids are rejected with 400.
     """
     print("Chat endpoint called")
+    if message.session_id and not session_ids.verify(message.session_id):
+        raise HTTPException(status_code=400, detail="Unknown session; start a new conversation")
     try:
+        session_context = None
+        search_query = message.message
+        if message.session_id:
+            memory = await conversation_memory.get(message.session_id)
+            session_context = conversation_memory.render(memory)
+            search_query = await conversation_memory.rewrite_query(memory, message.message)
+
         # Search for relevant documents
-        documents = rag_service.search_documents(message.message, 5)
+        documents = await rag_service.asearch_documents(search_query, 5)
 
         # Generate answer using RAG service
-        result = rag_service.generate_answer(message.message, documents)
+        result = await run_in_threadpool(rag_service.generate_answer, message.message, documents, session_context)
+
+        if message.session_id and result.get("reason") != "error":
+            # After the response is sent: summarizing older turns must not delay the answer
+            background_tasks.add_task(conversation_memory.add_turn, message.session_id,
+                                      message.message, result["answer"])
 
         # Detect intent from user message
         print(f"Detecting intent for message: {message.message}")
@@ -71,9 +104,8 @@ async def chat_endpoint(message: ChatMessage):
         upsell = None
         if intent_hint_value != "none":
             try:
-                intent_request = IntentHintRequest(intent=intent_hint_value, session_id=message.session_id or "default")
-                upsell_response = await intent_hint(intent_request)
-                upsell = upsell_response.get("upsells", [])
+                with STAGE_LATENCY.time(stage="upsell_lookup"), tracer.span("chat.upsell_lookup", intent=intent_hint_value):
+                    upsell = upsells_for(intent_hint_value)
             except Exception as e:
                 print(f"Error getting upsell suggestions: {e}")
                 upsell = []
@@ -1,12 +1,48 @@
-from fastapi import APIRouter
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Query, Request
 from pydantic import BaseModel
 
+from backend.services.http_cache import PreparedResponse
+
 router = APIRouter()
 
+# Upsell suggestions per detected intent
+UPSELLS: Dict[str, List[Dict[str, Any]]] = {
+    "web-development": [
+        {
+            "service": "SEO",
+            "reason": "improves visibility",
+            "pricing_link": "/api/pricing?service=seo"
+        },
+        {
+            "service": "Graphic Design",
+            "reason": "improves UX",
+            "pricing_link": "/api/pricing?service=graphic-design"
+        }
+    ]
+}
+
+# Encoded once; every other intent shares the empty response
+_UPSELL_RESPONSES = {intent: PreparedResponse({"upsells": upsells}) for intent, upsells in UPSELLS.items()}
+_NO_UPSELLS = PreparedResponse({"upsells": []})
+
 class IntentHintRequest(BaseModel):
     intent: str
     session_id: str
 
+def upsells_for(intent: str) -> List[Dict[str, Any]]:
+    """Upsell suggestions for an intent (empty if there are none)."""
+    return UPSELLS.get(intent, [])
+
+@router.get("/intent-hint")
+async def get_intent_hint(request: Request, intent: str = Query(..., description="Detected intent")):
+    """
+    Cacheable form of POST /intent-hint: same body, with an ETag and
+    Cache-Control, and 304 when If-None-Match matches.
+    """
+    return _UPSELL_RESPONSES.get(intent, _NO_UPSELLS).respond(request)
+
 @router.post("/intent-hint")
 async def intent_hint(request: IntentHintRequest):
     """
@@ -18,19 +54,4 @@ async def intent_hint(request: IntentHintRequest):
     Returns:
         Upsell suggestions with services, reasons, and pricing links
     """
-    if request.intent == "web-development":
-        upsells = [
-            {
-                "service": "SEO",
-                "reason": "improves visibility",
-                "pricing_link": "/api/pricing?service=seo"
-            },
-            {
-                "service": "Graphic Design",
-                "reason": "improves UX",
-                "pricing_link": "/api/pricing?service=graphic-design"
-            }
-        ]
-        return {"upsells": upsells}
-    else:
-        return {"upsells": []}
+    return _UPSELL_RESPONSES.get(request.intent, _NO_UPSELLS).respond()
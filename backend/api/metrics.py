@@ -0,0 +1,88 @@
+"""
+Prometheus metrics and tracing control endpoints.
+"""
+
+import os
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from backend.services.admission import admission_controller
+from backend.services.cache_warmup import cache_warmup
+from backend.services.metrics import registry
+from backend.services.tracing import tracer, ConsoleSpanExporter, FileSpanExporter
+
+router = APIRouter()
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """
+    Allow a request only with the X-Admin-Token header matching ADMIN_API_TOKEN.
+
+    Guards the diagnostic and control endpoints (everything here except
+    /metrics, which stays open for Prometheus). With ADMIN_API_TOKEN unset
+    they are refused and tracing settings come from the environment only.
+    """
+    expected = os.getenv("ADMIN_API_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_API_TOKEN is not set)")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Expose application metrics in Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/admission", dependencies=[Depends(require_admin)])
+async def admission_status():
+    """Admission limits with in-flight, queued and shed counts per route class (requires X-Admin-Token)."""
+    return admission_controller.snapshot()
+
+@router.get("/cache/warmup", dependencies=[Depends(require_admin)])
+async def cache_warmup_status():
+    """Startup cache warmup progress and query cache hit ratios since it finished (requires X-Admin-Token)."""
+    return cache_warmup.snapshot()
+
+def _tracing_status():
+    exporter = tracer.exporter
+    return {
+        "enabled": tracer.enabled,
+        "exporter": "file" if isinstance(exporter, FileSpanExporter) else "console",
+        "file": getattr(exporter, "path", None),
+        "sample_rate": tracer.sample_rate
+    }
+
+@router.get("/tracing", dependencies=[Depends(require_admin)])
+async def tracing_status():
+    """Current tracing settings (requires X-Admin-Token)."""
+    return _tracing_status()
+
+@router.put("/tracing", dependencies=[Depends(require_admin)])
+async def update_tracing(enabled: bool, exporter: Optional[str] = None, sample_rate: Optional[float] = None):
+    """
+    Turn request tracing on or off without a restart (requires X-Admin-Token).
+
+    Args:
+        enabled: Record spans
+        exporter: 'console' or 'file' (TRACING_FILE, default traces.jsonl)
+        sample_rate: Fraction of requests to trace (0.0 - 1.0)
+    """
+    if exporter not in (None, "console", "file"):
+        raise HTTPException(status_code=400, detail="exporter must be 'console' or 'file'")
+    if sample_rate is not None and not 0.0 <= sample_rate <= 1.0:
+        raise HTTPException(status_code=400, detail="sample_rate must be between 0 and 1")
+
+    if enabled:
+        new_exporter = None
+        path = os.getenv("TRACING_FILE", "traces.jsonl")
+        if exporter == "file" and getattr(tracer.exporter, "path", None) != path:
+            # Opened once; the replaced exporter is closed by enable()
+            new_exporter = FileSpanExporter(path)
+        elif exporter == "console" and isinstance(tracer.exporter, FileSpanExporter):
+            new_exporter = ConsoleSpanExporter()
+        tracer.enable(exporter=new_exporter, sample_rate=sample_rate)
+    else:
+        tracer.disable()
+    return _tracing_status()
@@ -4,7 +4,8 @@ API Routes for Chatbot Backend
 
 print("Routes module loaded")
 
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
@@ -13,14 +14,19 @@ import os
 import re
 import json
 from pathlib import Path
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 
 from backend.services.rag_service import RAGService
-from backend.db.database import get_db
+from backend.services.job_service import JobConflict, job_manager
+from backend.services.pricing_catalog import pricing_catalog
+from backend.services.rate_limit import rate_limiter
+from backend.db.database import get_async_db
 from backend.db.models import Session as SessionModel, Lead
+from knowledge_base.processors.generations import try_rebuild_lock
 import json
-from sqlalchemy.orm import Session as DBSession
 import httpx
 
 
@@ -29,36 +35,9 @@ router = APIRouter()
 # Initialize RAG service
 rag_service = RAGService()
 
-# Pricing templates
-pricing_templates = {
-    "web-development": {
-        "service": "web-development",
-        "duration_options": [
-            {"duration": "1 month", "price": 1500, "breakdown": "Design: $500, Development: $800, Testing: $200"},
-            {"duration": "2 months", "price": 2500, "breakdown": "Design: $700, Development: $1400, Testing: $400"},
-            {"duration": "3 months", "price": 3500, "breakdown": "Design: $900, Development: $2000, Testing: $600"}
-        ],
-        "default_cta": "Get Started"
-    },
-    "seo": {
-        "service": "seo",
-        "duration_options": [
-            {"duration": "1 month", "price": 800, "breakdown": "Keyword Research: $200, On-page: $300, Off-page: $300"},
-            {"duration": "3 months", "price": 2000, "breakdown": "Keyword Research: $400, On-page: $900, Off-page: $700"},
-            {"duration": "6 months", "price": 3500, "breakdown": "Keyword Research: $600, On-page: $1500, Off-page: $1400"}
-        ],
-        "default_cta": "Optimize Now"
-    },
-    "graphic-design": {
-        "service": "graphic-design",
-        "duration_options": [
-            {"duration": "1 week", "price": 300, "breakdown": "Concept: $100, Design: $150, Revisions: $50"},
-            {"duration": "2 weeks", "price": 500, "breakdown": "Concept: $150, Design: $250, Revisions: $100"},
-            {"duration": "1 month", "price": 800, "breakdown": "Concept: $200, Design: $400, Revisions: $200"}
-        ],
-        "default_cta": "Design My Brand"
-    }
-}
+# Most queries accepted by /rag-search/batch (one embeddings request)
+MAX_BATCH_QUERIES = int(os.getenv("RAG_BATCH_MAX_QUERIES", "50"))
+
 
 class RAGSearchResponse(BaseModel):
     query: str
@@ -66,6 +45,17 @@ class RAGSearchResponse(BaseModel):
     total_results: int
     timestamp: str
 
+class RAGBatchSearchRequest(BaseModel):
+    queries: List[str]
+    n_results: int = 5
+    category: Optional[List[str]] = None
+    exclude_category: Optional[List[str]] = None
+
+class RAGBatchSearchResponse(BaseModel):
+    results: List[RAGSearchResponse]
+    total_queries: int
+    timestamp: str
+
 class RAGAnswerResponse(BaseModel):
     query: str
     answer: str
@@ -88,7 +78,9 @@ class LogMessageResponse(BaseModel):
 @router.get("/rag-search", response_model=RAGSearchResponse)
 async def rag_search(
     q: str = Query(..., description="Search query"),
-    n_results: int = Query(5, description="Number of results to return", ge=1, le=20)
+    n_results: int = Query(5, description="Number of results to return", ge=1, le=20),
+    category: Optional[List[str]] = Query(None, description="Only search these folders, e.g. FAQ, Services, Portfolio"),
+    exclude_category: Optional[List[str]] = Query(None, description="Skip these folders")
 ):
     """
     Search the knowledge base for relevant documents.
@@ -96,6 +88,8 @@ async def rag_search(
     Args:
         q: Search query
         n_results: Number of results to return (1-20)
+        category: Restrict the search to these knowledge base folders
+        exclude_category: Exclude these knowledge base folders
         
     Returns:
         List of relevant documents with metadata and relevance scores
@@ -103,19 +97,10 @@ async def rag_search(
     """
     try:
         # Search for relevant documents
-        documents = rag_service.search_documents(q, n_results)
+        documents = await rag_service.asearch_documents(q, n_results, categories=category, exclude_categories=exclude_category)
         
         # Format documents to match expected output format
-        formatted_docs = []
-        for doc in documents:
-            formatted_doc = {
-                "text": doc.get("content", ""),
-                "file_name": doc.get("metadata", {}).get("file_name", "unknown"),
-                "score": doc.get("relevance_score", 0.0),
-                "file_path": doc.get("metadata", {}).get("file_path", ""),
-                "chunk_index": doc.get("metadata", {}).get("chunk_index", 0)
-            }
-            formatted_docs.append(formatted_doc)
+        formatted_docs = format_search_documents(documents)
         
         return RAGSearchResponse(
             query=q,
@@ -127,6 +112,69 @@ async def rag_search(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+@router.post("/rag-search/batch", response_model=RAGBatchSearchResponse)
+async def rag_search_batch(request: RAGBatchSearchRequest, http_request: Request):
+    """
+    Search the knowledge base for several queries in one call.
+
+    The queries are embedded in a single OpenAI request and looked up
+    together, which is much faster than one /rag-search call per query.
+
+    Args:
+        request: Up to MAX_BATCH_QUERIES queries, n_results (1-20) and the
+            same category filters as /rag-search
+
+    Returns:
+        One /rag-search result per query, in request order
+    """
+    if not request.queries or len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {MAX_BATCH_QUERIES} queries")
+    if not 1 <= request.n_results <= 20:
+        raise HTTPException(status_code=400, detail="n_results must be between 1 and 20")
+    # Each query counts against the search rate limit like a /rag-search call
+    retry_after = await rate_limiter.check_scope(http_request.scope, cost=len(request.queries))
+    if retry_after is not None:
+        raise HTTPException(status_code=429, detail="Too many requests, please slow down.",
+                            headers={"Retry-After": str(retry_after)})
+
+    try:
+        batches = await rag_service.asearch_documents_batch(
+            request.queries, request.n_results,
+            categories=request.category,
+            exclude_categories=request.exclude_category
+        )
+
+        timestamp = datetime.utcnow().isoformat()
+        results = []
+        for query, documents in zip(request.queries, batches):
+            formatted_docs = format_search_documents(documents)
+            results.append(RAGSearchResponse(
+                query=query,
+                documents=formatted_docs,
+                total_results=len(formatted_docs),
+                timestamp=timestamp
+            ))
+
+        return RAGBatchSearchResponse(results=results, total_queries=len(results), timestamp=timestamp)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch search failed: {str(e)}")
+
+def format_search_documents(documents: List[dict]) -> List[dict]:
+    """Format search results as {text, file_name, score, ...} for the API."""
+    formatted_docs = []
+    for doc in documents:
+        metadata = doc.get("metadata") or {}
+        formatted_docs.append({
+            "text": doc.get("content", ""),
+            "file_name": metadata.get("file_name", "unknown"),
+            "score": doc.get("relevance_score", 0.0),
+            "file_path": metadata.get("file_path", ""),
+            "category": metadata.get("category", ""),
+            "chunk_index": metadata.get("chunk_index", 0)
+        })
+    return formatted_docs
+
 @router.post("/rag-answer")
 async def rag_answer(
     query: str,
@@ -146,10 +194,10 @@ async def rag_answer(
     """
     try:
         # Search for relevant documents
-        documents = rag_service.search_documents(query, 5)
+        documents = await rag_service.asearch_documents(query, 5)
         
         # Generate answer using retrieved documents
-        result = rag_service.generate_answer(query, documents, session_context, relevance_threshold)
+        result = await run_in_threadpool(rag_service.generate_answer, query, documents, session_context, relevance_threshold)
         
         return {
             "query": query,
@@ -179,21 +227,49 @@ async def get_knowledge_base():
             "error": str(e)
         }
 
-@router.post("/knowledge/process")
+@router.post("/knowledge/process", status_code=202)
 async def process_knowledge_base():
-    """Process all documents in the knowledge base."""
+    """
+    Start processing all documents in the knowledge base as a background job.
+
+    Returns immediately with a job ID. If a rebuild is already running in
+    this worker, its job is returned instead of starting a duplicate run;
+    if one is running in another worker or the CLI, 409.
+    """
     try:
-        rag_service.process_knowledge_base()
+        job = job_manager.submit("knowledge_rebuild", rag_service.process_knowledge_base, lock=try_rebuild_lock)
         return {
-            "message": "Knowledge base processing completed",
+            "message": "Knowledge base processing started",
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/api/knowledge/jobs/{job.id}",
             "timestamp": datetime.utcnow().isoformat()
         }
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Knowledge base processing failed: {str(e)}")
 
 
+@router.get("/knowledge/jobs/{job_id}")
+async def get_knowledge_job(job_id: str):
+    """
+    Get the status and progress of a knowledge base background job.
+
+    Args:
+        job_id: Job ID returned by POST /api/knowledge/process
+
+    Returns:
+        Job status with files seen, chunks embedded, errors and ETA
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
 @router.get("/pricing")
-async def get_pricing(service: str = Query(..., description="Service type")):
+async def get_pricing(request: Request, service: str = Query(..., description="Service type")):
     """
     Get pricing information for a specific service.
 
@@ -202,14 +278,16 @@ async def get_pricing(service: str = Query(..., description="Service type")):
 
     Returns:
         Pricing card with service details, duration options, and default CTA
+        (pre-serialized, with an ETag; 304 when If-None-Match matches)
     """
-    if service not in pricing_templates:
+    prepared = pricing_catalog.response(service)
+    if prepared is None:
         raise HTTPException(status_code=404, detail="Service not found")
-    return pricing_templates[service]
+    return prepared.respond(request)
 
 
 @router.post("/api/log-message", response_model=LogMessageResponse)
-async def log_message(request: LogMessageRequest, db: DBSession = Depends(get_db)):
+async def log_message(request: LogMessageRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Log a message to the session's messages JSON.
 
@@ -220,7 +298,8 @@ async def log_message(request: LogMessageRequest, db: DBSession = Depends(get_db
         Status and session_id
     """
     # Get or create session
-    session = db.query(SessionModel).filter(SessionModel.session_id == request.session_id).first()
+    result = await db.execute(select(SessionModel).where(SessionModel.session_id == request.session_id))
+    session = result.scalars().first()
     if not session:
         session = SessionModel(
             session_id=request.session_id,
@@ -228,8 +307,8 @@ async def log_message(request: LogMessageRequest, db: DBSession = Depends(get_db
             messages=json.dumps([])
         )
         db.add(session)
-        db.commit()
-        db.refresh(session)
+        await db.commit()
+        await db.refresh(session)
 
     # Load current messages
     messages = json.loads(session.messages) if session.messages else []
@@ -244,7 +323,7 @@ async def log_message(request: LogMessageRequest, db: DBSession = Depends(get_db
 
     # Save back
     session.messages = json.dumps(messages)
-    db.commit()
+    await db.commit()
 
     return LogMessageResponse(status="logged", session_id=request.session_id)
 
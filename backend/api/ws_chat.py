@@ -0,0 +1,216 @@
+"""
+WebSocket chat transport
+
+One connection per conversation on /ws/chat; the session's conversation
+memory carries follow-up questions across turns. The client sends
+
+    {"type": "message", "message": "...", "turn_id": "..."}
+                                            start a turn (cancels the one in flight);
+                                            turn_id is optional, one is issued if omitted
+    {"type": "cancel"}                      stop the turn in flight
+
+and the server pushes events for each turn, tagged with its turn_id, as
+they become available:
+
+    session    {session_id}                 once, on connect; a new signed id unless
+                                            the session_id given was issued here
+    sources    {documents}                  retrieved chunks (without their text)
+    token      {text}                       answer text, in order
+    intent     {intent}                     detected intent, if any
+    upsell     {upsells}                    upsell suggestions for that intent
+    done       {answer, confidence, reason}
+    cancelled  {}
+    error      {message}               retry_after (seconds) too when rate limited
+
+Outgoing events go through a bounded queue drained by one sender task.
+A slow client fills the queue, which pauses the turn (and so the reading
+of the OpenAI stream) instead of buffering without limit; queued tokens
+are sent as one event, and a client that accepts nothing for
+WS_SEND_TIMEOUT seconds is disconnected.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from backend.api.chat import detect_intent, rag_service
+from backend.api.intent import upsells_for
+from backend.api.routes import format_search_documents
+from backend.services.conversation_memory import conversation_memory
+from backend.services.metrics import STAGE_LATENCY
+from backend.services.rate_limit import rate_limiter
+from backend.services.session_ids import session_ids
+
+router = APIRouter()
+
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
+# Strong references to fire-and-forget tasks, so they are not garbage collected mid-run
+_background_tasks = set()
+
+
+class ChatConnection:
+    """State of one /ws/chat connection: its session, send queue and turn in flight."""
+
+    def __init__(self, websocket: WebSocket, session_id: Optional[str] = None):
+        self.websocket = websocket
+        self.session_id = session_id or session_ids.issue()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.turn: Optional[asyncio.Task] = None
+        self.turn_id: Optional[str] = None
+
+    async def send(self, event: Dict[str, Any]):
+        """Queue an event; waits while the client is behind."""
+        await self.queue.put(event)
+
+    async def sender(self):
+        """Write queued events to the socket, merging runs of tokens into one event."""
+        carry = None
+        while True:
+            event = carry if carry is not None else await self.queue.get()
+            carry = None
+            if event["type"] == "token":
+                while not self.queue.empty():
+                    following = self.queue.get_nowait()
+                    if following["type"] == "token" and following["turn_id"] == event["turn_id"]:
+                        event = {**event, "text": event["text"] + following["text"]}
+                    else:
+                        carry = following
+                        break
+            await asyncio.wait_for(self.websocket.send_json(event), SEND_TIMEOUT)
+
+    def start_turn(self, message: str, turn_id: Optional[str] = None):
+        self.cancel_turn()
+        self.turn_id = turn_id or uuid.uuid4().hex[:12]
+        self.turn = asyncio.create_task(self.run_turn(self.turn_id, message))
+
+    def cancel_turn(self):
+        if self.turn is not None and not self.turn.done():
+            self.turn.cancel()
+
+    async def run_turn(self, turn_id: str, message: str):
+        started = time.perf_counter()
+        intent_task = asyncio.create_task(self.intent_events(turn_id, message))
+        try:
+            memory = await conversation_memory.get(self.session_id)
+            session_context = conversation_memory.render(memory)
+            search_query = await conversation_memory.rewrite_query(memory, message)
+            documents = await rag_service.asearch_documents(search_query, 5)
+            await self.send({
+                "type": "sources", "turn_id": turn_id,
+                "documents": [{key: value for key, value in doc.items() if key != "text"}
+                              for doc in format_search_documents(documents)]
+            })
+
+            result: Dict[str, Any] = {}
+            first_token = True
+            async for event in rag_service.astream_answer(message, documents, session_context):
+                if event["type"] == "token":
+                    if first_token:
+                        STAGE_LATENCY.observe(time.perf_counter() - started, stage="ws_first_token")
+                        first_token = False
+                    await self.send({"type": "token", "turn_id": turn_id, "text": event["text"]})
+                else:
+                    result = event
+
+            await intent_task
+            # Not awaited: summarizing older turns must not hold up the done event
+            self.remember(message, result)
+            await self.send({
+                "type": "done", "turn_id": turn_id,
+                "answer": result.get("answer", ""),
+                "confidence": result.get("confidence"),
+                "reason": result.get("reason")
+            })
+        except asyncio.CancelledError:
+            intent_task.cancel()
+            # put_nowait: a cancelled turn must not wait on a slow client
+            try:
+                self.queue.put_nowait({"type": "cancelled", "turn_id": turn_id})
+            except asyncio.QueueFull:
+                pass
+            raise
+        except Exception as e:
+            intent_task.cancel()
+            print(f"Error in websocket chat turn: {e}")
+            await self.send({"type": "error", "turn_id": turn_id, "message": str(e)})
+        finally:
+            STAGE_LATENCY.observe(time.perf_counter() - started, stage="ws_chat_turn")
+
+    def remember(self, message: str, result: Dict[str, Any]):
+        """Add a finished turn to the session's conversation memory in the background."""
+        if result.get("answer") and result.get("reason") != "error":
+            task = asyncio.create_task(conversation_memory.add_turn(self.session_id, message, result["answer"]))
+            # The turn is remembered even if this connection closes meanwhile
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+
+    async def intent_events(self, turn_id: str, message: str):
+        """Push the intent and its upsells as soon as the classifier answers."""
+        intent = await detect_intent(message)
+        if intent == "none":
+            return
+        await self.send({"type": "intent", "turn_id": turn_id, "intent": intent})
+        upsells = upsells_for(intent)
+        if upsells:
+            await self.send({"type": "upsell", "turn_id": turn_id, "upsells": upsells})
+
+
+@router.websocket("/ws/chat")
+async def websocket_chat(websocket: WebSocket, session_id: Optional[str] = None):
+    """
+    Chat over a WebSocket; see the module docstring for the protocol.
+
+    Args:
+        session_id: Resume a conversation; a new id is issued when it is
+            omitted or was not issued by this server
+    """
+    await websocket.accept()
+    # A forged or guessed id must not read or extend someone else's conversation
+    connection = ChatConnection(websocket, session_id if session_ids.verify(session_id) else None)
+    # Messages count against the same per-client limit as POST /api/chat
+    limit = rate_limiter.limit_for("/ws/chat") if rate_limiter.enabled else None
+    client_key, ip_key = rate_limiter.client_key(websocket.scope), rate_limiter.ip_key(websocket.scope)
+    sender = asyncio.create_task(connection.sender())
+    await connection.send({"type": "session", "session_id": connection.session_id})
+    try:
+        while True:
+            receive = asyncio.create_task(websocket.receive_json())
+            done, _ = await asyncio.wait({receive, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if sender in done:
+                # Slow or broken client: the sender timed out or failed
+                receive.cancel()
+                break
+            try:
+                data = receive.result()
+            except ValueError:
+                # A frame that is not JSON
+                continue
+            if not isinstance(data, dict):
+                continue
+            if data.get("type") == "message" and str(data.get("message") or "").strip():
+                turn_id = str(data["turn_id"])[:64] if data.get("turn_id") else None
+                retry_after = await rate_limiter.check(limit, client_key, ip_key) if limit is not None else None
+                if retry_after is not None:
+                    await connection.send({"type": "error", "turn_id": turn_id, "retry_after": retry_after,
+                                           "message": "Too many messages, please slow down."})
+                    continue
+                connection.start_turn(str(data["message"]), turn_id)
+            elif data.get("type") == "cancel":
+                connection.cancel_turn()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        connection.cancel_turn()
+        slow_client = sender.done() and not sender.cancelled() and sender.exception() is not None
+        sender.cancel()
+        if slow_client:
+            try:
+                await websocket.close(code=1008)
+            except Exception:
+                pass
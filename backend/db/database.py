@@ -1,9 +1,18 @@
 """
 Database connection and session management
+
+Two engines share one DATABASE_URL: a sync engine (psycopg2) for ingestion
+jobs, scripts and migrations, and an async engine (asyncpg) for request
+handlers, so routes never block the event loop on database I/O. Both use
+an explicit, pre-pinged, recycled connection pool.
 """
 
 import os
+from typing import AsyncIterator
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from .models import Base
 
@@ -12,12 +21,79 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is required")
 
+# Connection pool settings (per engine, per process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Seconds before a connection is replaced; keeps clear of server/proxy idle timeouts
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Async drivers for the sync URL schemes used in DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Swap the driver of a database URL for its asyncio equivalent."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    parsed = parsed.set(drivername=driver)
+    if driver == "postgresql+asyncpg" and "sslmode" in parsed.query:
+        # asyncpg takes libpq's sslmode values as ssl= and rejects sslmode=
+        query = dict(parsed.query)
+        query["ssl"] = query.pop("sslmode")
+        parsed = parsed.set(query=query)
+    return parsed.render_as_string(hide_password=False)
+
+
+def _pool_options(url: str) -> dict:
+    if make_url(url).get_backend_name() == "sqlite":
+        # SQLite uses a per-file pool without size limits
+        return {"pool_pre_ping": True}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
 # Create engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **_pool_options(DATABASE_URL))
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The async engine is created on first use, so processes that only need the
+# sync engine (scripts, migrations) do not need the async driver installed
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_engine():
+    """Get the process-wide async engine."""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(to_async_url(DATABASE_URL), **_pool_options(DATABASE_URL))
+    return _async_engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    """Create an async session bound to the async engine."""
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = async_sessionmaker(
+            get_async_engine(), class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+    return _async_session_factory()
+
+
 def get_db():
     """Dependency to get database session."""
     db = SessionLocal()
@@ -26,7 +102,23 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Dependency to get an async database session."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_engines():
+    """Close pooled connections on shutdown."""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_session_factory = None
+    engine.dispose()
+
+
 def create_tables():
     """Create all database tables."""
     Base.metadata.create_all(bind=engine)
-
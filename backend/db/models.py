@@ -2,13 +2,20 @@
 Database models for the chatbot application
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, JSON, Index
+import os
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Text, Boolean, JSON, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from pgvector.sqlalchemy import Vector
 
 Base = declarative_base()
 
+# text-embedding-3-small returns 1536 dimensions natively; smaller values use
+# Matryoshka shortening. Changing this requires migration 0004 or a rebuild.
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+# Truncated prefix of the embedding used for the coarse first search pass
+COARSE_EMBEDDING_DIMENSIONS = int(os.getenv("COARSE_EMBEDDING_DIMENSIONS", "256"))
+
 class User(Base):
     """User model for storing user information."""
     __tablename__ = "users"
@@ -51,6 +58,16 @@ class Session(Base):
     ended_at = Column(DateTime(timezone=True), nullable=True)
     messages = Column(JSON)  # JSON array of messages
 
+class ConversationState(Base):
+    """Conversation memory of a chat session: rolling summary plus recent turns."""
+    __tablename__ = "conversation_states"
+
+    session_id = Column(String, primary_key=True, index=True)
+    summary = Column(Text, default="")
+    turns = Column(Text)  # JSON array of recent {"user", "assistant"} turns
+    summarized_turns = Column(Integer, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class Lead(Base):
     """Lead model linking leads to sessions and HubSpot."""
     __tablename__ = "leads"
@@ -75,12 +92,25 @@ class OAuthToken(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+class IndexGeneration(Base):
+    """A build of the vector index; exactly one generation serves queries."""
+    __tablename__ = "index_generations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, index=True, default="building")  # 'building', 'serving' or 'retired'
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    activated_at = Column(DateTime(timezone=True), nullable=True)
+
 class Document(Base):
     """Document model for storing document metadata."""
     __tablename__ = "documents"
+    __table_args__ = (
+        UniqueConstraint('file_path', 'generation', name='uq_documents_file_path_generation'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    file_path = Column(String, unique=True, index=True)
+    generation = Column(Integer, index=True, nullable=False, server_default="1")
+    file_path = Column(String, index=True)
     file_name = Column(String)
     file_type = Column(String)
     file_size = Column(Integer)
@@ -92,12 +122,18 @@ class DocumentChunk(Base):
     __tablename__ = "document_chunks"
 
     id = Column(Integer, primary_key=True, index=True)
+    generation = Column(Integer, index=True, nullable=False, server_default="1")
     document_id = Column(Integer, index=True)
     chunk_index = Column(Integer)
     content = Column(Text)
-    embedding = Column(Vector(1536))  # OpenAI text-embedding-3-small dimension
+    embedding = Column(Vector(EMBEDDING_DIMENSIONS))  # OpenAI text-embedding-3-small dimension
+    embedding_coarse = Column(Vector(COARSE_EMBEDDING_DIMENSIONS), nullable=True)  # normalised prefix of embedding
+    category = Column(String, nullable=False, server_default="General")  # top-level knowledge base folder
+    content_simhash = Column(BigInteger, nullable=True)  # 64-bit SimHash of content, for near-duplicate collapsing
     chunk_metadata = Column(JSON)
 
 # Create vector index
 Index('document_chunks_embedding_idx', DocumentChunk.embedding, postgresql_using='ivfflat')
+# Category pre-filtering within a generation
+Index('document_chunks_generation_category_idx', DocumentChunk.generation, DocumentChunk.category)
 
@@ -15,7 +15,7 @@ load_dotenv()
 # Set up structured logging
 logging.basicConfig(
     level=logging.INFO,
-    format='{"timestamp": "%(asctime)s", "level": "%(levelname)s", "message": "%(message)s"}',
+    format='{"timestamp": "%(asctime)s", "level": "%(levelname)s", "trace_id": "%(trace_id)s", "message": "%(message)s"}',
     datefmt='%Y-%m-%dT%H:%M:%S%z'
 )
 
@@ -24,6 +24,10 @@ backend_dir = Path(__file__).parent
 project_root = backend_dir.parent
 sys.path.insert(0, str(project_root))
 
+# Stamp the active trace id on every log line
+from backend.services.tracing import install_log_filter
+install_log_filter()
+
 def main():
     """Main function to initialize the backend server."""
     print("🚀 Chatbot Backend - Project scaffold initialized!")
@@ -59,7 +63,7 @@ def main():
 #     main()
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Query, Depends
+from fastapi import FastAPI, Query, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 print("Main module loaded")
@@ -69,8 +73,16 @@ from backend.api.chat import router as chat_router
 from backend.api.hubspot import router as hubspot_router
 from backend.api.intent import router as intent_router
 from backend.api.health import router as health_router
+from backend.api.metrics import router as metrics_router
+from backend.api.ws_chat import router as ws_chat_router
+from backend.services.admission import AdmissionMiddleware
+from backend.services.cache_warmup import cache_warmup
+from backend.services.rate_limit import RateLimitMiddleware
+from backend.services.tracing import tracer, parse_traceparent
 from backend.services.rag_service import RAGService
-from backend.db.database import create_tables
+from backend.services.query_log import unanswered_log
+from backend.db.database import create_tables, dispose_engines
+from knowledge_base.processors.generations import try_rebuild_lock
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -81,15 +93,28 @@ async def lifespan(app: FastAPI):
         create_tables()
         logging.info("Database tables created successfully")
 
-        # Initialize RAG system
+        # Initialize RAG system; skip the ingest if another worker or the CLI is already rebuilding
         rag_service = RAGService()
-        rag_service.process_knowledge_base()
+        release = try_rebuild_lock()
+        if release is None:
+            logging.info("A knowledge base rebuild is running elsewhere; skipping the startup ingest")
+        else:
+            try:
+                rag_service.process_knowledge_base()
+            finally:
+                release()
         logging.info("RAG system initialized successfully")
 
+        # Fill the query caches from historical queries in the background, without delaying readiness
+        cache_warmup.start(rag_service.asearch_documents_batch)
+
     except Exception as e:
         logging.error(f"Error initializing system: {e}")
         logging.warning("The system will continue but some functionality may not work properly.")
     yield
+    cache_warmup.stop()
+    unanswered_log.close()
+    await dispose_engines()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -97,6 +122,11 @@ app = FastAPI(lifespan=lifespan)
 allowed_origins = os.getenv('ALLOWED_ORIGINS', 'http://localhost:3000,http://127.0.0.1:3000,http://localhost:4173,http://127.0.0.1:4173')
 allow_origins_list = [origin.strip() for origin in allowed_origins.split(',') if origin.strip()]
 
+# Shed load on the chat and booking routes; added before CORS so 503s and 429s still carry CORS headers
+app.add_middleware(AdmissionMiddleware)
+# Per-client limits, checked before a request can take an admission slot
+app.add_middleware(RateLimitMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -106,12 +136,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Open the root span for each request, continuing an incoming traceparent."""
+    if not tracer.enabled:
+        return await call_next(request)
+    trace_id, parent_id = parse_traceparent(request.headers.get("traceparent"))
+    with tracer.span(f"{request.method} {request.url.path}", trace_id=trace_id, parent_id=parent_id,
+                     **{"http.method": request.method, "http.path": request.url.path}) as span:
+        response = await call_next(request)
+        span.set_attribute("http.status_code", response.status_code)
+    if span.trace_id:
+        response.headers["X-Trace-Id"] = span.trace_id
+    return response
+
 app.include_router(router, prefix="/api")
 app.include_router(calendar_router, prefix="/api")
 app.include_router(chat_router, prefix="/api")
 app.include_router(hubspot_router, prefix="/api")
 app.include_router(intent_router, prefix="/api")
 app.include_router(health_router, prefix="/api")
+app.include_router(metrics_router)
+app.include_router(ws_chat_router)
 
 @app.get("/")
 async def root():
@@ -121,6 +167,10 @@ async def root():
         "endpoints": {
             "search": "/api/rag-search?q=your_query",
             "health": "/health",
+            "chat_websocket": "/ws/chat",
+            "metrics": "/metrics",
+            "admission": "/admission",
+            "tracing": "/tracing",
             "docs": "/docs"
         }
     }
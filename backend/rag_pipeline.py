@@ -131,10 +131,9 @@ def generate_answer(query, docs, session_context=None):
     
     # Use OpenAI to generate a proper answer
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-        response = client.chat.completions.create(
+        from backend.services.openai_gateway import openai_gateway
+
+        response = openai_gateway.chat_completion(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided context from a knowledge base. Use the retrieved documents to provide accurate, relevant answers."},
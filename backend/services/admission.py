@@ -0,0 +1,333 @@
+"""
+Admission control and load shedding for HTTP routes
+
+Routes are grouped into classes (chat, booking), each with a concurrency
+limit, a bounded wait queue and a longest acceptable wait; all classes
+also share one overall concurrency limit. A request that cannot start at
+once waits in the queue, and when a slot frees, higher-priority classes
+(booking, by default) are admitted first.
+
+A request is rejected with a fast 503 and a Retry-After header instead
+of queueing when
+
+    queue_full  its class's queue is full
+    deadline    the expected wait (queue position times the class's
+                recent service time) is already longer than max_wait
+    timeout     it waited max_wait without being admitted
+
+so when upstream calls slow down, the requests that are accepted still
+finish in bounded time and the rest fail fast instead of piling up in
+the server. A queued request whose client disconnects leaves the queue
+at once instead of taking a slot when its turn comes.
+"""
+
+import asyncio
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from fastapi.responses import JSONResponse
+
+from backend.services.metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUED, ADMISSION_SHED, ADMISSION_WAIT
+
+
+def match_path(path: str, patterns: Sequence[str]) -> bool:
+    """Whether path is one of patterns; a pattern ending in "/" matches everything under it."""
+    return any(path.startswith(p) if p.endswith("/") else path == p for p in patterns)
+
+
+class Overloaded(Exception):
+    """A request was shed; retry_after is a hint in whole seconds."""
+
+    def __init__(self, route_class: str, reason: str, retry_after: int):
+        super().__init__(f"{route_class} overloaded ({reason})")
+        self.route_class = route_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RouteClass:
+    """Limits and live counts for a group of routes."""
+
+    def __init__(self, name: str, paths: Sequence[str], max_concurrency: int, max_queue: int,
+                 max_wait: float, priority: int = 0):
+        """
+        Args:
+            name: Label for metrics
+            paths: Paths in the class; one ending in "/" matches everything under it
+            max_concurrency: Requests of this class running at once
+            max_queue: Requests of this class waiting at once
+            max_wait: Longest a request may wait for admission (seconds)
+            priority: Higher classes are admitted first when slots free up
+        """
+        self.name = name
+        self.paths = tuple(paths)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.priority = priority
+        self.in_flight = 0
+        self.queued = 0
+        self.shed = 0
+        # Moving average of how long an admitted request runs, for wait estimates
+        self.service_time = 0.0
+
+    def matches(self, path: str) -> bool:
+        return match_path(path, self.paths)
+
+
+class AdmissionController:
+    """Per-class concurrency limits with bounded, prioritized, deadline-aware queues."""
+
+    def __init__(self, route_classes: Sequence[RouteClass], max_concurrency: int, enabled: bool = True):
+        """
+        Args:
+            route_classes: The route classes; requests to other paths are not limited
+            max_concurrency: Requests of all classes running at once
+            enabled: When False every request is admitted
+        """
+        self.route_classes = list(route_classes)
+        self.max_concurrency = max_concurrency
+        self.enabled = enabled
+        self.in_flight = 0
+        # [-priority, arrival, future, route class], admitted in that order
+        self._waiters: List[List[Any]] = []
+        self._arrivals = itertools.count()
+
+    def route_class(self, path: str) -> Optional[RouteClass]:
+        """The class path belongs to, or None if it is not limited."""
+        for route_class in self.route_classes:
+            if route_class.matches(path):
+                return route_class
+        return None
+
+    def _has_room(self, route_class: RouteClass) -> bool:
+        return self.in_flight < self.max_concurrency and route_class.in_flight < route_class.max_concurrency
+
+    def _start(self, route_class: RouteClass):
+        self.in_flight += 1
+        route_class.in_flight += 1
+        ADMISSION_IN_FLIGHT.set(route_class.in_flight, route_class=route_class.name)
+
+    def _estimated_wait(self, route_class: RouteClass) -> float:
+        """Expected seconds until a request joining route_class's queue now would start."""
+        ahead = sum(1 for waiter in self._waiters if -waiter[0] >= route_class.priority) + 1
+        slots = max(1, min(route_class.max_concurrency, self.max_concurrency))
+        return math.ceil(ahead / slots) * route_class.service_time
+
+    def _shed(self, route_class: RouteClass, reason: str, estimate: float = 0.0) -> Overloaded:
+        route_class.shed += 1
+        ADMISSION_SHED.inc(route_class=route_class.name, reason=reason)
+        retry_after = max(1, math.ceil(estimate or route_class.service_time or 1))
+        return Overloaded(route_class.name, reason, retry_after)
+
+    async def acquire(self, route_class: RouteClass):
+        """
+        Wait for a slot in route_class; pair with release().
+
+        Raises:
+            Overloaded: The request should be rejected
+        """
+        if self._has_room(route_class):
+            self._start(route_class)
+            ADMISSION_WAIT.observe(0.0, route_class=route_class.name)
+            return
+        if route_class.queued >= route_class.max_queue:
+            raise self._shed(route_class, "queue_full")
+        estimate = self._estimated_wait(route_class)
+        if estimate > route_class.max_wait:
+            raise self._shed(route_class, "deadline", estimate)
+
+        enqueued = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        waiter = [-route_class.priority, next(self._arrivals), future, route_class]
+        self._waiters.append(waiter)
+        self._waiters.sort(key=lambda w: (w[0], w[1]))
+        route_class.queued += 1
+        ADMISSION_QUEUED.set(route_class.queued, route_class=route_class.name)
+        try:
+            # _dispatch() counts the request as started before resolving the future
+            await asyncio.wait_for(future, route_class.max_wait)
+        except asyncio.TimeoutError:
+            raise self._shed(route_class, "timeout") from None
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the client went away
+                self.release(route_class, 0.0)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            route_class.queued -= 1
+            ADMISSION_QUEUED.set(route_class.queued, route_class=route_class.name)
+        ADMISSION_WAIT.observe(time.perf_counter() - enqueued, route_class=route_class.name)
+
+    def release(self, route_class: RouteClass, duration: float):
+        """Free route_class's slot and admit whoever is next."""
+        self.in_flight -= 1
+        route_class.in_flight -= 1
+        ADMISSION_IN_FLIGHT.set(route_class.in_flight, route_class=route_class.name)
+        if duration:
+            route_class.service_time = duration if not route_class.service_time \
+                else 0.8 * route_class.service_time + 0.2 * duration
+        self._dispatch()
+
+    def _dispatch(self):
+        for waiter in list(self._waiters):
+            if self.in_flight >= self.max_concurrency:
+                break
+            future, route_class = waiter[2], waiter[3]
+            if future.done() or not self._has_room(route_class):
+                continue
+            self._waiters.remove(waiter)
+            self._start(route_class)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, route_class: RouteClass):
+        """Hold a slot in route_class for the duration of the block."""
+        await self.acquire(route_class)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(route_class, time.perf_counter() - started)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Limits and current counts, per class."""
+        return {
+            "enabled": self.enabled,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "route_classes": {
+                route_class.name: {
+                    "paths": list(route_class.paths),
+                    "priority": route_class.priority,
+                    "max_concurrency": route_class.max_concurrency,
+                    "max_queue": route_class.max_queue,
+                    "max_wait": route_class.max_wait,
+                    "in_flight": route_class.in_flight,
+                    "queued": route_class.queued,
+                    "shed": route_class.shed,
+                    "service_time": round(route_class.service_time, 3)
+                }
+                for route_class in self.route_classes
+            }
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an AdmissionController to HTTP requests."""
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        route_class = None
+        if scope["type"] == "http" and self.controller.enabled:
+            route_class = self.controller.route_class(scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            receive = await self._admit(route_class, receive)
+        except Overloaded as e:
+            response = JSONResponse(
+                {"detail": "The server is busy, please retry shortly."},
+                status_code=503,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+        if receive is None:
+            # The client went away while queued; nobody is left to answer
+            return
+        started = time.perf_counter()
+        try:
+            # The slot is held until the response body is sent, streamed or not
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class, time.perf_counter() - started)
+
+    async def _admit(self, route_class: RouteClass,
+                     receive: Callable[[], Awaitable[Dict[str, Any]]]) -> Optional[Callable[[], Awaitable[Dict[str, Any]]]]:
+        """
+        Acquire a slot, watching the client while queued.
+
+        Returns:
+            The receive callable for the app (replaying messages read while
+            queued), or None if the client disconnected before admission
+
+        Raises:
+            Overloaded: The request should be rejected
+        """
+        acquire = asyncio.ensure_future(self.controller.acquire(route_class))
+        # Let acquire() run: a request admitted at once never touches receive
+        await asyncio.sleep(0)
+        received: List[Dict[str, Any]] = []
+        pending: Optional[asyncio.Future] = None
+        try:
+            while not acquire.done():
+                if pending is None:
+                    pending = asyncio.ensure_future(receive())
+                await asyncio.wait({acquire, pending}, return_when=asyncio.FIRST_COMPLETED)
+                if pending.done() and not acquire.done():
+                    message = pending.result()
+                    pending = None
+                    if message["type"] == "http.disconnect":
+                        acquire.cancel()
+                        try:
+                            await acquire
+                        except (asyncio.CancelledError, Overloaded):
+                            pass
+                        return None
+                    # Request body, kept for the app
+                    received.append(message)
+            acquire.result()
+        except BaseException:
+            if acquire.done() and not acquire.cancelled() and acquire.exception() is None:
+                # Admitted just as this task was cancelled
+                self.controller.release(route_class, 0.0)
+            raise
+        finally:
+            acquire.cancel()
+            if pending is not None and pending.done():
+                received.append(pending.result())
+            elif pending is not None:
+                # ASGI receive is safe to cancel; the app reads the message itself
+                pending.cancel()
+        if not received:
+            return receive
+
+        async def replay():
+            return received.pop(0) if received else await receive()
+        return replay
+
+
+# Global admission controller instance
+admission_controller = AdmissionController(
+    route_classes=[
+        RouteClass(
+            "booking",
+            ["/api/create-booking", "/api/schedule-check", "/api/calendar/create", "/api/calendar/freebusy"],
+            max_concurrency=int(os.getenv("ADMISSION_BOOKING_CONCURRENCY", "16")),
+            max_queue=int(os.getenv("ADMISSION_BOOKING_QUEUE", "32")),
+            max_wait=float(os.getenv("ADMISSION_BOOKING_MAX_WAIT", "10")),
+            priority=1 if os.getenv("ADMISSION_BOOKING_PRIORITY", "1").lower() not in ("0", "false", "no") else 0
+        ),
+        RouteClass(
+            "chat",
+            ["/api/chat", "/api/rag-answer"],
+            max_concurrency=int(os.getenv("ADMISSION_CHAT_CONCURRENCY", "32")),
+            max_queue=int(os.getenv("ADMISSION_CHAT_QUEUE", "64")),
+            max_wait=float(os.getenv("ADMISSION_CHAT_MAX_WAIT", "5"))
+        )
+    ],
+    max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", "40")),
+    enabled=os.getenv("ADMISSION_ENABLED", "1").lower() not in ("0", "false", "no")
+)
@@ -0,0 +1,451 @@
+"""
+Layered cache shared across workers
+
+A Cache looks a key up in its layers in order and fills the faster
+layers on the way back:
+
+    L1  LRUBackend       in this process, bounded by bytes
+    L2  RedisBackend     any Redis-protocol server (CACHE_L2=redis)
+        PostgresBackend  an UNLOGGED table (CACHE_L2=postgres, migration 0008)
+        MemoryBackend    a dict standing in for a shared store, for tests
+
+Values are stored encoded (encode_value): vectors as packed float32,
+about a fifth of their JSON size, everything else as compact JSON. So L1
+is bounded in bytes and every caller gets its own copy.
+
+get_or_compute() adds
+    negative caching   a compute that returns None is remembered (for
+                       negative_ttl) so misses are not recomputed
+    stampede control   concurrent misses in a process share one compute
+                       (single_flight); across workers, the first to take
+                       a short L2 lock computes while the others poll L2
+
+An L2 that fails or times out counts as a miss, so the cache never turns
+an outage of the shared store into failed requests.
+"""
+
+import array
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from backend.services.metrics import CACHE_LAYER_REQUESTS, record_cache
+from backend.services.single_flight import SingleFlight
+
+# Tags of the encoded forms
+_VECTOR = b"v"
+_JSON = b"j"
+_NONE = b"n"
+
+
+def encode_value(value: Any) -> bytes:
+    """Encode a value for storage: None, a list of floats (packed float32) or anything JSON can hold."""
+    if value is None:
+        return _NONE
+    if isinstance(value, list) and value and all(isinstance(x, float) for x in value):
+        return _VECTOR + array.array("f", value).tobytes()
+    return _JSON + json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def decode_value(data: bytes) -> Any:
+    """Inverse of encode_value (vectors come back as lists of floats, rounded to float32)."""
+    tag, payload = data[:1], data[1:]
+    if tag == _NONE:
+        return None
+    if tag == _VECTOR:
+        vector = array.array("f")
+        vector.frombytes(payload)
+        return vector.tolist()
+    if tag == _JSON:
+        return json.loads(payload)
+    raise ValueError(f"unknown cache value tag {tag!r}")
+
+
+class CacheBackend:
+    """A key -> bytes store with expiry; one layer of a Cache."""
+
+    name = "backend"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Set key only if it is absent (or expired); True if it was set."""
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+
+class LRUBackend(CacheBackend):
+    """In-process LRU, bounded by the total size of the stored values."""
+
+    name = "l1"
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        # key -> (value, expires_at)
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    def _lookup(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._lookup(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        if len(value) > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        if self._lookup(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: str):
+        self._remove(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MemoryBackend(LRUBackend):
+    """
+    Unbounded dict with expiry, standing in for a shared L2 in tests and
+    development: caches given the same instance share it the way workers
+    share a Redis server.
+    """
+
+    name = "l2"
+
+    def __init__(self):
+        super().__init__(max_bytes=2 ** 62)
+
+
+class RedisBackend(CacheBackend):
+    """L2 on any Redis-protocol server, over a small pool of connections speaking RESP."""
+
+    name = "l2"
+
+    def __init__(self, url: str = "redis://localhost:6379/0", pool_size: int = 4, timeout: float = 0.5):
+        """
+        Args:
+            url: redis://[:password@]host[:port][/db]
+            pool_size: Connections kept open
+            timeout: Seconds before a command counts as failed (and the lookup as a miss)
+        """
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        connection = (reader, writer)
+        if self.password:
+            await self._send(connection, "AUTH", self.password)
+        if self.db:
+            await self._send(connection, "SELECT", str(self.db))
+        return connection
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def _send(self, connection, *args):
+        reader, writer = connection
+        writer.write(self._encode(*args))
+        await writer.drain()
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by the cache server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            return (await reader.readexactly(length + 2))[:-2]
+        raise RuntimeError(f"unexpected reply {line!r}")
+
+    async def _command(self, *args):
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            try:
+                if connection is None:
+                    connection = await asyncio.wait_for(self._connect(), self.timeout)
+                reply = await asyncio.wait_for(self._send(connection, *args), self.timeout)
+            except BaseException:
+                # The connection may hold a half-read reply; never reuse it
+                if connection is not None:
+                    connection[1].close()
+                raise
+            self._idle.append(connection)
+            return reply
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._command("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._command("SET", key, value, "PX", max(1, int(ttl * 1000)))
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return await self._command("SET", key, value, "PX", max(1, int(ttl * 1000)), "NX") == "OK"
+
+    async def delete(self, key: str):
+        await self._command("DEL", key)
+
+
+class PostgresBackend(CacheBackend):
+    """
+    L2 in the cache_entries UNLOGGED table: no WAL, so writes are cheap, and
+    its contents are lost on a crash, which a cache can afford.
+    """
+
+    name = "l2"
+
+    def __init__(self, purge_interval: float = 300.0):
+        """
+        Args:
+            purge_interval: Seconds between deletes of expired rows
+        """
+        self.purge_interval = purge_interval
+        self._next_purge = time.monotonic() + purge_interval
+
+    async def _execute(self, sql: str, **params):
+        from sqlalchemy import text
+        from backend.db.database import get_async_engine
+        async with get_async_engine().begin() as connection:
+            return (await connection.execute(text(sql), params)).first()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        row = await self._execute(
+            "SELECT value FROM cache_entries WHERE key = :key AND expires_at > now()", key=key)
+        return bytes(row[0]) if row else None
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._execute(
+            "INSERT INTO cache_entries (key, value, expires_at) "
+            "VALUES (:key, :value, now() + make_interval(secs => :ttl)) "
+            "ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at",
+            key=key, value=value, ttl=float(ttl))
+        await self._maybe_purge()
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        row = await self._execute(
+            "INSERT INTO cache_entries (key, value, expires_at) "
+            "VALUES (:key, :value, now() + make_interval(secs => :ttl)) "
+            "ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at "
+            "WHERE cache_entries.expires_at <= now() RETURNING key",
+            key=key, value=value, ttl=float(ttl))
+        return row is not None
+
+    async def delete(self, key: str):
+        await self._execute("DELETE FROM cache_entries WHERE key = :key", key=key)
+
+    async def _maybe_purge(self):
+        now = time.monotonic()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + self.purge_interval
+        await self._execute("DELETE FROM cache_entries WHERE expires_at <= now()")
+
+
+class Cache:
+    """A namespace of cached values over an L1 and an optional shared L2."""
+
+    def __init__(self, namespace: str, ttl: float = 3600.0, negative_ttl: float = 60.0,
+                 l1_max_bytes: int = 16 * 1024 * 1024, l1_ttl: float = 300.0,
+                 l2: Optional[CacheBackend] = None, lock_ttl: float = 10.0, lock_wait: float = 2.0):
+        """
+        Args:
+            namespace: Key prefix and metrics label
+            ttl: Seconds a value is kept
+            negative_ttl: Seconds a None result is kept (0 to not cache None)
+            l1_max_bytes: Size of this process's LRU
+            l1_ttl: Longest a value stays in L1, which other workers' deletes do not reach
+            l2: Shared layer, or None for an in-process cache only
+            lock_ttl: Seconds a worker may hold the compute lock for a key
+            lock_wait: Longest another worker polls L2 for that value before computing it too
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.l1_ttl = l1_ttl
+        self.lock_ttl = lock_ttl
+        self.lock_wait = lock_wait
+        self.layers: List[CacheBackend] = [LRUBackend(l1_max_bytes)] + ([l2] if l2 is not None else [])
+        self._flights = SingleFlight(f"cache_{namespace}")
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _layer_ttl(self, index: int, ttl: float) -> float:
+        return min(ttl, self.l1_ttl) if index == 0 else ttl
+
+    async def _layer_call(self, layer: CacheBackend, method: str, *args):
+        """Call a layer, treating a failed shared layer as absent."""
+        try:
+            return await getattr(layer, method)(*args)
+        except Exception as e:
+            if method == "get":
+                CACHE_LAYER_REQUESTS.inc(cache=self.namespace, layer=layer.name, result="error")
+            print(f"Warning: cache {self.namespace} {layer.name} {method} failed: {e}")
+            return None
+
+    async def lookup(self, key: str) -> Tuple[bool, Any]:
+        """
+        Look key up, filling faster layers from slower ones.
+
+        Returns:
+            (found, value); found is True with value None for a cached negative result
+        """
+        full_key = self._key(key)
+        for index, layer in enumerate(self.layers):
+            data = await self._layer_call(layer, "get", full_key)
+            if data is None:
+                CACHE_LAYER_REQUESTS.inc(cache=self.namespace, layer=layer.name, result="miss")
+                continue
+            negative = data == _NONE
+            CACHE_LAYER_REQUESTS.inc(cache=self.namespace, layer=layer.name,
+                                     result="negative_hit" if negative else "hit")
+            for upper in self.layers[:index]:
+                await self._layer_call(upper, "set", full_key, data,
+                                       self.l1_ttl if not negative else min(self.l1_ttl, self.negative_ttl))
+            record_cache(self.namespace, True)
+            return True, decode_value(data)
+        record_cache(self.namespace, False)
+        return False, None
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        """The cached value, or default if it is not cached (or cached as None)."""
+        found, value = await self.lookup(key)
+        return value if found and value is not None else default
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store value in every layer (None is stored as a negative result, for negative_ttl)."""
+        if value is None:
+            ttl = self.negative_ttl
+            if not ttl:
+                return
+        elif ttl is None:
+            ttl = self.ttl
+        data = encode_value(value)
+        full_key = self._key(key)
+        for index, layer in enumerate(self.layers):
+            await self._layer_call(layer, "set", full_key, data, self._layer_ttl(index, ttl))
+
+    async def delete(self, key: str):
+        """Remove key from every layer (other workers' L1 copies expire within l1_ttl)."""
+        full_key = self._key(key)
+        for layer in self.layers:
+            await self._layer_call(layer, "delete", full_key)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]],
+                             ttl: Optional[float] = None) -> Any:
+        """
+        The cached value for key, computing and storing it on a miss.
+
+        Args:
+            key: Cache key within the namespace
+            compute: Coroutine function producing the value; exceptions are not cached
+            ttl: Seconds to keep the value (default: the cache's ttl)
+
+        Returns:
+            The value (None for a negative result)
+        """
+        found, value = await self.lookup(key)
+        if found:
+            return value
+        return await self._flights.run(key, lambda: self._compute(key, compute, ttl))
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> Any:
+        shared = self.layers[1] if len(self.layers) > 1 else None
+        lock_key = self._key(key) + ":lock"
+        locked = False
+        if shared is not None:
+            try:
+                locked = await shared.add(lock_key, b"1", self.lock_ttl)
+            except Exception as e:
+                # Shared layer down: compute here rather than wait on it
+                print(f"Warning: cache {self.namespace} {shared.name} add failed: {e}")
+                shared = None
+            if shared is not None and not locked:
+                # Another worker is computing it; wait for its result rather than repeat the work
+                deadline = time.monotonic() + self.lock_wait
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(0.05)
+                    data = await self._layer_call(shared, "get", self._key(key))
+                    if data is not None:
+                        await self._layer_call(self.layers[0], "set", self._key(key), data, self.l1_ttl)
+                        return decode_value(data)
+        try:
+            value = await compute()
+            await self.set(key, value, ttl)
+            return value
+        finally:
+            if locked:
+                await self._layer_call(shared, "delete", lock_key)
+
+
+_shared_backend: Optional[CacheBackend] = None
+
+
+def shared_backend() -> Optional[CacheBackend]:
+    """
+    The process's L2, from CACHE_L2: 'redis' (CACHE_REDIS_URL), 'postgres'
+    or 'none' (the default, in-process caching only).
+    """
+    global _shared_backend
+    if _shared_backend is None:
+        kind = os.getenv("CACHE_L2", "none").lower()
+        if kind == "redis":
+            _shared_backend = RedisBackend(
+                os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"),
+                pool_size=int(os.getenv("CACHE_REDIS_POOL_SIZE", "4")),
+                timeout=float(os.getenv("CACHE_L2_TIMEOUT", "0.5"))
+            )
+        elif kind == "postgres":
+            _shared_backend = PostgresBackend()
+        elif kind not in ("", "none"):
+            print(f"Warning: unknown CACHE_L2 {kind!r}; caching in-process only")
+    return _shared_backend
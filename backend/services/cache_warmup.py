@@ -0,0 +1,233 @@
+"""
+Cache warmup from historical queries
+
+After a deploy every worker starts with empty caches, so the first
+visitors asking the most common questions pay for the query embedding and
+the vector search. At startup CacheWarmup
+
+    1. collects the most frequent historical queries (top_n): user messages
+       from the session logs (sessions.messages) and the unanswered query
+       log, including the legacy unanswered_queries.json, counted by
+       normalized query (query_log.aggregate)
+    2. runs them through the batch search, batch_size at a time; each batch
+       embeds only the queries missing from query_embedding_cache in one
+       OpenAI request and fills query_embedding_cache and retrieval_cache
+
+It runs as a background task once the server is up, so readiness is not
+delayed, and with a shared L2 (CACHE_L2) workers that start later find
+most of the entries already there.
+
+For report_seconds after warming finishes (an hour by default) lookups
+in the warmed caches are counted; snapshot() (GET /cache/warmup) reports
+the hit ratios so far, and the final ratios are logged when the window
+closes.
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+
+from backend.services.metrics import CACHE_REQUESTS
+from backend.services.query_log import aggregate, read_entries, unanswered_log
+
+# Caches the warmup fills, by metrics namespace
+WARMED_CACHES = ("query_embedding", "retrieval")
+
+
+class CacheWarmup:
+    """Pre-populates the query caches from historical queries and reports hit ratios after a deploy."""
+
+    def __init__(self, top_n: int = 200, batch_size: int = 32, max_sessions: int = 5000,
+                 report_seconds: float = 3600.0, log_path: Optional[Path] = None,
+                 caches: Iterable[str] = WARMED_CACHES, enabled: bool = True):
+        """
+        Args:
+            top_n: Most frequent historical queries to warm
+            batch_size: Queries per batch search (and embedding request)
+            max_sessions: Most recent sessions to read user messages from
+            report_seconds: How long after warming to count hits and misses
+            log_path: Unanswered query log (default: the one unanswered_log writes)
+            caches: Cache namespaces to report on
+            enabled: When False start() does nothing
+        """
+        self.top_n = top_n
+        self.batch_size = max(1, batch_size)
+        self.max_sessions = max_sessions
+        self.report_seconds = report_seconds
+        self.log_path = log_path
+        self.caches = tuple(caches)
+        self.enabled = enabled
+        self.state = "idle"
+        self.queries = 0
+        self.warmed = 0
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        # Counter values when the report window opened, and the final counts once it closed
+        self._baseline: Optional[Dict[str, Dict[str, float]]] = None
+        self._final: Optional[Dict[str, Dict[str, float]]] = None
+        self._window_start: Optional[float] = None
+
+    async def _session_entries(self) -> List[Dict[str, Any]]:
+        """User messages from the most recent sessions, as query log entries."""
+        from backend.db.database import AsyncSessionLocal
+        from backend.db.models import Session as SessionModel
+
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(SessionModel.messages).order_by(SessionModel.started_at.desc()).limit(self.max_sessions)
+            )).scalars().all()
+
+        entries = []
+        for messages in rows:
+            if isinstance(messages, str):
+                try:
+                    messages = json.loads(messages)
+                except ValueError:
+                    continue
+            for message in messages or []:
+                if isinstance(message, dict) and message.get("role") == "user" and message.get("content"):
+                    entries.append({"query": message["content"], "timestamp": message.get("timestamp")})
+        return entries
+
+    def _log_entries(self) -> List[Dict[str, Any]]:
+        path = Path(self.log_path or unanswered_log.path)
+        # The JSON-lines log, its rotated files and the old unanswered_queries.json beside it
+        return list(read_entries(path, legacy_path=path.with_suffix(".json")))
+
+    async def historical_queries(self) -> List[str]:
+        """
+        The top_n most frequent historical queries, most frequent first.
+
+        A source that cannot be read is skipped with a warning.
+        """
+        entries: List[Dict[str, Any]] = []
+        try:
+            entries.extend(await self._session_entries())
+        except Exception as e:
+            print(f"Warning: cache warmup could not read session logs: {e}")
+        try:
+            entries.extend(await asyncio.to_thread(self._log_entries))
+        except Exception as e:
+            print(f"Warning: cache warmup could not read the unanswered query log: {e}")
+        return [row["query"] for row in aggregate(entries)[:self.top_n]]
+
+    async def warm(self, search: Callable[[List[str]], Awaitable[Any]]) -> int:
+        """
+        Run the historical queries through search, batch_size at a time.
+
+        Args:
+            search: Batch search filling the caches, e.g. RAGService.asearch_documents_batch
+
+        Returns:
+            Number of queries warmed
+        """
+        self.state = "warming"
+        self.started_at = time.time()
+        queries = await self.historical_queries()
+        self.queries = len(queries)
+        for start in range(0, len(queries), self.batch_size):
+            await search(queries[start:start + self.batch_size])
+            self.warmed += len(queries[start:start + self.batch_size])
+        self.finished_at = time.time()
+        self.state = "warm"
+        return self.warmed
+
+    async def run(self, search: Callable[[List[str]], Awaitable[Any]]):
+        """Warm the caches, then count hits and misses for report_seconds and log the result."""
+        try:
+            await self.warm(search)
+            print(f"Cache warmup: {self.warmed} of {self.queries} historical queries warmed in "
+                  f"{self.finished_at - self.started_at:.1f}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Serving continues with cold caches
+            self.state = "failed"
+            self.error = str(e)
+            print(f"Warning: cache warmup failed after {self.warmed} queries: {e}")
+
+        self._baseline, self._window_start = self._counts(), time.time()
+        await asyncio.sleep(self.report_seconds)
+        self._final = self._since_baseline()
+        print(f"Cache warmup: hit ratios in the {self.report_seconds / 60:.0f} minutes after warmup: "
+              + json.dumps(self._ratios(self._final)))
+
+    def start(self, search: Callable[[List[str]], Awaitable[Any]]) -> Optional[asyncio.Task]:
+        """Start run() in the background; call from the running event loop."""
+        if not self.enabled or self._task is not None:
+            return self._task
+        self._task = asyncio.get_running_loop().create_task(self.run(search))
+        return self._task
+
+    def stop(self):
+        """Cancel the background task, if it is still running."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def _counts(self) -> Dict[str, Dict[str, float]]:
+        return {
+            cache: {result: CACHE_REQUESTS.get(cache=cache, result=result) for result in ("hit", "miss")}
+            for cache in self.caches
+        }
+
+    def _since_baseline(self) -> Dict[str, Dict[str, float]]:
+        now = self._counts()
+        return {
+            cache: {result: now[cache][result] - self._baseline[cache][result] for result in ("hit", "miss")}
+            for cache in self.caches
+        }
+
+    @staticmethod
+    def _ratios(counts: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for cache, count in counts.items():
+            lookups = count["hit"] + count["miss"]
+            report[cache] = {
+                "hits": int(count["hit"]),
+                "misses": int(count["miss"]),
+                "hit_ratio": round(count["hit"] / lookups, 4) if lookups else None
+            }
+        return report
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Warmup progress and the hit ratios in the report window."""
+        report = None
+        if self._baseline is not None:
+            report = {
+                "window_seconds": self.report_seconds,
+                "elapsed": round(min(time.time() - self._window_start, self.report_seconds), 1),
+                "complete": self._final is not None,
+                "caches": self._ratios(self._final if self._final is not None else self._since_baseline())
+            }
+        return {
+            "enabled": self.enabled,
+            "state": self.state,
+            "queries": self.queries,
+            "warmed": self.warmed,
+            "error": self.error,
+            "started_at": _isoformat(self.started_at),
+            "finished_at": _isoformat(self.finished_at),
+            "report": report
+        }
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp else None
+
+
+# Global cache warmup instance
+cache_warmup = CacheWarmup(
+    top_n=int(os.getenv("CACHE_WARMUP_TOP_N", "200")),
+    batch_size=int(os.getenv("CACHE_WARMUP_BATCH_SIZE", "32")),
+    max_sessions=int(os.getenv("CACHE_WARMUP_MAX_SESSIONS", "5000")),
+    report_seconds=float(os.getenv("CACHE_WARMUP_REPORT_SECONDS", "3600")),
+    enabled=os.getenv("CACHE_WARMUP_ENABLED", "1").lower() not in ("0", "false", "no")
+)
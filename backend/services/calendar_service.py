@@ -12,6 +12,8 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from backend.services.metrics import EXTERNAL_CALL_LATENCY
+
 
 # backend/services/calendar_service.py (pseudocode)
 from datetime import datetime, timedelta
@@ -41,9 +43,15 @@ class CalendarService:
         self.client_secret = os.getenv('GOOGLE_CLIENT_SECRET')
         self.redirect_uri = os.getenv('GOOGLE_REDIRECT_URI', 'http://localhost:8000/api/calendar/callback')
         self.token_path = Path(__file__).parent.parent / 'token.pickle'
+        # Point at a stand-in server (e.g. scripts/fake_services.py) instead of Google
+        self.api_url = os.getenv('GOOGLE_CALENDAR_API_URL')
+        self.static_access_token = os.getenv('GOOGLE_CALENDAR_ACCESS_TOKEN')
 
     def get_credentials(self) -> Optional[Credentials]:
         """Get valid credentials for Google API."""
+        if self.static_access_token:
+            return Credentials(token=self.static_access_token)
+
         creds = None
         # The file token.pickle stores the user's access and refresh tokens
         if self.token_path.exists():
@@ -123,6 +131,14 @@ class CalendarService:
             print(f"OAuth completion failed: {e}")
             return False
 
+    def _build_service(self, creds: Credentials):
+        """Calendar API client, using GOOGLE_CALENDAR_API_URL when set."""
+        if self.api_url:
+            endpoint = self.api_url.rstrip('/') + '/calendar/v3/'
+            return build('calendar', 'v3', credentials=creds, client_options={"api_endpoint": endpoint})
+        return build('calendar', 'v3', credentials=creds)
+
+    @EXTERNAL_CALL_LATENCY.time(service="google_calendar", operation="freebusy")
     def get_freebusy(self, start: str, end: str, calendar_id: str = 'primary', timezone: str = 'UTC') -> Dict[str, Any]:
         """Get free/busy information for a calendar."""
         creds = self.get_credentials()
@@ -130,7 +146,7 @@ class CalendarService:
             raise Exception("No valid credentials. Please authenticate first.")
 
         try:
-            service = build('calendar', 'v3', credentials=creds)
+            service = self._build_service(creds)
 
             body = {
                 "timeMin": start,
@@ -144,6 +160,7 @@ class CalendarService:
         except HttpError as error:
             raise Exception(f"Freebusy query failed: {error}")
 
+    @EXTERNAL_CALL_LATENCY.time(service="google_calendar", operation="list_events")
     def get_events(self, calendar_id: str, time_min: str, time_max: str) -> List[Dict[str, Any]]:
         """Get calendar events between time_min and time_max."""
         creds = self.get_credentials()
@@ -151,7 +168,7 @@ class CalendarService:
             raise Exception("No valid credentials. Please authenticate first.")
 
         try:
-            service = build('calendar', 'v3', credentials=creds)
+            service = self._build_service(creds)
             events_result = service.events().list(
                 calendarId=calendar_id,
                 timeMin=time_min,
@@ -241,6 +258,7 @@ class CalendarService:
 
         return {"message": f"No available slots found within the next {searchHorizonHours} hours. Please try a different time or contact support for assistance."}
 
+    @EXTERNAL_CALL_LATENCY.time(service="google_calendar", operation="create_event")
     def create_event(self, summary: str, start: str, end: str, timezone: str = 'UTC',
                     description: Optional[str] = None, attendees: Optional[List[str]] = None,
                     calendar_id: str = 'primary') -> str:
@@ -250,7 +268,7 @@ class CalendarService:
             raise Exception("No valid credentials. Please authenticate first.")
 
         try:
-            service = build('calendar', 'v3', credentials=creds)
+            service = self._build_service(creds)
 
             event = {
                 'summary': summary,
@@ -9,6 +9,7 @@ from datetime import datetime
 from pathlib import Path
 
 from knowledge_base.processors.document_processor import DocumentProcessor
+from backend.services.openai_gateway import openai_gateway
 
 class ChatService:
     """Service for handling chat operations."""
@@ -62,12 +63,7 @@ class ChatService:
         Returns:
             List of relevant documents
         """
-        from backend.db.database import SessionLocal
-        db = SessionLocal()
-        try:
-            return self.document_processor.search_similar_documents(query, n_results=5, db=db)
-        finally:
-            db.close()
+        return await self.document_processor.asearch_similar_documents(query, n_results=5)
 
     def _generate_answer(self, query: str, docs: List[Dict[str, Any]]) -> str:
         """Generate an answer using retrieved documents and OpenAI."""
@@ -81,10 +77,7 @@ class ChatService:
         context = "\n\n".join(context_parts)
 
         try:
-            from openai import OpenAI
-            client = OpenAI(api_key=self.openai_key)
-
-            response = client.chat.completions.create(
+            response = openai_gateway.chat_completion(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided context. Be concise but informative."},
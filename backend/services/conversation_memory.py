@@ -0,0 +1,313 @@
+"""
+Per-session conversation memory for multi-turn chat
+
+Each session keeps its latest turns verbatim and folds older turns into a
+rolling summary, so the history that goes into a prompt stays under a
+fixed budget however long the conversation runs:
+
+    recent turns   at most recent_tokens; when a new turn pushes them over,
+                   the oldest turns are folded into the summary
+    summary        rewritten by the model, capped at summary_tokens
+
+After every turn the state is written to the conversation_states table
+and each message reads it back, so a session moving between workers
+continues where it left off. A turn is saved with a compare-and-set on
+the row's updated_at: if another worker stored a turn in the meantime,
+this one is redone on top of it rather than overwriting it. An in-memory
+LRU holds each session's latest state for when the database cannot be
+reached (and is the only store with persist=False).
+
+rewrite_query() uses the summary and the last turn to turn a follow-up
+("how much does that cost?") into a standalone search query.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from backend.services.metrics import STAGE_LATENCY, record_openai_usage
+from backend.services.openai_gateway import estimate_tokens, openai_gateway
+from backend.services.tracing import traced
+
+# Characters per token, the same rough ratio the gateway uses
+CHARS_PER_TOKEN = 4
+# Times a turn is redone when other workers keep storing turns for the same session
+STORE_ATTEMPTS = 3
+
+
+def _tokens(text: str) -> int:
+    return estimate_tokens({"input": text})
+
+
+def _clip(text: str, tokens: int) -> str:
+    """text cut to about tokens tokens."""
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+def _format_turns(turns: List[Dict[str, str]]) -> str:
+    return "\n".join(f"User: {turn['user']}\nAssistant: {turn['assistant']}" for turn in turns)
+
+
+def new_state() -> Dict[str, Any]:
+    """Memory of a conversation that has not started yet."""
+    return {"summary": "", "turns": [], "summarized_turns": 0}
+
+
+class ConversationMemory:
+    """Rolling summary plus recent turns per chat session, cached in memory and persisted to the database."""
+
+    def __init__(self, gateway=openai_gateway, model: str = "gpt-3.5-turbo", recent_tokens: int = 600,
+                 summary_tokens: int = 250, max_sessions: int = 1000, rewrite_queries: bool = True,
+                 persist: bool = True, session_factory: Optional[Callable[[], Any]] = None):
+        """
+        Args:
+            gateway: OpenAI gateway used for summaries and query rewriting
+            model: Chat model for summaries and query rewriting
+            recent_tokens: Budget for the turns kept verbatim
+            summary_tokens: Budget for the rolling summary
+            max_sessions: Sessions kept in memory (least recently used are dropped)
+            rewrite_queries: Rewrite follow-ups into standalone search queries
+            persist: Store each session in the conversation_states table and read it from there
+            session_factory: Opens an AsyncSession for persistence (default: AsyncSessionLocal)
+        """
+        self.gateway = gateway
+        self.model = model
+        self.recent_tokens = recent_tokens
+        self.summary_tokens = summary_tokens
+        self.max_sessions = max_sessions
+        self.rewrite_queries = rewrite_queries
+        self.persist = persist
+        self.session_factory = session_factory
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    # Reading
+
+    async def get(self, session_id: str) -> Dict[str, Any]:
+        """
+        Memory of a session: the stored one (which another worker may have
+        updated), else the cached copy, else a new one.
+
+        Returns:
+            {"summary", "turns", "summarized_turns"}; treat it as read-only
+        """
+        state, _ = await self._read(session_id)
+        self._cache(session_id, state)
+        return state
+
+    async def _read(self, session_id: str) -> Tuple[Dict[str, Any], Optional[datetime]]:
+        """The session's latest state and the stored row's updated_at (None if not stored)."""
+        if self.persist:
+            try:
+                stored, updated_at = await self._load(session_id)
+                if stored is not None:
+                    return stored, updated_at
+            except Exception as e:
+                print(f"Warning: could not load conversation {session_id}: {e}")
+        state = self._sessions.get(session_id)
+        return (state if state is not None else new_state()), None
+
+    def render(self, state: Dict[str, Any]) -> Optional[str]:
+        """
+        The conversation so far as prompt text, within summary_tokens + recent_tokens.
+
+        Returns:
+            The text, or None before the first turn
+        """
+        parts = []
+        if state["summary"]:
+            parts.append(f"Summary of the earlier conversation:\n{state['summary']}")
+        if state["turns"]:
+            parts.append(f"Most recent turns:\n{_format_turns(state['turns'])}")
+        return "\n\n".join(parts) or None
+
+    @STAGE_LATENCY.time(stage="rewrite_query")
+    @traced("conversation.rewrite_query")
+    async def rewrite_query(self, state: Dict[str, Any], message: str) -> str:
+        """
+        Rewrite a follow-up as a standalone search query, using the summary and the last turn.
+
+        Args:
+            state: The session's memory, from get()
+            message: The user's new message
+
+        Returns:
+            The query to search with (message itself for a first turn or when rewriting fails)
+        """
+        if not self.rewrite_queries or not (state["summary"] or state["turns"]):
+            return message
+        history = []
+        if state["summary"]:
+            history.append(f"Summary: {state['summary']}")
+        if state["turns"]:
+            history.append(_format_turns(state["turns"][-1:]))
+        try:
+            response = await self.gateway.achat_completion(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "Rewrite the user's latest message as a standalone search query for a company knowledge base. Resolve pronouns and references using the conversation. If the message is already standalone, return it unchanged. Return only the query."},
+                    {"role": "user", "content": "Conversation:\n" + "\n".join(history) + f"\n\nLatest message: {message}"}
+                ],
+                max_tokens=60,
+                temperature=0
+            )
+            record_openai_usage(response, self.model)
+            rewritten = (response.choices[0].message.content or "").strip().strip('"')
+            return rewritten or message
+        except Exception as e:
+            print(f"Error rewriting query: {e}")
+            return message
+
+    # Writing
+
+    async def add_turn(self, session_id: str, user_message: str, answer: str) -> Dict[str, Any]:
+        """
+        Record a finished turn, folding older turns into the summary when over budget, and persist it.
+
+        Args:
+            session_id: Chat session
+            user_message: What the user asked
+            answer: What the assistant replied
+
+        Returns:
+            The session's updated memory
+        """
+        turn = {
+            # One turn can take at most the whole recent budget
+            "user": _clip(user_message, self.recent_tokens // 4),
+            "assistant": _clip(answer, self.recent_tokens * 3 // 4)
+        }
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            for attempt in range(STORE_ATTEMPTS):
+                current, updated_at = await self._read(session_id)
+                # Never mutate the cached state: readers may be rendering it
+                state = {"summary": current["summary"], "turns": current["turns"] + [turn],
+                         "summarized_turns": current["summarized_turns"]}
+                await self._compact(state)
+                if not self.persist or await self._store(session_id, state, updated_at):
+                    break
+                # Another worker stored a turn since we read the row; add ours on top of it
+            else:
+                print(f"Warning: conversation {session_id} kept changing, turn kept in this worker only")
+            self._cache(session_id, state)
+            return state
+
+    async def _compact(self, state: Dict[str, Any]):
+        """Fold the oldest turns into the summary until the recent turns fit recent_tokens."""
+        overflow = []
+        while len(state["turns"]) > 1 and _tokens(_format_turns(state["turns"])) > self.recent_tokens:
+            overflow.append(state["turns"].pop(0))
+        if not overflow:
+            return
+        state["summarized_turns"] += len(overflow)
+        summary = await self._summarize(state["summary"], overflow)
+        if summary is not None:
+            state["summary"] = summary
+
+    @traced("conversation.summarize")
+    async def _summarize(self, summary: str, turns: List[Dict[str, str]]) -> Optional[str]:
+        """The summary updated with turns, or None if the model could not be reached (the turns are then dropped)."""
+        started = time.perf_counter()
+        try:
+            response = await self.gateway.achat_completion(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": f"You maintain a running summary of a conversation between a customer and a company's assistant. Update the summary with the new turns. Keep what the customer said about themselves and their needs (name, company, project, budget, timeline), the services and prices discussed, and any open questions. Write at most {self.summary_tokens * 3 // 4} words. Return only the summary."},
+                    {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{_format_turns(turns)}"}
+                ],
+                max_tokens=self.summary_tokens,
+                temperature=0.2
+            )
+            record_openai_usage(response, self.model)
+            text = (response.choices[0].message.content or "").strip()
+            return _clip(text, self.summary_tokens) if text else summary
+        except Exception as e:
+            print(f"Warning: could not summarize conversation, dropping {len(turns)} old turns: {e}")
+            return None
+        finally:
+            STAGE_LATENCY.observe(time.perf_counter() - started, stage="summarize_conversation")
+
+    def _cache(self, session_id: str, state: Dict[str, Any]):
+        self._sessions[session_id] = state
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            evicted, _ = self._sessions.popitem(last=False)
+            lock = self._locks.get(evicted)
+            if lock is not None and not lock.locked():
+                del self._locks[evicted]
+
+    # Persistence
+
+    def _open(self):
+        if self.session_factory is not None:
+            return self.session_factory()
+        from backend.db.database import AsyncSessionLocal
+        return AsyncSessionLocal()
+
+    async def _load(self, session_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[datetime]]:
+        """The stored state and its updated_at, or (None, None); raises if the database fails."""
+        from backend.db.models import ConversationState
+        async with self._open() as db:
+            row = (await db.execute(
+                select(ConversationState).where(ConversationState.session_id == session_id)
+            )).scalars().first()
+            if row is None:
+                return None, None
+            return {
+                "summary": row.summary or "",
+                "turns": json.loads(row.turns) if row.turns else [],
+                "summarized_turns": row.summarized_turns or 0
+            }, row.updated_at
+
+    async def _store(self, session_id: str, state: Dict[str, Any], updated_at: Optional[datetime]) -> bool:
+        """
+        Store state if the row is still as it was read (updated_at, None for no row).
+
+        Returns:
+            False if another worker changed the row first; True otherwise, also
+            when the database fails (the cached copy then serves this worker)
+        """
+        from backend.db.models import ConversationState
+        values = {
+            "summary": state["summary"],
+            "turns": json.dumps(state["turns"]),
+            "summarized_turns": state["summarized_turns"],
+            "updated_at": datetime.now(timezone.utc)
+        }
+        try:
+            async with self._open() as db:
+                if updated_at is None:
+                    db.add(ConversationState(session_id=session_id, **values))
+                    try:
+                        await db.commit()
+                    except IntegrityError:
+                        return False
+                    return True
+                result = await db.execute(
+                    update(ConversationState)
+                    .where(ConversationState.session_id == session_id, ConversationState.updated_at == updated_at)
+                    .values(**values)
+                )
+                await db.commit()
+                return result.rowcount == 1
+        except Exception as e:
+            print(f"Warning: could not store conversation {session_id}: {e}")
+            return True
+
+
+# Global conversation memory instance
+conversation_memory = ConversationMemory(
+    recent_tokens=int(os.getenv("CONVERSATION_RECENT_TOKENS", "600")),
+    summary_tokens=int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "250")),
+    max_sessions=int(os.getenv("CONVERSATION_CACHE_SIZE", "1000")),
+    rewrite_queries=os.getenv("CONVERSATION_REWRITE_QUERIES", "1").lower() not in ("0", "false", "no")
+)
@@ -0,0 +1,53 @@
+"""
+Pre-serialized JSON responses with strong ETags
+
+For endpoints that return the same static data to every caller: the body
+is encoded and hashed once, when the data is loaded, and each request
+either gets those bytes or, when its If-None-Match names the current
+ETag, an empty 304. Cache-Control lets browsers and CDNs keep the copy.
+"""
+
+import hashlib
+import json
+from typing import Any, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value names etag (weak comparison, as RFC 9110 asks)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class PreparedResponse:
+    """A JSON body encoded once, with its ETag and caching headers."""
+
+    __slots__ = ("body", "etag", "headers")
+
+    def __init__(self, content: Any, cache_control: str = "public, max-age=300"):
+        """
+        Args:
+            content: JSON-serializable data
+            cache_control: Cache-Control header sent with the body and with 304s
+        """
+        self.body = json.dumps(content, separators=(",", ":")).encode("utf-8")
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        self.headers = {"ETag": self.etag, "Cache-Control": cache_control}
+
+    def respond(self, request: Optional[Request] = None) -> Response:
+        """The body, or 304 Not Modified for a GET/HEAD whose If-None-Match names the ETag."""
+        if request is not None and request.method in ("GET", "HEAD") \
+                and etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=self.headers)
+        return Response(content=self.body, media_type="application/json", headers=self.headers)
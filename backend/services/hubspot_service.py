@@ -6,7 +6,9 @@ import requests
 from datetime import datetime
 from typing import Optional, Tuple, Dict, Any
 
-BASE_URL = "https://api.hubapi.com"
+from backend.services.metrics import EXTERNAL_CALL_LATENCY
+
+BASE_URL = os.environ.get("HUBSPOT_API_URL", "https://api.hubapi.com").rstrip("/")
 APP_BASE_URL = os.environ.get("APP_BASE_URL", "").rstrip("/")
 SESSIONS_API_URL = os.environ.get("SESSIONS_API_URL")  # optional: e.g. http://localhost:8001
 
@@ -31,6 +33,7 @@ def _ensure_int_if_digits(s: Any):
     s = str(s)
     return int(s) if s.isdigit() else s
 
+@EXTERNAL_CALL_LATENCY.time(service="hubspot", operation="search_contact")
 def search_contact_by_email(email: str, access_token: str) -> Tuple[Optional[str], Optional[dict]]:
     """
     Returns (contact_id, properties) or (None, None) if not found.
@@ -51,6 +54,7 @@ def search_contact_by_email(email: str, access_token: str) -> Tuple[Optional[str
         return results[0]["id"], results[0].get("properties", {})
     return None, None
 
+@EXTERNAL_CALL_LATENCY.time(service="hubspot", operation="create_contact")
 def create_contact(name: str, email: str, company: Optional[str] = None, access_token: str = None) -> str:
     url = f"{BASE_URL}/crm/v3/objects/contacts"
     first, last = _split_name(name)
@@ -67,6 +71,7 @@ def create_contact(name: str, email: str, company: Optional[str] = None, access_
     resp.raise_for_status()
     return resp.json()["id"]
 
+@EXTERNAL_CALL_LATENCY.time(service="hubspot", operation="update_contact")
 def update_contact(contact_id: str, name: Optional[str] = None, company: Optional[str] = None, access_token: str = None) -> str:
     url = f"{BASE_URL}/crm/v3/objects/contacts/{contact_id}"
     properties = {}
@@ -86,6 +91,7 @@ def update_contact(contact_id: str, name: Optional[str] = None, company: Optiona
     resp.raise_for_status()
     return resp.json()["id"]
 
+@EXTERNAL_CALL_LATENCY.time(service="hubspot", operation="create_note")
 def create_note_for_contact(contact_id: str, note_body: str, timestamp_iso: Optional[str] = None, access_token: str = None) -> str:
     """
     Creates a note and associates it to the contact. Uses the 'note_to_contact' association type (HubSpot accepts snake_case).
@@ -0,0 +1,211 @@
+"""
+Background job service for long-running knowledge base operations
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class JobConflict(Exception):
+    """A job of this kind is already running elsewhere (another worker or the CLI)."""
+
+
+class JobProgress:
+    """Thread-safe progress record for a single background job."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files_total = 0
+        self.files_seen = 0
+        self.chunks_embedded = 0
+        self.chunks_deduplicated = 0
+        # (file, file it duplicates) -> shared chunks
+        self.overlaps: Dict[Tuple[str, str], int] = {}
+        self.errors: List[Dict[str, str]] = []
+        self.current_file: Optional[str] = None
+        self.started_at: Optional[float] = None
+
+    def start(self):
+        with self._lock:
+            self.started_at = time.monotonic()
+
+    def set_total(self, files_total: int):
+        with self._lock:
+            self.files_total = files_total
+
+    def file_started(self, file_path: str):
+        with self._lock:
+            self.current_file = file_path
+
+    def file_done(self, file_path: str, chunks_embedded: int = 0):
+        with self._lock:
+            self.files_seen += 1
+            self.chunks_embedded += chunks_embedded
+            self.current_file = None
+
+    def record_duplicate(self, file_path: str, duplicate_of: str):
+        """Count a chunk of file_path that was stored once, as a copy of a chunk from duplicate_of."""
+        with self._lock:
+            self.chunks_deduplicated += 1
+            key = (file_path, duplicate_of)
+            self.overlaps[key] = self.overlaps.get(key, 0) + 1
+
+    def record_error(self, file_path: str, message: str):
+        with self._lock:
+            self.errors.append({"file_path": file_path, "error": message})
+
+    def eta_seconds(self) -> Optional[float]:
+        """Estimate remaining seconds from the average time per file so far."""
+        if not self.started_at or not self.files_seen or not self.files_total:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        remaining = max(self.files_total - self.files_seen, 0)
+        return round(elapsed / self.files_seen * remaining, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "files_total": self.files_total,
+                "files_seen": self.files_seen,
+                "chunks_embedded": self.chunks_embedded,
+                "chunks_deduplicated": self.chunks_deduplicated,
+                "overlaps": [
+                    {"file": file, "duplicates_of": original, "chunks": n}
+                    for (file, original), n in sorted(self.overlaps.items(), key=lambda item: -item[1])[:20]
+                ],
+                "current_file": self.current_file,
+                "error_count": len(self.errors),
+                "errors": list(self.errors[-20:]),
+                "eta_seconds": self.eta_seconds(),
+            }
+
+
+class Job:
+    """A unit of background work with status and progress."""
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = JOB_PENDING
+        self.progress = JobProgress()
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in (JOB_PENDING, JOB_RUNNING)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress.to_dict(),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """Runs jobs in a worker pool and keeps a bounded history of their status."""
+
+    def __init__(self, max_workers: Optional[int] = None, history_size: int = 50):
+        if max_workers is None:
+            max_workers = int(os.getenv("KNOWLEDGE_JOB_WORKERS", "1"))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kb-job")
+        self._jobs: Dict[str, Job] = {}
+        self._order: List[str] = []
+        self._history_size = history_size
+        self._lock = threading.Lock()
+        # One active job per kind, so concurrent rebuild requests share a run
+        self._active: Dict[str, str] = {}
+
+    def submit(self, kind: str, func: Callable[[JobProgress], Any],
+               lock: Optional[Callable[[], Optional[Callable[[], None]]]] = None) -> Job:
+        """
+        Submit a job, or return the already running job of the same kind.
+
+        Args:
+            kind: Job type; only one job per kind runs at a time
+            func: Callable receiving the job's JobProgress
+            lock: Takes a lock shared with other processes for a new job,
+                returning its release function (called when the job ends),
+                or None if it is held elsewhere
+
+        Returns:
+            The new or existing Job
+
+        Raises:
+            JobConflict: lock is held by another process
+        """
+        with self._lock:
+            active_id = self._active.get(kind)
+            if active_id and self._jobs[active_id].is_active:
+                return self._jobs[active_id]
+
+            release = lock() if lock is not None else None
+            if lock is not None and release is None:
+                raise JobConflict(f"A {kind} job is already running in another process")
+
+            job = Job(kind)
+            self._jobs[job.id] = job
+            self._order.append(job.id)
+            self._active[kind] = job.id
+            self._trim_history()
+
+        self._executor.submit(self._run, job, func, release)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Job]:
+        with self._lock:
+            return [self._jobs[job_id] for job_id in reversed(self._order)]
+
+    def _run(self, job: Job, func: Callable[[JobProgress], Any], release: Optional[Callable[[], None]] = None):
+        job.status = JOB_RUNNING
+        job.started_at = datetime.utcnow().isoformat()
+        job.progress.start()
+        try:
+            job.result = func(job.progress)
+            job.status = JOB_COMPLETED
+        except Exception as e:
+            print(f"Background job {job.id} ({job.kind}) failed: {e}")
+            job.error = str(e)
+            job.status = JOB_FAILED
+        finally:
+            job.finished_at = datetime.utcnow().isoformat()
+            if release is not None:
+                release()
+
+    def _trim_history(self):
+        while len(self._order) > self._history_size:
+            oldest = self._order[0]
+            if self._jobs[oldest].is_active:
+                break
+            self._order.pop(0)
+            del self._jobs[oldest]
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+# Global instance
+job_manager = JobManager()
@@ -0,0 +1,336 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition
+
+Counters, gauges and histograms are plain dicts guarded by a lock, so
+recording a value costs a dict lookup and a few additions. Use
+registry.render() (served on /metrics) to export them.
+"""
+
+import bisect
+import functools
+import inspect
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers fast cache hits up to slow completions
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class for a metric family with optional labels."""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        try:
+            if len(labels) == len(self.labelnames):
+                return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError:
+            pass
+        raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items
+        ]
+
+
+class _Timer:
+    """Context manager / decorator that observes elapsed seconds into a histogram."""
+
+    def __init__(self, histogram: "Histogram", labels: Dict[str, str]):
+        self._histogram = histogram
+        self._labels = labels
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._start, **self._labels)
+        return False
+
+    def __call__(self, func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _Timer(self._histogram, self._labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self._histogram, self._labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def time(self, **labels) -> _Timer:
+        """Time a block (`with hist.time(stage="x"):`) or a function (`@hist.time(...)`)."""
+        return _Timer(self, labels)
+
+    def snapshot(self, **labels) -> Optional[Dict[str, float]]:
+        """Count and sum for one label set, or None if nothing was observed."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if state is None:
+                return None
+            return {"count": sum(state[:-1]), "sum": state[-1]}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = self._header()
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            cumulative += state[len(self.buckets)]
+            bucket_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metric families and renders them in Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global registry and the application's metrics
+registry = MetricsRegistry()
+
+STAGE_LATENCY = registry.histogram(
+    "chatbot_stage_duration_seconds",
+    "Latency of each stage of a chat or search request",
+    ["stage"]
+)
+EXTERNAL_CALL_LATENCY = registry.histogram(
+    "chatbot_external_call_duration_seconds",
+    "Latency of calls to external services",
+    ["service", "operation"]
+)
+OPENAI_TOKENS = registry.counter(
+    "chatbot_openai_tokens_total",
+    "OpenAI tokens consumed",
+    ["model", "type"]
+)
+OPENAI_QUEUE_WAIT = registry.histogram(
+    "chatbot_openai_queue_wait_seconds",
+    "Time OpenAI calls wait in the gateway for a concurrency slot and rate budget",
+    ["operation"]
+)
+OPENAI_IN_FLIGHT = registry.gauge(
+    "chatbot_openai_in_flight",
+    "OpenAI requests currently in flight through the gateway"
+)
+OPENAI_CALLS = registry.counter(
+    "chatbot_openai_calls_total",
+    "OpenAI gateway attempts by result (success, retry, error, queue_timeout, circuit_open)",
+    ["operation", "result"]
+)
+OPENAI_CIRCUIT_OPEN = registry.gauge(
+    "chatbot_openai_circuit_open",
+    "1 while the OpenAI circuit breaker is open"
+)
+CACHE_REQUESTS = registry.counter(
+    "chatbot_cache_requests_total",
+    "Cache lookups by result; hit ratio = hit / (hit + miss)",
+    ["cache", "result"]
+)
+ADMISSION_IN_FLIGHT = registry.gauge(
+    "chatbot_admission_in_flight",
+    "Requests admitted and still running, by route class",
+    ["route_class"]
+)
+ADMISSION_QUEUED = registry.gauge(
+    "chatbot_admission_queued",
+    "Requests waiting for admission, by route class",
+    ["route_class"]
+)
+ADMISSION_SHED = registry.counter(
+    "chatbot_admission_shed_total",
+    "Requests rejected with 503 by route class and reason (queue_full, deadline, timeout)",
+    ["route_class", "reason"]
+)
+ADMISSION_WAIT = registry.histogram(
+    "chatbot_admission_wait_seconds",
+    "Time admitted requests waited in the admission queue",
+    ["route_class"]
+)
+RATE_LIMITED = registry.counter(
+    "chatbot_rate_limited_total",
+    "Requests rejected with 429 by the per-client rate limiter, by route class",
+    ["route_class"]
+)
+RATE_LIMIT_CHECK = registry.histogram(
+    "chatbot_rate_limit_check_seconds",
+    "Time the rate limiter adds to a request (key lookup plus bucket update)",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+)
+RATE_LIMIT_BUCKETS = registry.gauge(
+    "chatbot_rate_limit_buckets",
+    "Client buckets held by the in-process rate limit store"
+)
+CACHE_LAYER_REQUESTS = registry.counter(
+    "chatbot_cache_layer_requests_total",
+    "Layered cache lookups per layer by result (hit, negative_hit, miss, error)",
+    ["cache", "layer", "result"]
+)
+COALESCED_REQUESTS = registry.counter(
+    "chatbot_coalesced_requests_total",
+    "Calls by single-flight role: leader (did the work) or follower (shared a leader's result)",
+    ["operation", "role"]
+)
+
+
+def record_openai_usage(response, model: str):
+    """Count prompt and completion tokens from an OpenAI response, if it reports usage."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    if prompt_tokens:
+        OPENAI_TOKENS.inc(prompt_tokens, model=model, type="prompt")
+    if completion_tokens:
+        OPENAI_TOKENS.inc(completion_tokens, model=model, type="completion")
+
+
+def record_cache(cache: str, hit: bool):
+    """Count a cache lookup."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
@@ -0,0 +1,394 @@
+"""
+Shared gateway for OpenAI calls
+
+Every chat completion and embedding request goes through one gateway, so
+the whole process respects a single set of limits:
+
+- a concurrency limit on requests in flight,
+- token buckets for requests and tokens per minute (the account's rate
+  limits), so bursts queue here instead of coming back as 429s,
+- a deadline per call, covering the queue wait, every attempt and the
+  backoff between them,
+- retries with exponential backoff and full jitter for rate limits,
+  timeouts, connection errors and 5xx responses,
+- a circuit breaker that, after repeated failures, rejects calls at once
+  for a cool-down period so callers fall back to their canned answers
+  instead of waiting on an API that is down.
+
+Sync callers (threadpool, ingestion jobs) and async callers (request
+handlers) share the same limits. Calls rejected by the open circuit or
+that wait too long for a slot raise OpenAIUnavailable; otherwise the last
+API error is raised once retries run out.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import openai
+from dotenv import load_dotenv
+
+from backend.services.metrics import (
+    EXTERNAL_CALL_LATENCY,
+    OPENAI_CALLS,
+    OPENAI_CIRCUIT_OPEN,
+    OPENAI_IN_FLIGHT,
+    OPENAI_QUEUE_WAIT,
+)
+
+load_dotenv()
+
+# Longest single sleep while waiting for a free slot, so released slots are noticed quickly
+_POLL_INTERVAL = 0.05
+
+# Errors worth another attempt; anything else (bad request, auth) fails straight away
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class OpenAIUnavailable(Exception):
+    """The gateway could not get an answer from OpenAI in time (or the circuit is open)."""
+
+
+class TokenBucket:
+    """Refills at rate units per second up to capacity; callers take units out."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount units are available (0 if they are now)."""
+        self._refill(now)
+        # A single request larger than the bucket waits for a full bucket rather than forever
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        """Remove units; negative amounts give units back. May go below zero."""
+        self.level = min(self.capacity, self.level - amount)
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls
+    for reset_timeout seconds; then one trial call is let through
+    (half-open), which closes the circuit on success or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+        OPENAI_CIRCUIT_OPEN.set(0)
+
+    def abandon_trial(self):
+        """A call ended without an answer either way (e.g. it was cancelled); let the next call be the trial."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+            is_open = self.opened_at is not None
+        if is_open:
+            OPENAI_CIRCUIT_OPEN.set(1)
+
+
+def estimate_tokens(kwargs: Dict[str, Any]) -> int:
+    """
+    Rough token count of a request (about 4 characters per token), used to
+    charge the token bucket before the response reports actual usage.
+    """
+    chars = 0
+    for message in kwargs.get("messages") or []:
+        chars += len(str(message.get("content") or ""))
+    request_input = kwargs.get("input")
+    if isinstance(request_input, str):
+        chars += len(request_input)
+    elif request_input:
+        chars += sum(len(str(item)) for item in request_input)
+    return chars // 4 + 1 + (kwargs.get("max_tokens") or 0)
+
+
+class OpenAIGateway:
+    """Rate-limited, retrying access to the OpenAI API shared by all callers."""
+
+    def __init__(self, client=None, async_client=None,
+                 max_concurrency: int = 8,
+                 requests_per_minute: float = 500,
+                 tokens_per_minute: float = 200000,
+                 timeout: float = 30.0,
+                 max_retries: int = 2,
+                 queue_timeout: float = 10.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        """
+        Args:
+            client: OpenAI client (created from OPENAI_API_KEY when omitted)
+            async_client: AsyncOpenAI client (created from OPENAI_API_KEY when omitted)
+            max_concurrency: Most requests in flight at once
+            requests_per_minute: Request rate limit
+            tokens_per_minute: Token rate limit (prompt + max completion tokens)
+            timeout: Default deadline in seconds for a call, including retries
+            max_retries: Additional attempts after a retryable error
+            queue_timeout: Longest wait for a slot before giving up
+            breaker: Circuit breaker (a default one when omitted)
+        """
+        self._client = client
+        self._async_client = async_client
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._requests = TokenBucket(max(requests_per_minute / 60.0, 1.0), requests_per_minute / 60.0)
+        self._tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        """Whether an API key (or client) is configured."""
+        return self._client is not None or self._async_client is not None or bool(os.getenv("OPENAI_API_KEY"))
+
+    @property
+    def client(self):
+        if self._client is None:
+            # Retries are the gateway's job, so the client makes a single attempt
+            self._client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        return self._async_client
+
+    # Public API
+
+    def chat_completion(self, timeout: Optional[float] = None, **kwargs):
+        """client.chat.completions.create(**kwargs) within the gateway's limits."""
+        return self._call("chat_completion", lambda: self.client.chat.completions.create, kwargs, timeout)
+
+    def embeddings(self, timeout: Optional[float] = None, **kwargs):
+        """client.embeddings.create(**kwargs) within the gateway's limits."""
+        return self._call("embeddings", lambda: self.client.embeddings.create, kwargs, timeout)
+
+    async def achat_completion(self, timeout: Optional[float] = None, **kwargs):
+        """Async version of chat_completion."""
+        return await self._acall("chat_completion", lambda: self.async_client.chat.completions.create,
+                                 kwargs, timeout)
+
+    async def aembeddings(self, timeout: Optional[float] = None, **kwargs):
+        """Async version of embeddings."""
+        return await self._acall("embeddings", lambda: self.async_client.embeddings.create, kwargs, timeout)
+
+    # Admission
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Take a slot and the rate budget for one attempt, or return how long to wait."""
+        with self._lock:
+            if self._in_flight >= self.max_concurrency:
+                return _POLL_INTERVAL
+            now = time.monotonic()
+            wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now))
+            if wait > 0:
+                return min(wait, _POLL_INTERVAL)
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            self._in_flight += 1
+        OPENAI_IN_FLIGHT.inc()
+        return 0.0
+
+    def _release(self, estimated_tokens: int, response=None):
+        usage = getattr(response, "usage", None)
+        total_tokens = getattr(usage, "total_tokens", None) if usage is not None else None
+        with self._lock:
+            self._in_flight -= 1
+            if total_tokens:
+                # Correct the estimate with what the request actually used
+                self._tokens.take(total_tokens - estimated_tokens)
+        OPENAI_IN_FLIGHT.dec()
+
+    def _check_queue(self, operation: str, queue_deadline: float, queued_at: float):
+        """Fail fast while the circuit is open or once the wait for a slot runs out."""
+        if self.breaker.state == "open":
+            OPENAI_CALLS.inc(operation=operation, result="circuit_open")
+            raise OpenAIUnavailable("OpenAI circuit breaker is open")
+        if time.monotonic() >= queue_deadline:
+            OPENAI_QUEUE_WAIT.observe(time.monotonic() - queued_at, operation=operation)
+            OPENAI_CALLS.inc(operation=operation, result="queue_timeout")
+            raise OpenAIUnavailable(f"Timed out waiting for an OpenAI {operation} slot")
+
+    def _start_attempt(self, operation: str, tokens: int, queued_at: float) -> bool:
+        """
+        Let the breaker veto the attempt that just got a slot (only one half-open trial runs).
+
+        Returns:
+            Whether the attempt is the half-open trial
+        """
+        OPENAI_QUEUE_WAIT.observe(time.monotonic() - queued_at, operation=operation)
+        if not self.breaker.allow():
+            self._release(tokens)
+            OPENAI_CALLS.inc(operation=operation, result="circuit_open")
+            raise OpenAIUnavailable("OpenAI circuit breaker is open")
+        return self.breaker.opened_at is not None
+
+    def _backoff(self, attempt: int, remaining: float) -> Optional[float]:
+        """Full-jitter exponential backoff, or None if it would not fit before the deadline."""
+        delay = random.uniform(0, min(8.0, 0.5 * 2 ** attempt))
+        return delay if delay < remaining else None
+
+    def _fail(self, operation: str, error: Exception, attempt: int, remaining: float) -> Optional[float]:
+        """Record a failed attempt; the backoff before retrying, or None to give up."""
+        retryable = isinstance(error, RETRYABLE_ERRORS)
+        if retryable:
+            self.breaker.record_failure()
+        else:
+            # The API answered (e.g. a bad request), so it is up
+            self.breaker.record_success()
+        if not retryable or attempt >= self.max_retries:
+            OPENAI_CALLS.inc(operation=operation, result="error")
+            return None
+        delay = self._backoff(attempt, remaining)
+        if delay is None:
+            OPENAI_CALLS.inc(operation=operation, result="error")
+        else:
+            OPENAI_CALLS.inc(operation=operation, result="retry")
+        return delay
+
+    # Call loops (sync and async mirror each other)
+
+    def _call(self, operation: str, method: Callable[[], Callable], kwargs: Dict[str, Any],
+              timeout: Optional[float]):
+        tokens = estimate_tokens(kwargs)
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            queued_at = time.monotonic()
+            queue_deadline = min(deadline, queued_at + self.queue_timeout)
+            while True:
+                self._check_queue(operation, queue_deadline, queued_at)
+                wait = self._try_acquire(tokens)
+                if not wait:
+                    break
+                time.sleep(wait)
+            trial = self._start_attempt(operation, tokens, queued_at)
+
+            response = None
+            remaining = deadline - time.monotonic()
+            try:
+                with EXTERNAL_CALL_LATENCY.time(service="openai", operation=operation):
+                    response = method()(timeout=max(remaining, 0.1), **kwargs)
+            except Exception as e:
+                delay = self._fail(operation, e, attempt, deadline - time.monotonic())
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled (client gone, turn cancelled): a half-open trial must not stay claimed
+                if trial:
+                    self.breaker.abandon_trial()
+                raise
+            finally:
+                self._release(tokens, response)
+            self.breaker.record_success()
+            OPENAI_CALLS.inc(operation=operation, result="success")
+            return response
+
+    async def _acall(self, operation: str, method: Callable[[], Callable], kwargs: Dict[str, Any],
+                     timeout: Optional[float]):
+        tokens = estimate_tokens(kwargs)
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            queued_at = time.monotonic()
+            queue_deadline = min(deadline, queued_at + self.queue_timeout)
+            while True:
+                self._check_queue(operation, queue_deadline, queued_at)
+                wait = self._try_acquire(tokens)
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+            trial = self._start_attempt(operation, tokens, queued_at)
+
+            response = None
+            remaining = deadline - time.monotonic()
+            try:
+                with EXTERNAL_CALL_LATENCY.time(service="openai", operation=operation):
+                    response = await method()(timeout=max(remaining, 0.1), **kwargs)
+            except Exception as e:
+                delay = self._fail(operation, e, attempt, deadline - time.monotonic())
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled (client gone, turn cancelled): a half-open trial must not stay claimed
+                if trial:
+                    self.breaker.abandon_trial()
+                raise
+            finally:
+                self._release(tokens, response)
+            self.breaker.record_success()
+            OPENAI_CALLS.inc(operation=operation, result="success")
+            return response
+
+
+# Global gateway instance
+openai_gateway = OpenAIGateway(
+    max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "8")),
+    requests_per_minute=float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500")),
+    tokens_per_minute=float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000")),
+    timeout=float(os.getenv("OPENAI_TIMEOUT", "30")),
+    max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+    queue_timeout=float(os.getenv("OPENAI_QUEUE_TIMEOUT", "10")),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("OPENAI_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("OPENAI_BREAKER_RESET_SECONDS", "30"))
+    )
+)
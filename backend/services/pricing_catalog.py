@@ -0,0 +1,102 @@
+"""
+Pricing catalog loaded from a data file
+
+The catalog (backend/data/pricing.json by default, PRICING_CATALOG_PATH
+to override) maps a service to its pricing card. Every card is encoded
+to a PreparedResponse when the file is loaded, and the whole set is
+swapped in with a single assignment, so a request sees either the old
+catalog or the new one, never a mix. The file is re-read when its
+modification time changes (checked at most every PRICING_RELOAD_SECONDS)
+or on reload(); a file that fails to parse leaves the current catalog in
+place.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.services.http_cache import PreparedResponse
+
+DEFAULT_CATALOG_PATH = Path(__file__).parent.parent / "data" / "pricing.json"
+
+
+class PricingCatalog:
+    """Service -> pricing card, with pre-serialized responses."""
+
+    def __init__(self, path: Path = DEFAULT_CATALOG_PATH, reload_interval: float = 5.0,
+                 cache_control: str = "public, max-age=300"):
+        """
+        Args:
+            path: JSON file mapping service name to pricing card
+            reload_interval: Seconds between checks of the file's modification time
+            cache_control: Cache-Control header for the pricing responses
+        """
+        self.path = Path(path)
+        self.reload_interval = reload_interval
+        self.cache_control = cache_control
+        # (cards, responses), replaced as a whole
+        self._catalog: Tuple[Dict[str, Any], Dict[str, PreparedResponse]] = ({}, {})
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self) -> bool:
+        """
+        Re-read the catalog file.
+
+        Returns:
+            True if a new catalog was swapped in
+        """
+        with self._lock:
+            try:
+                # Remembered even if the file is bad, so it is not re-parsed until it changes again
+                self._mtime = os.stat(self.path).st_mtime
+                with open(self.path, "r", encoding="utf-8") as f:
+                    cards = json.load(f)
+                if not isinstance(cards, dict):
+                    raise ValueError("expected an object mapping service to pricing card")
+                responses = {service: PreparedResponse(card, self.cache_control) for service, card in cards.items()}
+            except (OSError, ValueError) as e:
+                print(f"Warning: could not load pricing catalog {self.path}: {e}")
+                return False
+            # One assignment, so readers never see a half-built catalog
+            self._catalog = (cards, responses)
+            return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    def response(self, service: str) -> Optional[PreparedResponse]:
+        """Pre-serialized pricing card for service, or None if it is not in the catalog."""
+        self._maybe_reload()
+        return self._catalog[1].get(service)
+
+    def get(self, service: str) -> Optional[Dict[str, Any]]:
+        """Pricing card for service as a dict, or None."""
+        self._maybe_reload()
+        return self._catalog[0].get(service)
+
+    def services(self) -> List[str]:
+        self._maybe_reload()
+        return list(self._catalog[0])
+
+
+# Global pricing catalog instance
+pricing_catalog = PricingCatalog(
+    path=Path(os.getenv("PRICING_CATALOG_PATH", str(DEFAULT_CATALOG_PATH))),
+    reload_interval=float(os.getenv("PRICING_RELOAD_SECONDS", "5")),
+    cache_control=f"public, max-age={int(os.getenv('PRICING_CACHE_SECONDS', '300'))}"
+)
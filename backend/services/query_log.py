@@ -0,0 +1,217 @@
+"""
+Append-only log of queries the assistant could not answer
+
+record() only puts the entry on an in-memory queue, so logging costs the
+request thread a deque append. A background thread drains the queue in
+batches and appends them to a JSON-lines file with one write per batch
+(O_APPEND, so several workers can share the file without corrupting it),
+rotating the file when it passes max_bytes.
+
+read_entries() and aggregate() read the log back (current file, rotated
+files and the old unanswered_queries.json array) and count entries by
+normalized query, for knowledge base gap analysis.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_LOG_PATH = Path(__file__).parent.parent.parent / "knowledge_base" / "unanswered_queries.jsonl"
+# The log before it became append-only: one JSON array, rewritten on every entry
+LEGACY_LOG_PATH = DEFAULT_LOG_PATH.with_suffix(".json")
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace, so repeats of a question match."""
+    return _SPACE_RE.sub(" ", _PUNCTUATION_RE.sub(" ", query.lower())).strip()
+
+
+class UnansweredQueryLog:
+    """Queue-fed, batched, size-rotated JSONL sink for unanswered queries."""
+
+    def __init__(self, path: Path = DEFAULT_LOG_PATH, max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 5, flush_interval: float = 2.0, batch_size: int = 500,
+                 max_queue: int = 10000):
+        """
+        Args:
+            path: JSON-lines file to append to
+            max_bytes: Rotate the file once it grows past this size
+            backup_count: Rotated files to keep (path.1 is the newest)
+            flush_interval: Seconds between background flushes
+            batch_size: Most entries written per write
+            max_queue: Entries held in memory before new ones are dropped
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue: deque = deque()
+        self._wakeup = threading.Event()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def record(self, query: str, reason: str):
+        """Queue an unanswered query; never blocks on I/O."""
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append({"query": query, "reason": reason, "timestamp": datetime.utcnow().isoformat()})
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="unanswered-query-log", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Could not save unanswered query log: {e}")
+
+    def flush(self) -> int:
+        """
+        Write everything queued so far, in batches.
+
+        Returns:
+            Number of entries written
+        """
+        written = 0
+        with self._write_lock:
+            while self._queue:
+                batch = []
+                while self._queue and len(batch) < self.batch_size:
+                    batch.append(self._queue.popleft())
+                self._append(batch)
+                written += len(batch)
+        return written
+
+    def close(self):
+        """Flush what is queued; call on shutdown."""
+        self.flush()
+
+    def _append(self, entries: List[Dict[str, Any]]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = "".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8")
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        if self.backup_count <= 0:
+            self.path.unlink(missing_ok=True)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{i}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.path.exists():
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+
+
+def read_entries(path: Path = DEFAULT_LOG_PATH, include_rotated: bool = True,
+                 legacy_path: Optional[Path] = LEGACY_LOG_PATH) -> Iterator[Dict[str, Any]]:
+    """
+    Entries from the log, oldest first.
+
+    Args:
+        path: Current JSON-lines file
+        include_rotated: Also read path.N rotated files
+        legacy_path: Old JSON-array log to read first, if it exists
+
+    Yields:
+        Dicts with 'query', 'reason' and 'timestamp'
+    """
+    path = Path(path)
+    if legacy_path is not None and Path(legacy_path).exists():
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                yield from json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read legacy unanswered query log {legacy_path}: {e}")
+
+    files = []
+    if include_rotated:
+        rotated = [p for p in path.parent.glob(f"{path.name}.*") if p.suffix[1:].isdigit()]
+        files.extend(sorted(rotated, key=lambda p: int(p.suffix[1:]), reverse=True))
+    files.append(path)
+    for file in files:
+        if not file.exists():
+            continue
+        with open(file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash mid-write
+                    continue
+
+
+def aggregate(entries: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Count entries by normalized query.
+
+    Args:
+        entries: Log entries (see read_entries)
+
+    Returns:
+        List of {"query", "count", "reasons", "first_seen", "last_seen"},
+        most frequent first; 'query' is the most recent original wording
+    """
+    groups: Dict[str, Dict[str, Any]] = {}
+    for entry in entries:
+        query = entry.get("query") or ""
+        key = normalize_query(query)
+        if not key:
+            continue
+        timestamp = entry.get("timestamp")
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {"query": query, "count": 0, "reasons": Counter(),
+                                   "first_seen": timestamp, "last_seen": timestamp}
+        group["count"] += 1
+        group["reasons"][entry.get("reason", "")] += 1
+        if timestamp and (group["last_seen"] is None or timestamp >= group["last_seen"]):
+            group["last_seen"] = timestamp
+            group["query"] = query
+        if timestamp and (group["first_seen"] is None or timestamp < group["first_seen"]):
+            group["first_seen"] = timestamp
+
+    rows = sorted(groups.values(), key=lambda group: (-group["count"], group["query"]))
+    for row in rows:
+        row["reasons"] = dict(row["reasons"].most_common())
+    return rows
+
+
+# Global unanswered query log
+unanswered_log = UnansweredQueryLog(
+    path=Path(os.getenv("UNANSWERED_LOG_PATH", str(DEFAULT_LOG_PATH))),
+    max_bytes=int(os.getenv("UNANSWERED_LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+    backup_count=int(os.getenv("UNANSWERED_LOG_BACKUPS", "5")),
+    flush_interval=float(os.getenv("UNANSWERED_LOG_FLUSH_SECONDS", "2"))
+)
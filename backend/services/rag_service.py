@@ -5,38 +5,58 @@ RAG (Retrieval-Augmented Generation) Service
 import os
 import sys
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-import openai
-from openai import OpenAI
+from typing import AsyncIterator, List, Dict, Any, Optional
 from datetime import datetime
 from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Load environment variables from .env file
 load_dotenv()
 
 from knowledge_base.processors.document_processor import DocumentProcessor
+from knowledge_base.processors.generations import get_serving_generation
+from backend.db.models import Document, DocumentChunk
+from backend.services.metrics import STAGE_LATENCY, record_openai_usage
+from backend.services.openai_gateway import openai_gateway
+from backend.services.query_log import normalize_query, unanswered_log
+from backend.services.single_flight import COALESCE_REQUESTS, SingleFlight
+from backend.services.tracing import tracer, traced
+
+def _documents_key(docs: List[Dict[str, Any]]):
+    """Identity of a set of retrieved chunks, for coalescing answers generated from them."""
+    return tuple(
+        ((doc.get("metadata") or {}).get("file_path"), (doc.get("metadata") or {}).get("chunk_index"),
+         doc.get("content"))
+        for doc in docs
+    )
+
 
 class RAGService:
     """Service for Retrieval-Augmented Generation."""
+
+    # Shared by every RAGService in the process, so callers using different instances still coalesce
+    search_flights = SingleFlight("search", enabled=COALESCE_REQUESTS)
+    answer_flights = SingleFlight("answer", enabled=COALESCE_REQUESTS)
     
     def __init__(self):
-        api_key = os.getenv("OPENAI_API_KEY")
-        if api_key:
-            self.openai_client = OpenAI(api_key=api_key)
-        else:
-            self.openai_client = None
+        self.openai_gateway = openai_gateway
+        if not self.openai_gateway.available:
             print("Warning: OPENAI_API_KEY is not set. RAG answer generation will not work.")
         self.document_processor = DocumentProcessor(
             documents_dir=str(Path(__file__).parent.parent.parent / "knowledge_base")
         )
     
-    def search_documents(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+    @traced("rag.search_documents")
+    def search_documents(self, query: str, n_results: int = 5, categories: Optional[List[str]] = None,
+                         exclude_categories: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         Search for relevant documents in the knowledge base.
 
         Args:
             query: Search query
             n_results: Number of results to return
+            categories: Only search these knowledge base folders (e.g. FAQ, Services)
+            exclude_categories: Skip these knowledge base folders
 
         Returns:
             List of relevant documents with metadata and scores
@@ -44,10 +64,69 @@ class RAGService:
         from backend.db.database import SessionLocal
         db = SessionLocal()
         try:
-            return self.document_processor.search_similar_documents(query, n_results, db)
+            return self.document_processor.search_similar_documents(
+                query, n_results, db,
+                categories=categories,
+                exclude_categories=exclude_categories
+            )
         finally:
             db.close()
-    
+
+    @traced("rag.search_documents")
+    async def asearch_documents(self, query: str, n_results: int = 5, categories: Optional[List[str]] = None,
+                                exclude_categories: Optional[List[str]] = None,
+                                db: Optional[AsyncSession] = None) -> List[Dict[str, Any]]:
+        """
+        Async version of search_documents, for request handlers. Concurrent
+        searches for the same normalized query and parameters share one
+        embedding and vector search (unless db is given).
+
+        Args:
+            query: Search query
+            n_results: Number of results to return
+            categories: Only search these knowledge base folders (e.g. FAQ, Services)
+            exclude_categories: Skip these knowledge base folders
+            db: Async session to use; one is opened for the search when omitted
+
+        Returns:
+            List of relevant documents with metadata and scores
+        """
+        search = lambda: self.document_processor.asearch_similar_documents(
+            query, n_results, db,
+            categories=categories,
+            exclude_categories=exclude_categories
+        )
+        if db is not None:
+            # The search must run on the caller's session
+            return await search()
+        key = (normalize_query(query), n_results, tuple(sorted(categories or ())),
+               tuple(sorted(exclude_categories or ())))
+        return await self.search_flights.run(key, search)
+
+    @traced("rag.search_documents_batch")
+    async def asearch_documents_batch(self, queries: List[str], n_results: int = 5,
+                                      categories: Optional[List[str]] = None,
+                                      exclude_categories: Optional[List[str]] = None,
+                                      db: Optional[AsyncSession] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search the knowledge base for several queries in one pass.
+
+        Args:
+            queries: Search queries
+            n_results: Number of results per query
+            categories: Only search these knowledge base folders (e.g. FAQ, Services)
+            exclude_categories: Skip these knowledge base folders
+            db: Async session to use; one is opened for the search when omitted
+
+        Returns:
+            One list of relevant documents per query, in query order
+        """
+        return await self.document_processor.asearch_similar_documents_batch(
+            queries, n_results, db,
+            categories=categories,
+            exclude_categories=exclude_categories
+        )
+
     def generate_answer(self, query: str, docs: List[Dict[str, Any]], session_context: Optional[str] = None, relevance_threshold: float = 0.7) -> Dict[str, Any]:
         """
         Generate an answer using retrieved documents and context.
@@ -55,15 +134,118 @@ class RAGService:
         Args:
             query: User's question
             docs: Retrieved documents from search
-            session_context: Optional session context
+            session_context: Optional conversation so far (e.g. ConversationMemory.render())
             relevance_threshold: Minimum relevance score to consider documents relevant
             
         Returns:
             Dictionary containing answer, confidence, and metadata
         """
+        relevant_docs, fallback = self._select_documents(query, docs, relevance_threshold)
+        if fallback is not None:
+            return fallback
+
+        # Callers asking the same thing with the same documents at the same time share one completion
+        return self.answer_flights.call(
+            self._answer_key(query, relevant_docs, session_context),
+            lambda: self._complete_answer(query, relevant_docs, session_context)
+        )
+
+    def _complete_answer(self, query: str, relevant_docs: List[Dict[str, Any]],
+                         session_context: Optional[str]) -> Dict[str, Any]:
+        try:
+            with STAGE_LATENCY.time(stage="generate_answer"), \
+                    tracer.span("openai.chat_completion", model="gpt-3.5-turbo", documents=len(relevant_docs)):
+                response = self.openai_gateway.chat_completion(
+                    model="gpt-3.5-turbo",
+                    messages=self._answer_messages(query, relevant_docs, session_context),
+                    max_tokens=1000,
+                    temperature=0.7
+                )
+            record_openai_usage(response, "gpt-3.5-turbo")
+            
+            return self._answer_result(response.choices[0].message.content, relevant_docs)
+            
+        except Exception as e:
+            return self._error_result(query, e)
+
+    async def astream_answer(self, query: str, docs: List[Dict[str, Any]], session_context: Optional[str] = None,
+                             relevance_threshold: float = 0.7) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming version of generate_answer.
+
+        Args:
+            query: User's question
+            docs: Retrieved documents from search
+            session_context: Optional conversation so far
+            relevance_threshold: Minimum relevance score to consider documents relevant
+
+        Yields:
+            {"type": "token", "text": ...} as the answer is generated, then
+            {"type": "answer", ...} with the same fields generate_answer returns
+        """
+        relevant_docs, fallback = self._select_documents(query, docs, relevance_threshold)
+        if fallback is not None:
+            yield {"type": "token", "text": fallback["answer"]}
+            yield {"type": "answer", **fallback}
+            return
+
+        # Identical concurrent questions share one completion stream, fanned out to every caller
+        events = self.answer_flights.stream(
+            self._answer_key(query, relevant_docs, session_context),
+            lambda: self._stream_completion(query, relevant_docs, session_context)
+        )
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+
+    async def _stream_completion(self, query: str, relevant_docs: List[Dict[str, Any]],
+                                 session_context: Optional[str]) -> AsyncIterator[Dict[str, Any]]:
+        parts = []
+        stream = None
+        try:
+            with STAGE_LATENCY.time(stage="generate_answer"):
+                # The span covers opening the stream only; it must not stay current across yields
+                with tracer.span("openai.chat_completion", model="gpt-3.5-turbo", documents=len(relevant_docs),
+                                 stream=True):
+                    stream = await self.openai_gateway.achat_completion(
+                        model="gpt-3.5-turbo",
+                        messages=self._answer_messages(query, relevant_docs, session_context),
+                        max_tokens=1000,
+                        temperature=0.7,
+                        stream=True
+                    )
+                async for chunk in stream:
+                    text = chunk.choices[0].delta.content if chunk.choices else None
+                    if text:
+                        parts.append(text)
+                        yield {"type": "token", "text": text}
+        except Exception as e:
+            result = self._error_result(query, e)
+            if parts:
+                # Keep what was already streamed rather than replacing it with the error
+                result["answer"] = "".join(parts)
+            else:
+                yield {"type": "token", "text": result["answer"]}
+            yield {"type": "answer", **result}
+            return
+        finally:
+            # Stop the upstream generation too when the caller cancels or stops reading
+            response = getattr(stream, "response", None)
+            if response is not None:
+                await response.aclose()
+
+        yield {"type": "answer", **self._answer_result("".join(parts), relevant_docs)}
+
+    def _answer_key(self, query: str, relevant_docs: List[Dict[str, Any]], session_context: Optional[str]):
+        return normalize_query(query), session_context or "", _documents_key(relevant_docs)
+
+    def _select_documents(self, query: str, docs: List[Dict[str, Any]], relevance_threshold: float):
+        """(documents relevant enough to answer from, None), or (None, fallback result) when there are none."""
         if not docs:
             self._log_unanswered_query(query, "No documents found")
-            return {
+            return None, {
                 "answer": "I couldn't find any relevant information to answer your question. Please try rephrasing your query or check if the knowledge base has been populated.",
                 "confidence": "low",
                 "reason": "no_documents_found",
@@ -75,13 +257,17 @@ class RAGService:
         
         if not relevant_docs:
             self._log_unanswered_query(query, f"No documents above relevance threshold {relevance_threshold}")
-            return {
+            return None, {
                 "answer": f"I found some documents but they don't seem highly relevant to your question (relevance below {relevance_threshold}). Please try rephrasing your query or ask a more specific question.",
                 "confidence": "low",
                 "reason": "low_relevance",
                 "documents_used": docs[:2]  # Show top 2 for reference
             }
-        
+        return relevant_docs, None
+
+    def _answer_messages(self, query: str, relevant_docs: List[Dict[str, Any]],
+                         session_context: Optional[str] = None) -> List[Dict[str, str]]:
+        """Chat messages asking the model to answer query from relevant_docs, in the light of session_context."""
         # Prepare context from relevant documents
         context_parts = []
         for i, doc in enumerate(relevant_docs, 1):
@@ -100,102 +286,82 @@ class RAGService:
         - Be concise but comprehensive
         - If you're uncertain about something, express that uncertainty
         - Cite which document(s) your answer is based on when relevant
-        - If the context doesn't fully answer the question, acknowledge this limitation"""
+        - If the context doesn't fully answer the question, acknowledge this limitation
+        - Use the conversation so far, when given, to understand follow-up questions"""
         
-        user_prompt = f"""Question: {query}
+        # Bounded by the conversation memory's budget, so it does not grow with the conversation
+        conversation = f"Conversation so far:\n{session_context}\n\n" if session_context else ""
+
+        user_prompt = f"""{conversation}Question: {query}
 
 Context from knowledge base:
 {context}
 
 Please provide a comprehensive answer based on the above context."""
 
-        try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=1000,
-                temperature=0.7
-            )
-            
-            answer = response.choices[0].message.content
-            
-            # Determine confidence based on relevance scores
-            avg_relevance = sum(doc.get('relevance_score', 0) for doc in relevant_docs) / len(relevant_docs)
-            if avg_relevance >= 0.8:
-                confidence = "high"
-            elif avg_relevance >= 0.6:
-                confidence = "medium"
-            else:
-                confidence = "low"
-            
-            return {
-                "answer": answer,
-                "confidence": confidence,
-                "reason": "success",
-                "documents_used": relevant_docs,
-                "avg_relevance": avg_relevance
-            }
-            
-        except Exception as e:
-            print(f"Error generating answer: {str(e)}")
-            self._log_unanswered_query(query, f"Error: {str(e)}")
-            return {
-                "answer": f"I encountered an error while generating an answer: {str(e)}",
-                "confidence": "low",
-                "reason": "error",
-                "documents_used": []
-            }
-    
-    def _log_unanswered_query(self, query: str, reason: str):
-        """Log unanswered queries for later knowledge base updates."""
-        log_entry = {
-            "query": query,
-            "reason": reason,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        
-        # In a production system, you might want to log to a database or file
-        print(f"UNANSWERED QUERY LOG: {log_entry}")
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    def _answer_result(self, answer: str, relevant_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Determine confidence based on relevance scores
+        avg_relevance = sum(doc.get('relevance_score', 0) for doc in relevant_docs) / len(relevant_docs)
+        if avg_relevance >= 0.8:
+            confidence = "high"
+        elif avg_relevance >= 0.6:
+            confidence = "medium"
+        else:
+            confidence = "low"
         
-        # Optionally save to a file for later analysis
-        log_file = Path(__file__).parent.parent.parent / "knowledge_base" / "unanswered_queries.json"
-        try:
-            import json
-            if log_file.exists():
-                with open(log_file, 'r') as f:
-                    logs = json.load(f)
-            else:
-                logs = []
-            
-            logs.append(log_entry)
-            
-            with open(log_file, 'w') as f:
-                json.dump(logs, f, indent=2)
-        except Exception as e:
-            print(f"Could not save unanswered query log: {e}")
+        return {
+            "answer": answer,
+            "confidence": confidence,
+            "reason": "success",
+            "documents_used": relevant_docs,
+            "avg_relevance": avg_relevance
+        }
+
+    def _error_result(self, query: str, e: Exception) -> Dict[str, Any]:
+        print(f"Error generating answer: {str(e)}")
+        self._log_unanswered_query(query, f"Error: {str(e)}")
+        return {
+            "answer": f"I encountered an error while generating an answer: {str(e)}",
+            "confidence": "low",
+            "reason": "error",
+            "documents_used": []
+        }
     
-    def process_knowledge_base(self):
-        """Process all documents in the knowledge base."""
+    def _log_unanswered_query(self, query: str, reason: str):
+        """Log unanswered queries for later knowledge base updates (queued, written in the background)."""
+        unanswered_log.record(query, reason)
+
+    def process_knowledge_base(self, progress=None):
+        """
+        Process all documents in the knowledge base.
+
+        Args:
+            progress: Optional JobProgress updated as files are processed
+        """
         from backend.db.database import SessionLocal
         db = SessionLocal()
         try:
-            return self.document_processor.process_all_documents(db)
+            return self.document_processor.process_all_documents(db, progress=progress)
         finally:
             db.close()
     
     def get_knowledge_base_stats(self) -> Dict[str, Any]:
-        """Get statistics about the knowledge base."""
+        """Get statistics about the knowledge base (the serving generation, not builds in progress or retired ones)."""
         from backend.db.database import SessionLocal
         db = SessionLocal()
         try:
             # Get document and chunk counts
-            doc_count = db.query(Document).count()
-            chunk_count = db.query(DocumentChunk).count()
+            generation = get_serving_generation(db)
+            doc_count = db.query(Document).filter(Document.generation == generation).count()
+            chunk_count = db.query(DocumentChunk).filter(DocumentChunk.generation == generation).count()
 
             return {
+                "generation": generation,
                 "total_documents": doc_count,
                 "total_chunks": chunk_count,
                 "last_updated": datetime.utcnow().isoformat()
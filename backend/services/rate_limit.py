@@ -0,0 +1,307 @@
+"""
+Per-client rate limiting
+
+Each client gets a token bucket per route class (chat, search, booking):
+a bucket holds up to burst tokens, refills at per_minute / 60 tokens a
+second, and every request takes one. A request finding its bucket empty
+gets a 429 with Retry-After, before it reaches admission control or any
+upstream call. Batch routes (handler_paths) are charged by their handler
+once the body is parsed, one token per item: a batch is admitted while
+the bucket has a token left, and a large one leaves the bucket in debt,
+so the client waits until it has refilled.
+
+Clients are keyed by IP address or, with RATE_LIMIT_KEY=session, by the
+X-Session-Id header or session_id query parameter, falling back to the
+IP address. Behind RATE_LIMIT_TRUST_PROXY reverse proxies the address is
+the X-Forwarded-For hop the outermost of them added, counted from the
+right; the hops to its left are whatever the client sent. Session ids
+are chosen by the client too, so with session keys every request also
+counts against its address's bucket, which allows
+RATE_LIMIT_SESSIONS_PER_IP times the limit: several people behind one
+NAT keep their own limits, but rotating session ids gains no more.
+
+Buckets live in a RateLimitStore. InMemoryRateLimitStore keeps them in
+this process, sharded so concurrent requests rarely share a lock, and
+drops idle buckets incrementally, one shard at a time. To enforce one
+limit across several workers, pass a store backed by shared storage to
+RateLimiter.
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi.responses import JSONResponse
+
+from backend.services.admission import match_path
+from backend.services.metrics import RATE_LIMIT_BUCKETS, RATE_LIMIT_CHECK, RATE_LIMITED
+
+
+class RateLimitStore:
+    """Where token buckets are kept. Subclasses implement take()."""
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Take cost tokens from key's bucket, creating it full if it does not exist.
+
+        The request is allowed while at least one token is left; a cost
+        above that leaves the bucket negative until it refills.
+
+        Args:
+            key: Bucket key (route class and client)
+            rate: Tokens added per second
+            burst: Bucket capacity
+            cost: Tokens the request uses
+
+        Returns:
+            (allowed, seconds until a token will be available if not allowed)
+        """
+        raise NotImplementedError
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """Token buckets in this process, sharded by key, with incremental cleanup of idle buckets."""
+
+    def __init__(self, shards: int = 16, idle_seconds: float = 600.0, cleanup_interval: float = 60.0):
+        """
+        Args:
+            shards: Independent dicts (each with its own lock) the keys are spread over
+            idle_seconds: Buckets untouched this long are dropped; keep it above burst / rate,
+                so a dropped bucket would have been full again anyway
+            cleanup_interval: Seconds in which every shard is swept once
+        """
+        self._shards: List[Tuple[Dict[str, List[float]], threading.Lock]] = [
+            ({}, threading.Lock()) for _ in range(shards)
+        ]
+        self.idle_seconds = idle_seconds
+        self._sweep_every = cleanup_interval / shards
+        self._next_sweep = time.monotonic() + self._sweep_every
+        self._sweep_shard = 0
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> Tuple[bool, float]:
+        return self.take_now(key, rate, burst, cost=cost)
+
+    def take_now(self, key: str, rate: float, burst: float, now: Optional[float] = None,
+                 cost: float = 1.0) -> Tuple[bool, float]:
+        """Synchronous take(); now defaults to the monotonic clock."""
+        now = time.monotonic() if now is None else now
+        buckets, lock = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [burst, now]
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - cost
+                allowed, retry_after = True, 0.0
+            else:
+                bucket[0] = tokens
+                allowed, retry_after = False, (1 - tokens) / rate if rate > 0 else math.inf
+        if now >= self._next_sweep:
+            self._sweep(now)
+        return allowed, retry_after
+
+    def _sweep(self, now: float):
+        """Drop idle buckets from the next shard."""
+        self._next_sweep = now + self._sweep_every
+        buckets, lock = self._shards[self._sweep_shard]
+        self._sweep_shard = (self._sweep_shard + 1) % len(self._shards)
+        with lock:
+            for key in [key for key, bucket in buckets.items() if now - bucket[1] > self.idle_seconds]:
+                del buckets[key]
+        RATE_LIMIT_BUCKETS.set(len(self))
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for buckets, _ in self._shards)
+
+
+class RateLimit:
+    """Per-client limit for a group of routes."""
+
+    def __init__(self, name: str, paths: Sequence[str], per_minute: float, burst: float,
+                 handler_paths: Sequence[str] = ()):
+        """
+        Args:
+            name: Route class, for bucket keys and metrics
+            paths: Paths in the class; one ending in "/" matches everything under it
+            per_minute: Sustained requests per minute per client
+            burst: Requests a client may make at once after being idle
+            handler_paths: Paths in the class whose handler charges the request
+                itself, by its size (RateLimiter.check_scope with a cost); the
+                middleware lets them through
+        """
+        self.name = name
+        self.paths = tuple(paths)
+        self.per_minute = per_minute
+        self.burst = burst
+        self.handler_paths = tuple(handler_paths)
+
+    def matches(self, path: str) -> bool:
+        return match_path(path, self.paths) or match_path(path, self.handler_paths)
+
+    def charged_by_handler(self, path: str) -> bool:
+        return match_path(path, self.handler_paths)
+
+
+class RateLimiter:
+    """Per-client token buckets per route class."""
+
+    def __init__(self, limits: Sequence[RateLimit], store: Optional[RateLimitStore] = None,
+                 key_by: str = "ip", trust_proxy: int = 0, sessions_per_ip: float = 5.0,
+                 enabled: bool = True):
+        """
+        Args:
+            limits: Route classes and their limits; other paths are not limited
+            store: Where buckets are kept (in this process by default)
+            key_by: 'ip', or 'session' to key by session id when the client sends one
+            trust_proxy: Reverse proxies in front of the app that append to X-Forwarded-For
+                (0: use the connection's address)
+            sessions_per_ip: With session keys, multiple of the limit one address may use
+            enabled: When False every request is allowed
+        """
+        self.limits = list(limits)
+        self.store = store or InMemoryRateLimitStore()
+        self.key_by = key_by
+        self.trust_proxy = int(trust_proxy)
+        self.sessions_per_ip = sessions_per_ip
+        self.enabled = enabled
+
+    def limit_for(self, path: str) -> Optional[RateLimit]:
+        """The limit path falls under, or None."""
+        for limit in self.limits:
+            if limit.matches(path):
+                return limit
+        return None
+
+    def client_key(self, scope) -> str:
+        """Who is making an HTTP or WebSocket request, from its ASGI scope."""
+        if self.key_by == "session":
+            headers = {name: value for name, value in scope.get("headers") or []}
+            session_id = headers.get(b"x-session-id", b"").decode("latin-1").strip()
+            if not session_id:
+                for pair in (scope.get("query_string") or b"").decode("latin-1").split("&"):
+                    if pair.startswith("session_id="):
+                        session_id = pair[len("session_id="):]
+                        break
+            if session_id:
+                return "session:" + session_id[:128]
+        return self.ip_key(scope)
+
+    def ip_key(self, scope) -> str:
+        """The address an HTTP or WebSocket request comes from, as a bucket key."""
+        if self.trust_proxy:
+            headers = {name: value for name, value in scope.get("headers") or []}
+            hops = [hop.strip() for hop in headers.get(b"x-forwarded-for", b"").decode("latin-1").split(",")
+                    if hop.strip()]
+            if len(hops) >= self.trust_proxy:
+                # Added by the outermost trusted proxy; anything further left came from the client
+                return "ip:" + hops[-self.trust_proxy]
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    async def check(self, limit: RateLimit, client_key: str, ip_key: Optional[str] = None,
+                    cost: float = 1.0) -> Optional[int]:
+        """
+        Count a request from client_key against limit.
+
+        Args:
+            limit: The route class's limit
+            client_key: From client_key()
+            ip_key: From ip_key(); with a session client_key the request also counts
+                against the address, at sessions_per_ip times the limit
+            cost: Requests this one counts as, e.g. the queries in a batch
+
+        Returns:
+            None if allowed, else the seconds to wait (Retry-After)
+        """
+        started = time.perf_counter()
+        try:
+            rate = limit.per_minute / 60.0
+            allowed, retry_after = await self.store.take(f"{limit.name}:{client_key}", rate, limit.burst, cost)
+            if allowed and ip_key is not None and ip_key != client_key:
+                allowed, retry_after = await self.store.take(f"{limit.name}:{ip_key}", rate * self.sessions_per_ip,
+                                                             limit.burst * self.sessions_per_ip, cost)
+        finally:
+            RATE_LIMIT_CHECK.observe(time.perf_counter() - started)
+        if allowed:
+            return None
+        RATE_LIMITED.inc(route_class=limit.name)
+        return max(1, math.ceil(min(retry_after, 3600)))
+
+    async def check_scope(self, scope, cost: float = 1.0) -> Optional[int]:
+        """
+        Count an HTTP or WebSocket request against the limit for its path.
+
+        Args:
+            scope: The request's ASGI scope
+            cost: Requests this one counts as, e.g. the queries in a batch
+
+        Returns:
+            None if allowed (or the path is not limited), else the seconds to wait
+        """
+        limit = self.limit_for(scope["path"]) if self.enabled else None
+        if limit is None:
+            return None
+        return await self.check(limit, self.client_key(scope), self.ip_key(scope), cost)
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying a RateLimiter to HTTP requests."""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self.limiter.enabled:
+            limit = self.limiter.limit_for(scope["path"])
+            if limit is not None and not limit.charged_by_handler(scope["path"]):
+                retry_after = await self.limiter.check(limit, self.limiter.client_key(scope),
+                                                       self.limiter.ip_key(scope))
+                if retry_after is not None:
+                    response = JSONResponse(
+                        {"detail": "Too many requests, please slow down."},
+                        status_code=429,
+                        headers={"Retry-After": str(retry_after)}
+                    )
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
+
+def _proxy_count(value: str) -> int:
+    """RATE_LIMIT_TRUST_PROXY: a number of proxies, or true/yes for one."""
+    value = value.strip().lower()
+    if value in ("true", "yes"):
+        return 1
+    return int(value) if value.isdigit() else 0
+
+
+# Global rate limiter instance
+rate_limiter = RateLimiter(
+    limits=[
+        RateLimit("chat", ["/api/chat", "/api/rag-answer", "/ws/chat"],
+                  per_minute=float(os.getenv("RATE_LIMIT_CHAT_PER_MINUTE", "20")),
+                  burst=float(os.getenv("RATE_LIMIT_CHAT_BURST", "5"))),
+        RateLimit("search", ["/api/rag-search"],
+                  per_minute=float(os.getenv("RATE_LIMIT_SEARCH_PER_MINUTE", "60")),
+                  burst=float(os.getenv("RATE_LIMIT_SEARCH_BURST", "10")),
+                  # Charged one token per query by rag_search_batch
+                  handler_paths=["/api/rag-search/batch"]),
+        RateLimit("booking", ["/api/create-booking", "/api/schedule-check", "/api/calendar/create",
+                              "/api/calendar/freebusy"],
+                  per_minute=float(os.getenv("RATE_LIMIT_BOOKING_PER_MINUTE", "10")),
+                  burst=float(os.getenv("RATE_LIMIT_BOOKING_BURST", "5")))
+    ],
+    store=InMemoryRateLimitStore(
+        shards=int(os.getenv("RATE_LIMIT_SHARDS", "16")),
+        idle_seconds=float(os.getenv("RATE_LIMIT_IDLE_SECONDS", "600"))
+    ),
+    key_by=os.getenv("RATE_LIMIT_KEY", "ip"),
+    trust_proxy=_proxy_count(os.getenv("RATE_LIMIT_TRUST_PROXY", "0")),
+    sessions_per_ip=float(os.getenv("RATE_LIMIT_SESSIONS_PER_IP", "5")),
+    enabled=os.getenv("RATE_LIMIT_ENABLED", "1").lower() not in ("0", "false", "no")
+)
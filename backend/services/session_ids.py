@@ -0,0 +1,60 @@
+"""
+Server-issued chat session ids
+
+Conversation memory is keyed by session id and its rolling summary keeps
+what the visitor said (name, company, budget), so a client may only
+resume a session this server issued. An id is a random value and an
+HMAC-SHA256 of it, "<value>.<signature>"; ids without a valid signature
+are not accepted by /ws/chat or POST /api/chat.
+
+The key is SESSION_SECRET (or SECRET_KEY). Set it, and set it the same
+on every worker: without one each process signs with a random key, so a
+session cannot move between workers or survive a restart.
+"""
+
+import hashlib
+import hmac
+import os
+import secrets
+from typing import Optional
+
+# Length of the hex signature in an id
+SIGNATURE_CHARS = 32
+
+
+class SessionIds:
+    """Issues session ids and verifies that a client-supplied id was issued here."""
+
+    def __init__(self, secret: str):
+        """
+        Args:
+            secret: Signing key, shared by every worker
+        """
+        self._key = secret.encode("utf-8")
+
+    def _sign(self, value: str) -> str:
+        return hmac.new(self._key, value.encode("utf-8"), hashlib.sha256).hexdigest()[:SIGNATURE_CHARS]
+
+    def issue(self) -> str:
+        """A new signed session id."""
+        value = secrets.token_hex(16)
+        return f"{value}.{self._sign(value)}"
+
+    def verify(self, session_id: Optional[str]) -> bool:
+        """Whether session_id was issued with this key."""
+        if not session_id or session_id.count(".") != 1:
+            return False
+        value, signature = session_id.split(".")
+        return bool(value) and hmac.compare_digest(signature, self._sign(value))
+
+
+def _secret() -> str:
+    secret = os.getenv("SESSION_SECRET") or os.getenv("SECRET_KEY")
+    if not secret:
+        print("Warning: SESSION_SECRET is not set; chat sessions cannot be resumed on other workers or after a restart")
+        secret = secrets.token_hex(32)
+    return secret
+
+
+# Global session id signer
+session_ids = SessionIds(_secret())
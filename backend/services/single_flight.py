@@ -0,0 +1,199 @@
+"""
+Single-flight request coalescing
+
+Concurrent calls with the same key share one execution: the first caller
+(the leader) starts the work and every caller that arrives while it is in
+flight (a follower) waits for the same result. Nothing is cached: once
+the work finishes, the next call with that key starts afresh.
+
+    call()    for blocking functions, run in threads
+    run()     for coroutines
+    stream()  for async iterators; every subscriber gets every event,
+              late joiners first replay what was already produced
+
+Async work runs in its own task, so a leader whose request is cancelled
+does not fail its followers; the work is cancelled only when every
+caller waiting on it has gone.
+"""
+
+import asyncio
+import os
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from backend.services.metrics import COALESCED_REQUESTS
+
+# Default for the request paths that coalesce (COALESCE_REQUESTS=0 turns it off)
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "1").lower() not in ("0", "false", "no")
+
+
+class _Call:
+    """A blocking call in flight."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _Flight:
+    """A coroutine or stream in flight, and the callers waiting on it."""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        # Stream events so far; wakeup is set (and replaced) whenever one is added
+        self.events: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.wakeup = asyncio.Event()
+
+    def publish(self, event: Any = None, finished: bool = False, error: Optional[BaseException] = None):
+        if finished:
+            self.finished = True
+            self.error = error
+        else:
+            self.events.append(event)
+        wakeup, self.wakeup = self.wakeup, asyncio.Event()
+        wakeup.set()
+
+
+class SingleFlight:
+    """Collapses concurrent identical calls into one."""
+
+    def __init__(self, operation: str, enabled: bool = True):
+        """
+        Args:
+            operation: Name for the coalescing metrics
+            enabled: When False every call runs on its own
+        """
+        self.operation = operation
+        self.enabled = enabled
+        self._calls: Dict[Hashable, _Call] = {}
+        self._calls_lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._streams: Dict[Hashable, _Flight] = {}
+
+    def _count(self, leader: bool):
+        COALESCED_REQUESTS.inc(operation=self.operation, role="leader" if leader else "follower")
+
+    def call(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn(), or wait for the call with the same key already running in another thread.
+
+        Returns:
+            fn()'s result, shared by every caller; treat it as read-only
+        """
+        if not self.enabled:
+            return fn()
+        with self._calls_lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        self._count(leader)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._calls_lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await fn(), or the call with the same key already in flight.
+
+        Returns:
+            fn()'s result, shared by every caller; treat it as read-only
+        """
+        if not self.enabled:
+            return await fn()
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.ensure_future(fn())
+            flight.task.add_done_callback(lambda _: self._forget(self._flights, key, flight))
+        self._count(leader)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Everyone waiting was cancelled
+                flight.task.cancel()
+                self._forget(self._flights, key, flight)
+
+    async def stream(self, key: Hashable, fn: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Iterate fn(), or subscribe to the stream with the same key already in flight.
+
+        Yields:
+            Every event of the stream, from the first, to every subscriber
+        """
+        if not self.enabled:
+            async for event in fn():
+                yield event
+            return
+        flight = self._streams.get(key)
+        leader = flight is None
+        if leader:
+            flight = self._streams[key] = _Flight()
+            flight.task = asyncio.ensure_future(self._pump(key, flight, fn))
+        self._count(leader)
+        flight.waiters += 1
+        position = 0
+        try:
+            while True:
+                wakeup = flight.wakeup
+                if position < len(flight.events):
+                    position += 1
+                    yield flight.events[position - 1]
+                elif flight.finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await wakeup.wait()
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # The last subscriber stopped reading; stop the producer too
+                flight.task.cancel()
+                self._forget(self._streams, key, flight)
+
+    async def _pump(self, key: Hashable, flight: _Flight, fn: Callable[[], AsyncIterator[Any]]):
+        """Read the stream into flight, waking subscribers as events arrive."""
+        iterator = fn()
+        try:
+            async for event in iterator:
+                flight.publish(event)
+            flight.publish(finished=True)
+        except asyncio.CancelledError:
+            flight.publish(finished=True, error=asyncio.CancelledError())
+            raise
+        except Exception as e:
+            flight.publish(finished=True, error=e)
+        finally:
+            # Joiners from now on start a new stream
+            self._forget(self._streams, key, flight)
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    @staticmethod
+    def _forget(flights: Dict[Hashable, _Flight], key: Hashable, flight: _Flight):
+        if flights.get(key) is flight:
+            del flights[key]
@@ -0,0 +1,275 @@
+"""
+Request tracing with OpenTelemetry-style spans
+
+Spans carry W3C-compatible trace and span ids, nest through a context
+variable (which follows asyncio tasks and FastAPI's threadpool), and are
+written as JSON lines to the console or a file when they end. The active
+trace id is added to every log record, so logs and spans can be joined.
+
+Tracing is toggled at runtime with tracer.enable()/disable() (or
+PUT /tracing). When disabled, span() hands back a shared no-op object and
+@traced calls straight through, so the cost is one attribute check.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "attributes",
+                 "status", "start_time", "end_time", "_start", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str],
+                 attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "ok"
+        self.start_time = time.time()
+        self.end_time = None
+        self._start = time.perf_counter()
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException):
+        self.status = "error"
+        self.attributes["exception.type"] = type(exc).__name__
+        self.attributes["exception.message"] = str(exc)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_exception(exc)
+        _current_span.reset(self._token)
+        self.end_time = time.time()
+        self.tracer._export(self, time.perf_counter() - self._start)
+        return False
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is disabled."""
+
+    __slots__ = ()
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def record_exception(self, exc: BaseException):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class ConsoleSpanExporter:
+    """Write finished spans as JSON lines to stderr."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self._lock = threading.Lock()
+
+    def export(self, record: Dict[str, Any]):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            if self.stream.closed:
+                return
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def close(self):
+        """Stop exporting; the stream belongs to the caller, so it is left open."""
+
+
+class FileSpanExporter(ConsoleSpanExporter):
+    """Append finished spans as JSON lines to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        super().__init__(open(path, "a", encoding="utf-8"))
+
+    def close(self):
+        """Close the file; spans finishing afterwards are dropped."""
+        with self._lock:
+            self.stream.close()
+
+
+class Tracer:
+    """Creates spans and hands finished ones to an exporter."""
+
+    def __init__(self, enabled: bool = False, exporter=None, sample_rate: float = 1.0):
+        """
+        Args:
+            enabled: Whether spans are recorded
+            exporter: Object with export(record); defaults to ConsoleSpanExporter
+            sample_rate: Fraction of new traces that are recorded (0.0 - 1.0)
+        """
+        self.enabled = enabled
+        self.exporter = exporter or ConsoleSpanExporter()
+        self.sample_rate = sample_rate
+
+    def enable(self, exporter=None, sample_rate: Optional[float] = None):
+        if exporter is not None and exporter is not self.exporter:
+            previous, self.exporter = self.exporter, exporter
+            close = getattr(previous, "close", None)
+            if close is not None:
+                close()
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None, **attributes):
+        """
+        Start a span as a context manager, child of the current span if any.
+
+        Args:
+            name: Operation name, e.g. 'rag.search_documents'
+            trace_id: Continue this trace (e.g. from a traceparent header)
+                instead of the current one
+            parent_id: Remote parent span id that goes with trace_id
+            **attributes: Initial span attributes
+
+        Returns:
+            A Span, or a no-op span while tracing is disabled or the trace
+            was not sampled
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = _current_span.get()
+        if trace_id is None and parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        elif trace_id is None:
+            if parent is None and random.random() >= self.sample_rate:
+                return NOOP_SPAN
+            trace_id = f"{random.getrandbits(128):032x}"
+        return Span(self, name, trace_id, parent_id, attributes)
+
+    def _export(self, span: Span, duration: float):
+        try:
+            self.exporter.export({
+                "name": span.name,
+                "trace_id": span.trace_id,
+                "span_id": span.span_id,
+                "parent_id": span.parent_id,
+                "start_time": span.start_time,
+                "end_time": span.end_time,
+                "duration_ms": round(duration * 1000, 3),
+                "status": span.status,
+                "attributes": span.attributes,
+            })
+        except Exception as e:
+            print(f"Error exporting span: {e}")
+
+
+def _exporter_from_env():
+    if os.getenv("TRACING_EXPORTER", "console").lower() == "file":
+        return FileSpanExporter(os.getenv("TRACING_FILE", "traces.jsonl"))
+    return ConsoleSpanExporter()
+
+
+# Global tracer instance
+tracer = Tracer(
+    enabled=os.getenv("TRACING_ENABLED", "false").lower() == "true",
+    exporter=_exporter_from_env() if os.getenv("TRACING_ENABLED", "false").lower() == "true" else None,
+    sample_rate=float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))
+)
+
+
+def current_span():
+    """The active span, or None outside a trace."""
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+def traced(name: str, **attributes):
+    """Decorator that wraps each call of a sync or async function in a span."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not tracer.enabled:
+                    return await func(*args, **kwargs)
+                with tracer.span(name, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def parse_traceparent(header: Optional[str]):
+    """
+    Parse a W3C traceparent header.
+
+    Returns:
+        (trace_id, parent_span_id), or (None, None) if the header is missing or invalid
+    """
+    if not header:
+        return None, None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+    except ValueError:
+        return None, None
+    return parts[1], parts[2]
+
+
+class TraceIdLogFilter(logging.Filter):
+    """Adds the active trace_id (or '-') to log records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = _current_span.get()
+        record.trace_id = span.trace_id if span is not None else "-"
+        return True
+
+
+def install_log_filter(logger: Optional[logging.Logger] = None):
+    """Attach TraceIdLogFilter to the handlers of a logger (root by default)."""
+    logger = logger or logging.getLogger()
+    for handler in logger.handlers:
+        if not any(isinstance(f, TraceIdLogFilter) for f in handler.filters):
+            handler.addFilter(TraceIdLogFilter())
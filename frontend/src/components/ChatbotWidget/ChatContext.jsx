@@ -1,5 +1,5 @@
 import React, { createContext, useContext, useState, useEffect, useRef } from 'react';
-import { api } from './api';
+import { api, ChatSocket } from './api';
 
 const ChatContext = createContext();
 
@@ -17,24 +17,29 @@ export const ChatProvider = ({ children }) => {
   const [pricing, setPricing] = useState(null);
   const bottomRef = useRef();
 
+  const socketRef = useRef(null);
+  // Turn in flight over the socket: { text, turnId, messageId, started }
+  const turnRef = useRef(null);
+  const socketEventRef = useRef();
+
   useEffect(() => {
     bottomRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [messages, isTyping]);
 
-  const sendMessage = async (text) => {
-    if (!text?.trim()) return;
-    const userMsg = { id: Date.now(), role: 'user', text };
-    setMessages(m => [...m, userMsg]);
-    setInput('');
-    setIsTyping(true);
-    setSuggestions([]);
+  useEffect(() => {
+    const socket = new ChatSocket(event => socketEventRef.current(event));
+    socketRef.current = socket;
+    return () => socket.close();
+  }, []);
 
+  const chatOverHttp = async (text) => {
     try {
-      const data = await api.chat(text);
+      const data = await api.chat(text, socketRef.current?.sessionId);
       if (data?.answer) {
         setMessages(m => [...m, { id: Date.now() + 1, role: 'assistant', text: data.answer }]);
       }
       if (data?.intent_hint) handleIntent(data.intent_hint, data);
+      if (data?.upsell?.length) setSuggestions(data.upsell.map(u => `Tell me about ${u.service}`));
       // For now, assume booking is triggered by intent or user action
     } catch (err) {
       setMessages(m => [...m, { id: Date.now() + 2, role: 'assistant', text: 'Sorry — something went wrong. Try again later.' }]);
@@ -43,6 +48,70 @@ export const ChatProvider = ({ children }) => {
     }
   };
 
+  const updateMessage = (id, update) => {
+    setMessages(m => m.map(msg => (msg.id === id ? { ...msg, ...update(msg) } : msg)));
+  };
+
+  socketEventRef.current = (event) => {
+    const turn = turnRef.current;
+    if (event.type === 'disconnected') {
+      // The socket dropped mid-answer: drop the partial answer and ask over HTTP instead
+      if (turn) {
+        turnRef.current = null;
+        setMessages(m => m.filter(msg => msg.id !== turn.messageId));
+        chatOverHttp(turn.text);
+      }
+      return;
+    }
+    if (event.type === 'cancelled') {
+      // An answer cut off by a newer message; drop it if nothing had streamed yet
+      setMessages(m => m.filter(msg => msg.id !== `turn-${event.turn_id}` || msg.text));
+      return;
+    }
+    if (!turn || event.turn_id !== turn.turnId) return;
+    if (!turn.started) {
+      turn.started = true;
+      setMessages(m => [...m, { id: turn.messageId, role: 'assistant', text: '' }]);
+    }
+
+    if (event.type === 'token') {
+      setIsTyping(false);
+      updateMessage(turn.messageId, msg => ({ text: msg.text + event.text }));
+    } else if (event.type === 'intent') {
+      handleIntent(event.intent, event);
+    } else if (event.type === 'upsell') {
+      setSuggestions(event.upsells.map(u => `Tell me about ${u.service}`));
+    } else if (event.type === 'done') {
+      turnRef.current = null;
+      setIsTyping(false);
+      updateMessage(turn.messageId, msg => ({ text: msg.text || event.answer }));
+    } else if (event.type === 'error') {
+      turnRef.current = null;
+      setIsTyping(false);
+      const text = event.retry_after
+        ? `You're sending messages too quickly. Please wait ${event.retry_after}s and try again.`
+        : 'Sorry — something went wrong. Try again later.';
+      updateMessage(turn.messageId, () => ({ text }));
+    }
+  };
+
+  const sendMessage = async (text) => {
+    if (!text?.trim()) return;
+    const userMsg = { id: Date.now(), role: 'user', text };
+    setMessages(m => [...m, userMsg]);
+    setInput('');
+    setIsTyping(true);
+    setSuggestions([]);
+
+    // Sending over the socket also cancels the answer still streaming, if any
+    const turnId = `${Date.now()}-${Math.random().toString(36).slice(2, 8)}`;
+    if (socketRef.current?.send(text, turnId)) {
+      turnRef.current = { text, turnId, messageId: `turn-${turnId}`, started: false };
+      return;
+    }
+    await chatOverHttp(text);
+  };
+
   const handleIntent = async (intent, data) => {
     if (intent === 'booking') {
       // Check schedule before booking
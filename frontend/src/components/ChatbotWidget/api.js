@@ -1,11 +1,63 @@
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
+const WS_BASE_URL = import.meta.env.VITE_WS_BASE_URL || API_BASE_URL.replace(/^http/, 'ws');
+
+// One WebSocket per conversation (/ws/chat). onEvent receives the server's
+// events plus {type: 'disconnected'}; send() returns false while the socket
+// is not open, so callers can fall back to api.chat.
+export class ChatSocket {
+  constructor(onEvent) {
+    this.onEvent = onEvent;
+    this.sessionId = null;
+    this.socket = null;
+    this.retryDelay = 1000;
+    this.closed = false;
+    this.connect();
+  }
+
+  connect() {
+    if (this.closed || typeof WebSocket === 'undefined') return;
+    const query = this.sessionId ? `?session_id=${encodeURIComponent(this.sessionId)}` : '';
+    const socket = new WebSocket(`${WS_BASE_URL}/ws/chat${query}`);
+    socket.onopen = () => { this.retryDelay = 1000; };
+    socket.onmessage = (e) => {
+      const event = JSON.parse(e.data);
+      if (event.type === 'session') this.sessionId = event.session_id;
+      this.onEvent(event);
+    };
+    socket.onclose = () => {
+      if (this.socket === socket) this.socket = null;
+      this.onEvent({ type: 'disconnected' });
+      if (!this.closed) {
+        setTimeout(() => this.connect(), this.retryDelay);
+        this.retryDelay = Math.min(this.retryDelay * 2, 30000);
+      }
+    };
+    this.socket = socket;
+  }
+
+  get isOpen() {
+    return this.socket?.readyState === WebSocket.OPEN;
+  }
+
+  send(message, turnId) {
+    if (!this.isOpen) return false;
+    this.socket.send(JSON.stringify({ type: 'message', message, turn_id: turnId }));
+    return true;
+  }
+
+  close() {
+    this.closed = true;
+    this.socket?.close();
+  }
+}
 
 export const api = {
-  async chat(message) {
+  async chat(message, sessionId) {
     const response = await fetch(`${API_BASE_URL}/api/chat`, {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ message })
+      // The session header lets the server rate limit per conversation (RATE_LIMIT_KEY=session)
+      headers: { 'Content-Type': 'application/json', ...(sessionId ? { 'X-Session-Id': sessionId } : {}) },
+      body: JSON.stringify({ message, session_id: sessionId || undefined })
     });
     if (!response.ok) throw new Error('Chat API failed');
     return response.json();
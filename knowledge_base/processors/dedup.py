@@ -0,0 +1,141 @@
+"""
+Ingestion-time near-duplicate detection
+
+Each chunk gets a MinHash signature of its word shingles; the fraction of
+matching signature slots estimates the Jaccard similarity of two chunks.
+An LSH index (banded signatures) finds the few earlier chunks that could
+be near-duplicates of a new one without comparing against every chunk, so
+copies of the same text from different files are embedded and stored once
+and the other files are kept as provenance on that chunk.
+"""
+
+import hashlib
+from collections import Counter, defaultdict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from knowledge_base.processors.diversity import shingles
+
+NUM_PERM = 64
+LSH_BANDS = 16  # 4 rows per band: chunks with Jaccard >= ~0.5 share a bucket
+
+# Estimated Jaccard similarity at or above which chunks are duplicates
+DUPLICATE_THRESHOLD = 0.85
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def _permutations(num_perm: int, seed: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+_PERMUTATIONS = _permutations(NUM_PERM)
+
+
+def minhash(text: str, num_perm: int = NUM_PERM) -> np.ndarray:
+    """MinHash signature (uint64 array of num_perm values) of the word shingles of text."""
+    a, b = _PERMUTATIONS if num_perm == NUM_PERM else _permutations(num_perm)
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+         for s in set(shingles(text))],
+        dtype=np.uint64
+    )
+    if not len(hashes):
+        return np.full(num_perm, _MAX_HASH, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        permuted = ((hashes[:, None] * a + b) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=0)
+
+
+def estimated_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+class LSHIndex:
+    """Banded MinHash LSH: candidate lookup for near-duplicate signatures."""
+
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = LSH_BANDS):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: Dict[Tuple, List[Hashable]] = defaultdict(list)
+        self.signatures: Dict[Hashable, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def _band_keys(self, signature: np.ndarray, namespace: Hashable) -> Iterable[Tuple]:
+        for band in range(self.bands):
+            yield namespace, band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, key: Hashable, signature: np.ndarray, namespace: Hashable = None):
+        """Index a signature; namespace keeps e.g. categories from matching each other."""
+        self.signatures[key] = signature
+        for band_key in self._band_keys(signature, namespace):
+            self._buckets[band_key].append(key)
+
+    def candidates(self, signature: np.ndarray, namespace: Hashable = None) -> set:
+        """Keys sharing at least one band with the signature."""
+        found = set()
+        for band_key in self._band_keys(signature, namespace):
+            found.update(self._buckets.get(band_key, ()))
+        return found
+
+    def best_match(self, signature: np.ndarray, threshold: float = DUPLICATE_THRESHOLD,
+                   namespace: Hashable = None) -> Optional[Hashable]:
+        """The indexed key most similar to the signature, if at or above threshold."""
+        best, best_similarity = None, threshold
+        for key in self.candidates(signature, namespace):
+            similarity = estimated_jaccard(signature, self.signatures[key])
+            if similarity >= best_similarity:
+                best, best_similarity = key, similarity
+        return best
+
+
+def find_duplicates(chunks: List[Dict[str, Any]], threshold: float = DUPLICATE_THRESHOLD,
+                    namespace_key: Optional[str] = None) -> List[Tuple[Any, Any]]:
+    """
+    Run chunks through an LSH index in order, as ingestion does.
+
+    Args:
+        chunks: Dicts with 'id' and 'text' (and namespace_key, if given)
+        threshold: Estimated Jaccard similarity for a duplicate
+        namespace_key: Only compare chunks with the same value for this key
+
+    Returns:
+        (duplicate id, id of the earlier chunk it repeats) pairs
+    """
+    index = LSHIndex()
+    duplicates = []
+    for chunk in chunks:
+        signature = minhash(chunk["text"])
+        namespace = chunk.get(namespace_key) if namespace_key else None
+        match = index.best_match(signature, threshold, namespace)
+        if match is None:
+            index.add(chunk["id"], signature, namespace)
+        else:
+            duplicates.append((chunk["id"], match))
+    return duplicates
+
+
+def overlap_report(pairs: Iterable[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """
+    Count shared chunks per pair of files.
+
+    Args:
+        pairs: (file of the duplicate chunk, file of the stored chunk), one per duplicate
+
+    Returns:
+        List of {"file", "duplicates_of", "chunks"}, most shared chunks first
+    """
+    counts = Counter(pairs)
+    return [
+        {"file": file, "duplicates_of": original, "chunks": n}
+        for (file, original), n in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    ]
@@ -0,0 +1,100 @@
+"""
+Result diversification: near-duplicate collapsing and maximal marginal relevance
+
+Chunks overlap by design and some knowledge base files are near copies of
+each other, so the nearest chunks to a query are often the same text
+several times. Each chunk carries a 64-bit SimHash of its word shingles
+(computed at ingestion); two chunks whose SimHashes differ in only a few
+bits are near-duplicates, and the Hamming distance estimates the cosine
+similarity of their shingle sets, which MMR uses as the redundancy term.
+"""
+
+import hashlib
+import math
+import re
+from typing import Any, Dict, List, Optional
+
+SIMHASH_BITS = 64
+SHINGLE_WORDS = 3
+
+# Chunks whose SimHashes differ in at most this many bits are duplicates
+DUPLICATE_BITS = 3
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> List[str]:
+    """Overlapping word n-grams of text, lowercased."""
+    words = TOKEN_RE.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the word shingles of text, as a signed integer (fits a BIGINT column)."""
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles(text):
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (value >> bit) & 1 else -1
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint - (1 << SIMHASH_BITS) if fingerprint >= 1 << (SIMHASH_BITS - 1) else fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin((a ^ b) & ((1 << SIMHASH_BITS) - 1)).count("1")
+
+
+def simhash_similarity(a: int, b: int) -> float:
+    """Estimated cosine similarity of the shingle sets behind two SimHashes."""
+    return math.cos(math.pi * hamming_distance(a, b) / SIMHASH_BITS)
+
+
+def diversify(docs: List[Dict[str, Any]], n_results: int, mmr_lambda: float = 0.7,
+              duplicate_bits: int = DUPLICATE_BITS) -> List[Dict[str, Any]]:
+    """
+    Pick n_results documents that are relevant but not redundant.
+
+    Near-duplicates of a more relevant document are dropped, then the rest
+    are chosen greedily by maximal marginal relevance:
+    mmr_lambda * relevance - (1 - mmr_lambda) * max similarity to the picks.
+
+    Args:
+        docs: Candidates with 'relevance_score' and 'simhash' (None is
+            computed from 'content')
+        n_results: Number of documents to return
+        mmr_lambda: 1.0 ranks by relevance only (after duplicate collapsing)
+        duplicate_bits: SimHash Hamming distance at or below which two
+            chunks are duplicates; negative disables collapsing
+
+    Returns:
+        The chosen documents, in pick order
+    """
+    candidates = sorted(docs, key=lambda doc: doc.get("relevance_score", 0.0), reverse=True)
+    signatures = [doc.get("simhash") for doc in candidates]
+    signatures = [signature if signature is not None else simhash(doc.get("content") or "")
+                  for doc, signature in zip(candidates, signatures)]
+
+    unique = []
+    for i, signature in enumerate(signatures):
+        if all(hamming_distance(signature, signatures[j]) > duplicate_bits for j in unique):
+            unique.append(i)
+
+    picked: List[int] = []
+    redundancy: Dict[int, float] = {i: 0.0 for i in unique}
+    while unique and len(picked) < n_results:
+        best: Optional[int] = None
+        best_score = -math.inf
+        for i in unique:
+            score = mmr_lambda * candidates[i].get("relevance_score", 0.0) - (1 - mmr_lambda) * redundancy[i]
+            if score > best_score:
+                best, best_score = i, score
+        picked.append(best)
+        unique.remove(best)
+        for i in unique:
+            redundancy[i] = max(redundancy[i], simhash_similarity(signatures[i], signatures[best]))
+    return [candidates[i] for i in picked]
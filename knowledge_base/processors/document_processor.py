@@ -2,18 +2,35 @@
 Document processor for knowledge base ingestion
 """
 
+import asyncio
 import os
 import json
 import hashlib
+import threading
 import tiktoken
 from pathlib import Path
 from typing import List, Dict, Any, Optional
-import openai
-from openai import OpenAI
 from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from backend.db.database import get_db
-from backend.db.models import Document, DocumentChunk
+from backend.db.models import Document, DocumentChunk, EMBEDDING_DIMENSIONS, COARSE_EMBEDDING_DIMENSIONS
+from knowledge_base.processors.generations import (
+    get_serving_generation, aget_serving_generation, get_content_version, aget_content_version, completed_files,
+    invalidate_content_version
+)
+from knowledge_base.processors.vector_index import InMemoryVectorIndex, truncate_embedding
+from knowledge_base.processors.dedup import DUPLICATE_THRESHOLD, LSHIndex, minhash
+from knowledge_base.processors.diversity import DUPLICATE_BITS, diversify, simhash
+from knowledge_base.processors.vector_queries import (
+    PUBLIC_INDEX_EXCLUDED, batch_search_statement, search_statement, vector_literal
+)
+from backend.services.cache import Cache, shared_backend
+from backend.services.metrics import STAGE_LATENCY, record_openai_usage, record_cache
+from backend.services.openai_gateway import openai_gateway
+from backend.services.query_log import normalize_query
+from backend.services.tracing import tracer
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -27,11 +44,33 @@ except ImportError:
     PDF_AVAILABLE = False
 
 try:
-    from docx import Document
+    from docx import Document as DocxDocument
     DOCX_AVAILABLE = True
 except ImportError:
     DOCX_AVAILABLE = False
 
+# Query embeddings, shared by every worker when CACHE_L2 is set; an embedding
+# only changes with the model and dimensions, which are part of the key
+query_embedding_cache = Cache(
+    "query_embedding",
+    ttl=float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", str(7 * 24 * 3600))),
+    negative_ttl=0,
+    l1_max_bytes=int(os.getenv("QUERY_EMBEDDING_CACHE_L1_MB", "64")) * 1024 * 1024,
+    l2=shared_backend()
+)
+
+# Search results, keyed by serving generation and its content version so a
+# reindex or an ingest moves to fresh keys instead of serving stale chunks.
+# Empty results are not cached: they usually mean the knowledge base is
+# empty or still loading, not that the question has no answer
+retrieval_cache = Cache(
+    "retrieval",
+    ttl=float(os.getenv("RETRIEVAL_CACHE_TTL", "3600")),
+    negative_ttl=0,
+    l1_max_bytes=int(os.getenv("RETRIEVAL_CACHE_L1_MB", "32")) * 1024 * 1024,
+    l2=shared_backend()
+)
+
 class DocumentProcessor:
     """Processes documents for knowledge base ingestion."""
 
@@ -41,12 +80,9 @@ class DocumentProcessor:
         # Load environment variables
         load_dotenv(dotenv_path=Path(__file__).parent.parent.parent / ".env")
 
-        # Initialize OpenAI client
-        api_key = os.getenv("OPENAI_API_KEY")
-        if api_key:
-            self.openai_client = OpenAI(api_key=api_key)
-        else:
-            self.openai_client = None
+        # OpenAI calls go through the shared, rate-limited gateway
+        self.openai_gateway = openai_gateway
+        if not self.openai_gateway.available:
             print("Warning: OPENAI_API_KEY is not set. Document embedding will not work.")
 
         # Initialize tokenizer for chunking
@@ -55,6 +91,44 @@ class DocumentProcessor:
         # Chunking parameters
         self.chunk_size = 1000  # tokens
         self.chunk_overlap = 200  # tokens
+
+        # Embedding parameters
+        self.embedding_model = "text-embedding-3-small"
+        self.native_dimensions = 1536
+        self.embedding_dimensions = EMBEDDING_DIMENSIONS
+        self.coarse_dimensions = COARSE_EMBEDDING_DIMENSIONS
+
+        # Search parameters
+        # Two-stage search: coarse pass over the truncated embeddings, re-ranked with the full vectors
+        self.two_stage_search = os.getenv("VECTOR_TWO_STAGE_SEARCH", "false").lower() == "true"
+        # 'pgvector' queries Postgres; 'memory' searches an in-process copy of the serving generation
+        self.search_backend = os.getenv("VECTOR_SEARCH_BACKEND", "pgvector")
+        # pgvector: 'full' (float32) or 'halfvec' (float16 candidate scan, full-precision re-rank)
+        self.embedding_storage = os.getenv("EMBEDDING_STORAGE", "full")
+        # memory backend: 'float32', 'float16' or 'int8'
+        self.memory_index_storage = os.getenv("MEMORY_INDEX_STORAGE", "float32")
+        self.rerank_factor = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+        # Categories (top-level knowledge base folders) never returned unless explicitly requested
+        self.internal_categories = {
+            category.strip() for category in os.getenv("KB_INTERNAL_CATEGORIES", "Internal_Resources").split(",")
+            if category.strip()
+        }
+        # Result diversification: over-fetch candidates, collapse near-duplicate
+        # chunks, then pick by maximal marginal relevance (1.0 = relevance only)
+        self.diversify_results = os.getenv("SEARCH_DIVERSIFY", "true").lower() == "true"
+        self.mmr_lambda = float(os.getenv("SEARCH_MMR_LAMBDA", "0.7"))
+        self.duplicate_bits = int(os.getenv("SEARCH_DUPLICATE_BITS", str(DUPLICATE_BITS)))
+        self.diversity_factor = int(os.getenv("SEARCH_DIVERSITY_CANDIDATES", "3"))
+        # Ingestion: store near-duplicate chunks (MinHash Jaccard >= threshold,
+        # same category) once, with the other files recorded as provenance
+        self.deduplicate_chunks = os.getenv("INGEST_DEDUP", "true").lower() == "true"
+        self.dedup_threshold = float(os.getenv("INGEST_DEDUP_THRESHOLD", str(DUPLICATE_THRESHOLD)))
+        self._dedup_index = None
+        self._dedup_generation = None
+        self._memory_index = None
+        # (generation, content version) the index was built from
+        self._memory_index_version = None
+        self._memory_index_lock = threading.Lock()
     
     def process_document(self, file_path: Path) -> Dict[str, Any]:
         """
@@ -123,7 +197,7 @@ class DocumentProcessor:
         elif file_extension in ['.docx']:
             if DOCX_AVAILABLE:
                 try:
-                    doc = Document(file_path)
+                    doc = DocxDocument(file_path)
                     text = ""
                     for paragraph in doc.paragraphs:
                         text += paragraph.text + "\n"
@@ -169,15 +243,23 @@ class DocumentProcessor:
             chunk_text = self.tokenizer.decode(chunk_tokens)
             chunks.append(chunk_text)
             
+            # The last window reached the end of the text
+            if end == len(tokens):
+                break
+            
             # Move start position with overlap
             start = end - self.chunk_overlap
-            
-            # Prevent infinite loop
-            if start >= len(tokens):
-                break
         
         return chunks
     
+    def _category_for(self, file_path: str) -> str:
+        """Top-level knowledge base folder of a file, e.g. 'Services' or 'FAQ'."""
+        try:
+            parts = Path(file_path).relative_to(self.documents_dir).parts
+        except ValueError:
+            parts = Path(file_path).parts[-2:]
+        return parts[0] if len(parts) > 1 else "General"
+
     def generate_embeddings(self, content: str) -> List[float]:
         """
         Generate embeddings for the given content using OpenAI.
@@ -189,57 +271,146 @@ class DocumentProcessor:
             List of embedding vectors
         """
         try:
-            response = self.openai_client.embeddings.create(
-                model="text-embedding-3-small",
-                input=content
-            )
+            with tracer.span("openai.embeddings", model=self.embedding_model,
+                             dimensions=self.embedding_dimensions):
+                response = self.openai_gateway.embeddings(**self._embedding_request(content))
+            record_openai_usage(response, self.embedding_model)
             return response.data[0].embedding
         except Exception as e:
             print(f"Error generating embeddings: {str(e)}")
             return None
+
+    async def agenerate_embeddings(self, content: str) -> List[float]:
+        """Async version of generate_embeddings, for request handlers; cached in query_embedding_cache."""
+        try:
+            return await query_embedding_cache.get_or_compute(
+                self._embedding_cache_key(content), lambda: self._aembed([content], single=True)
+            )
+        except Exception as e:
+            print(f"Error generating embeddings: {str(e)}")
+            return None
+
+    async def agenerate_embeddings_batch(self, contents: List[str]) -> Optional[List[List[float]]]:
+        """
+        Embed several texts with a single OpenAI request.
+
+        Args:
+            contents: Texts to embed
+
+        Returns:
+            One embedding per text, in order, or None on failure
+        """
+        try:
+            # Only the texts not in query_embedding_cache are sent
+            embeddings = await asyncio.gather(
+                *(query_embedding_cache.get(self._embedding_cache_key(content)) for content in contents)
+            )
+            missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+            if missing:
+                fresh = await self._aembed([contents[i] for i in missing])
+                for i, embedding in zip(missing, fresh):
+                    embeddings[i] = embedding
+                await asyncio.gather(*(
+                    query_embedding_cache.set(self._embedding_cache_key(contents[i]), embeddings[i]) for i in missing
+                ))
+            return embeddings
+        except Exception as e:
+            print(f"Error generating embeddings: {str(e)}")
+            return None
+
+    async def _aembed(self, contents: List[str], single: bool = False):
+        """Embed contents with one request (raising on failure); single returns just the first embedding."""
+        with tracer.span("openai.embeddings", model=self.embedding_model,
+                         dimensions=self.embedding_dimensions, inputs=len(contents)):
+            response = await self.openai_gateway.aembeddings(
+                **self._embedding_request(contents[0] if single else contents)
+            )
+        record_openai_usage(response, self.embedding_model)
+        embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        return embeddings[0] if single else embeddings
+
+    def _embedding_cache_key(self, content: str) -> str:
+        text = f"{self.embedding_model}:{self.embedding_dimensions}:{content}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _embedding_request(self, content) -> Dict[str, Any]:
+        # openai 1.1.0 has no `dimensions` argument yet, so send it in the body
+        extra_body = None
+        if self.embedding_dimensions != self.native_dimensions:
+            extra_body = {"dimensions": self.embedding_dimensions}
+        return {"model": self.embedding_model, "input": content, "extra_body": extra_body}
     
-    def upsert_to_vector_db(self, document_data: Dict[str, Any], db: Session):
+    def upsert_to_vector_db(self, document_data: Dict[str, Any], db: Session, progress=None,
+                            generation: Optional[int] = None) -> int:
         """
         Upsert document chunks to PostgreSQL vector database.
 
         Args:
             document_data: Processed document data
             db: Database session
+            progress: Optional JobProgress that receives embedding errors
+            generation: Index generation to write into (defaults to the serving one)
+
+        Returns:
+            Number of chunks embedded and stored
         """
         if not document_data or not document_data.get("chunks"):
-            return
+            return 0
 
         try:
+            if generation is None:
+                generation = get_serving_generation(db)
+
             # Check if document already exists
-            existing_doc = db.query(Document).filter(Document.file_path == document_data["file_path"]).first()
+            existing_doc = db.query(Document).filter(
+                Document.file_path == document_data["file_path"],
+                Document.generation == generation
+            ).first()
             if existing_doc:
                 print(f"Document {document_data['file_name']} already exists, skipping")
-                return
+                return 0
 
             # Create document record
             doc = Document(
+                generation=generation,
                 file_path=document_data["file_path"],
                 file_name=document_data["file_name"],
                 file_type=document_data["file_type"],
                 file_size=document_data["metadata"]["file_size"],
-                processed_at=document_data["processed_at"],
+                processed_at=datetime.fromisoformat(document_data["processed_at"]),
                 content=document_data["content"]
             )
             db.add(doc)
             db.flush()  # Get the document ID
 
             # Generate embeddings for each chunk
+            category = self._category_for(document_data["file_path"])
+            dedup_index = self._get_dedup_index(db, generation) if self.deduplicate_chunks else None
+            embedded_count = 0
             for i, chunk in enumerate(document_data["chunks"]):
+                if dedup_index is not None:
+                    signature = minhash(chunk)
+                    duplicate_of = dedup_index.best_match(signature, self.dedup_threshold, category)
+                    original = None
+                    if duplicate_of is not None:
+                        original = self._add_provenance(db, duplicate_of, document_data, i)
+                    if original is not None:
+                        if progress is not None:
+                            progress.record_duplicate(document_data["file_path"], original)
+                        continue
+
                 # Generate embedding
                 embedding = self.generate_embeddings(chunk)
                 if embedding is None:
-                    continue
+                    # A stored Document is a checkpoint (completed_files), so store all of it or none
+                    raise RuntimeError(f"Embedding failed for chunk {i}")
 
                 # Prepare metadata
                 chunk_metadata = {
                     "file_name": document_data["file_name"],
                     "file_path": document_data["file_path"],
                     "file_type": document_data["file_type"],
+                    "category": category,
                     "chunk_index": i,
                     "chunk_size": len(chunk),
                     "processed_at": document_data["processed_at"]
@@ -247,22 +418,77 @@ class DocumentProcessor:
 
                 # Create chunk record
                 chunk_record = DocumentChunk(
+                    generation=generation,
                     document_id=doc.id,
                     chunk_index=i,
                     content=chunk,
                     embedding=embedding,
+                    embedding_coarse=truncate_embedding(embedding, self.coarse_dimensions),
+                    content_simhash=simhash(chunk),
+                    category=category,
                     chunk_metadata=chunk_metadata
                 )
                 db.add(chunk_record)
+                embedded_count += 1
+                if dedup_index is not None:
+                    db.flush()  # Get the chunk ID
+                    dedup_index.add(chunk_record.id, signature, category)
 
             db.commit()
-            print(f"Upserted {len(document_data['chunks'])} chunks from {document_data['file_name']}")
+            invalidate_content_version()
+            print(f"Upserted {embedded_count} chunks from {document_data['file_name']}")
+            return embedded_count
 
         except Exception as e:
             db.rollback()
+            # Rolled-back chunks may be in the dedup index; rebuild it from the database
+            self._dedup_index = None
             print(f"Error upserting to vector DB: {str(e)}")
+            if progress is not None:
+                progress.record_error(document_data["file_path"], str(e))
+            return 0
     
-    def search_similar_documents(self, query: str, n_results: int = 5, db: Session = None) -> List[Dict[str, Any]]:
+    def _get_dedup_index(self, db: Session, generation: int) -> LSHIndex:
+        """LSH index of the chunks already stored in the generation, built on first use (also when resuming)."""
+        if self._dedup_index is None or self._dedup_generation != generation:
+            index = LSHIndex()
+            rows = db.query(DocumentChunk.id, DocumentChunk.content, DocumentChunk.category).filter(
+                DocumentChunk.generation == generation
+            ).all()
+            for row in rows:
+                index.add(row.id, minhash(row.content or ""), row.category)
+            self._dedup_index = index
+            self._dedup_generation = generation
+        return self._dedup_index
+
+    def _add_provenance(self, db: Session, chunk_id: int, document_data: Dict[str, Any],
+                        chunk_index: int) -> Optional[str]:
+        """
+        Record a duplicate chunk's source on the stored chunk.
+
+        Returns:
+            The stored chunk's file path, or None if it has been deleted
+            since the dedup index was built (the duplicate is then stored)
+        """
+        chunk = db.get(DocumentChunk, chunk_id)
+        if chunk is None:
+            return None
+        metadata = dict(chunk.chunk_metadata or {})
+        duplicates = list(metadata.get("duplicates", []))
+        duplicates.append({
+            "file_name": document_data["file_name"],
+            "file_path": document_data["file_path"],
+            "chunk_index": chunk_index
+        })
+        metadata["duplicates"] = duplicates
+        # Reassign so the JSON column is flagged as changed
+        chunk.chunk_metadata = metadata
+        return metadata.get("file_path", "")
+
+    def search_similar_documents(self, query: str, n_results: int = 5, db: Session = None,
+                                 categories: Optional[List[str]] = None,
+                                 exclude_categories: Optional[List[str]] = None,
+                                 include_internal: bool = False) -> List[Dict[str, Any]]:
         """
         Search for similar documents in the PostgreSQL vector database.
 
@@ -270,6 +496,9 @@ class DocumentProcessor:
             query: Search query
             n_results: Number of results to return
             db: Database session
+            categories: Only search these top-level folders (e.g. ['FAQ', 'Services'])
+            exclude_categories: Never return chunks from these folders
+            include_internal: Allow internal categories such as Internal_Resources
 
         Returns:
             List of similar documents with metadata and scores
@@ -281,31 +510,25 @@ class DocumentProcessor:
 
         try:
             # Generate embedding for query
-            query_embedding = self.generate_embeddings(query)
+            with STAGE_LATENCY.time(stage="embed_query"):
+                query_embedding = self.generate_embeddings(query)
             if query_embedding is None:
                 return []
 
-            # Search using pgvector cosine similarity
-            from sqlalchemy import text
-            results = db.query(
-                DocumentChunk,
-                DocumentChunk.embedding.cosine_distance(query_embedding).label('distance')
-            ).join(Document).order_by(
-                DocumentChunk.embedding.cosine_distance(query_embedding)
-            ).limit(n_results).all()
-
-            # Format results
-            similar_docs = []
-            for chunk, distance in results:
-                doc = {
-                    "id": chunk.id,
-                    "content": chunk.content,
-                    "metadata": chunk.chunk_metadata,
-                    "relevance_score": 1 - distance  # Convert distance to similarity
-                }
-                similar_docs.append(doc)
-
-            return similar_docs
+            excluded = self._excluded_categories(exclude_categories, include_internal)
+
+            with STAGE_LATENCY.time(stage="vector_search"), \
+                    tracer.span("db.vector_search", backend=self.search_backend, n_results=n_results) as span:
+                generation = get_serving_generation(db)
+                span.set_attribute("generation", generation)
+                n_candidates = self._candidate_count(n_results)
+                if self.search_backend == "memory":
+                    results = self._search_memory_index(query_embedding, n_candidates, db, generation, categories, excluded)
+                else:
+                    results = self._search_pgvector(query_embedding, n_candidates, db, generation, categories, excluded)
+                results = self._select_results(results, n_results)
+                span.set_attribute("results", len(results))
+                return results
 
         except Exception as e:
             print(f"Error searching documents: {str(e)}")
@@ -313,9 +536,387 @@ class DocumentProcessor:
         finally:
             if db:
                 db.close()
-    
-    def process_all_documents(self, db: Session = None):
-        """Process all documents in the documents directory and subdirectories."""
+
+    async def asearch_similar_documents(self, query: str, n_results: int = 5, db: AsyncSession = None,
+                                        categories: Optional[List[str]] = None,
+                                        exclude_categories: Optional[List[str]] = None,
+                                        include_internal: bool = False) -> List[Dict[str, Any]]:
+        """
+        Async version of search_similar_documents for request handlers.
+
+        The query embedding and the database round trips are awaited, so a
+        single worker keeps serving other requests while a search waits.
+        Takes the same arguments, with an AsyncSession; a session is opened
+        (and closed) here when none is given.
+        """
+        if db is None:
+            from backend.db.database import AsyncSessionLocal
+            async with AsyncSessionLocal() as session:
+                return await self.asearch_similar_documents(
+                    query, n_results, session, categories, exclude_categories, include_internal
+                )
+
+        try:
+            generation = await aget_serving_generation(db)
+            version = await aget_content_version(db, generation)
+            excluded = self._excluded_categories(exclude_categories, include_internal)
+            cache_key = self._retrieval_cache_key(query, n_results, generation, version, categories, excluded)
+            cached = await retrieval_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            with STAGE_LATENCY.time(stage="embed_query"):
+                query_embedding = await self.agenerate_embeddings(query)
+            if query_embedding is None:
+                return []
+
+            with STAGE_LATENCY.time(stage="vector_search"), \
+                    tracer.span("db.vector_search", backend=self.search_backend, n_results=n_results) as span:
+                span.set_attribute("generation", generation)
+                n_candidates = self._candidate_count(n_results)
+                if self.search_backend == "memory":
+                    results = await self._asearch_memory_index(query_embedding, n_candidates, db, generation, categories, excluded)
+                else:
+                    statement, params = self._pgvector_search(query_embedding, n_candidates, generation, categories, excluded)
+                    with tracer.span("db.query", statement="vector_search", two_pass="candidates" in params):
+                        rows = (await db.execute(statement, params)).all()
+                    results = self._format_pgvector_rows(rows)
+                results = self._select_results(results, n_results)
+                span.set_attribute("results", len(results))
+            if results:
+                await retrieval_cache.set(cache_key, results)
+            return results
+
+        except Exception as e:
+            print(f"Error searching documents: {str(e)}")
+            return []
+
+    def _retrieval_cache_key(self, query: str, n_results: int, generation: int, version: str,
+                             categories: Optional[List[str]], excluded: set) -> str:
+        """Key for retrieval_cache; queries that differ only in case or punctuation share results."""
+        text = json.dumps([generation, version, n_results, sorted(categories or ()), sorted(excluded),
+                           self.search_backend, self.diversify_results, normalize_query(query)])
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    async def asearch_similar_documents_batch(self, queries: List[str], n_results: int = 5,
+                                              db: AsyncSession = None,
+                                              categories: Optional[List[str]] = None,
+                                              exclude_categories: Optional[List[str]] = None,
+                                              include_internal: bool = False) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries at once.
+
+        All queries are embedded in one OpenAI request, then looked up
+        together: one matrix multiply over the in-memory index, or a single
+        LATERAL-join query against pgvector.
+
+        Args:
+            queries: Search queries
+            n_results: Number of results per query
+            db: Async database session; one is opened (and closed) here when omitted
+            categories: Only search these top-level folders
+            exclude_categories: Never return chunks from these folders
+            include_internal: Allow internal categories such as Internal_Resources
+
+        Returns:
+            One list of similar documents per query, in query order
+        """
+        if not queries:
+            return []
+        if db is None:
+            from backend.db.database import AsyncSessionLocal
+            async with AsyncSessionLocal() as session:
+                return await self.asearch_similar_documents_batch(
+                    queries, n_results, session, categories, exclude_categories, include_internal
+                )
+
+        empty = [[] for _ in queries]
+        try:
+            generation = await aget_serving_generation(db)
+            version = await aget_content_version(db, generation)
+            excluded = self._excluded_categories(exclude_categories, include_internal)
+            # Only the queries not in retrieval_cache are embedded and searched
+            cache_keys = [self._retrieval_cache_key(query, n_results, generation, version, categories, excluded)
+                          for query in queries]
+            found = await asyncio.gather(*(retrieval_cache.get(key) for key in cache_keys))
+            missing = [i for i, docs in enumerate(found) if docs is None]
+            if not missing:
+                return found
+
+            with STAGE_LATENCY.time(stage="embed_query_batch"):
+                query_embeddings = await self.agenerate_embeddings_batch([queries[i] for i in missing])
+            if query_embeddings is None:
+                return [docs or [] for docs in found]
+
+            with STAGE_LATENCY.time(stage="vector_search_batch"), \
+                    tracer.span("db.vector_search", backend=self.search_backend, n_results=n_results,
+                                queries=len(missing)) as span:
+                span.set_attribute("generation", generation)
+                n_candidates = self._candidate_count(n_results)
+                if self.search_backend == "memory":
+                    results = await self._asearch_memory_index_batch(query_embeddings, n_candidates, db, generation,
+                                                                     categories, excluded)
+                else:
+                    statement, params = self._pgvector_batch_search(query_embeddings, n_candidates, generation,
+                                                                    categories, excluded)
+                    with tracer.span("db.query", statement="vector_search_batch", two_pass="candidates" in params):
+                        rows = (await db.execute(statement, params)).all()
+                    results = [[] for _ in missing]
+                    for row in rows:
+                        results[row[0] - 1].extend(self._format_pgvector_rows([row[1:]]))
+            for i, docs in zip(missing, results):
+                found[i] = self._select_results(docs, n_results)
+                if found[i]:
+                    await retrieval_cache.set(cache_keys[i], found[i])
+            return found
+
+        except Exception as e:
+            print(f"Error searching documents: {str(e)}")
+            return empty
+
+    def _candidate_count(self, n_results: int) -> int:
+        """Rows to fetch for n_results; diversification needs spare candidates to replace duplicates."""
+        return n_results * max(1, self.diversity_factor) if self.diversify_results else n_results
+
+    def _select_results(self, docs: List[Dict[str, Any]], n_results: int) -> List[Dict[str, Any]]:
+        """Diversify the candidates (when enabled) down to n_results and drop their signatures."""
+        if self.diversify_results:
+            # Diversification picks which documents to return; callers still get them by relevance
+            docs = sorted(diversify(docs, n_results, self.mmr_lambda, self.duplicate_bits),
+                          key=lambda doc: doc.get("relevance_score", 0.0), reverse=True)
+        docs = docs[:n_results]
+        for doc in docs:
+            doc.pop("simhash", None)
+        return docs
+
+    def _excluded_categories(self, exclude_categories: Optional[List[str]], include_internal: bool) -> set:
+        excluded = set(exclude_categories or [])
+        if not include_internal:
+            excluded |= self.internal_categories
+        return excluded
+
+    def _candidate_pass(self) -> Optional[str]:
+        """First pass of a two-pass pgvector search, or None for a single exact pass."""
+        if self.two_stage_search:
+            return "coarse"
+        if self.embedding_storage == "halfvec":
+            return "halfvec"
+        return None
+
+    @staticmethod
+    def _split_excluded(excluded: Optional[set]):
+        """(public_only, the rest of excluded): the internal category is a constant predicate, not a parameter."""
+        excluded = set(excluded or ())
+        public_only = PUBLIC_INDEX_EXCLUDED in excluded
+        excluded.discard(PUBLIC_INDEX_EXCLUDED)
+        return public_only, excluded
+
+    def _pgvector_params(self, n_results: int, generation: int, categories: Optional[List[str]],
+                         excluded: Optional[set], candidate_pass: Optional[str]) -> Dict[str, Any]:
+        params = {"generation": generation, "limit": n_results}
+        if categories:
+            params["categories"] = list(categories)
+        if excluded:
+            params["excluded"] = sorted(excluded)
+        if candidate_pass is not None:
+            # Find candidates on a cheaper index, then re-rank them with the
+            # full-precision vectors
+            params["candidates"] = n_results * self.rerank_factor
+        return params
+
+    def _pgvector_search(self, query_embedding: List[float], n_results: int, generation: int,
+                         categories: Optional[List[str]] = None, excluded: Optional[set] = None):
+        """Prepared statement and bind parameters for a pgvector search; runs on sync and async sessions alike."""
+        candidate_pass = self._candidate_pass()
+        public_only, excluded = self._split_excluded(excluded)
+        statement = search_statement(
+            self.embedding_dimensions, candidate_pass, self.coarse_dimensions,
+            filter_categories=bool(categories), exclude_categories=bool(excluded), public_only=public_only
+        )
+        params = self._pgvector_params(n_results, generation, categories, excluded, candidate_pass)
+        params["embedding"] = vector_literal(query_embedding)
+        if candidate_pass == "coarse":
+            params["coarse_embedding"] = vector_literal(truncate_embedding(query_embedding, self.coarse_dimensions))
+        return statement, params
+
+    def _pgvector_batch_search(self, query_embeddings: List[List[float]], n_results: int, generation: int,
+                               categories: Optional[List[str]] = None, excluded: Optional[set] = None):
+        """Prepared statement and bind parameters for a batch of pgvector searches."""
+        candidate_pass = self._candidate_pass()
+        public_only, excluded = self._split_excluded(excluded)
+        statement = batch_search_statement(
+            self.embedding_dimensions, candidate_pass, self.coarse_dimensions,
+            filter_categories=bool(categories), exclude_categories=bool(excluded), public_only=public_only
+        )
+        params = self._pgvector_params(n_results, generation, categories, excluded, candidate_pass)
+        params["embeddings"] = [vector_literal(embedding) for embedding in query_embeddings]
+        if candidate_pass == "coarse":
+            params["coarse_embeddings"] = [
+                vector_literal(truncate_embedding(embedding, self.coarse_dimensions)) for embedding in query_embeddings
+            ]
+        return statement, params
+
+    @staticmethod
+    def _format_pgvector_rows(rows) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": chunk_id,
+                "content": content,
+                "metadata": metadata,
+                "simhash": signature,
+                "relevance_score": 1 - distance  # Convert distance to similarity
+            }
+            for chunk_id, content, metadata, signature, distance in rows
+        ]
+
+    def _search_pgvector(self, query_embedding: List[float], n_results: int, db: Session,
+                         generation: int, categories: Optional[List[str]] = None,
+                         excluded: Optional[set] = None) -> List[Dict[str, Any]]:
+        """Search the serving generation with pgvector cosine distance."""
+        statement, params = self._pgvector_search(query_embedding, n_results, generation, categories, excluded)
+        with tracer.span("db.query", statement="vector_search", two_pass="candidates" in params):
+            rows = db.execute(statement, params).all()
+        return self._format_pgvector_rows(rows)
+
+    def _memory_index_statement(self, generation: int):
+        return select(
+            DocumentChunk.id,
+            DocumentChunk.embedding,
+            DocumentChunk.content,
+            DocumentChunk.category,
+            DocumentChunk.chunk_metadata,
+            DocumentChunk.content_simhash
+        ).where(DocumentChunk.generation == generation)
+
+    def _cached_memory_index(self, generation: int, version: str) -> Optional[InMemoryVectorIndex]:
+        with self._memory_index_lock:
+            if self._memory_index is not None and self._memory_index_version == (generation, version):
+                record_cache("memory_index", True)
+                return self._memory_index
+        record_cache("memory_index", False)
+        return None
+
+    def _build_memory_index(self, rows, generation: int, version: str) -> InMemoryVectorIndex:
+        index = InMemoryVectorIndex(
+            storage=self.memory_index_storage,
+            rerank_factor=self.rerank_factor,
+            dimensions=self.coarse_dimensions if self.two_stage_search else None
+        )
+        index.build(
+            [row.id for row in rows],
+            [row.embedding for row in rows],
+            [(row.content, row.chunk_metadata, row.content_simhash) for row in rows],
+            [row.category for row in rows]
+        )
+        print(f"Loaded {len(index)} chunks into the in-memory index ({index.storage})")
+        with self._memory_index_lock:
+            self._memory_index = index
+            self._memory_index_version = (generation, version)
+        return index
+
+    def _get_memory_index(self, db: Session, generation: int) -> InMemoryVectorIndex:
+        """
+        Load (or reuse) the in-process index for the serving generation; it
+        is reloaded when chunks are added to or removed from the generation.
+        """
+        version = get_content_version(db, generation)
+        index = self._cached_memory_index(generation, version)
+        if index is None:
+            index = self._build_memory_index(db.execute(self._memory_index_statement(generation)).all(),
+                                             generation, version)
+        return index
+
+    async def _aget_memory_index(self, db: AsyncSession, generation: int) -> InMemoryVectorIndex:
+        """Async version of _get_memory_index."""
+        version = await aget_content_version(db, generation)
+        index = self._cached_memory_index(generation, version)
+        if index is None:
+            rows = (await db.execute(self._memory_index_statement(generation))).all()
+            index = self._build_memory_index(rows, generation, version)
+        return index
+
+    @staticmethod
+    def _format_memory_results(results) -> List[Dict[str, Any]]:
+        similar_docs = []
+        for chunk_id, score, (content, metadata, signature) in results:
+            similar_docs.append({
+                "id": chunk_id,
+                "content": content,
+                "metadata": metadata,
+                "simhash": signature,
+                "relevance_score": score
+            })
+        return similar_docs
+
+    def _search_memory_index(self, query_embedding: List[float], n_results: int, db: Session,
+                             generation: int, categories: Optional[List[str]] = None,
+                             excluded: Optional[set] = None) -> List[Dict[str, Any]]:
+        """Search the in-process index, re-ranking quantized candidates from Postgres."""
+        index = self._get_memory_index(db, generation)
+
+        def load_full_vectors(ids: List[int]):
+            rows = dict(db.query(DocumentChunk.id, DocumentChunk.embedding).filter(DocumentChunk.id.in_(ids)).all())
+            return [rows[chunk_id] for chunk_id in ids]
+
+        results = index.search(query_embedding, n_results, load_full_vectors,
+                               include_labels=categories, exclude_labels=excluded)
+        return self._format_memory_results(results)
+
+    async def _asearch_memory_index(self, query_embedding: List[float], n_results: int, db: AsyncSession,
+                                    generation: int, categories: Optional[List[str]] = None,
+                                    excluded: Optional[set] = None) -> List[Dict[str, Any]]:
+        """Async version of _search_memory_index; full vectors for re-ranking are awaited."""
+        index = await self._aget_memory_index(db, generation)
+
+        if not index.is_approximate:
+            results = index.search(query_embedding, n_results, include_labels=categories, exclude_labels=excluded)
+            return self._format_memory_results(results)
+
+        candidates = index.search(query_embedding, n_results * index.rerank_factor,
+                                  include_labels=categories, exclude_labels=excluded)
+        ids = [chunk_id for chunk_id, _, _ in candidates]
+        rows = dict((await db.execute(
+            select(DocumentChunk.id, DocumentChunk.embedding).where(DocumentChunk.id.in_(ids))
+        )).all())
+        results = index.rerank(candidates, [rows[chunk_id] for chunk_id in ids], query_embedding, n_results)
+        return self._format_memory_results(results)
+
+    async def _asearch_memory_index_batch(self, query_embeddings: List[List[float]], n_results: int,
+                                          db: AsyncSession, generation: int,
+                                          categories: Optional[List[str]] = None,
+                                          excluded: Optional[set] = None) -> List[List[Dict[str, Any]]]:
+        """Search the in-memory index for several queries; re-ranking vectors are fetched in one query."""
+        index = await self._aget_memory_index(db, generation)
+
+        if not index.is_approximate:
+            batches = index.search_batch(query_embeddings, n_results, include_labels=categories, exclude_labels=excluded)
+            return [self._format_memory_results(results) for results in batches]
+
+        batches = index.search_batch(query_embeddings, n_results * index.rerank_factor,
+                                     include_labels=categories, exclude_labels=excluded)
+        ids = {chunk_id for candidates in batches for chunk_id, _, _ in candidates}
+        rows = dict((await db.execute(
+            select(DocumentChunk.id, DocumentChunk.embedding).where(DocumentChunk.id.in_(ids))
+        )).all()) if ids else {}
+        results = []
+        for query_embedding, candidates in zip(query_embeddings, batches):
+            full_vectors = [rows[chunk_id] for chunk_id, _, _ in candidates]
+            results.append(self._format_memory_results(
+                index.rerank(candidates, full_vectors, query_embedding, n_results)
+            ))
+        return results
+
+    def process_all_documents(self, db: Session = None, progress=None, generation: Optional[int] = None):
+        """
+        Process all documents in the documents directory and subdirectories.
+
+        Args:
+            db: Database session
+            progress: Optional JobProgress updated as files are processed
+            generation: Index generation to build into (defaults to the serving one).
+                Files already stored in that generation are skipped, so an
+                interrupted build resumes where it stopped.
+        """
         if db is None:
             from backend.db.database import SessionLocal
             db = SessionLocal()
@@ -335,16 +936,42 @@ class DocumentProcessor:
             if DOCX_AVAILABLE:
                 supported_extensions.append('.docx')
 
-            for file_path in self.documents_dir.rglob('*'):
-                if file_path.is_file() and file_path.suffix.lower() in supported_extensions:
-                    print(f"Processing: {file_path.relative_to(self.documents_dir)}")
-                    document_data = self.process_document(file_path)
-                    if document_data:
-                        self.upsert_to_vector_db(document_data, db)
-                        processed_count += 1
-                        print(f"Processed: {file_path.relative_to(self.documents_dir)}")
+            files = [
+                file_path for file_path in self.documents_dir.rglob('*')
+                if file_path.is_file() and file_path.suffix.lower() in supported_extensions
+            ]
+            if progress is not None:
+                progress.set_total(len(files))
+
+            if generation is None:
+                generation = get_serving_generation(db)
+            checkpointed = completed_files(db, generation)
+            # Chunks may have been deleted or added since the last job; rebuild the dedup index
+            self._dedup_index = None
+
+            for file_path in files:
+                if str(file_path) in checkpointed:
+                    print(f"Already built: {file_path.relative_to(self.documents_dir)}")
+                    if progress is not None:
+                        progress.file_done(str(file_path))
+                    continue
+
+                print(f"Processing: {file_path.relative_to(self.documents_dir)}")
+                if progress is not None:
+                    progress.file_started(str(file_path))
+                chunks_embedded = 0
+                document_data = self.process_document(file_path)
+                if document_data:
+                    chunks_embedded = self.upsert_to_vector_db(document_data, db, progress, generation)
+                    processed_count += 1
+                    print(f"Processed: {file_path.relative_to(self.documents_dir)}")
+                elif progress is not None:
+                    progress.record_error(str(file_path), "Could not read document")
+                if progress is not None:
+                    progress.file_done(str(file_path), chunks_embedded)
 
             print(f"Total documents processed: {processed_count}")
+            return processed_count
         finally:
             if db:
                 db.close()
@@ -0,0 +1,287 @@
+"""
+Index generations for shadow rebuilds of the vector store
+
+Every Document and DocumentChunk row belongs to a generation. Queries only
+read the generation whose status is 'serving'; a rebuild writes into a new
+'building' generation and is promoted in a single transaction once complete.
+Files already stored in the building generation act as checkpoints, so an
+interrupted rebuild resumes where it stopped.
+
+Only one rebuild may write at a time, across workers and the CLI:
+try_rebuild_lock() takes a PostgreSQL advisory lock that every rebuild
+path (POST /api/knowledge/process, the startup ingest and
+rebuild_embeddings.py) must hold.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional, Set
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.db.models import Document, DocumentChunk, IndexGeneration
+from backend.services.metrics import record_cache
+
+GENERATION_BUILDING = "building"
+GENERATION_SERVING = "serving"
+GENERATION_RETIRED = "retired"
+
+# pg_advisory_lock key held while a rebuild writes to the vector store
+REBUILD_LOCK_KEY = 7246201
+
+# Cache the serving generation so the search hot path does not query it every time
+SERVING_CACHE_TTL = float(os.getenv("INDEX_GENERATION_CACHE_TTL", "5"))
+
+_cache_lock = threading.Lock()
+# Stands in for the advisory lock on databases without one (SQLite)
+_local_rebuild_lock = threading.Lock()
+_serving_cache = {"id": None, "expires_at": 0.0}
+# Content version per generation: (version, expires_at)
+_version_cache = {}
+
+
+def invalidate_serving_cache():
+    """Forget the cached serving generation (and content versions) in this process."""
+    with _cache_lock:
+        _serving_cache["id"] = None
+        _serving_cache["expires_at"] = 0.0
+        _version_cache.clear()
+
+
+def invalidate_content_version():
+    """Forget the cached content versions in this process, e.g. after storing chunks."""
+    with _cache_lock:
+        _version_cache.clear()
+
+
+def _cached_serving_generation():
+    with _cache_lock:
+        if _serving_cache["id"] is not None and _serving_cache["expires_at"] > time.monotonic():
+            record_cache("serving_generation", True)
+            return _serving_cache["id"]
+    record_cache("serving_generation", False)
+    return None
+
+
+def _cache_serving_generation(generation_id: int):
+    with _cache_lock:
+        _serving_cache["id"] = generation_id
+        _serving_cache["expires_at"] = time.monotonic() + SERVING_CACHE_TTL
+
+
+def get_serving_generation(db: Session) -> int:
+    """
+    Get the ID of the generation that serves queries, creating one if needed.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Serving generation ID
+    """
+    cached = _cached_serving_generation()
+    if cached is not None:
+        return cached
+
+    serving = db.query(IndexGeneration).filter(IndexGeneration.status == GENERATION_SERVING).first()
+    if serving is None:
+        serving = IndexGeneration(status=GENERATION_SERVING, activated_at=datetime.utcnow())
+        db.add(serving)
+        db.commit()
+
+    _cache_serving_generation(serving.id)
+    return serving.id
+
+
+async def aget_serving_generation(db: AsyncSession) -> int:
+    """Async version of get_serving_generation; shares its cache."""
+    cached = _cached_serving_generation()
+    if cached is not None:
+        return cached
+
+    result = await db.execute(
+        select(IndexGeneration.id).where(IndexGeneration.status == GENERATION_SERVING).limit(1)
+    )
+    serving_id = result.scalar()
+    if serving_id is None:
+        serving = IndexGeneration(status=GENERATION_SERVING, activated_at=datetime.utcnow())
+        db.add(serving)
+        await db.flush()
+        serving_id = serving.id
+        await db.commit()
+
+    _cache_serving_generation(serving_id)
+    return serving_id
+
+
+def _content_version_statement(generation_id: int):
+    return select(func.count(DocumentChunk.id), func.max(DocumentChunk.id)).where(
+        DocumentChunk.generation == generation_id
+    )
+
+
+def _cached_content_version(generation_id: int):
+    with _cache_lock:
+        cached = _version_cache.get(generation_id)
+        if cached is not None and cached[1] > time.monotonic():
+            record_cache("content_version", True)
+            return cached[0]
+    record_cache("content_version", False)
+    return None
+
+
+def _cache_content_version(generation_id: int, row) -> str:
+    version = f"{row[0] or 0}-{row[1] or 0}"
+    with _cache_lock:
+        _version_cache[generation_id] = (version, time.monotonic() + SERVING_CACHE_TTL)
+    return version
+
+
+def get_content_version(db: Session, generation_id: int) -> str:
+    """
+    A version of a generation's contents that changes whenever chunks are
+    added to or deleted from it (its chunk count and highest chunk id).
+
+    Cached like the serving generation, so other processes see a change
+    within INDEX_GENERATION_CACHE_TTL seconds.
+
+    Args:
+        db: Database session
+        generation_id: Generation to version
+
+    Returns:
+        Opaque version string
+    """
+    cached = _cached_content_version(generation_id)
+    if cached is not None:
+        return cached
+    return _cache_content_version(generation_id, db.execute(_content_version_statement(generation_id)).one())
+
+
+async def aget_content_version(db: AsyncSession, generation_id: int) -> str:
+    """Async version of get_content_version; shares its cache."""
+    cached = _cached_content_version(generation_id)
+    if cached is not None:
+        return cached
+    row = (await db.execute(_content_version_statement(generation_id))).one()
+    return _cache_content_version(generation_id, row)
+
+
+def try_rebuild_lock(engine=None) -> Optional[Callable[[], None]]:
+    """
+    Take the rebuild lock if no other process or thread holds it.
+
+    On PostgreSQL this is a session-level advisory lock on a connection
+    kept open until release, so a crashed rebuild cannot leave it held.
+    Other databases get a lock in this process only.
+
+    Args:
+        engine: Engine to lock through (default: the sync application engine)
+
+    Returns:
+        A function releasing the lock, or None if another rebuild holds it
+    """
+    if engine is None:
+        from backend.db.database import engine
+    if engine.dialect.name != "postgresql":
+        return _local_rebuild_lock.release if _local_rebuild_lock.acquire(blocking=False) else None
+
+    conn = engine.connect()
+    try:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": REBUILD_LOCK_KEY}).scalar()
+        conn.commit()
+    except Exception:
+        conn.close()
+        raise
+    if not acquired:
+        conn.close()
+        return None
+
+    def release():
+        try:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": REBUILD_LOCK_KEY})
+            conn.commit()
+        except Exception:
+            # Session locks survive a return to the pool; drop the connection instead
+            conn.invalidate()
+        finally:
+            conn.close()
+    return release
+
+
+def start_shadow_generation(db: Session) -> IndexGeneration:
+    """
+    Return the unfinished building generation, or create a new one.
+
+    Reusing an existing building generation is what makes rebuilds resumable.
+    """
+    building = db.query(IndexGeneration).filter(
+        IndexGeneration.status == GENERATION_BUILDING
+    ).order_by(IndexGeneration.id.desc()).first()
+    if building is not None:
+        return building
+
+    building = IndexGeneration(status=GENERATION_BUILDING)
+    db.add(building)
+    db.commit()
+    db.refresh(building)
+    return building
+
+
+def completed_files(db: Session, generation_id: int) -> Set[str]:
+    """Get the file paths already stored in a generation (the per-file checkpoints)."""
+    rows = db.query(Document.file_path).filter(Document.generation == generation_id).all()
+    return {row[0] for row in rows}
+
+
+def promote_generation(db: Session, generation_id: int) -> List[int]:
+    """
+    Atomically make a generation the serving one.
+
+    Args:
+        db: Database session
+        generation_id: Generation to promote
+
+    Returns:
+        IDs of the generations that were retired
+    """
+    try:
+        previous = db.query(IndexGeneration).filter(
+            IndexGeneration.status == GENERATION_SERVING
+        ).with_for_update().all()
+        retired_ids = [generation.id for generation in previous if generation.id != generation_id]
+        for generation in previous:
+            if generation.id != generation_id:
+                generation.status = GENERATION_RETIRED
+
+        target = db.query(IndexGeneration).filter(IndexGeneration.id == generation_id).one()
+        target.status = GENERATION_SERVING
+        target.activated_at = datetime.utcnow()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    invalidate_serving_cache()
+    return retired_ids
+
+
+def drop_generation(db: Session, generation_id: int):
+    """Delete all documents and chunks stored in a non-serving generation."""
+    generation = db.query(IndexGeneration).filter(IndexGeneration.id == generation_id).first()
+    if generation is not None and generation.status == GENERATION_SERVING:
+        raise ValueError(f"Refusing to drop serving generation {generation_id}")
+
+    try:
+        db.query(DocumentChunk).filter(DocumentChunk.generation == generation_id).delete(synchronize_session=False)
+        db.query(Document).filter(Document.generation == generation_id).delete(synchronize_session=False)
+        if generation is not None:
+            db.delete(generation)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
@@ -0,0 +1,130 @@
+"""
+Clustering of unanswered queries for knowledge base gap analysis
+
+Distinct (normalized) queries are embedded and assigned one at a time to
+the nearest cluster centroid, or start a new cluster when nothing is
+similar enough, so new log entries can be folded into existing clusters
+without re-clustering everything. Clusters are ranked by a recency
+weighted frequency: each logged miss counts 0.5 ** (age / half-life), so
+a gap that is still being hit outranks one that was fixed months ago.
+"""
+
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from backend.services.query_log import aggregate, normalize_query
+
+# Cosine similarity at or above which a query joins a cluster
+CLUSTER_THRESHOLD = 0.8
+HALF_LIFE_DAYS = 30.0
+
+
+def recency_weights(entries: Iterable[Dict[str, Any]], half_life_days: float = HALF_LIFE_DAYS,
+                    now: Optional[datetime] = None) -> Dict[str, float]:
+    """
+    Sum of 0.5 ** (age in days / half_life_days) over the entries of each normalized query.
+
+    Entries without a readable timestamp count as new.
+    """
+    now = now or datetime.utcnow()
+    weights: Dict[str, float] = {}
+    for entry in entries:
+        key = normalize_query(entry.get("query") or "")
+        if not key:
+            continue
+        try:
+            age_days = max((now - datetime.fromisoformat(entry["timestamp"])).total_seconds() / 86400, 0.0)
+        except (KeyError, TypeError, ValueError):
+            age_days = 0.0
+        weights[key] = weights.get(key, 0.0) + 0.5 ** (age_days / half_life_days)
+    return weights
+
+
+class IncrementalClusterer:
+    """Online centroid clustering of unit-length vectors by cosine similarity."""
+
+    def __init__(self, threshold: float = CLUSTER_THRESHOLD):
+        self.threshold = threshold
+        self.centroids: List[np.ndarray] = []
+        self.weights: List[float] = []
+        self.members: List[List[Any]] = []
+
+    def add(self, key: Any, vector: np.ndarray, weight: float = 1.0) -> int:
+        """
+        Assign a vector to the most similar cluster, or a new one.
+
+        Args:
+            key: Identifier stored as a member of the cluster
+            vector: Normalized embedding
+            weight: How much the vector pulls the centroid (e.g. its count)
+
+        Returns:
+            Index of the cluster
+        """
+        if self.centroids:
+            similarities = np.stack(self.centroids) @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                total = self.weights[best] + weight
+                centroid = (self.centroids[best] * self.weights[best] + vector * weight) / total
+                self.centroids[best] = centroid / (np.linalg.norm(centroid) or 1.0)
+                self.weights[best] = total
+                self.members[best].append(key)
+                return best
+        self.centroids.append(np.asarray(vector, dtype=np.float32))
+        self.weights.append(weight)
+        self.members.append([key])
+        return len(self.centroids) - 1
+
+
+def cluster_report(entries: Sequence[Dict[str, Any]], embed: Callable[[List[str]], np.ndarray],
+                   threshold: float = CLUSTER_THRESHOLD, half_life_days: float = HALF_LIFE_DAYS,
+                   now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Group unanswered queries into knowledge gaps, most pressing first.
+
+    Args:
+        entries: Unanswered query log entries (see query_log.read_entries)
+        embed: Embeds a list of texts into normalized row vectors (e.g.
+            EmbeddingCache.embed, which batches and caches)
+        threshold: Cosine similarity for joining a cluster
+        half_life_days: Age at which a logged miss counts half
+        now: Reference time for recency (defaults to utcnow)
+
+    Returns:
+        List of {"query", "score", "count", "last_seen", "reasons",
+        "examples"}; 'query' is the most asked wording in the cluster and
+        'examples' lists the other wordings by frequency
+    """
+    entries = list(entries)
+    groups = aggregate(entries)
+    if not groups:
+        return []
+    weights = recency_weights(entries, half_life_days, now)
+    # Oldest questions first, so clusters form around the wording seen earliest
+    groups.sort(key=lambda group: group["first_seen"] or "")
+    vectors = embed([normalize_query(group["query"]) for group in groups])
+
+    clusterer = IncrementalClusterer(threshold)
+    for index, (group, vector) in enumerate(zip(groups, vectors)):
+        clusterer.add(index, vector, weight=group["count"])
+
+    clusters = []
+    for members in clusterer.members:
+        member_groups = sorted((groups[i] for i in members), key=lambda group: -group["count"])
+        reasons = Counter()
+        for group in member_groups:
+            reasons.update(group["reasons"])
+        clusters.append({
+            "query": member_groups[0]["query"],
+            "score": sum(weights.get(normalize_query(group["query"]), 0.0) for group in member_groups),
+            "count": sum(group["count"] for group in member_groups),
+            "last_seen": max((group["last_seen"] or "" for group in member_groups), default="") or None,
+            "reasons": dict(reasons.most_common()),
+            "examples": [group["query"] for group in member_groups[1:]],
+        })
+    clusters.sort(key=lambda cluster: (-cluster["score"], -cluster["count"], cluster["query"]))
+    return clusters
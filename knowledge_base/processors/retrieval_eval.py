@@ -0,0 +1,259 @@
+"""
+Offline retrieval evaluation
+
+Builds a labelled query set from the FAQ files (each question is expected
+to retrieve the file it came from), chunks the knowledge base the way
+ingestion does, and scores a search function with recall@k, MRR and
+latency percentiles. Embeddings come from an on-disk cache, so once it is
+filled (with an API key) runs are deterministic and work offline; the
+local hashing embedder needs no cache or key at all.
+"""
+
+import hashlib
+import math
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from knowledge_base.processors.vector_index import normalize
+
+SUPPORTED_EXTENSIONS = ('.txt', '.md', '.py', '.js', '.html', '.css', '.json', '.yaml', '.yml')
+
+# Roughly DocumentProcessor's 1000/200 token chunks, in words
+CHUNK_WORDS = 750
+CHUNK_OVERLAP_WORDS = 150
+
+FAQ_QUESTION_RE = re.compile(r"^\*\*Q:\s*(.+?)\*\*", re.MULTILINE)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Model name for the local, offline hashing embedder
+HASHING_MODEL = "hashing"
+
+# Folders under the knowledge base root that hold code and tooling, not content
+TOOLING_FOLDERS = ("processors", "scripts", "config", "embeddings", "__pycache__")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def chunk_words(text: str, size: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP_WORDS) -> List[str]:
+    """Split text into overlapping windows of words."""
+    words = text.split()
+    chunks = []
+    start = 0
+    while start < len(words):
+        end = min(start + size, len(words))
+        chunks.append(" ".join(words[start:end]))
+        if end == len(words):
+            break
+        start = end - overlap
+    return chunks
+
+
+def load_corpus(kb_dir: Path, exclude_categories: Iterable[str] = ("Internal_Resources",),
+                exclude_folders: Iterable[str] = TOOLING_FOLDERS) -> List[Dict[str, Any]]:
+    """
+    Chunk every supported content file under kb_dir.
+
+    Files directly in kb_dir (package files, logs) and in exclude_folders
+    are not content and are skipped, so code changes do not change the corpus.
+
+    Args:
+        kb_dir: Knowledge base root
+        exclude_categories: Top-level folders that search never returns
+        exclude_folders: Folders, at any depth, holding code or tooling
+
+    Returns:
+        List of {"id", "file", "text"}; id is the list position and file is
+        the path relative to kb_dir
+    """
+    excluded = set(exclude_categories)
+    tooling = set(exclude_folders)
+    chunks = []
+    for path in sorted(kb_dir.rglob('*')):
+        if not path.is_file() or path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+            continue
+        relative = path.relative_to(kb_dir)
+        if len(relative.parts) == 1 or relative.parts[0] in excluded or tooling.intersection(relative.parts[:-1]):
+            continue
+        try:
+            text = path.read_text(encoding='utf-8')
+        except (UnicodeDecodeError, OSError):
+            continue
+        for piece in chunk_words(text):
+            chunks.append({"id": len(chunks), "file": relative.as_posix(), "text": piece})
+    return chunks
+
+
+def faq_queries(kb_dir: Path, faq_folder: str = "FAQ") -> List[Dict[str, Any]]:
+    """Each '**Q: ...**' question in the FAQ folder as {"query", "relevant_files"}, labelled with its own file."""
+    queries = []
+    for path in sorted((kb_dir / faq_folder).glob('*.md')):
+        relative = path.relative_to(kb_dir).as_posix()
+        for question in FAQ_QUESTION_RE.findall(path.read_text(encoding='utf-8')):
+            queries.append({"query": question.strip(), "relevant_files": [relative]})
+    return queries
+
+
+def evaluate(backend: str, search: Callable[[np.ndarray, str, int], List[int]], queries: Sequence[Dict[str, Any]],
+             query_vectors: np.ndarray, chunks: Sequence[Dict[str, Any]], k: int) -> Dict[str, Any]:
+    """
+    Run every query through a search function and score it.
+
+    Args:
+        backend: Name for the report
+        search: Called as search(query_vector, query_text, n) and returns chunk ids, best first
+        queries: Labelled queries
+        query_vectors: One embedding per query
+        chunks: Corpus, indexed by chunk id
+        k: Cut-off for recall@k and MRR
+
+    Returns:
+        Dict with backend, recall (fraction of relevant files found in the
+        top k), mrr (rank of the first relevant file) and p50/p95/p99 latency
+    """
+    latencies = []
+    recall_total = 0.0
+    reciprocal_total = 0.0
+    for query, vector in zip(queries, query_vectors):
+        start = time.perf_counter()
+        ids = search(vector, query["query"], k)
+        latencies.append(time.perf_counter() - start)
+
+        ranked_files = []
+        for chunk_id in ids:
+            file = chunks[chunk_id]["file"]
+            if file not in ranked_files:
+                ranked_files.append(file)
+        relevant = set(query["relevant_files"])
+        recall_total += len(relevant & set(ranked_files[:k])) / len(relevant)
+        for rank, file in enumerate(ranked_files[:k], 1):
+            if file in relevant:
+                reciprocal_total += 1.0 / rank
+                break
+
+    n = max(len(queries), 1)
+    return {
+        "backend": backend,
+        "queries": len(queries),
+        "recall": recall_total / n,
+        "mrr": reciprocal_total / n,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+    }
+
+
+def percentile_ms(samples: Sequence[float], pct: float) -> float:
+    return float(np.percentile(samples, pct) * 1000) if len(samples) else 0.0
+
+
+def hashing_embedding(text: str, dimensions: int) -> np.ndarray:
+    """
+    Deterministic offline embedding: signed feature hashing of words and
+    word bigrams. Captures lexical overlap only, but is stable across runs.
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    tokens = tokenize(text)
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+        value = int.from_bytes(digest, 'little')
+        vector[value % dimensions] += 1.0 if (value >> 63) & 1 else -1.0
+    return normalize(vector)
+
+
+class EmbeddingCache:
+    """Text -> embedding store persisted as a .npz file."""
+
+    def __init__(self, path: Path, model: str, dimensions: int, embed_fn: Optional[Callable[[List[str]], List]] = None):
+        """
+        Args:
+            path: Cache file; created on save
+            model: Embedding model name, part of the cache key; 'hashing'
+                computes hashing_embedding locally for misses
+            dimensions: Embedding size, part of the cache key
+            embed_fn: Embeds a batch of texts for cache misses (e.g. via
+                OpenAI); without it, misses for other models raise LookupError
+        """
+        self.path = Path(path)
+        self.model = model
+        self.dimensions = dimensions
+        self.embed_fn = embed_fn
+        self._vectors: Dict[str, np.ndarray] = {}
+        self.misses = 0
+        if self.path.exists():
+            with np.load(self.path) as data:
+                self._vectors = {key: data[key] for key in data.files}
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}:{self.dimensions}:{text}".encode('utf-8')).hexdigest()
+
+    def _embed_missing(self, texts: List[str]) -> List:
+        if self.model == HASHING_MODEL:
+            return [hashing_embedding(text, self.dimensions) for text in texts]
+        if self.embed_fn is None:
+            raise LookupError(f"{len(texts)} texts are not in {self.path} for {self.model}; "
+                              f"embed them once with an API key to refresh the cache")
+        return self.embed_fn(texts)
+
+    def embed(self, texts: Sequence[str], batch_size: int = 100) -> np.ndarray:
+        """Embeddings for texts (one row each), from the cache where possible."""
+        keys = [self._key(text) for text in texts]
+        missing = list({key: text for key, text in zip(keys, texts) if key not in self._vectors}.items())
+        self.misses += len(missing)
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            vectors = self._embed_missing([text for _, text in batch])
+            for (key, _), vector in zip(batch, vectors):
+                self._vectors[key] = np.asarray(vector, dtype=np.float32)
+        if not keys:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        return normalize(np.stack([self._vectors[key] for key in keys]))
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(self.path, **self._vectors)
+
+
+class BM25:
+    """Okapi BM25 over chunk texts, for lexical and hybrid retrieval."""
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_tokens = [Counter(tokenize(text)) for text in texts]
+        self.doc_lengths = np.array([sum(tokens.values()) for tokens in self.doc_tokens], dtype=np.float32)
+        self.avg_length = float(self.doc_lengths.mean()) if len(texts) else 0.0
+        document_frequency = Counter(term for tokens in self.doc_tokens for term in tokens)
+        n = len(texts)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.doc_tokens), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / (self.avg_length or 1.0))
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            tf = np.array([tokens.get(term, 0) for tokens in self.doc_tokens], dtype=np.float32)
+            scores += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, n: int) -> List[int]:
+        scores = self.scores(query)
+        return [int(i) for i in np.argsort(-scores)[:n] if scores[i] > 0]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], n: int, k: int = 60) -> List[int]:
+    """Merge ranked id lists; each id scores sum(1 / (k + rank))."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return [item for item, _ in sorted(fused.items(), key=lambda pair: -pair[1])[:n]]
@@ -0,0 +1,261 @@
+"""
+In-process vector index with optional scalar quantization
+
+Vectors are L2-normalised at build time so cosine similarity is a dot
+product. Storage can be full float32, float16 (half the memory) or
+per-vector scaled int8 (a quarter of the memory), and the index can keep
+only a Matryoshka prefix of each vector. Quantized or truncated searches
+over-fetch candidates and re-rank them with full-precision vectors when a
+loader for those is available.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+STORAGE_FLOAT32 = "float32"
+STORAGE_FLOAT16 = "float16"
+STORAGE_INT8 = "int8"
+STORAGE_MODES = (STORAGE_FLOAT32, STORAGE_FLOAT16, STORAGE_INT8)
+
+# Rows scored per block, which bounds the temporary float32 buffer for quantized storage
+SCORE_BLOCK_ROWS = 4096
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalise rows of a float matrix (or a single vector)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def truncate_embedding(vector, dimensions: int) -> List[float]:
+    """
+    Shorten a Matryoshka embedding (e.g. text-embedding-3-*) to its first
+    dimensions and re-normalise it, which is what the API's `dimensions`
+    parameter returns.
+    """
+    return normalize(np.asarray(vector, dtype=np.float32)[:dimensions]).tolist()
+
+
+class InMemoryVectorIndex:
+    """Brute-force cosine index kept in process memory."""
+
+    def __init__(self, storage: str = STORAGE_FLOAT32, rerank_factor: int = 4,
+                 full_vector_loader: Optional[Callable[[List[int]], np.ndarray]] = None,
+                 dimensions: Optional[int] = None):
+        """
+        Args:
+            storage: One of 'float32', 'float16' or 'int8'
+            rerank_factor: Candidates fetched per requested result before re-ranking
+            full_vector_loader: Returns full-precision vectors for a list of ids,
+                in the same order; used to re-rank quantized candidates
+            dimensions: Index only this many leading dimensions (Matryoshka
+                truncation); None keeps the full vectors
+        """
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode '{storage}', expected one of {STORAGE_MODES}")
+        self.storage = storage
+        self.rerank_factor = max(1, rerank_factor)
+        self.full_vector_loader = full_vector_loader
+        self.dimensions = dimensions
+        self.ids = np.empty(0, dtype=np.int64)
+        self.payloads: List[Any] = []
+        self.labels = np.empty(0, dtype=object)
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def build(self, ids: Sequence[int], vectors, payloads: Optional[Sequence[Any]] = None,
+              labels: Optional[Sequence[str]] = None):
+        """
+        Replace the index contents.
+
+        Args:
+            ids: Row identifiers (e.g. DocumentChunk ids)
+            vectors: Matrix of shape (len(ids), dimensions)
+            payloads: Optional per-row data returned with search results
+            labels: Optional per-row label (e.g. category) that searches can filter on
+        """
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.payloads = list(payloads) if payloads is not None else [None] * len(self.ids)
+        self.labels = np.asarray(labels if labels is not None else [None] * len(self.ids), dtype=object)
+        if not len(self.ids):
+            self._codes = None
+            self._scales = None
+            return
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(self.ids), -1)
+        if self.dimensions is not None:
+            matrix = matrix[:, :self.dimensions]
+        matrix = normalize(matrix)
+
+        if self.storage == STORAGE_INT8:
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._codes = np.round(matrix / scales[:, None]).astype(np.int8)
+            self._scales = scales.astype(np.float32)
+        elif self.storage == STORAGE_FLOAT16:
+            self._codes = matrix.astype(np.float16)
+            self._scales = None
+        else:
+            self._codes = matrix
+            self._scales = None
+
+    @property
+    def is_approximate(self) -> bool:
+        """Whether scores come from quantized or truncated vectors and benefit from re-ranking."""
+        return self.storage != STORAGE_FLOAT32 or self.dimensions is not None
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the vector storage (excluding payloads)."""
+        total = self.ids.nbytes
+        if self._codes is not None:
+            total += self._codes.nbytes
+        if self._scales is not None:
+            total += self._scales.nbytes
+        return total
+
+    def _approximate_scores(self, queries: np.ndarray) -> np.ndarray:
+        """Scores of every row for a (n_queries, dimensions) matrix, shaped (n_queries, rows)."""
+        if self.storage == STORAGE_FLOAT32:
+            return queries @ self._codes.T
+
+        scores = np.empty((len(queries), len(self.ids)), dtype=np.float32)
+        for start in range(0, len(self.ids), SCORE_BLOCK_ROWS):
+            block = self._codes[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + SCORE_BLOCK_ROWS] = queries @ block.T
+        if self._scales is not None:
+            scores *= self._scales
+        return scores
+
+    def _label_mask(self, include_labels: Optional[Sequence[str]],
+                    exclude_labels: Optional[Sequence[str]]) -> Optional[np.ndarray]:
+        if not include_labels and not exclude_labels:
+            return None
+        mask = np.ones(len(self.ids), dtype=bool)
+        if include_labels:
+            mask &= np.isin(self.labels, list(include_labels))
+        if exclude_labels:
+            mask &= ~np.isin(self.labels, list(exclude_labels))
+        return mask
+
+    def search(self, query_vector, k: int = 5,
+               full_vector_loader: Optional[Callable[[List[int]], np.ndarray]] = None,
+               include_labels: Optional[Sequence[str]] = None,
+               exclude_labels: Optional[Sequence[str]] = None) -> List[Tuple[int, float, Any]]:
+        """
+        Find the k most similar rows.
+
+        Args:
+            query_vector: Query embedding
+            k: Number of results
+            full_vector_loader: Overrides the index's loader for this call
+            include_labels: Only consider rows with one of these labels
+            exclude_labels: Never return rows with one of these labels
+
+        Returns:
+            List of (id, cosine similarity, payload), best first
+        """
+        if not len(self.ids) or k <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = self._approximate_scores(normalize(query[:self.dimensions])[None, :])[0]
+
+        available = len(self.ids)
+        mask = self._label_mask(include_labels, exclude_labels)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            available = int(mask.sum())
+            if not available:
+                return []
+
+        loader = full_vector_loader or self.full_vector_loader
+        rerank = self.is_approximate and loader is not None
+        n_candidates = min(available, k * self.rerank_factor if rerank else k)
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+
+        if rerank:
+            full = normalize(loader([int(i) for i in self.ids[candidates]]))
+            scores = np.full(len(self.ids), -np.inf, dtype=np.float32)
+            scores[candidates] = full @ normalize(query)
+
+        top = candidates[np.argsort(-scores[candidates])][:k]
+        return [(int(self.ids[i]), float(scores[i]), self.payloads[i]) for i in top]
+
+    def search_batch(self, query_vectors, k: int = 5,
+                     include_labels: Optional[Sequence[str]] = None,
+                     exclude_labels: Optional[Sequence[str]] = None) -> List[List[Tuple[int, float, Any]]]:
+        """
+        Find the k most similar rows for each of several queries with one
+        matrix multiply.
+
+        Scores come from the stored (possibly quantized or truncated)
+        vectors; for an approximate index, over-fetch and call rerank on
+        each result list.
+
+        Args:
+            query_vectors: Matrix with one query embedding per row
+            k: Number of results per query
+            include_labels: Only consider rows with one of these labels
+            exclude_labels: Never return rows with one of these labels
+
+        Returns:
+            One list of (id, score, payload), best first, per query
+        """
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        if not len(self.ids) or k <= 0 or not len(queries):
+            return [[] for _ in range(len(queries))]
+        scores = self._approximate_scores(normalize(queries[:, :self.dimensions]))
+
+        available = len(self.ids)
+        mask = self._label_mask(include_labels, exclude_labels)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            available = int(mask.sum())
+            if not available:
+                return [[] for _ in range(len(queries))]
+
+        n_candidates = min(available, k)
+        top = np.argpartition(-scores, n_candidates - 1, axis=1)[:, :n_candidates]
+        results = []
+        for row_scores, candidates in zip(scores, top):
+            ordered = candidates[np.argsort(-row_scores[candidates])]
+            results.append([(int(self.ids[i]), float(row_scores[i]), self.payloads[i]) for i in ordered])
+        return results
+
+    def rerank(self, candidates: Sequence[Tuple[int, float, Any]], full_vectors, query_vector,
+               k: int) -> List[Tuple[int, float, Any]]:
+        """
+        Re-score search results with full-precision vectors.
+
+        For callers that fetch full vectors themselves (e.g. with an async
+        session) instead of passing a loader to search.
+
+        Args:
+            candidates: Results of search, over-fetched by rerank_factor
+            full_vectors: Full-precision vectors, in the same order as candidates
+            query_vector: Query embedding
+            k: Number of results
+
+        Returns:
+            List of (id, cosine similarity, payload), best first
+        """
+        if not len(candidates):
+            return []
+        scores = normalize(full_vectors) @ normalize(np.asarray(query_vector, dtype=np.float32))
+        order = np.argsort(-scores)[:k]
+        return [(candidates[i][0], float(scores[i]), candidates[i][2]) for i in order]
+
+
+def storage_bytes_per_vector(dimensions: int) -> Dict[str, int]:
+    """Approximate bytes per stored vector for each storage option."""
+    return {
+        "pgvector_vector": 4 * dimensions + 8,
+        "pgvector_halfvec": 2 * dimensions + 8,
+        "memory_float32": 4 * dimensions,
+        "memory_float16": 2 * dimensions,
+        "memory_int8": dimensions + 4,
+    }
@@ -0,0 +1,176 @@
+"""
+Prepared SQL for pgvector similarity search
+
+The search statements are plain SQL with bind parameters, built once per
+query shape (single or two-pass, with or without category filters) and
+reused, so SQLAlchemy's compiled cache and asyncpg's per-connection
+prepared statement cache both hit on every search. They select only the
+columns a result needs (never the embedding), do not join documents and
+compute the query distance once, ordering by its alias.
+
+Excluding the internal category is the one filter written as a constant:
+the planner only uses the partial vector index that leaves it out when
+the query repeats that index's predicate literally.
+"""
+
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import Float, Integer, String, bindparam, column, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.sql.selectable import TextualSelect
+
+from backend.db.models import DocumentChunk
+
+# First-pass distance for two-pass searches; each matches an index expression.
+# {query} / {coarse_query} are the vector(N) query expressions.
+CANDIDATE_PASSES = {
+    # Truncated Matryoshka prefix (document_chunks_embedding_coarse_idx)
+    "coarse": "embedding_coarse <=> {coarse_query}",
+    # float16 copy of the full vector (document_chunks_embedding_half_idx)
+    "halfvec": "CAST(embedding AS halfvec({dimensions})) <=> CAST({query} AS halfvec({dimensions}))",
+}
+
+# Category left out of document_chunks_embedding_public_idx (migration 0005)
+PUBLIC_INDEX_EXCLUDED = "Internal_Resources"
+# That index's predicate, repeated verbatim so searches can use it
+PUBLIC_INDEX_PREDICATE = f"category <> '{PUBLIC_INDEX_EXCLUDED}'"
+
+_statements: Dict[Tuple, TextualSelect] = {}
+
+
+def vector_literal(vector: Sequence[float]) -> str:
+    """pgvector text form of a vector, e.g. '[0.1,0.2]'."""
+    return "[" + ",".join(str(float(value)) for value in vector) + "]"
+
+
+def _where(filter_categories: bool, exclude_categories: bool, public_only: bool) -> str:
+    clauses = ["generation = :generation"]
+    if filter_categories:
+        clauses.append("category = ANY(:categories)")
+    if public_only:
+        clauses.append(PUBLIC_INDEX_PREDICATE)
+    if exclude_categories:
+        clauses.append("category <> ALL(:excluded)")
+    return " AND ".join(clauses)
+
+
+def _search_sql(query: str, coarse_query: str, dimensions: int, candidate_pass: Optional[str], where: str) -> str:
+    """SELECT of the nearest chunks to one query vector expression."""
+    distance = f"embedding <=> {query}"
+    if candidate_pass is None:
+        return (f"SELECT id, content, chunk_metadata, content_simhash, {distance} AS distance "
+                f"FROM document_chunks WHERE {where} ORDER BY distance LIMIT :limit")
+    candidate_distance = CANDIDATE_PASSES[candidate_pass].format(
+        query=query, coarse_query=coarse_query, dimensions=dimensions
+    )
+    # Candidates come from the cheaper index; only they are re-ranked with
+    # the full-precision vectors
+    return (f"SELECT id, content, chunk_metadata, content_simhash, {distance} AS distance FROM document_chunks "
+            f"JOIN (SELECT id FROM document_chunks WHERE {where} "
+            f"ORDER BY {candidate_distance} LIMIT :candidates) AS candidates USING (id) "
+            f"ORDER BY distance LIMIT :limit")
+
+
+def _bind(suffix: str, vector_type, candidate_pass: Optional[str], filter_categories: bool,
+          exclude_categories: bool) -> list:
+    """Typed bind parameters; suffix 's' names the per-batch list parameters."""
+    params = [
+        bindparam("embedding" + suffix, type_=vector_type),
+        bindparam("generation", type_=Integer),
+        bindparam("limit", type_=Integer),
+    ]
+    if filter_categories:
+        params.append(bindparam("categories", type_=ARRAY(String)))
+    if exclude_categories:
+        params.append(bindparam("excluded", type_=ARRAY(String)))
+    if candidate_pass is not None:
+        params.append(bindparam("candidates", type_=Integer))
+    if candidate_pass == "coarse":
+        params.append(bindparam("coarse_embedding" + suffix, type_=vector_type))
+    return params
+
+
+def search_statement(dimensions: int, candidate_pass: Optional[str] = None, coarse_dimensions: Optional[int] = None,
+                     filter_categories: bool = False, exclude_categories: bool = False,
+                     public_only: bool = False) -> TextualSelect:
+    """
+    Get the prepared statement for a similarity search.
+
+    Bind parameters: embedding (vector_literal), generation, limit, plus
+    categories / excluded (lists) when filtered, and for two-pass searches
+    candidates (first-pass row count) and, for 'coarse', coarse_embedding.
+
+    Args:
+        dimensions: Embedding column dimensions
+        candidate_pass: None for a single exact pass, or a key of CANDIDATE_PASSES
+        coarse_dimensions: embedding_coarse dimensions, for the 'coarse' pass
+        filter_categories: Restrict to the categories parameter
+        exclude_categories: Skip the excluded parameter
+        public_only: Skip PUBLIC_INDEX_EXCLUDED (not part of excluded)
+
+    Returns:
+        Text statement whose rows are (id, content, chunk_metadata, content_simhash, distance)
+    """
+    key = ("single", dimensions, candidate_pass, coarse_dimensions, filter_categories, exclude_categories, public_only)
+    statement = _statements.get(key)
+    if statement is not None:
+        return statement
+
+    sql = _search_sql(
+        f"CAST(:embedding AS vector({dimensions}))",
+        f"CAST(:coarse_embedding AS vector({coarse_dimensions}))",
+        dimensions, candidate_pass, _where(filter_categories, exclude_categories, public_only)
+    )
+    params = _bind("", String, candidate_pass, filter_categories, exclude_categories)
+    statement = text(sql).bindparams(*params).columns(
+        DocumentChunk.id, DocumentChunk.content, DocumentChunk.chunk_metadata, DocumentChunk.content_simhash,
+        column("distance", Float)
+    )
+    _statements[key] = statement
+    return statement
+
+
+def batch_search_statement(dimensions: int, candidate_pass: Optional[str] = None,
+                           coarse_dimensions: Optional[int] = None, filter_categories: bool = False,
+                           exclude_categories: bool = False, public_only: bool = False) -> TextualSelect:
+    """
+    Get the prepared statement that searches for many query vectors at once.
+
+    The query vectors are unnested with their position and each one runs
+    the single-query search through a LATERAL join, so every lookup still
+    uses the vector index, in one round trip.
+
+    Bind parameters are those of search_statement, with embeddings (and
+    coarse_embeddings) as lists of vector_literal strings.
+
+    Returns:
+        Text statement whose rows are (ord, id, content, chunk_metadata,
+        content_simhash, distance), ordered by query position (ord, from 1)
+        then distance
+    """
+    key = ("batch", dimensions, candidate_pass, coarse_dimensions, filter_categories, exclude_categories, public_only)
+    statement = _statements.get(key)
+    if statement is not None:
+        return statement
+
+    if candidate_pass == "coarse":
+        queries = (f"SELECT ord, CAST(embedding AS vector({dimensions})) AS embedding, "
+                   f"CAST(coarse_embedding AS vector({coarse_dimensions})) AS coarse_embedding "
+                   f"FROM unnest(:embeddings, :coarse_embeddings) WITH ORDINALITY AS q(embedding, coarse_embedding, ord)")
+    else:
+        queries = (f"SELECT ord, CAST(embedding AS vector({dimensions})) AS embedding "
+                   f"FROM unnest(:embeddings) WITH ORDINALITY AS q(embedding, ord)")
+    search = _search_sql("q.embedding", "q.coarse_embedding", dimensions, candidate_pass,
+                         _where(filter_categories, exclude_categories, public_only))
+    sql = (f"SELECT q.ord, results.id, results.content, results.chunk_metadata, results.content_simhash, "
+           f"results.distance "
+           f"FROM ({queries}) AS q CROSS JOIN LATERAL ({search}) AS results "
+           f"ORDER BY q.ord, results.distance")
+
+    params = _bind("s", ARRAY(String), candidate_pass, filter_categories, exclude_categories)
+    statement = text(sql).bindparams(*params).columns(
+        column("ord", Integer), DocumentChunk.id, DocumentChunk.content, DocumentChunk.chunk_metadata,
+        DocumentChunk.content_simhash, column("distance", Float)
+    )
+    _statements[key] = statement
+    return statement
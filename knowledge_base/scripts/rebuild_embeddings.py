@@ -2,10 +2,16 @@
 """
 Script to rebuild embeddings for the knowledge base.
 This script clears existing embeddings and re-processes all documents.
+
+With --shadow the rebuild goes into a new index generation instead: queries
+keep using the serving generation while it runs, every finished file is a
+checkpoint so an interrupted run resumes where it stopped, and the new
+generation is swapped in atomically once complete.
 """
 
 import os
 import sys
+import time
 import argparse
 from pathlib import Path
 from dotenv import load_dotenv
@@ -22,6 +28,16 @@ sys.path.insert(0, str(project_root / "backend"))
 from processors.document_processor import DocumentProcessor
 from backend.db.database import SessionLocal
 from backend.db.models import Document, DocumentChunk
+from knowledge_base.processors.generations import (
+    start_shadow_generation,
+    completed_files,
+    promote_generation,
+    drop_generation,
+    get_serving_generation,
+    try_rebuild_lock,
+    SERVING_CACHE_TTL,
+)
+from backend.services.job_service import JobProgress
 
 def clear_existing_data(dry_run=False):
     """Clear existing documents and chunks from the database."""
@@ -68,12 +84,65 @@ def rebuild_embeddings(dry_run=False):
 
     print("Embedding rebuild completed")
 
+def shadow_rebuild(dry_run=False, keep_old=False):
+    """Build a new index generation with per-file checkpoints, then swap it in."""
+    if dry_run:
+        print("DRY RUN: Would build a shadow generation and swap it in")
+        return 0
+
+    db = SessionLocal()
+    try:
+        generation = start_shadow_generation(db)
+        done = completed_files(db, generation.id)
+        if done:
+            print(f"Resuming generation {generation.id}: {len(done)} files already built")
+        else:
+            print(f"Building new generation {generation.id}")
+
+        processor = DocumentProcessor(
+            documents_dir=str(project_root / "knowledge_base")
+        )
+        progress = JobProgress()
+        progress.start()
+        # process_all_documents closes the session it is given, so hand it its own
+        processor.process_all_documents(SessionLocal(), progress=progress, generation=generation.id)
+
+        status = progress.to_dict()
+        if status["error_count"]:
+            print(f"{status['error_count']} errors during build; not swapping generations.")
+            print("Re-run with --shadow to retry the failed files.")
+            for error in status["errors"]:
+                print(f"  {error['file_path']}: {error['error']}")
+            return 1
+
+        chunk_count = db.query(DocumentChunk).filter(DocumentChunk.generation == generation.id).count()
+        if chunk_count == 0:
+            print(f"Generation {generation.id} has no chunks; not swapping generations.")
+            return 1
+
+        retired = promote_generation(db, generation.id)
+        print(f"Generation {generation.id} is now serving ({chunk_count} chunks)")
+
+        if not keep_old and retired:
+            # Other processes cache the serving generation for SERVING_CACHE_TTL seconds;
+            # let them switch before deleting the rows they may still be searching
+            wait = SERVING_CACHE_TTL + 1
+            print(f"Waiting {wait:.0f}s for workers to switch to generation {generation.id}...")
+            time.sleep(wait)
+            for old_id in retired:
+                drop_generation(db, old_id)
+                print(f"Dropped retired generation {old_id}")
+        return 0
+    finally:
+        db.close()
+
 def get_stats():
-    """Get current knowledge base statistics."""
+    """Get document and chunk counts of the serving generation."""
     db = SessionLocal()
     try:
-        doc_count = db.query(Document).count()
-        chunk_count = db.query(DocumentChunk).count()
+        generation = get_serving_generation(db)
+        doc_count = db.query(Document).filter(Document.generation == generation).count()
+        chunk_count = db.query(DocumentChunk).filter(DocumentChunk.generation == generation).count()
         return doc_count, chunk_count
     finally:
         db.close()
@@ -90,6 +159,16 @@ def main():
         action="store_true",
         help="Skip clearing existing data (append mode)"
     )
+    parser.add_argument(
+        "--shadow",
+        action="store_true",
+        help="Build into a new generation with checkpoints and swap it in when complete"
+    )
+    parser.add_argument(
+        "--keep-old",
+        action="store_true",
+        help="With --shadow, keep the retired generation instead of deleting it"
+    )
 
     args = parser.parse_args()
 
@@ -115,27 +194,45 @@ def main():
     else:
         print("\nPRODUCTION MODE - Changes will be applied")
 
-    # Clear existing data unless skipped
-    if not args.skip_clear:
-        print("\n1. Clearing existing data...")
-        clear_existing_data(args.dry_run)
-    else:
-        print("\n1. Skipping data clearing (append mode)...")
-
-    # Rebuild embeddings
-    print("\n2. Rebuilding embeddings...")
-    rebuild_embeddings(args.dry_run)
-
-    # Show final stats
+    # One rebuild at a time across API workers, the server's startup ingest and this script
+    release = None
     if not args.dry_run:
-        try:
-            doc_count, chunk_count = get_stats()
-            print(f"\nFinal state: {doc_count} documents, {chunk_count} chunks")
-        except Exception as e:
-            print(f"Could not get final stats: {e}")
-
-    print("\nRebuild process completed successfully!")
-    return 0
+        release = try_rebuild_lock()
+        if release is None:
+            print("Error: another knowledge base rebuild is running; try again when it has finished")
+            return 1
+
+    try:
+        if args.shadow:
+            print("\n1. Building shadow generation...")
+            result = shadow_rebuild(args.dry_run, args.keep_old)
+            if result:
+                return result
+        # Clear existing data unless skipped
+        elif not args.skip_clear:
+            print("\n1. Clearing existing data...")
+            clear_existing_data(args.dry_run)
+        else:
+            print("\n1. Skipping data clearing (append mode)...")
+
+        # Rebuild embeddings
+        if not args.shadow:
+            print("\n2. Rebuilding embeddings...")
+            rebuild_embeddings(args.dry_run)
+
+        # Show final stats
+        if not args.dry_run:
+            try:
+                doc_count, chunk_count = get_stats()
+                print(f"\nFinal state: {doc_count} documents, {chunk_count} chunks")
+            except Exception as e:
+                print(f"Could not get final stats: {e}")
+
+        print("\nRebuild process completed successfully!")
+        return 0
+    finally:
+        if release is not None:
+            release()
 
 if __name__ == "__main__":
     exit(main())
\ No newline at end of file
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark Matryoshka dimension reduction.
+
+Measures recall@k (against exact full-dimension search), latency and memory
+for indexes built on truncated embedding prefixes, with and without a
+full-vector re-rank of the candidates (the two-stage search used by
+VECTOR_TWO_STAGE_SEARCH).
+
+Synthetic vectors get decaying per-dimension variance to mimic Matryoshka
+embeddings, where the leading dimensions carry most of the signal. Use
+--from-db for numbers on the real corpus.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmark_quantization import synthetic_corpus, load_corpus_from_db, percentile_ms
+from knowledge_base.processors.vector_index import InMemoryVectorIndex, normalize
+
+
+def matryoshka_like(corpus):
+    """Concentrate variance in the leading dimensions."""
+    weights = 1.0 / np.sqrt(1.0 + np.arange(corpus.shape[1]) / 32.0)
+    return normalize(corpus * weights)
+
+
+def measure(index, queries, truth, k):
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = index.search(query, k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(expected & {row[0] for row in found})
+    return hits / (k * len(queries)), percentile_ms(latencies, 50), percentile_ms(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Matryoshka dimension reduction")
+    parser.add_argument("--vectors", type=int, default=5000, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("-k", type=int, default=5, help="Results per query (recall@k)")
+    parser.add_argument("--rerank-factor", type=int, default=4, help="Candidates per result before re-ranking")
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 128, 256, 512, 768],
+                        help="Truncated dimensions to test")
+    parser.add_argument("--from-db", action="store_true", help="Use embeddings from the database")
+    args = parser.parse_args()
+
+    corpus = load_corpus_from_db() if args.from_db else matryoshka_like(synthetic_corpus(args.vectors, 1536))
+    if not len(corpus):
+        print("No embeddings to benchmark")
+        return 1
+
+    rng = np.random.default_rng(7)
+    picks = rng.integers(0, len(corpus), args.queries)
+    noise = rng.standard_normal((args.queries, corpus.shape[1])) / np.sqrt(corpus.shape[1])
+    queries = normalize(corpus[picks] + 0.5 * noise)
+
+    ids = list(range(len(corpus)))
+    exact = InMemoryVectorIndex()
+    exact.build(ids, corpus)
+    truth = [{row[0] for row in exact.search(q, args.k)} for q in queries]
+    load_full = lambda chunk_ids: corpus[chunk_ids]
+
+    print(f"Corpus: {len(corpus)} vectors x {corpus.shape[1]} dims, {args.queries} queries, recall@{args.k}")
+    print()
+    print(f"{'dims':<8}{'mode':<12}{'memory MB':>12}{'recall':>10}{'p50 ms':>10}{'p95 ms':>10}")
+
+    recall, p50, p95 = measure(exact, queries, truth, args.k)
+    print(f"{corpus.shape[1]:<8}{'exact':<12}{exact.memory_bytes() / 1e6:>12.2f}{recall:>10.3f}{p50:>10.2f}{p95:>10.2f}")
+
+    for dims in args.dims:
+        if dims >= corpus.shape[1]:
+            continue
+        for rerank in (False, True):
+            index = InMemoryVectorIndex(rerank_factor=args.rerank_factor, dimensions=dims,
+                                        full_vector_loader=load_full if rerank else None)
+            index.build(ids, corpus)
+            recall, p50, p95 = measure(index, queries, truth, args.k)
+            mode = "two-stage" if rerank else "truncated"
+            print(f"{dims:<8}{mode:<12}{index.memory_bytes() / 1e6:>12.2f}{recall:>10.3f}{p50:>10.2f}{p95:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
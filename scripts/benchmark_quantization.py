@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark quantized embedding storage.
+
+Compares float32, float16 and int8 storage in the in-process vector index
+(with and without full-precision re-ranking) against exact float32 search,
+and reports memory, estimated pgvector disk size, recall@k and latency.
+
+Uses synthetic clustered embeddings by default; pass --from-db to use the
+serving generation from DATABASE_URL instead.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to the path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from knowledge_base.processors.vector_index import (
+    InMemoryVectorIndex,
+    STORAGE_MODES,
+    STORAGE_FLOAT32,
+    normalize,
+    storage_bytes_per_vector,
+)
+
+
+def synthetic_corpus(n_vectors, dimensions, n_clusters=50, seed=42):
+    """Clustered unit vectors, which resemble real embeddings more than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = normalize(rng.standard_normal((n_clusters, dimensions)))
+    assignments = rng.integers(0, n_clusters, n_vectors)
+    vectors = centers[assignments] + 1.4 * rng.standard_normal((n_vectors, dimensions)) / np.sqrt(dimensions)
+    return normalize(vectors)
+
+
+def load_corpus_from_db():
+    """Load the serving generation's chunk embeddings."""
+    from backend.db.database import SessionLocal
+    from backend.db.models import DocumentChunk
+    from knowledge_base.processors.generations import get_serving_generation
+
+    db = SessionLocal()
+    try:
+        generation = get_serving_generation(db)
+        rows = db.query(DocumentChunk.embedding).filter(DocumentChunk.generation == generation).all()
+        return normalize(np.array([row[0] for row in rows], dtype=np.float32))
+    finally:
+        db.close()
+
+
+def percentile_ms(samples, pct):
+    return float(np.percentile(samples, pct) * 1000)
+
+
+def run(corpus, queries, k, rerank_factor):
+    ids = list(range(len(corpus)))
+    exact = InMemoryVectorIndex(STORAGE_FLOAT32)
+    exact.build(ids, corpus)
+    truth = [{row[0] for row in exact.search(q, k)} for q in queries]
+    load_full = lambda chunk_ids: corpus[chunk_ids]
+
+    results = []
+    for storage in STORAGE_MODES:
+        for rerank in ([False, True] if storage != STORAGE_FLOAT32 else [False]):
+            index = InMemoryVectorIndex(storage, rerank_factor=rerank_factor,
+                                        full_vector_loader=load_full if rerank else None)
+            index.build(ids, corpus)
+
+            latencies = []
+            hits = 0
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                found = index.search(query, k)
+                latencies.append(time.perf_counter() - start)
+                hits += len(expected & {row[0] for row in found})
+
+            results.append({
+                "mode": f"{storage}{' + rerank' if rerank else ''}",
+                "memory_mb": index.memory_bytes() / 1e6,
+                "recall": hits / (k * len(queries)),
+                "p50_ms": percentile_ms(latencies, 50),
+                "p95_ms": percentile_ms(latencies, 95),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quantized embedding storage")
+    parser.add_argument("--vectors", type=int, default=5000, help="Synthetic corpus size")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Synthetic vector dimensions")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("-k", type=int, default=5, help="Results per query (recall@k)")
+    parser.add_argument("--rerank-factor", type=int, default=4, help="Candidates per result before re-ranking")
+    parser.add_argument("--from-db", action="store_true", help="Use embeddings from the database")
+    args = parser.parse_args()
+
+    corpus = load_corpus_from_db() if args.from_db else synthetic_corpus(args.vectors, args.dimensions)
+    if not len(corpus):
+        print("No embeddings to benchmark")
+        return 1
+
+    rng = np.random.default_rng(7)
+    picks = rng.integers(0, len(corpus), args.queries)
+    noise = rng.standard_normal((args.queries, corpus.shape[1])) / np.sqrt(corpus.shape[1])
+    queries = normalize(corpus[picks] + 0.5 * noise)
+
+    n, dimensions = corpus.shape
+    print(f"Corpus: {n} vectors x {dimensions} dims, {args.queries} queries, recall@{args.k}")
+    print()
+    print(f"{'mode':<18}{'memory MB':>12}{'recall':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for row in run(corpus, queries, args.k, args.rerank_factor):
+        print(f"{row['mode']:<18}{row['memory_mb']:>12.2f}{row['recall']:>10.3f}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}")
+
+    print()
+    print("Estimated pgvector storage per table (vector data only):")
+    per_vector = storage_bytes_per_vector(dimensions)
+    full = per_vector["pgvector_vector"] * n
+    half = per_vector["pgvector_halfvec"] * n
+    print(f"  vector({dimensions}):  {full / 1e6:.2f} MB")
+    print(f"  halfvec({dimensions}): {half / 1e6:.2f} MB ({(1 - half / full) * 100:.0f}% smaller index)")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Benchmark retrieval quality and latency per search backend.
+
+Builds a labelled query set from the FAQ files (each question should find
+its own FAQ file), plus the hand-labelled paraphrases in --queries
+(scripts/retrieval_queries.json by default), and reports recall@k,
+MRR and p50/p95/p99 search latency for:
+
+  memory-exact    in-process float32 index (same ranking as pgvector exact)
+  memory-int8     in-process int8 index with full-precision re-rank
+  bm25            lexical baseline
+  hybrid          reciprocal rank fusion of memory-exact and bm25
+  pgvector-exact  sequential scan in Postgres   (needs --database-url)
+  pgvector-hnsw   HNSW ANN index in Postgres    (needs --database-url)
+
+Embeddings are cached in --cache. The committed fixture,
+knowledge_base/embeddings/retrieval_benchmark_cache.npz, holds the corpus
+(content folders only, not code) and labelled queries so runs are offline
+and deterministic. Texts missing from the cache are embedded with
+OPENAI_API_KEY, or else with the local hashing embedder, but the fixture
+is only rewritten with --update-cache; another --cache file is always
+saved. Refresh the fixture after editing the knowledge base:
+
+    python scripts/benchmark_retrieval.py --embedder hashing --update-cache
+
+    python scripts/benchmark_retrieval.py -k 5
+    python scripts/benchmark_retrieval.py --embedder hashing --save retrieval.json
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to the path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from knowledge_base.processors.retrieval_eval import (
+    BM25,
+    EmbeddingCache,
+    HASHING_MODEL,
+    evaluate,
+    faq_queries,
+    load_corpus,
+    reciprocal_rank_fusion,
+)
+from knowledge_base.processors.vector_index import InMemoryVectorIndex, STORAGE_FLOAT32, STORAGE_INT8
+
+DEFAULT_QUERIES = Path(__file__).parent / "retrieval_queries.json"
+DEFAULT_CACHE = project_root / "knowledge_base" / "embeddings" / "retrieval_benchmark_cache.npz"
+BACKENDS = ("memory-exact", "memory-int8", "bm25", "hybrid", "pgvector-exact", "pgvector-hnsw")
+
+
+def openai_embedder(model, dimensions):
+    from openai import OpenAI
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    extra_body = {"dimensions": dimensions} if dimensions != 1536 else None
+
+    def embed(texts):
+        response = client.embeddings.create(model=model, input=texts, extra_body=extra_body)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    return embed
+
+
+def embed_all(args, texts):
+    """Embed texts according to --embedder; returns (vectors, model used)."""
+    if args.embedder == "hashing":
+        cache = EmbeddingCache(args.cache, HASHING_MODEL, args.dimensions)
+        vectors = cache.embed(texts)
+        save_cache(args, cache)
+        return vectors, HASHING_MODEL
+
+    embed_fn = openai_embedder(args.model, args.dimensions) if os.getenv("OPENAI_API_KEY") else None
+    cache = EmbeddingCache(args.cache, args.model, args.dimensions, embed_fn)
+    try:
+        vectors = cache.embed(texts)
+    except LookupError as e:
+        if args.embedder == "openai":
+            raise
+        print(f"Note: {e}. Falling back to the hashing embedder.")
+        return embed_all(argparse.Namespace(**{**vars(args), "embedder": "hashing"}), texts)
+    save_cache(args, cache)
+    return vectors, args.model
+
+
+def save_cache(args, cache):
+    """Save new embeddings, to the committed fixture only with --update-cache."""
+    if not cache.misses:
+        return
+    if args.update_cache or args.cache.resolve() != DEFAULT_CACHE.resolve():
+        cache.save()
+        print(f"Embedded {cache.misses} new texts with {cache.model}; cache saved to {args.cache}")
+    else:
+        print(f"Note: {cache.misses} texts are not in the fixture {args.cache} for {cache.model}; "
+              f"embedded for this run only (pass --update-cache to save them)")
+
+
+class PgvectorBackend:
+    """Loads the corpus into a temporary pgvector table on one connection."""
+
+    def __init__(self, database_url, vectors, ef_search):
+        from sqlalchemy import create_engine, text
+        self.text = text
+        self.engine = create_engine(database_url)
+        self.conn = self.engine.connect()
+        dimensions = vectors.shape[1]
+        self.conn.execute(text(
+            f"CREATE TEMP TABLE retrieval_benchmark_chunks (id integer PRIMARY KEY, embedding vector({dimensions}))"
+        ))
+        self.conn.execute(
+            text("INSERT INTO retrieval_benchmark_chunks (id, embedding) VALUES (:id, CAST(:embedding AS vector))"),
+            [{"id": i, "embedding": self._literal(vector)} for i, vector in enumerate(vectors)]
+        )
+        self.conn.execute(text("ANALYZE retrieval_benchmark_chunks"))
+        self.ef_search = ef_search
+
+    @staticmethod
+    def _literal(vector):
+        return "[" + ",".join(f"{value:.7g}" for value in vector) + "]"
+
+    def _search(self, query_vector, n):
+        rows = self.conn.execute(
+            self.text("SELECT id FROM retrieval_benchmark_chunks ORDER BY embedding <=> CAST(:q AS vector) LIMIT :n"),
+            {"q": self._literal(query_vector), "n": n}
+        )
+        return [row[0] for row in rows]
+
+    def exact(self):
+        self.conn.execute(self.text("SET enable_indexscan = off"))
+        return lambda vector, _query, n: self._search(vector, n)
+
+    def hnsw(self):
+        self.conn.execute(self.text(
+            "CREATE INDEX ON retrieval_benchmark_chunks USING hnsw (embedding vector_cosine_ops)"
+        ))
+        self.conn.execute(self.text("SET enable_indexscan = on"))
+        self.conn.execute(self.text("SET enable_seqscan = off"))
+        self.conn.execute(self.text(f"SET hnsw.ef_search = {int(self.ef_search)}"))
+        return lambda vector, _query, n: self._search(vector, n)
+
+    def close(self):
+        self.conn.close()
+        self.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency per backend")
+    parser.add_argument("--kb-dir", type=Path, default=project_root / "knowledge_base", help="Knowledge base root")
+    parser.add_argument("-k", type=int, default=5, help="Cut-off for recall@k and MRR")
+    parser.add_argument("--queries", type=Path, default=DEFAULT_QUERIES,
+                        help='Extra labelled queries: JSON list of {"query": ..., "relevant_files": [...]}')
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, help="Backends to run (default: all available)")
+    parser.add_argument("--embedder", choices=["auto", "openai", "hashing"], default="auto",
+                        help="auto: cache, then OpenAI if a key is set, then hashing")
+    parser.add_argument("--model", default="text-embedding-3-small", help="OpenAI embedding model")
+    parser.add_argument("--dimensions", type=int, default=int(os.getenv("EMBEDDING_DIMENSIONS", "1536")))
+    parser.add_argument("--cache", type=Path, default=DEFAULT_CACHE, help="Embedding cache file")
+    parser.add_argument("--update-cache", action="store_true",
+                        help="Save new embeddings to the committed fixture (other --cache files are always saved)")
+    parser.add_argument("--rerank-factor", type=int, default=4, help="Candidates per result for re-ranking and fusion")
+    parser.add_argument("--database-url", help="Postgres with pgvector, for the pgvector backends")
+    parser.add_argument("--ef-search", type=int, default=40, help="hnsw.ef_search for pgvector-hnsw")
+    parser.add_argument("--repeat", type=int, default=1, help="Run the query set this many times for latency")
+    parser.add_argument("--save", type=Path, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    chunks = load_corpus(args.kb_dir)
+    queries = faq_queries(args.kb_dir)
+    if args.queries:
+        queries += json.loads(args.queries.read_text())
+    if not chunks or not queries:
+        print("No documents or labelled queries found")
+        return 1
+
+    vectors, model = embed_all(args, [chunk["text"] for chunk in chunks] + [q["query"] for q in queries])
+    chunk_vectors, query_vectors = vectors[:len(chunks)], vectors[len(chunks):]
+    queries = queries * args.repeat
+    query_vectors = np.tile(query_vectors, (args.repeat, 1))
+
+    backends = args.backends or [b for b in BACKENDS if args.database_url or not b.startswith("pgvector")]
+    ids = [chunk["id"] for chunk in chunks]
+    exact_index = InMemoryVectorIndex(STORAGE_FLOAT32)
+    exact_index.build(ids, chunk_vectors)
+    int8_index = InMemoryVectorIndex(STORAGE_INT8, rerank_factor=args.rerank_factor,
+                                     full_vector_loader=lambda chunk_ids: chunk_vectors[chunk_ids])
+    int8_index.build(ids, chunk_vectors)
+    bm25 = BM25([chunk["text"] for chunk in chunks])
+    candidates = args.k * args.rerank_factor
+
+    searches = {
+        "memory-exact": lambda vector, _query, n: [row[0] for row in exact_index.search(vector, n)],
+        "memory-int8": lambda vector, _query, n: [row[0] for row in int8_index.search(vector, n)],
+        "bm25": lambda _vector, query, n: bm25.search(query, n),
+        "hybrid": lambda vector, query, n: reciprocal_rank_fusion([
+            [row[0] for row in exact_index.search(vector, candidates)],
+            bm25.search(query, candidates),
+        ], n),
+    }
+
+    pgvector = None
+    if any(b.startswith("pgvector") for b in backends):
+        if not args.database_url:
+            parser.error("pgvector backends need --database-url")
+        pgvector = PgvectorBackend(args.database_url, chunk_vectors, args.ef_search)
+
+    print(f"Corpus: {len(chunks)} chunks from {len({c['file'] for c in chunks})} files; "
+          f"{len(queries) // args.repeat} labelled queries; embeddings: {model} ({chunk_vectors.shape[1]} dims)")
+    print()
+    print(f"{'backend':<16}{'recall@' + str(args.k):>10}{'MRR':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    results = []
+    try:
+        for backend in backends:
+            if backend == "pgvector-exact":
+                search = pgvector.exact()
+            elif backend == "pgvector-hnsw":
+                search = pgvector.hnsw()
+            else:
+                search = searches[backend]
+            row = evaluate(backend, search, queries, query_vectors, chunks, args.k)
+            results.append(row)
+            print(f"{backend:<16}{row['recall']:>10.3f}{row['mrr']:>8.3f}"
+                  f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}")
+    finally:
+        if pgvector is not None:
+            pgvector.close()
+
+    if args.save:
+        args.save.write_text(json.dumps({"k": args.k, "embedding_model": model, "results": results}, indent=2))
+        print(f"\nSaved results to {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
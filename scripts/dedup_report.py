@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Report which knowledge base files overlap.
+
+By default reads the provenance that ingestion recorded for near-duplicate
+chunks in the serving generation (DATABASE_URL) and lists, per pair of
+files, how many chunks were stored once instead of twice. --offline scans
+the knowledge base files instead, with the same MinHash/LSH check, to
+preview what a rebuild would deduplicate without a database or API key.
+
+    python scripts/dedup_report.py
+    python scripts/dedup_report.py --offline --threshold 0.8
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from knowledge_base.processors.dedup import DUPLICATE_THRESHOLD, find_duplicates, overlap_report
+from knowledge_base.processors.retrieval_eval import load_corpus
+
+
+def report_from_db(generation=None):
+    """(stored chunks, overlap rows) from the provenance recorded at ingestion."""
+    from backend.db.database import SessionLocal
+    from backend.db.models import DocumentChunk
+    from knowledge_base.processors.generations import get_serving_generation
+
+    db = SessionLocal()
+    try:
+        if generation is None:
+            generation = get_serving_generation(db)
+        rows = db.query(DocumentChunk.chunk_metadata).filter(DocumentChunk.generation == generation).all()
+    finally:
+        db.close()
+
+    pairs = []
+    for (metadata,) in rows:
+        metadata = metadata or {}
+        for duplicate in metadata.get("duplicates", []):
+            pairs.append((duplicate.get("file_path", ""), metadata.get("file_path", "")))
+    return len(rows), overlap_report(pairs)
+
+
+def report_from_files(kb_dir, threshold):
+    """(chunks, overlap rows) that ingestion would find in the knowledge base files."""
+    chunks = load_corpus(kb_dir, exclude_categories=())
+    for chunk in chunks:
+        chunk["category"] = chunk["file"].split("/")[0] if "/" in chunk["file"] else "General"
+    files = {chunk["id"]: chunk["file"] for chunk in chunks}
+    duplicates = find_duplicates(chunks, threshold, namespace_key="category")
+    return len(chunks) - len(duplicates), overlap_report((files[dup], files[original]) for dup, original in duplicates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report overlapping knowledge base files")
+    parser.add_argument("--offline", action="store_true", help="Scan the knowledge base files instead of the database")
+    parser.add_argument("--kb-dir", type=Path, default=project_root / "knowledge_base", help="Knowledge base root (--offline)")
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD,
+                        help="Estimated Jaccard similarity for a duplicate (--offline)")
+    parser.add_argument("--generation", type=int, help="Generation to report on (default: serving)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if args.offline:
+        stored, overlaps = report_from_files(args.kb_dir, args.threshold)
+    else:
+        stored, overlaps = report_from_db(args.generation)
+    deduplicated = sum(row["chunks"] for row in overlaps)
+
+    if args.json:
+        print(json.dumps({"stored_chunks": stored, "deduplicated_chunks": deduplicated, "overlaps": overlaps}, indent=2))
+        return 0
+
+    print(f"Stored chunks: {stored}; near-duplicate chunks stored once: {deduplicated}")
+    if not overlaps:
+        print("No overlapping files found")
+        return 0
+    print()
+    print(f"{'chunks':>6}  file -> duplicates chunks of")
+    for row in overlaps:
+        print(f"{row['chunks']:>6}  {row['file']} -> {row['duplicates_of']}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
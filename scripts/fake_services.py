@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for OpenAI, Google Calendar and HubSpot.
+
+Serves just enough of each API for the backend to run without paid or
+real accounts, with configurable latency:
+
+- OpenAI: POST /v1/embeddings, POST /v1/chat/completions (incl. stream=true)
+- Google Calendar: events list/insert and freeBusy under /calendar/v3
+- HubSpot: contact search/create/update and notes under /crm/v3
+
+Point the backend at it with OPENAI_BASE_URL=http://host:port/v1,
+GOOGLE_CALENDAR_API_URL=http://host:port, GOOGLE_CALENDAR_ACCESS_TOKEN=<any>
+and HUBSPOT_API_URL=http://host:port. scripts/loadtest.py does this for you.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# Latency per call in seconds; set from the command line
+LATENCY = {
+    "embeddings": 0.05,
+    "chat": 0.4,
+    "stream_token": 0.02,
+    "calendar": 0.08,
+    "hubspot": 0.1,
+}
+
+CANNED_ANSWER = (
+    "Based on the knowledge base, we offer web development, SEO and graphic design "
+    "services. Pricing depends on scope; our team can prepare a quote after a short call."
+)
+
+app = FastAPI(title="Fake external services")
+
+_ids = itertools.count(1000)
+_events = {}
+_contacts = {}
+
+
+def fake_embedding(text: str, dimensions: int) -> list:
+    """Deterministic unit vector derived from the text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def _usage(prompt: str, completion: str = "") -> dict:
+    prompt_tokens = max(1, len(prompt) // 4)
+    completion_tokens = len(completion) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+# --- OpenAI ---------------------------------------------------------------
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    dimensions = int(body.get("dimensions") or 1536)
+    await asyncio.sleep(LATENCY["embeddings"])
+    return {
+        "object": "list",
+        "model": body.get("model", "text-embedding-3-small"),
+        "data": [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(str(text), dimensions)}
+            for i, text in enumerate(inputs)
+        ],
+        "usage": _usage(" ".join(map(str, inputs))),
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-3.5-turbo")
+    prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+    # Short max_tokens is how the intent classifier calls us
+    answer = "none" if (body.get("max_tokens") or 1000) <= 10 else CANNED_ANSWER
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    if body.get("stream"):
+        async def stream():
+            await asyncio.sleep(LATENCY["chat"] / 2)
+            for word in answer.split(" "):
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(LATENCY["stream_token"])
+            done = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    await asyncio.sleep(LATENCY["chat"])
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+        "usage": _usage(prompt, answer),
+    }
+
+
+# --- Google Calendar -------------------------------------------------------
+
+def _parse(iso: str) -> datetime:
+    return datetime.fromisoformat(iso.replace("Z", "+00:00"))
+
+
+@app.get("/calendar/v3/calendars/{calendar_id}/events")
+async def list_events(calendar_id: str, timeMin: str = None, timeMax: str = None):
+    await asyncio.sleep(LATENCY["calendar"])
+    items = list(_events.get(calendar_id, []))
+    if timeMin and timeMax:
+        start, end = _parse(timeMin), _parse(timeMax)
+        items = [e for e in items if start <= _parse(e["start"]["dateTime"]) < end]
+    return {"kind": "calendar#events", "items": items}
+
+
+@app.post("/calendar/v3/calendars/{calendar_id}/events")
+async def insert_event(calendar_id: str, request: Request):
+    event = await request.json()
+    await asyncio.sleep(LATENCY["calendar"])
+    event["id"] = f"evt{next(_ids)}"
+    event["status"] = "confirmed"
+    # Keep the store small; load tests create many events
+    calendar_events = _events.setdefault(calendar_id, [])
+    calendar_events.append(event)
+    del calendar_events[:-500]
+    return event
+
+
+@app.post("/calendar/v3/freeBusy")
+async def freebusy(request: Request):
+    body = await request.json()
+    await asyncio.sleep(LATENCY["calendar"])
+    return {
+        "kind": "calendar#freeBusy",
+        "timeMin": body.get("timeMin"),
+        "timeMax": body.get("timeMax"),
+        "calendars": {item["id"]: {"busy": []} for item in body.get("items", [])},
+    }
+
+
+# --- HubSpot ---------------------------------------------------------------
+
+@app.post("/crm/v3/objects/contacts/search")
+async def search_contacts(request: Request):
+    body = await request.json()
+    await asyncio.sleep(LATENCY["hubspot"])
+    email = body["filterGroups"][0]["filters"][0]["value"]
+    contact = _contacts.get(email)
+    return {"total": int(contact is not None), "results": [contact] if contact else []}
+
+
+@app.post("/crm/v3/objects/contacts")
+async def create_contact(request: Request):
+    body = await request.json()
+    await asyncio.sleep(LATENCY["hubspot"])
+    contact = {"id": str(next(_ids)), "properties": body.get("properties", {})}
+    _contacts[contact["properties"].get("email")] = contact
+    return contact
+
+
+@app.patch("/crm/v3/objects/contacts/{contact_id}")
+async def update_contact(contact_id: str, request: Request):
+    body = await request.json()
+    await asyncio.sleep(LATENCY["hubspot"])
+    return {"id": contact_id, "properties": body.get("properties", {})}
+
+
+@app.post("/crm/v3/objects/notes")
+async def create_note(request: Request):
+    await request.json()
+    await asyncio.sleep(LATENCY["hubspot"])
+    return {"id": str(next(_ids))}
+
+
+@app.get("/health")
+async def health():
+    return {"status": "healthy", "service": "fake-services", "latency": LATENCY}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run local stand-ins for OpenAI, Google Calendar and HubSpot")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--embeddings-ms", type=float, default=LATENCY["embeddings"] * 1000)
+    parser.add_argument("--chat-ms", type=float, default=LATENCY["chat"] * 1000)
+    parser.add_argument("--stream-token-ms", type=float, default=LATENCY["stream_token"] * 1000)
+    parser.add_argument("--calendar-ms", type=float, default=LATENCY["calendar"] * 1000)
+    parser.add_argument("--hubspot-ms", type=float, default=LATENCY["hubspot"] * 1000)
+    args = parser.parse_args()
+
+    LATENCY.update({
+        "embeddings": args.embeddings_ms / 1000,
+        "chat": args.chat_ms / 1000,
+        "stream_token": args.stream_token_ms / 1000,
+        "calendar": args.calendar_ms / 1000,
+        "hubspot": args.hubspot_ms / 1000,
+    })
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Rank knowledge base gaps by clustering unanswered queries.
+
+Embeds the distinct queries in the unanswered query log in batches
+(cached in --cache, so re-runs only embed new wordings), clusters them
+by similarity and ranks the clusters by recency-weighted frequency. Each
+cluster near the top is a document worth writing: once it exists, the
+repeats stop falling through to the fallback answer.
+
+Uses OpenAI embeddings (through the shared gateway) when OPENAI_API_KEY
+is set; otherwise, or with --embedder hashing, a local lexical embedder
+(lower --threshold suits it, e.g. 0.5).
+
+    python scripts/knowledge_gap_report.py --top 10
+    python scripts/knowledge_gap_report.py --embedder hashing --threshold 0.5 --json
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from backend.services.query_log import DEFAULT_LOG_PATH, LEGACY_LOG_PATH, read_entries
+from knowledge_base.processors.query_clusters import CLUSTER_THRESHOLD, HALF_LIFE_DAYS, cluster_report
+from knowledge_base.processors.retrieval_eval import EmbeddingCache, HASHING_MODEL
+
+DEFAULT_CACHE = project_root / "knowledge_base" / "embeddings" / "unanswered_query_cache.npz"
+
+
+def openai_embedder(model, dimensions):
+    from backend.services.openai_gateway import openai_gateway
+    extra_body = {"dimensions": dimensions} if dimensions != 1536 else None
+
+    def embed(texts):
+        response = openai_gateway.embeddings(model=model, input=texts, extra_body=extra_body)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    return embed
+
+
+def make_embedder(args):
+    """(embed function, model used) according to --embedder."""
+    if args.embedder == "hashing" or (args.embedder == "auto" and not os.getenv("OPENAI_API_KEY")):
+        cache = EmbeddingCache(args.cache, HASHING_MODEL, args.dimensions)
+        return lambda texts: cache.embed(texts, batch_size=args.batch_size), HASHING_MODEL
+
+    cache = EmbeddingCache(args.cache, args.model, args.dimensions, openai_embedder(args.model, args.dimensions))
+
+    def embed(texts):
+        vectors = cache.embed(texts, batch_size=args.batch_size)
+        if cache.misses:
+            cache.save()
+            print(f"Embedded {cache.misses} new queries with {args.model}; cache saved to {args.cache}",
+                  file=sys.stderr)
+        return vectors
+    return embed, args.model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster unanswered queries into ranked knowledge base gaps")
+    parser.add_argument("--log", type=Path, default=Path(os.getenv("UNANSWERED_LOG_PATH", str(DEFAULT_LOG_PATH))),
+                        help="Unanswered query log (JSON lines)")
+    parser.add_argument("--legacy-log", type=Path, default=LEGACY_LOG_PATH,
+                        help="Old JSON-array log to include, if it exists")
+    parser.add_argument("--cache", type=Path, default=DEFAULT_CACHE, help="Embedding cache (.npz)")
+    parser.add_argument("--embedder", choices=["auto", "openai", "hashing"], default="auto",
+                        help="auto: OpenAI if a key is set, else hashing")
+    parser.add_argument("--model", default="text-embedding-3-small", help="OpenAI embedding model")
+    parser.add_argument("--dimensions", type=int, default=int(os.getenv("EMBEDDING_DIMENSIONS", "1536")),
+                        help="Embedding dimensions")
+    parser.add_argument("--batch-size", type=int, default=100, help="Queries per embedding request")
+    parser.add_argument("--threshold", type=float, default=CLUSTER_THRESHOLD,
+                        help="Cosine similarity for joining a cluster")
+    parser.add_argument("--half-life-days", type=float, default=HALF_LIFE_DAYS,
+                        help="Age at which a logged miss counts half")
+    parser.add_argument("--top", type=int, default=10, help="Number of gaps to list")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    entries = list(read_entries(args.log, legacy_path=args.legacy_log))
+    embed, model = make_embedder(args)
+    clusters = cluster_report(entries, embed, args.threshold, args.half_life_days)
+
+    if args.json:
+        print(json.dumps({"model": model, "entries": len(entries), "clusters": len(clusters),
+                          "gaps": clusters[:args.top]}, indent=2))
+        return 0
+
+    print(f"Unanswered queries: {len(entries)} in {len(clusters)} clusters (embeddings: {model})")
+    for rank, cluster in enumerate(clusters[:args.top], 1):
+        print()
+        print(f"{rank}. {cluster['query']}")
+        print(f"   score {cluster['score']:.3g}, {cluster['count']} misses, last seen {cluster['last_seen'] or '-'}")
+        reasons = ", ".join(f"{reason} ({n})" for reason, n in cluster["reasons"].items())
+        print(f"   reasons: {reasons}")
+        for example in cluster["examples"][:5]:
+            print(f"   - {example}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
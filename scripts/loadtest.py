@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Load test the backend against local stand-ins for its external services.
+
+Starts scripts/fake_services.py and the FastAPI app (unless --backend-url
+points at a running backend), then sends an open-loop request mix to
+/api/chat, /api/rag-search, /api/schedule-check and /api/create-booking
+at a target rate. Reports throughput, errors and p50/p95/p99 latency per
+endpoint.
+
+The app still needs DATABASE_URL (Postgres with pgvector, ideally with the
+knowledge base indexed) for search results to be realistic.
+
+Every request comes from 127.0.0.1, so the started backend runs with
+per-client rate limiting off (RATE_LIMIT_ENABLED=0); otherwise most of
+the load would get 429s and a run would measure the limiter. Pass
+--rate-limit to keep it on, e.g. to load test the limiter itself.
+
+Save a run with --save and compare later runs against it with --compare to
+catch latency regressions:
+
+    python scripts/loadtest.py --rps 20 --duration 60 --save loadtest_baseline.json
+    python scripts/loadtest.py --rps 20 --duration 60 --compare loadtest_baseline.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+
+QUESTIONS = [
+    "What services do you offer?",
+    "How much does a website cost?",
+    "Do you do SEO for small businesses?",
+    "How long does a web development project take?",
+    "Can you redesign our logo?",
+    "What is included in the pricing packages?",
+    "Do you offer ongoing maintenance?",
+    "How do I book a consultation?",
+]
+
+DEFAULT_MIX = {"chat": 4, "rag-search": 4, "schedule-check": 1, "create-booking": 1}
+
+_counter = itertools.count()
+
+
+def _future_slot() -> str:
+    """A random quarter-hour slot in the next two weeks."""
+    start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    start += timedelta(minutes=15 * random.randint(4, 4 * 24 * 14))
+    return start.isoformat().replace("+00:00", "Z")
+
+
+def build_request(endpoint: str):
+    """(method, path, kwargs) for one request of the given kind."""
+    n = next(_counter)
+    question = random.choice(QUESTIONS)
+    if endpoint == "chat":
+        return "POST", "/api/chat", {"json": {"message": question, "session_id": f"loadtest-{n}"}}
+    if endpoint == "rag-search":
+        return "GET", "/api/rag-search", {"params": {"q": question}}
+    if endpoint == "schedule-check":
+        return "POST", "/api/schedule-check", {"json": {"user": "loadtest", "start": _future_slot(), "duration": 15}}
+    if endpoint == "create-booking":
+        return "POST", "/api/create-booking", {"json": {
+            "user": "loadtest",
+            "start": _future_slot(),
+            "duration": 30,
+            "summary": "Load test booking",
+            "hubspot_data": {"name": "Load Test", "email": f"loadtest{n % 50}@example.com", "session_id": f"loadtest-{n}"},
+        }}
+    raise ValueError(f"Unknown endpoint '{endpoint}'")
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint '{name}', expected one of {list(DEFAULT_MIX)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def run_load(base_url: str, rps: float, duration: float, mix: dict, timeout: float, max_in_flight: int):
+    """
+    Send requests on a fixed schedule, without waiting for responses
+    (open loop), so slow responses show up as latency rather than lower load.
+
+    Returns:
+        Dict of endpoint -> {"latencies": [...], "errors": int, "statuses": {...}}, and elapsed seconds
+    """
+    endpoints = list(mix)
+    weights = [mix[name] for name in endpoints]
+    results = {name: {"latencies": [], "errors": 0, "statuses": {}} for name in endpoints}
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def one(client, endpoint):
+        method, path, kwargs = build_request(endpoint)
+        stats = results[endpoint]
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            status = str(response.status_code)
+            if response.status_code >= 400:
+                stats["errors"] += 1
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+            stats["errors"] += 1
+        finally:
+            in_flight.release()
+        stats["latencies"].append(time.perf_counter() - start)
+        stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        tasks = []
+        interval = 1.0 / rps
+        started = time.perf_counter()
+        next_send = started
+        while next_send - started < duration:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await in_flight.acquire()
+            endpoint = random.choices(endpoints, weights)[0]
+            tasks.append(asyncio.create_task(one(client, endpoint)))
+            next_send += interval
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def summarize(results: dict, elapsed: float) -> dict:
+    summary = {}
+    for endpoint, stats in results.items():
+        latencies = np.array(stats["latencies"]) * 1000
+        count = len(latencies)
+        summary[endpoint] = {
+            "requests": count,
+            "errors": stats["errors"],
+            "throughput_rps": count / elapsed if elapsed else 0.0,
+            "p50_ms": float(np.percentile(latencies, 50)) if count else 0.0,
+            "p95_ms": float(np.percentile(latencies, 95)) if count else 0.0,
+            "p99_ms": float(np.percentile(latencies, 99)) if count else 0.0,
+            "statuses": stats["statuses"],
+        }
+    return summary
+
+
+def print_summary(summary: dict, elapsed: float):
+    print(f"\nRan for {elapsed:.1f}s")
+    print(f"{'endpoint':<16}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, row in summary.items():
+        print(f"{endpoint:<16}{row['requests']:>10}{row['errors']:>8}{row['throughput_rps']:>9.1f}"
+              f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+    for endpoint, row in summary.items():
+        if row["errors"]:
+            print(f"  {endpoint} statuses: {row['statuses']}")
+
+
+def compare(summary: dict, baseline_path: str, max_regression: float) -> bool:
+    """Print p95 changes against a saved run; False if any endpoint regressed too far."""
+    baseline = json.loads(Path(baseline_path).read_text())["endpoints"]
+    ok = True
+    print(f"\nCompared with {baseline_path} (allowed p95 regression {max_regression:.0%}):")
+    for endpoint, row in summary.items():
+        before = baseline.get(endpoint)
+        if not before or not before["p95_ms"]:
+            continue
+        change = row["p95_ms"] / before["p95_ms"] - 1
+        regressed = change > max_regression
+        ok = ok and not regressed
+        print(f"  {endpoint:<16}p95 {before['p95_ms']:.1f} -> {row['p95_ms']:.1f} ms ({change:+.0%})"
+              f"{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def wait_until_healthy(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Process for {url} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not become healthy within {timeout:.0f}s")
+
+
+def start_services(args):
+    """Start the fake services and the backend; returns (backend_url, processes)."""
+    if args.backend_url:
+        return args.backend_url, []
+
+    processes = []
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    fake = subprocess.Popen([
+        sys.executable, str(project_root / "scripts" / "fake_services.py"),
+        "--port", str(args.fake_port),
+        "--embeddings-ms", str(args.embeddings_ms),
+        "--chat-ms", str(args.chat_ms),
+        "--calendar-ms", str(args.calendar_ms),
+        "--hubspot-ms", str(args.hubspot_ms),
+    ])
+    processes.append(fake)
+    wait_until_healthy(f"{fake_url}/health", fake)
+
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "sk-loadtest",
+        "OPENAI_BASE_URL": f"{fake_url}/v1",
+        "GOOGLE_CALENDAR_API_URL": fake_url,
+        "GOOGLE_CALENDAR_ACCESS_TOKEN": "loadtest",
+        "HUBSPOT_API_URL": fake_url,
+        # All load comes from one address; see --rate-limit
+        "RATE_LIMIT_ENABLED": "1" if args.rate_limit else "0",
+    })
+    backend = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "backend.main:app",
+        "--port", str(args.backend_port), "--log-level", "warning",
+        "--workers", str(args.workers),
+    ], cwd=str(project_root), env=env)
+    processes.append(backend)
+    backend_url = f"http://127.0.0.1:{args.backend_port}"
+    wait_until_healthy(f"{backend_url}/api/health", backend, timeout=args.startup_timeout)
+    return backend_url, processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the backend with fake external services")
+    parser.add_argument("--rps", type=float, default=10, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds of load before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Endpoint weights, e.g. chat=4,rag-search=4,schedule-check=1,create-booking=1")
+    parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds")
+    parser.add_argument("--max-in-flight", type=int, default=200, help="Cap on concurrent requests")
+    parser.add_argument("--backend-url", help="Use a running backend instead of starting one and the fake "
+                                              "services (point it at scripts/fake_services.py yourself)")
+    parser.add_argument("--backend-port", type=int, default=8800)
+    parser.add_argument("--workers", type=int, default=1, help="Uvicorn workers for the started backend")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="Keep per-client rate limiting on in the started backend (off by default)")
+    parser.add_argument("--startup-timeout", type=float, default=300,
+                        help="Seconds to wait for the backend (startup indexes the knowledge base)")
+    parser.add_argument("--fake-port", type=int, default=8900)
+    parser.add_argument("--embeddings-ms", type=float, default=50, help="Fake OpenAI embeddings latency")
+    parser.add_argument("--chat-ms", type=float, default=400, help="Fake OpenAI chat completion latency")
+    parser.add_argument("--calendar-ms", type=float, default=80, help="Fake Google Calendar latency")
+    parser.add_argument("--hubspot-ms", type=float, default=100, help="Fake HubSpot latency")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Compare p95 latency with a JSON file from --save")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed p95 increase over --compare before failing (0.2 = 20%%)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    backend_url, processes = start_services(args)
+    try:
+        print(f"Target {args.rps} req/s against {backend_url}, mix {args.mix}")
+        if args.warmup > 0:
+            asyncio.run(run_load(backend_url, args.rps, args.warmup, args.mix, args.timeout, args.max_in_flight))
+        results, elapsed = asyncio.run(
+            run_load(backend_url, args.rps, args.duration, args.mix, args.timeout, args.max_in_flight)
+        )
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    summary = summarize(results, elapsed)
+    print_summary(summary, elapsed)
+
+    if args.save:
+        Path(args.save).write_text(json.dumps({
+            "timestamp": datetime.now().isoformat(),
+            "rps": args.rps,
+            "duration": args.duration,
+            "mix": args.mix,
+            "fake_latency_ms": {
+                "embeddings": args.embeddings_ms, "chat": args.chat_ms,
+                "calendar": args.calendar_ms, "hubspot": args.hubspot_ms,
+            },
+            "endpoints": summary,
+        }, indent=2))
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare and not compare(summary, args.compare, args.max_regression):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
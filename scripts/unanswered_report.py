@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Count unanswered queries by normalized wording.
+
+Reads the append-only unanswered query log (current file, rotated files
+and the old unanswered_queries.json, if present) and lists the most
+frequent questions the knowledge base could not answer.
+
+    python scripts/unanswered_report.py --top 20
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from backend.services.query_log import DEFAULT_LOG_PATH, LEGACY_LOG_PATH, aggregate, read_entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the most frequent unanswered queries")
+    parser.add_argument("--log", type=Path, default=Path(os.getenv("UNANSWERED_LOG_PATH", str(DEFAULT_LOG_PATH))),
+                        help="Unanswered query log (JSON lines)")
+    parser.add_argument("--legacy-log", type=Path, default=LEGACY_LOG_PATH,
+                        help="Old JSON-array log to include, if it exists")
+    parser.add_argument("--top", type=int, default=20, help="Number of queries to list")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    rows = aggregate(read_entries(args.log, legacy_path=args.legacy_log))
+    total = sum(row["count"] for row in rows)
+
+    if args.json:
+        print(json.dumps({"total": total, "distinct": len(rows), "queries": rows[:args.top]}, indent=2))
+        return 0
+
+    print(f"Unanswered queries: {total} ({len(rows)} distinct)")
+    if not rows:
+        return 0
+    print()
+    print(f"{'count':>5}  {'last seen':<19}  query")
+    for row in rows[:args.top]:
+        print(f"{row['count']:>5}  {(row['last_seen'] or '')[:19]:<19}  {row['query']}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,242 @@
+"""
+Unit tests for admission control and load shedding
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.services.admission import AdmissionController, AdmissionMiddleware, Overloaded, RouteClass
+
+
+def controller(chat_concurrency=1, chat_queue=2, chat_wait=1.0, total=10):
+    return AdmissionController(
+        [RouteClass("booking", ["/api/create-booking", "/api/calendar/"], max_concurrency=5, max_queue=5,
+                    max_wait=1.0, priority=1),
+         RouteClass("chat", ["/api/chat"], max_concurrency=chat_concurrency, max_queue=chat_queue,
+                    max_wait=chat_wait)],
+        max_concurrency=total
+    )
+
+
+class TestAdmissionController:
+    """Test cases for AdmissionController."""
+
+    def test_route_classes_match_paths(self):
+        """Test that exact paths and path prefixes map to their class, and other paths are not limited."""
+        admission = controller()
+
+        assert admission.route_class("/api/chat").name == "chat"
+        assert admission.route_class("/api/calendar/create").name == "booking"
+        assert admission.route_class("/api/chat-history") is None
+        assert admission.route_class("/api/pricing") is None
+
+    def test_full_queue_sheds_immediately(self):
+        """Test that requests beyond the concurrency limit and queue are rejected without waiting."""
+        admission = controller(chat_concurrency=1, chat_queue=1)
+        chat = admission.route_class("/api/chat")
+
+        async def run():
+            await admission.acquire(chat)
+            waiting = asyncio.create_task(admission.acquire(chat))
+            await asyncio.sleep(0)
+            with pytest.raises(Overloaded) as shed:
+                await admission.acquire(chat)
+            admission.release(chat, 0.1)
+            await waiting
+            return shed.value
+
+        shed = asyncio.run(run())
+
+        assert shed.reason == "queue_full"
+        assert shed.retry_after >= 1
+        assert chat.in_flight == 1 and chat.queued == 0 and chat.shed == 1
+
+    def test_expected_wait_past_deadline_sheds(self):
+        """Test that a request is rejected up front when the queue ahead will not clear within max_wait."""
+        admission = controller(chat_concurrency=1, chat_queue=10, chat_wait=1.0)
+        chat = admission.route_class("/api/chat")
+        chat.service_time = 0.6
+
+        async def run():
+            await admission.acquire(chat)
+            waiting = asyncio.create_task(admission.acquire(chat))
+            await asyncio.sleep(0)
+            with pytest.raises(Overloaded) as shed:
+                await admission.acquire(chat)
+            waiting.cancel()
+            return shed.value
+
+        shed = asyncio.run(run())
+
+        assert shed.reason == "deadline"
+        assert shed.retry_after == 2
+
+    def test_wait_times_out(self):
+        """Test that a queued request gives up after max_wait."""
+        admission = controller(chat_concurrency=1, chat_wait=0.05)
+        chat = admission.route_class("/api/chat")
+
+        async def run():
+            await admission.acquire(chat)
+            with pytest.raises(Overloaded) as shed:
+                await admission.acquire(chat)
+            return shed.value
+
+        assert asyncio.run(run()).reason == "timeout"
+        assert chat.queued == 0
+
+    def test_priority_class_admitted_first(self):
+        """Test that when the shared limit frees a slot, booking requests go before earlier chat requests."""
+        admission = controller(chat_concurrency=5, total=1)
+        chat = admission.route_class("/api/chat")
+        booking = admission.route_class("/api/create-booking")
+        order = []
+
+        async def request(route_class):
+            await admission.acquire(route_class)
+            order.append(route_class.name)
+
+        async def run():
+            await admission.acquire(chat)
+            waiting = [asyncio.create_task(request(chat))]
+            await asyncio.sleep(0)
+            waiting.append(asyncio.create_task(request(booking)))
+            await asyncio.sleep(0)
+            admission.release(chat, 0.01)
+            await asyncio.sleep(0)
+            admission.release(booking, 0.01)
+            await asyncio.gather(*waiting)
+
+        asyncio.run(run())
+
+        assert order == ["booking", "chat"]
+
+    def test_cancelled_waiter_leaves_queue(self):
+        """Test that a client that disconnects while queued frees its queue place and takes no slot."""
+        admission = controller(chat_concurrency=1)
+        chat = admission.route_class("/api/chat")
+
+        async def run():
+            await admission.acquire(chat)
+            waiting = asyncio.create_task(admission.acquire(chat))
+            await asyncio.sleep(0)
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            admission.release(chat, 0.01)
+
+        asyncio.run(run())
+
+        assert chat.queued == 0 and chat.in_flight == 0 and admission.in_flight == 0
+
+
+class TestAdmissionMiddleware:
+    """Test cases for AdmissionMiddleware."""
+
+    def test_overloaded_route_returns_503_with_retry_after(self):
+        """Test that shed requests get a fast 503 with Retry-After and other routes are untouched."""
+        admission = controller(chat_concurrency=0, chat_queue=0)
+        app = FastAPI()
+
+        @app.post("/api/chat")
+        async def chat():
+            return {"answer": "hi"}
+
+        @app.get("/api/pricing")
+        async def pricing():
+            return {"price": 1}
+
+        app.add_middleware(AdmissionMiddleware, controller=admission)
+        client = TestClient(app)
+
+        shed = client.post("/api/chat")
+        assert shed.status_code == 503
+        assert shed.headers["Retry-After"] == "1"
+        assert client.get("/api/pricing").status_code == 200
+        assert admission.snapshot()["route_classes"]["chat"]["shed"] == 1
+
+    def test_slot_released_after_response(self):
+        """Test that admitted requests release their slot."""
+        admission = controller()
+        app = FastAPI()
+
+        @app.post("/api/chat")
+        async def chat():
+            return {"answer": "hi"}
+
+        app.add_middleware(AdmissionMiddleware, controller=admission)
+        client = TestClient(app)
+
+        assert [client.post("/api/chat").status_code for _ in range(3)] == [200, 200, 200]
+        assert admission.in_flight == 0
+        assert admission.route_class("/api/chat").service_time > 0
+
+    def test_disconnect_while_queued_leaves_queue(self):
+        """Test that a client disconnecting while queued is dropped at once, without ever reaching the app."""
+        admission = controller(chat_concurrency=1, chat_wait=5.0)
+        chat = admission.route_class("/api/chat")
+        called = []
+
+        async def app(scope, receive, send):
+            called.append(scope["path"])
+
+        async def run():
+            await admission.acquire(chat)
+            disconnected = asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                pass
+
+            request = asyncio.create_task(
+                AdmissionMiddleware(app, controller=admission)({"type": "http", "path": "/api/chat"}, receive, send)
+            )
+            await asyncio.sleep(0.01)
+            assert chat.queued == 1
+            disconnected.set()
+            await asyncio.wait_for(request, 1.0)
+            admission.release(chat, 0.01)
+
+        asyncio.run(run())
+
+        assert called == []
+        assert chat.queued == 0 and chat.in_flight == 0 and admission.in_flight == 0
+
+    def test_body_read_while_queued_is_replayed(self):
+        """Test that request messages read while watching for a disconnect reach the app once admitted."""
+        admission = controller(chat_concurrency=1, chat_wait=5.0)
+        chat = admission.route_class("/api/chat")
+        bodies = []
+
+        async def app(scope, receive, send):
+            bodies.append(await receive())
+
+        async def run():
+            await admission.acquire(chat)
+            messages = [{"type": "http.request", "body": b"hello", "more_body": False}]
+            never = asyncio.Event()
+
+            async def receive():
+                if messages:
+                    return messages.pop(0)
+                await never.wait()
+
+            async def send(message):
+                pass
+
+            request = asyncio.create_task(
+                AdmissionMiddleware(app, controller=admission)({"type": "http", "path": "/api/chat"}, receive, send)
+            )
+            await asyncio.sleep(0.01)
+            admission.release(chat, 0.01)
+            await asyncio.wait_for(request, 1.0)
+
+        asyncio.run(run())
+
+        assert bodies == [{"type": "http.request", "body": b"hello", "more_body": False}]
+        assert admission.in_flight == 0
@@ -0,0 +1,226 @@
+"""
+Unit tests for the layered cache
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from backend.services.cache import (
+    Cache,
+    CacheBackend,
+    LRUBackend,
+    MemoryBackend,
+    RedisBackend,
+    decode_value,
+    encode_value,
+)
+from backend.services.metrics import CACHE_LAYER_REQUESTS
+
+
+class BrokenBackend(CacheBackend):
+    """A shared layer that is down."""
+
+    name = "l2"
+
+    async def get(self, key):
+        raise ConnectionError("down")
+
+    async def set(self, key, value, ttl):
+        raise ConnectionError("down")
+
+    async def add(self, key, value, ttl):
+        raise ConnectionError("down")
+
+    async def delete(self, key):
+        raise ConnectionError("down")
+
+
+async def serve_resp(reader, writer, store):
+    """Minimal Redis-protocol server: GET, SET (PX, NX) and DEL."""
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        args = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        command = args[0].upper()
+        if command == b"GET":
+            value = store.get(args[1])
+            writer.write(b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value))
+        elif command == b"SET":
+            if b"NX" in args[3:] and args[1] in store:
+                writer.write(b"$-1\r\n")
+            else:
+                store[args[1]] = args[2]
+                writer.write(b"+OK\r\n")
+        elif command == b"DEL":
+            writer.write(b":%d\r\n" % int(store.pop(args[1], None) is not None))
+        await writer.drain()
+    writer.close()
+
+
+class TestEncoding:
+    """Test cases for cache value encoding."""
+
+    def test_vectors_packed(self):
+        """Test that float vectors round-trip as float32 at a fraction of their JSON size."""
+        vector = [i / 7 for i in range(1536)]
+
+        data = encode_value(vector)
+
+        assert len(data) == 1 + 4 * 1536
+        assert len(data) * 4 < len(json.dumps(vector))
+        assert decode_value(data) == pytest.approx(vector, rel=1e-6)
+
+    def test_other_values_and_none(self):
+        """Test that JSON values and None round-trip."""
+        for value in ({"answer": "hi", "docs": [1, 2]}, "text", [], None):
+            assert decode_value(encode_value(value)) == value
+
+
+class TestLRUBackend:
+    """Test cases for the in-process layer."""
+
+    def test_bounded_by_bytes(self):
+        """Test that the least recently used entries are evicted once the byte budget is exceeded."""
+        lru = LRUBackend(max_bytes=10)
+
+        async def run():
+            await lru.set("a", b"12345", 60)
+            await lru.set("b", b"12345", 60)
+            await lru.get("a")
+            await lru.set("c", b"12345", 60)
+            return [await lru.get(key) for key in ("a", "b", "c")]
+
+        assert asyncio.run(run()) == [b"12345", None, b"12345"]
+        assert lru.size == 10
+
+
+class TestCache:
+    """Test cases for Cache."""
+
+    def test_l2_shared_between_workers(self):
+        """Test that a value cached by one worker is found in L2 by another and copied into its L1."""
+        shared = MemoryBackend()
+        first, second = Cache("t_shared", l2=shared), Cache("t_shared", l2=shared)
+
+        async def run():
+            await first.set("q", [0.5, 0.25])
+            found = await second.lookup("q")
+            in_l1 = await second.layers[0].get("t_shared:q")
+            return found, in_l1
+
+        found, in_l1 = asyncio.run(run())
+
+        assert found == (True, [0.5, 0.25])
+        assert in_l1 is not None
+        assert CACHE_LAYER_REQUESTS.get(cache="t_shared", layer="l2", result="hit") == 1
+
+    def test_negative_results_cached(self):
+        """Test that a compute returning None is not repeated within negative_ttl."""
+        cache = Cache("t_negative", negative_ttl=60)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return None
+
+        async def run():
+            return [await cache.get_or_compute("missing", compute) for _ in range(3)]
+
+        assert asyncio.run(run()) == [None, None, None]
+        assert len(calls) == 1
+        assert CACHE_LAYER_REQUESTS.get(cache="t_negative", layer="l1", result="negative_hit") == 2
+
+    def test_errors_not_cached(self):
+        """Test that a failing compute is retried on the next call."""
+        cache = Cache("t_errors")
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("upstream failed")
+            return "ok"
+
+        async def run():
+            with pytest.raises(RuntimeError):
+                await cache.get_or_compute("k", compute)
+            return await cache.get_or_compute("k", compute)
+
+        assert asyncio.run(run()) == "ok"
+        assert len(calls) == 2
+
+    def test_stampede_in_process(self):
+        """Test that concurrent misses for a key share one compute."""
+        cache = Cache("t_stampede")
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return {"answer": 42}
+
+        async def run():
+            return await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(10)))
+
+        assert asyncio.run(run()) == [{"answer": 42}] * 10
+        assert len(calls) == 1
+
+    def test_stampede_across_workers(self):
+        """Test that a worker that loses the L2 lock waits for the winner's value instead of computing."""
+        shared = MemoryBackend()
+        workers = [Cache("t_workers", l2=shared) for _ in range(3)]
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return "value"
+
+        async def run():
+            return await asyncio.gather(*(worker.get_or_compute("k", compute) for worker in workers))
+
+        assert asyncio.run(run()) == ["value"] * 3
+        assert len(calls) == 1
+
+    def test_failing_l2_is_a_miss(self):
+        """Test that an unavailable shared layer does not fail lookups or computes."""
+        cache = Cache("t_broken", l2=BrokenBackend())
+
+        async def compute():
+            return "value"
+
+        async def run():
+            first = await cache.get_or_compute("k", compute)
+            return first, await cache.lookup("k")
+
+        assert asyncio.run(run()) == ("value", (True, "value"))
+        assert CACHE_LAYER_REQUESTS.get(cache="t_broken", layer="l2", result="error") == 1
+
+
+class TestRedisBackend:
+    """Test cases for the Redis-protocol layer, against a local stand-in server."""
+
+    def test_get_set_add_delete(self):
+        """Test the commands the cache uses."""
+        store = {}
+
+        async def run():
+            server = await asyncio.start_server(lambda r, w: serve_resp(r, w, store), "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            redis = RedisBackend(f"redis://127.0.0.1:{port}/0")
+            try:
+                await redis.set("k", b"\x00binary\r\n", 60)
+                value = await redis.get("k")
+                added = [await redis.add("lock", b"1", 5), await redis.add("lock", b"1", 5)]
+                await redis.delete("k")
+                return value, added, await redis.get("k")
+            finally:
+                server.close()
+
+        assert asyncio.run(run()) == (b"\x00binary\r\n", [True, False], None)
@@ -0,0 +1,103 @@
+"""
+Unit tests for the startup cache warmup
+"""
+
+import asyncio
+import json
+
+from backend.services.cache_warmup import CacheWarmup
+from backend.services.metrics import record_cache
+
+
+class StubWarmup(CacheWarmup):
+    """CacheWarmup with the session logs given instead of read from the database."""
+
+    def __init__(self, sessions=(), session_error=None, **kwargs):
+        super().__init__(**kwargs)
+        self.sessions = sessions
+        self.session_error = session_error
+
+    async def _session_entries(self):
+        if self.session_error is not None:
+            raise self.session_error
+        return [{"query": query, "timestamp": "2024-01-01T00:00:00"} for query in self.sessions]
+
+
+def write_logs(tmp_path, log_queries=(), legacy_queries=()):
+    log_path = tmp_path / "unanswered_queries.jsonl"
+    log_path.write_text("".join(json.dumps({"query": q, "reason": "no_documents"}) + "\n" for q in log_queries))
+    (tmp_path / "unanswered_queries.json").write_text(json.dumps([{"query": q} for q in legacy_queries]))
+    return log_path
+
+
+class TestCacheWarmup:
+    """Test cases for CacheWarmup."""
+
+    def test_top_queries_from_sessions_and_logs(self, tmp_path):
+        """Test that sessions, the log and the legacy log are counted together by normalized query."""
+        log_path = write_logs(tmp_path, ["Do you build apps?", "Where are you based?"], ["do you build apps"])
+        warmup = StubWarmup(sessions=["What does a website cost?", "Where are you based", "Do you build apps"],
+                            log_path=log_path, top_n=2)
+
+        queries = asyncio.run(warmup.historical_queries())
+
+        assert [q.lower().rstrip("?") for q in queries] == ["do you build apps", "where are you based"]
+
+    def test_unreadable_source_skipped(self, tmp_path):
+        """Test that a failing session read still leaves the log's queries to warm."""
+        warmup = StubWarmup(session_error=ConnectionError("db down"), log_path=write_logs(tmp_path, ["Pricing?"]))
+
+        assert asyncio.run(warmup.historical_queries()) == ["Pricing?"]
+
+    def test_warms_in_batches(self, tmp_path):
+        """Test that the top queries are searched batch_size at a time."""
+        warmup = StubWarmup(sessions=[f"question {i}" for i in range(5)], log_path=write_logs(tmp_path),
+                            batch_size=2)
+        batches = []
+
+        async def search(queries):
+            batches.append(list(queries))
+
+        assert asyncio.run(warmup.warm(search)) == 5
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert warmup.snapshot()["state"] == "warm"
+
+    def test_hit_ratio_reported_after_warmup(self, tmp_path):
+        """Test that only lookups after warming count toward the report, which is final once the window closes."""
+        warmup = StubWarmup(sessions=["Pricing?"], log_path=write_logs(tmp_path), caches=("t_warmup",),
+                            report_seconds=0.2)
+
+        async def search(queries):
+            # The warmup's own lookups are misses and are not reported
+            record_cache("t_warmup", False)
+
+        async def run():
+            task = warmup.start(search)
+            while warmup._baseline is None:
+                await asyncio.sleep(0.01)
+            for hit in (True, True, True, False):
+                record_cache("t_warmup", hit)
+            during = warmup.snapshot()["report"]
+            await task
+            record_cache("t_warmup", False)
+            return during, warmup.snapshot()["report"]
+
+        during, final = asyncio.run(run())
+
+        assert during["complete"] is False
+        assert final["complete"] is True
+        assert final["caches"]["t_warmup"] == {"hits": 3, "misses": 1, "hit_ratio": 0.75}
+
+    def test_search_failure_leaves_caches_cold(self, tmp_path):
+        """Test that a failing warmup is reported and the hit ratio window still opens."""
+        warmup = StubWarmup(sessions=["Pricing?"], log_path=write_logs(tmp_path), report_seconds=0)
+
+        async def search(queries):
+            raise RuntimeError("embeddings unavailable")
+
+        asyncio.run(warmup.run(search))
+        snapshot = warmup.snapshot()
+
+        assert snapshot["state"] == "failed"
+        assert snapshot["error"] == "embeddings unavailable"
+        assert snapshot["report"]["complete"] is True
@@ -0,0 +1,186 @@
+"""
+Unit tests for per-session conversation memory
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.db.models import Base, ConversationState
+from backend.services.conversation_memory import ConversationMemory, _tokens
+
+
+class FakeGateway:
+    """Answers every chat completion with the next queued reply, recording the requests."""
+
+    def __init__(self, *replies, error=None):
+        self.replies = list(replies)
+        self.error = error
+        self.calls = []
+
+    async def achat_completion(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.error is not None:
+            raise self.error
+        content = self.replies.pop(0) if self.replies else "summary"
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def memory_with(gateway, **kwargs):
+    return ConversationMemory(gateway=gateway, persist=False, **kwargs)
+
+
+def with_workers(tmp_path, scenario):
+    """Run scenario(worker_a, worker_b, stored_turns) with two workers sharing one SQLite database."""
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'memory.db'}")
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(lambda c: Base.metadata.create_all(c, tables=[ConversationState.__table__]))
+            factory = async_sessionmaker(engine)
+            workers = [ConversationMemory(gateway=FakeGateway(), session_factory=factory) for _ in range(2)]
+
+            async def stored_turns(session_id):
+                async with factory() as db:
+                    row = (await db.execute(
+                        select(ConversationState).where(ConversationState.session_id == session_id)
+                    )).scalars().one()
+                    return [turn["user"] for turn in json.loads(row.turns)]
+
+            return await scenario(*workers, stored_turns)
+        finally:
+            await engine.dispose()
+    return asyncio.run(run())
+
+
+def add_turns(memory, session_id, count, answer="We build websites with React and Django."):
+    async def run():
+        state = None
+        for i in range(count):
+            state = await memory.add_turn(session_id, f"Question {i} about websites?", answer)
+        return state
+    return asyncio.run(run())
+
+
+class TestConversationMemory:
+    """Test cases for ConversationMemory."""
+
+    def test_recent_turns_kept_verbatim(self):
+        """Test that turns within the budget are kept as they are, without calling the model."""
+        gateway = FakeGateway()
+        memory = memory_with(gateway, recent_tokens=600)
+
+        state = add_turns(memory, "s", 2)
+
+        assert [turn["user"] for turn in state["turns"]] == ["Question 0 about websites?", "Question 1 about websites?"]
+        assert state["summary"] == ""
+        assert gateway.calls == []
+
+    def test_old_turns_folded_into_summary(self):
+        """Test that turns pushed out of the recent budget are summarized, oldest first, into a rolling summary."""
+        gateway = FakeGateway("Customer wants a website.", "Customer wants a website and its price.")
+        memory = memory_with(gateway, recent_tokens=40)
+
+        state = add_turns(memory, "s", 3)
+
+        assert state["summary"] == "Customer wants a website and its price."
+        assert state["summarized_turns"] == 3 - len(state["turns"])
+        assert state["turns"][-1]["user"] == "Question 2 about websites?"
+        assert "Question 0 about websites?" in gateway.calls[0]["messages"][1]["content"]
+        assert "Current summary:\nCustomer wants a website." in gateway.calls[1]["messages"][1]["content"]
+
+    def test_prompt_size_stays_flat(self):
+        """Test that the rendered history stays within the budget however long the conversation runs."""
+        memory = memory_with(FakeGateway(*["Customer wants a website. " * 3] * 50), recent_tokens=80, summary_tokens=40)
+
+        sizes = []
+        for count in (5, 20, 40):
+            state = add_turns(memory, f"s{count}", count, answer="A long answer about our services. " * 20)
+            sizes.append(_tokens(memory.render(state)))
+
+        assert max(sizes) <= 80 + 40 + 20
+
+    def test_summary_failure_keeps_within_budget(self):
+        """Test that when the model is unavailable old turns are dropped rather than kept."""
+        memory = memory_with(FakeGateway(error=RuntimeError("down")), recent_tokens=40)
+
+        state = add_turns(memory, "s", 4)
+
+        assert state["summary"] == ""
+        assert _tokens(memory.render(state)) <= 60
+
+    def test_rewrite_query_uses_history(self):
+        """Test that a follow-up is rewritten from the summary and last turn, and a first message is not."""
+        gateway = FakeGateway("Summary", "website development pricing")
+        memory = memory_with(gateway, recent_tokens=40)
+
+        async def run():
+            first = await memory.rewrite_query(await memory.get("s"), "Do you build websites?")
+            for i in range(3):
+                await memory.add_turn("s", f"Question {i} about websites?", "Yes, we build websites.")
+            return first, await memory.rewrite_query(await memory.get("s"), "How much does it cost?")
+
+        first, follow_up = asyncio.run(run())
+
+        assert first == "Do you build websites?"
+        assert follow_up == "website development pricing"
+        prompt = gateway.calls[-1]["messages"][1]["content"]
+        assert "Summary: Summary" in prompt and "How much does it cost?" in prompt
+
+    def test_rewrite_query_falls_back_to_message(self):
+        """Test that a failed rewrite searches with the message as typed."""
+        memory = memory_with(FakeGateway(error=RuntimeError("down")))
+        state = {"summary": "Customer wants a website.", "turns": [], "summarized_turns": 2}
+
+        assert asyncio.run(memory.rewrite_query(state, "How much?")) == "How much?"
+
+    def test_least_recently_used_sessions_evicted(self):
+        """Test that the in-memory cache is bounded."""
+        memory = memory_with(FakeGateway(), max_sessions=2)
+
+        for session_id in ("a", "b", "c"):
+            add_turns(memory, session_id, 1)
+
+        assert list(memory._sessions) == ["b", "c"]
+
+    def test_render_empty_conversation(self):
+        """Test that a new session adds nothing to the prompt."""
+        memory = memory_with(FakeGateway())
+
+        assert memory.render(asyncio.run(memory.get("new"))) is None
+
+
+class TestConversationPersistence:
+    """Test cases for ConversationMemory sharing sessions between workers."""
+
+    def test_workers_continue_each_others_turns(self, tmp_path):
+        """Test that a worker reads the stored state instead of its own stale copy before adding a turn."""
+        async def scenario(a, b, stored_turns):
+            await a.add_turn("s", "t1", "answer")
+            await b.add_turn("s", "t2", "answer")
+            await a.add_turn("s", "t3", "answer")
+            return await stored_turns("s")
+
+        assert with_workers(tmp_path, scenario) == ["t1", "t2", "t3"]
+
+    def test_concurrent_turn_redone_on_top(self, tmp_path):
+        """Test that a turn stored by another worker between read and write is not overwritten."""
+        async def scenario(a, b, stored_turns):
+            await a.add_turn("s", "t1", "answer")
+            load = a._load
+
+            async def load_then_interleave(session_id):
+                loaded = await load(session_id)
+                if a._load is load_then_interleave:
+                    a._load = load
+                    await b.add_turn(session_id, "t2", "answer")
+                return loaded
+
+            a._load = load_then_interleave
+            await a.add_turn("s", "t3", "answer")
+            return await stored_turns("s")
+
+        assert with_workers(tmp_path, scenario) == ["t1", "t2", "t3"]
@@ -11,7 +11,7 @@ from pathlib import Path
 backend_path = Path(__file__).parent.parent.parent / "backend"
 sys.path.insert(0, str(backend_path))
 
-from db.database import get_db, create_tables
+from db.database import get_db, create_tables, to_async_url
 from db.models import User, ChatSession, ChatMessage
 
 class TestDatabase:
@@ -52,3 +52,12 @@ class TestDatabase:
         assert message.user_message == "Hello"
         assert message.bot_response == "Hi there!"
 
+    def test_async_url_swaps_driver(self):
+        """Test that DATABASE_URL maps to the asyncio driver for the same database."""
+        assert to_async_url("postgresql://user:secret@db:5432/chatbot") == "postgresql+asyncpg://user:secret@db:5432/chatbot"
+        assert to_async_url("postgresql+psycopg2://db/chatbot") == "postgresql+asyncpg://db/chatbot"
+        assert to_async_url("sqlite:///local.db") == "sqlite+aiosqlite:///local.db"
+
+    def test_async_url_translates_sslmode(self):
+        """Test that libpq's sslmode becomes asyncpg's ssl parameter."""
+        assert to_async_url("postgresql://db/chatbot?sslmode=require") == "postgresql+asyncpg://db/chatbot?ssl=require"
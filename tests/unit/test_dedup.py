@@ -0,0 +1,46 @@
+"""
+Unit tests for ingestion-time near-duplicate detection
+"""
+
+from knowledge_base.processors.dedup import LSHIndex, estimated_jaccard, find_duplicates, minhash, overlap_report
+
+BASE = " ".join(f"word{i}" for i in range(300))
+
+
+class TestDedup:
+    """Test cases for MinHash signatures and the LSH index."""
+
+    def test_minhash_estimates_jaccard(self):
+        """Test that signature agreement tracks shingle overlap."""
+        edited = BASE.replace("word150", "changed")
+        other = " ".join(f"other{i}" for i in range(300))
+
+        assert estimated_jaccard(minhash(BASE), minhash(BASE)) == 1.0
+        assert estimated_jaccard(minhash(BASE), minhash(edited)) > 0.85
+        assert estimated_jaccard(minhash(BASE), minhash(other)) < 0.1
+
+    def test_lsh_finds_near_duplicates_within_namespace(self):
+        """Test that lookups only match close signatures in the same namespace."""
+        index = LSHIndex()
+        index.add(1, minhash(BASE), "Company_Info")
+        index.add(2, minhash(" ".join(f"other{i}" for i in range(300))), "Company_Info")
+        copy = minhash(BASE + " trailing")
+
+        assert index.best_match(copy, namespace="Company_Info") == 1
+        assert index.best_match(copy, namespace="Internal_Resources") is None
+
+    def test_find_duplicates_reports_file_overlap(self):
+        """Test that the first copy is kept and later copies are reported against it."""
+        chunks = [
+            {"id": 0, "file": "about.txt", "text": BASE},
+            {"id": 1, "file": "services.txt", "text": "web design seo and branding services"},
+            {"id": 2, "file": "about_copy.txt", "text": BASE},
+        ]
+
+        duplicates = find_duplicates(chunks)
+        files = {chunk["id"]: chunk["file"] for chunk in chunks}
+
+        assert duplicates == [(2, 0)]
+        assert overlap_report((files[a], files[b]) for a, b in duplicates) == [
+            {"file": "about_copy.txt", "duplicates_of": "about.txt", "chunks": 1}
+        ]
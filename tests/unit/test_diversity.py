@@ -0,0 +1,55 @@
+"""
+Unit tests for near-duplicate collapsing and MMR re-ranking
+"""
+
+from knowledge_base.processors.diversity import diversify, hamming_distance, simhash
+
+ABOUT = ("Metalogics is a software agency building web applications, mobile apps and SEO campaigns "
+         "for startups and enterprises across Europe and North America since 2015.")
+PRICING = ("Projects are priced by scope. A typical website costs between 1500 and 3500 dollars "
+           "and we ask for a deposit of thirty to fifty percent before work starts.")
+PROCESS = ("Every engagement starts with a discovery call, followed by a written proposal, "
+           "design mockups, development sprints and a final review before launch.")
+
+
+def doc(content, score, signature=None):
+    return {"content": content, "relevance_score": score, "simhash": signature}
+
+
+class TestDiversity:
+    """Test cases for simhash and diversify."""
+
+    def test_simhash_separates_copies_from_other_text(self):
+        """Test that a lightly edited copy is a few bits away and unrelated text is not."""
+        copy = ABOUT.replace("since 2015.", "since 2015!")
+
+        assert simhash(ABOUT) == simhash(ABOUT)
+        assert hamming_distance(simhash(ABOUT), simhash(copy)) <= 3
+        assert hamming_distance(simhash(ABOUT), simhash(PRICING)) > 10
+
+    def test_simhash_fits_bigint(self):
+        """Test that signatures are signed 64-bit integers."""
+        for text in (ABOUT, PRICING, PROCESS, ""):
+            assert -2 ** 63 <= simhash(text) < 2 ** 63
+
+    def test_duplicates_collapse_to_most_relevant(self):
+        """Test that a near-copy never takes a result slot."""
+        docs = [doc(ABOUT, 0.91), doc(ABOUT + " ", 0.90), doc(PRICING, 0.80), doc(PROCESS, 0.70)]
+
+        picked = diversify(docs, 3, mmr_lambda=1.0)
+
+        assert [d["relevance_score"] for d in picked] == [0.91, 0.80, 0.70]
+
+    def test_mmr_prefers_new_information(self):
+        """Test that MMR picks a less relevant but different chunk over a redundant one."""
+        overlapping = ABOUT + " " + PRICING[:60]
+        docs = [doc(ABOUT, 0.90), doc(overlapping, 0.89), doc(PROCESS, 0.80)]
+
+        assert [d["content"] for d in diversify(docs, 2, mmr_lambda=0.5, duplicate_bits=-1)] == [ABOUT, PROCESS]
+        assert [d["content"] for d in diversify(docs, 2, mmr_lambda=1.0, duplicate_bits=-1)] == [ABOUT, overlapping]
+
+    def test_stored_signatures_are_used(self):
+        """Test that precomputed signatures take precedence over the content."""
+        docs = [doc("a", 0.9, signature=0), doc("b", 0.8, signature=0), doc("c", 0.7, signature=-1)]
+
+        assert [d["content"] for d in diversify(docs, 3)] == ["a", "c"]
@@ -0,0 +1,228 @@
+"""
+Unit tests for knowledge base ingestion in DocumentProcessor
+"""
+
+import asyncio
+
+import pytest
+import tiktoken
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.db.models import Base, Document, DocumentChunk, IndexGeneration
+from knowledge_base.processors import generations
+
+
+class FakeEncoding:
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """SQLite file with the vector store tables, for sync and async sessions alike."""
+    path = tmp_path / "kb.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(
+        bind=engine,
+        tables=[IndexGeneration.__table__, Document.__table__, DocumentChunk.__table__]
+    )
+    engine.dispose()
+    generations.invalidate_serving_cache()
+    yield path
+    generations.invalidate_serving_cache()
+
+
+@pytest.fixture
+def db(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def asearch(processor, db_path, query, n_results=5):
+    """Run processor.asearch_similar_documents on an async session."""
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        try:
+            async with AsyncSession(engine) as session:
+                return await processor.asearch_similar_documents(query, n_results, session)
+        finally:
+            await engine.dispose()
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def processor(monkeypatch, tmp_path):
+    """A DocumentProcessor whose embeddings come from embed(text) instead of OpenAI."""
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: FakeEncoding())
+    from knowledge_base.processors.document_processor import DocumentProcessor
+
+    processor = DocumentProcessor(documents_dir=str(tmp_path))
+    processor.deduplicate_chunks = False
+    processor.embed = lambda text: [0.1] * processor.embedding_dimensions
+    monkeypatch.setattr(processor, "generate_embeddings", lambda text: processor.embed(text))
+
+    async def aembed(contents, single=False):
+        embeddings = [processor.embed(text) for text in contents]
+        return embeddings[0] if single else embeddings
+    monkeypatch.setattr(processor, "_aembed", aembed)
+    processor.search_backend = "memory"
+    return processor
+
+
+def document(tmp_path, name, chunks):
+    return {
+        "file_path": str(tmp_path / "FAQ" / name),
+        "file_name": name,
+        "file_type": ".md",
+        "metadata": {"file_size": 10},
+        "processed_at": "2024-01-01T00:00:00",
+        "content": " ".join(chunks),
+        "chunks": list(chunks)
+    }
+
+
+class TestUpsert:
+    """Test cases for DocumentProcessor.upsert_to_vector_db."""
+
+    def test_failed_chunk_rolls_back_document(self, processor, db, tmp_path):
+        """Test that a document with a chunk that cannot be embedded is not stored, so it is not a checkpoint."""
+        generation = generations.get_serving_generation(db)
+        processor.embed = lambda text: None if text == "second" else [0.1] * processor.embedding_dimensions
+
+        stored = processor.upsert_to_vector_db(document(tmp_path, "a.md", ["first", "second"]), db,
+                                               generation=generation)
+
+        assert stored == 0
+        assert db.query(DocumentChunk).count() == 0
+        assert generations.completed_files(db, generation) == set()
+
+    def test_complete_document_is_checkpointed(self, processor, db, tmp_path):
+        """Test that a fully embedded document is stored with all its chunks."""
+        generation = generations.get_serving_generation(db)
+        doc = document(tmp_path, "a.md", ["first", "second"])
+
+        assert processor.upsert_to_vector_db(doc, db, generation=generation) == 2
+        assert generations.completed_files(db, generation) == {doc["file_path"]}
+
+    def test_duplicate_of_deleted_chunk_is_stored(self, processor, db, tmp_path):
+        """Test that a chunk matching a since-deleted original in the dedup index is stored normally."""
+        generation = generations.get_serving_generation(db)
+        processor.deduplicate_chunks = True
+        text = "We build custom websites with React and Django for small businesses"
+        processor.upsert_to_vector_db(document(tmp_path, "a.md", [text]), db, generation=generation)
+        db.query(DocumentChunk).delete()
+        db.query(Document).delete()
+        db.commit()
+
+        stored = processor.upsert_to_vector_db(document(tmp_path, "b.md", [text]), db, generation=generation)
+
+        assert stored == 1
+        assert db.query(DocumentChunk).count() == 1
+
+
+class TestMemoryIndex:
+    """Test cases for the in-process vector index."""
+
+    def test_reloaded_when_chunks_added(self, processor, db, tmp_path):
+        """Test that chunks stored in the serving generation after the index was loaded are searched."""
+        generation = generations.get_serving_generation(db)
+        processor.upsert_to_vector_db(document(tmp_path, "a.md", ["first answer"]), db, generation=generation)
+        assert len(processor._get_memory_index(db, generation)) == 1
+
+        processor.upsert_to_vector_db(document(tmp_path, "b.md", ["second answer"]), db, generation=generation)
+
+        assert len(processor._get_memory_index(db, generation)) == 2
+        assert processor._get_memory_index(db, generation) is processor._get_memory_index(db, generation)
+
+
+class TestRetrievalCache:
+    """Test cases for caching search results."""
+
+    def test_empty_results_not_cached(self, processor, db, db_path):
+        """Test that a search finding nothing is not cached, e.g. while the knowledge base is still loading."""
+        from knowledge_base.processors.document_processor import retrieval_cache
+        generations.get_serving_generation(db)
+        cached = len(retrieval_cache.layers[0])
+
+        assert asearch(processor, db_path, "empty knowledge base question") == []
+        assert len(retrieval_cache.layers[0]) == cached
+
+    def test_ingest_invalidates_results(self, processor, db, db_path, tmp_path):
+        """Test that chunks stored in the serving generation show up in a search cached before them."""
+        generation = generations.get_serving_generation(db)
+        processor.upsert_to_vector_db(document(tmp_path, "a.md", ["first answer"]), db, generation=generation)
+        assert [doc["content"] for doc in asearch(processor, db_path, "question", 2)] == ["first answer"]
+
+        processor.upsert_to_vector_db(document(tmp_path, "b.md", ["second answer"]), db, generation=generation)
+
+        assert len(asearch(processor, db_path, "question", 2)) == 2
+
+
+class TestPgvectorSearch:
+    """Test cases for the pgvector search statements DocumentProcessor builds."""
+
+    def test_default_exclusion_uses_public_index(self, processor):
+        """Test that the default internal exclusion is the partial index predicate, other exclusions stay bound."""
+        excluded = processor._excluded_categories(["Careers"], include_internal=False)
+
+        statement, params = processor._pgvector_search([0.1] * processor.embedding_dimensions, 5, 1, None, excluded)
+
+        assert "category <> 'Internal_Resources'" in str(statement)
+        assert params["excluded"] == ["Careers"]
+
+    def test_internal_only_exclusion_binds_nothing(self, processor):
+        """Test that excluding just the internal category needs no excluded parameter."""
+        excluded = processor._excluded_categories(None, include_internal=False)
+
+        statement, params = processor._pgvector_batch_search([[0.1] * processor.embedding_dimensions], 5, 1,
+                                                             None, excluded)
+
+        assert "category <> 'Internal_Resources'" in str(statement)
+        assert "excluded" not in params
+
+
+class TestResultSelection:
+    """Test cases for diversifying search results."""
+
+    def test_diversified_results_in_relevance_order(self, processor):
+        """Test that diversification chooses the documents but they are returned by relevance."""
+        processor.diversify_results = True
+        processor.mmr_lambda = 0.5
+        docs = [
+            {"id": 1, "content": "web design pricing packages", "simhash": None, "relevance_score": 0.9},
+            {"id": 2, "content": "web design pricing packages and plans", "simhash": None, "relevance_score": 0.85},
+            {"id": 3, "content": "mobile app development timeline", "simhash": None, "relevance_score": 0.8},
+        ]
+
+        selected = processor._select_results(docs, 3)
+
+        scores = [doc["relevance_score"] for doc in selected]
+        assert scores == sorted(scores, reverse=True)
+
+
+class TestKnowledgeBaseStats:
+    """Test cases for RAGService.get_knowledge_base_stats."""
+
+    def test_counts_serving_generation_only(self, processor, db, db_path, tmp_path, monkeypatch):
+        """Test that a shadow build in progress is not counted in the knowledge base totals."""
+        import backend.db.database as database
+        from backend.services.rag_service import RAGService
+
+        serving = generations.get_serving_generation(db)
+        processor.upsert_to_vector_db(document(tmp_path, "a.md", ["first", "second"]), db, generation=serving)
+        building = generations.start_shadow_generation(db).id
+        processor.upsert_to_vector_db(document(tmp_path, "a.md", ["first"]), db, generation=building)
+        monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=create_engine(f"sqlite:///{db_path}")))
+        service = object.__new__(RAGService)  # only the database is needed
+
+        stats = service.get_knowledge_base_stats()
+
+        assert (stats["generation"], stats["total_documents"], stats["total_chunks"]) == (serving, 1, 2)
@@ -0,0 +1,122 @@
+"""
+Unit tests for index generations used by shadow rebuilds
+"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.db.models import Base, Document, DocumentChunk, IndexGeneration
+from knowledge_base.processors import generations
+
+
+@pytest.fixture
+def db():
+    """In-memory database with the vector store tables."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        bind=engine,
+        tables=[IndexGeneration.__table__, Document.__table__, DocumentChunk.__table__]
+    )
+    session = sessionmaker(bind=engine)()
+    generations.invalidate_serving_cache()
+    yield session
+    session.close()
+    generations.invalidate_serving_cache()
+
+
+def add_document(db, generation, file_path):
+    doc = Document(generation=generation, file_path=file_path, file_name=file_path)
+    db.add(doc)
+    db.flush()
+    db.add(DocumentChunk(generation=generation, document_id=doc.id, chunk_index=0, content="text"))
+    db.commit()
+
+
+class TestGenerations:
+    """Test cases for shadow generation management."""
+
+    def test_serving_generation_is_created_once(self, db):
+        """Test that a serving generation is created on first use and then reused."""
+        first = generations.get_serving_generation(db)
+        generations.invalidate_serving_cache()
+        assert generations.get_serving_generation(db) == first
+
+    def test_shadow_generation_resumes(self, db):
+        """Test that an unfinished building generation is reused with its checkpoints."""
+        generations.get_serving_generation(db)
+        building = generations.start_shadow_generation(db)
+        add_document(db, building.id, "Services/SEO.md")
+
+        resumed = generations.start_shadow_generation(db)
+
+        assert resumed.id == building.id
+        assert generations.completed_files(db, resumed.id) == {"Services/SEO.md"}
+
+    def test_promote_swaps_serving_generation(self, db):
+        """Test that promotion retires the old generation and can drop it."""
+        old = generations.get_serving_generation(db)
+        add_document(db, old, "FAQ/Pricing_FAQ.md")
+        building = generations.start_shadow_generation(db)
+        add_document(db, building.id, "FAQ/Pricing_FAQ.md")
+
+        retired = generations.promote_generation(db, building.id)
+
+        assert retired == [old]
+        assert generations.get_serving_generation(db) == building.id
+
+        generations.drop_generation(db, old)
+        assert db.query(DocumentChunk).filter(DocumentChunk.generation == old).count() == 0
+        assert db.query(DocumentChunk).filter(DocumentChunk.generation == building.id).count() == 1
+
+    def test_drop_serving_generation_refused(self, db):
+        """Test that the serving generation cannot be dropped."""
+        serving = generations.get_serving_generation(db)
+        with pytest.raises(ValueError):
+            generations.drop_generation(db, serving)
+
+    @pytest.mark.asyncio
+    async def test_async_serving_generation_matches_sync(self, db):
+        """Test that the async lookup finds the same serving generation."""
+        pytest.importorskip("aiosqlite")
+        from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(lambda sync_conn: IndexGeneration.__table__.create(sync_conn))
+        try:
+            async with AsyncSession(engine) as session:
+                first = await generations.aget_serving_generation(session)
+                generations.invalidate_serving_cache()
+                assert await generations.aget_serving_generation(session) == first
+        finally:
+            await engine.dispose()
+
+    def test_content_version_changes_with_chunks(self, db):
+        """Test that storing or deleting chunks changes the generation's content version."""
+        serving = generations.get_serving_generation(db)
+        add_document(db, serving, "FAQ/Pricing_FAQ.md")
+        before = generations.get_content_version(db, serving)
+
+        add_document(db, serving, "FAQ/Process_FAQ.md")
+        assert generations.get_content_version(db, serving) == before
+        generations.invalidate_content_version()
+        after = generations.get_content_version(db, serving)
+
+        assert after != before
+        db.query(DocumentChunk).filter(DocumentChunk.id == db.query(DocumentChunk.id).first()[0]).delete()
+        db.commit()
+        generations.invalidate_content_version()
+        assert generations.get_content_version(db, serving) not in (before, after)
+
+    def test_rebuild_lock_is_exclusive(self, db):
+        """Test that the rebuild lock cannot be taken twice until it is released."""
+        engine = db.get_bind()
+
+        release = generations.try_rebuild_lock(engine)
+        try:
+            assert release is not None
+            assert generations.try_rebuild_lock(engine) is None
+        finally:
+            release()
+        generations.try_rebuild_lock(engine)()
@@ -0,0 +1,77 @@
+"""
+Unit tests for pre-serialized responses, the pricing catalog and /intent-hint caching
+"""
+
+import json
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.api.intent import router as intent_router
+from backend.services.http_cache import PreparedResponse, etag_matches
+from backend.services.pricing_catalog import PricingCatalog
+
+
+class TestHttpCache:
+    """Test cases for PreparedResponse, PricingCatalog and the intent-hint endpoints."""
+
+    @pytest.fixture
+    def client(self):
+        app = FastAPI()
+        app.include_router(intent_router, prefix="/api")
+        return TestClient(app)
+
+    def test_etag_matching(self):
+        """Test If-None-Match lists, weak validators and the wildcard."""
+        etag = PreparedResponse({"a": 1}).etag
+
+        assert etag_matches(etag, etag)
+        assert etag_matches(f'"other", W/{etag}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches('"other"', etag)
+        assert not etag_matches(None, etag)
+
+    def test_etag_follows_content(self):
+        """Test that equal content shares an ETag and changed content does not."""
+        assert PreparedResponse({"a": 1}).etag == PreparedResponse({"a": 1}).etag
+        assert PreparedResponse({"a": 1}).etag != PreparedResponse({"a": 2}).etag
+
+    def test_conditional_get_returns_304(self, client):
+        """Test that a revalidation with the current ETag gets an empty 304."""
+        first = client.get("/api/intent-hint", params={"intent": "web-development"})
+        assert first.status_code == 200
+        assert first.headers["cache-control"].startswith("public")
+        assert [u["service"] for u in first.json()["upsells"]] == ["SEO", "Graphic Design"]
+
+        second = client.get("/api/intent-hint", params={"intent": "web-development"},
+                            headers={"If-None-Match": first.headers["etag"]})
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["etag"] == first.headers["etag"]
+
+    def test_post_intent_hint_keeps_its_body(self, client):
+        """Test that POST still answers with the upsells and never a 304."""
+        response = client.post("/api/intent-hint", json={"intent": "seo", "session_id": "s"},
+                               headers={"If-None-Match": "*"})
+
+        assert response.status_code == 200
+        assert response.json() == {"upsells": []}
+
+    def test_catalog_reloads_changed_file(self, tmp_path):
+        """Test that an edited catalog is picked up and a broken one leaves the last good catalog in place."""
+        path = tmp_path / "pricing.json"
+        path.write_text(json.dumps({"seo": {"service": "seo", "price": 1}}))
+        catalog = PricingCatalog(path, reload_interval=0)
+        etag = catalog.response("seo").etag
+
+        path.write_text(json.dumps({"seo": {"service": "seo", "price": 2}}))
+        os.utime(path, (1, 1))
+        assert catalog.get("seo")["price"] == 2
+        assert catalog.response("seo").etag != etag
+
+        path.write_text("{not json")
+        os.utime(path, (2, 2))
+        assert catalog.get("seo")["price"] == 2
+        assert catalog.response("web-development") is None
@@ -0,0 +1,107 @@
+"""
+Unit tests for the background job service
+"""
+
+import threading
+import time
+
+import pytest
+
+from backend.services.job_service import JobConflict, JobManager, JOB_COMPLETED, JOB_FAILED
+
+
+def wait_for(job, timeout=2.0):
+    """Poll until the job leaves the active states."""
+    deadline = time.monotonic() + timeout
+    while job.is_active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+class TestJobManager:
+    """Test cases for JobManager."""
+
+    @pytest.fixture
+    def manager(self):
+        manager = JobManager(max_workers=2)
+        yield manager
+        manager.shutdown()
+
+    def test_job_records_progress(self, manager):
+        """Test that progress updates are reflected in the job status."""
+        def work(progress):
+            progress.set_total(2)
+            progress.file_done("a.md", chunks_embedded=3)
+            progress.record_error("b.md", "Embedding failed")
+            progress.file_done("b.md")
+            return 1
+
+        job = wait_for(manager.submit("rebuild", work))
+        status = job.to_dict()
+
+        assert status["status"] == JOB_COMPLETED
+        assert status["progress"]["files_seen"] == 2
+        assert status["progress"]["chunks_embedded"] == 3
+        assert status["progress"]["error_count"] == 1
+        assert manager.get(job.id) is job
+
+    def test_job_reports_file_overlaps(self, manager):
+        """Test that deduplicated chunks are counted per pair of files."""
+        def work(progress):
+            progress.record_duplicate("about_scraped.txt", "about.txt")
+            progress.record_duplicate("about_scraped.txt", "about.txt")
+            progress.record_duplicate("services.txt", "Services/SEO.md")
+
+        progress = wait_for(manager.submit("rebuild", work)).to_dict()["progress"]
+
+        assert progress["chunks_deduplicated"] == 3
+        assert progress["overlaps"][0] == {"file": "about_scraped.txt", "duplicates_of": "about.txt", "chunks": 2}
+
+    def test_failed_job_reports_error(self, manager):
+        """Test that exceptions mark the job as failed."""
+        def work(progress):
+            raise RuntimeError("quota exceeded")
+
+        job = wait_for(manager.submit("rebuild", work))
+
+        assert job.status == JOB_FAILED
+        assert job.error == "quota exceeded"
+
+    def test_concurrent_submit_reuses_active_job(self, manager):
+        """Test that a second rebuild while one is running is deduplicated."""
+        release = threading.Event()
+
+        def work(progress):
+            release.wait(2)
+
+        first = manager.submit("rebuild", work)
+        second = manager.submit("rebuild", work)
+        release.set()
+        wait_for(first)
+
+        assert first.id == second.id
+        assert manager.submit("rebuild", lambda progress: None).id != first.id
+
+    def test_lock_held_elsewhere_conflicts(self, manager):
+        """Test that a job whose shared lock another process holds is refused, not started."""
+        with pytest.raises(JobConflict):
+            manager.submit("rebuild", lambda progress: None, lock=lambda: None)
+
+        assert manager.list_jobs() == []
+
+    def test_lock_released_when_job_ends(self, manager):
+        """Test that the shared lock is held for the run and released when the job finishes, even on failure."""
+        released = []
+
+        def work(progress):
+            assert released == []
+            raise RuntimeError("quota exceeded")
+
+        job = wait_for(manager.submit("rebuild", work, lock=lambda: lambda: released.append(True)))
+
+        assert job.status == JOB_FAILED
+        assert released == [True]
+
+    def test_unknown_job(self, manager):
+        """Test lookup of a job ID that does not exist."""
+        assert manager.get("missing") is None
@@ -0,0 +1,79 @@
+"""
+Unit tests for the metrics registry
+"""
+
+import asyncio
+
+import pytest
+
+from backend.services.metrics import MetricsRegistry, record_openai_usage, OPENAI_TOKENS
+
+
+class TestMetricsRegistry:
+    """Test cases for MetricsRegistry and its metric types."""
+
+    @pytest.fixture
+    def registry(self):
+        return MetricsRegistry()
+
+    def test_counter_renders_labels(self, registry):
+        """Test counter increments and Prometheus text output."""
+        counter = registry.counter("test_requests_total", "Requests", ["route"])
+        counter.inc(route="/api/chat")
+        counter.inc(2, route="/api/chat")
+
+        assert counter.get(route="/api/chat") == 3
+        assert 'test_requests_total{route="/api/chat"} 3.0' in registry.render()
+
+    def test_histogram_buckets_are_cumulative(self, registry):
+        """Test histogram bucket, sum and count lines."""
+        histogram = registry.histogram("test_latency_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, stage="embed")
+        histogram.observe(0.5, stage="embed")
+        histogram.observe(5.0, stage="embed")
+
+        output = registry.render()
+
+        assert 'test_latency_seconds_bucket{stage="embed",le="0.1"} 1' in output
+        assert 'test_latency_seconds_bucket{stage="embed",le="1.0"} 2' in output
+        assert 'test_latency_seconds_bucket{stage="embed",le="+Inf"} 3' in output
+        assert 'test_latency_seconds_count{stage="embed"} 3' in output
+        assert "# TYPE test_latency_seconds histogram" in output
+
+    def test_timer_decorates_sync_and_async_functions(self, registry):
+        """Test that the timer records one observation per call."""
+        histogram = registry.histogram("test_stage_seconds", "Stage", ["stage"])
+
+        @histogram.time(stage="sync")
+        def sync_call():
+            return 1
+
+        @histogram.time(stage="async")
+        async def async_call():
+            return 2
+
+        assert sync_call() == 1
+        assert asyncio.run(async_call()) == 2
+        assert histogram.snapshot(stage="sync")["count"] == 1
+        assert histogram.snapshot(stage="async")["count"] == 1
+
+    def test_wrong_labels_rejected(self, registry):
+        """Test that label names must match the metric definition."""
+        counter = registry.counter("test_labelled_total", "Labelled", ["cache"])
+        with pytest.raises(ValueError):
+            counter.inc(result="hit")
+
+    def test_record_openai_usage(self):
+        """Test token counting from an OpenAI response usage block."""
+        class Usage:
+            prompt_tokens = 12
+            completion_tokens = 5
+
+        class Response:
+            usage = Usage()
+
+        before = OPENAI_TOKENS.get(model="test-model", type="prompt")
+        record_openai_usage(Response(), "test-model")
+
+        assert OPENAI_TOKENS.get(model="test-model", type="prompt") == before + 12
+        assert OPENAI_TOKENS.get(model="test-model", type="completion") >= 5
@@ -0,0 +1,166 @@
+"""
+Unit tests for the OpenAI gateway
+"""
+
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from backend.services.metrics import OPENAI_QUEUE_WAIT
+from backend.services.openai_gateway import CircuitBreaker, OpenAIGateway, OpenAIUnavailable, TokenBucket
+
+
+def api_error(error_class, status):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return error_class("error", response=httpx.Response(status, request=request), body=None)
+
+
+class Usage:
+    total_tokens = 12
+
+
+class FakeResponse:
+    usage = Usage()
+
+
+class FakeClient:
+    """Stands in for OpenAI/AsyncOpenAI; raises the queued errors, then responds."""
+
+    def __init__(self, errors=(), delay=0.0, is_async=False):
+        self.errors = list(errors)
+        self.delay = delay
+        self.is_async = is_async
+        self.calls = []
+        self.chat = self
+        self.completions = self
+        self.embeddings = self
+
+    def _respond(self, kwargs):
+        self.calls.append(kwargs)
+        if self.errors:
+            raise self.errors.pop(0)
+        return FakeResponse()
+
+    def create(self, **kwargs):
+        if self.is_async:
+            return self._acreate(kwargs)
+        time.sleep(self.delay)
+        return self._respond(kwargs)
+
+    async def _acreate(self, kwargs):
+        await asyncio.sleep(self.delay)
+        return self._respond(kwargs)
+
+
+def make_gateway(client=None, async_client=None, **kwargs):
+    gateway = OpenAIGateway(client=client, async_client=async_client, **kwargs)
+    gateway._backoff = lambda attempt, remaining: 0.0
+    return gateway
+
+
+class TestOpenAIGateway:
+    """Test cases for OpenAIGateway, TokenBucket and CircuitBreaker."""
+
+    def test_retries_rate_limits_then_succeeds(self):
+        """Test that 429s and 5xx responses are retried and the deadline is passed on."""
+        client = FakeClient(errors=[api_error(openai.RateLimitError, 429),
+                                    api_error(openai.InternalServerError, 500)])
+        gateway = make_gateway(client, max_retries=2)
+
+        response = gateway.chat_completion(model="gpt-3.5-turbo", messages=[{"role": "user", "content": "hi"}])
+
+        assert isinstance(response, FakeResponse)
+        assert len(client.calls) == 3
+        assert 0 < client.calls[-1]["timeout"] <= gateway.timeout
+
+    def test_client_errors_are_not_retried(self):
+        """Test that a bad request fails on the first attempt and does not trip the breaker."""
+        client = FakeClient(errors=[api_error(openai.BadRequestError, 400)])
+        gateway = make_gateway(client, breaker=CircuitBreaker(failure_threshold=1))
+
+        with pytest.raises(openai.BadRequestError):
+            gateway.embeddings(model="text-embedding-3-small", input="hello")
+
+        assert len(client.calls) == 1
+        assert gateway.breaker.state == "closed"
+
+    def test_breaker_fails_fast_then_half_opens(self):
+        """Test that an open circuit rejects calls without reaching the API until the cool-down ends."""
+        client = FakeClient(errors=[api_error(openai.RateLimitError, 429)] * 2)
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+        gateway = make_gateway(client, max_retries=1, breaker=breaker)
+
+        with pytest.raises(openai.RateLimitError):
+            gateway.embeddings(model="text-embedding-3-small", input="hello")
+        with pytest.raises(OpenAIUnavailable):
+            gateway.embeddings(model="text-embedding-3-small", input="hello")
+        assert len(client.calls) == 2
+        assert breaker.state == "open"
+
+        time.sleep(0.25)
+        assert breaker.state == "half_open"
+        gateway.embeddings(model="text-embedding-3-small", input="hello")
+        assert breaker.state == "closed"
+
+    def test_cancelled_trial_releases_half_open_slot(self):
+        """Test that a half-open trial that is cancelled lets the next call be the trial instead of blocking all calls."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        async_client = FakeClient(errors=[api_error(openai.RateLimitError, 429)], delay=0.2, is_async=True)
+        gateway = make_gateway(async_client=async_client, max_retries=0, breaker=breaker)
+
+        async def run():
+            with pytest.raises(openai.RateLimitError):
+                await gateway.aembeddings(model="text-embedding-3-small", input="hello")
+            await asyncio.sleep(0.06)
+            trial = asyncio.ensure_future(gateway.aembeddings(model="text-embedding-3-small", input="hello"))
+            await asyncio.sleep(0.05)
+            trial.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await trial
+            return await gateway.aembeddings(model="text-embedding-3-small", input="hello")
+
+        assert isinstance(asyncio.run(run()), FakeResponse)
+        assert breaker.state == "closed"
+
+    def test_concurrency_limit_queues_and_times_out(self):
+        """Test that calls beyond the limit wait for a slot, and give up after queue_timeout."""
+        async_client = FakeClient(delay=0.2, is_async=True)
+        gateway = make_gateway(async_client=async_client, max_concurrency=1, queue_timeout=0.1)
+        before = (OPENAI_QUEUE_WAIT.snapshot(operation="chat_completion") or {"count": 0})["count"]
+
+        async def run():
+            return await asyncio.gather(
+                gateway.achat_completion(model="gpt-3.5-turbo", messages=[]),
+                gateway.achat_completion(model="gpt-3.5-turbo", messages=[]),
+                return_exceptions=True
+            )
+
+        first, second = asyncio.run(run())
+
+        assert isinstance(first, FakeResponse)
+        assert isinstance(second, OpenAIUnavailable)
+        assert len(async_client.calls) == 1
+        assert OPENAI_QUEUE_WAIT.snapshot(operation="chat_completion")["count"] == before + 2
+
+    def test_token_bucket_waits_for_refill(self):
+        """Test that the bucket reports how long until enough budget has refilled."""
+        bucket = TokenBucket(capacity=10, rate=5)
+        now = bucket._updated
+
+        assert bucket.wait_time(10, now) == 0.0
+        bucket.take(10)
+        assert bucket.wait_time(5, now) == pytest.approx(1.0)
+        assert bucket.wait_time(5, now + 1.0) == 0.0
+        assert bucket.wait_time(50, now + 1.0) == pytest.approx(1.0)
+
+    def test_token_budget_uses_reported_usage(self):
+        """Test that the token bucket is charged what the response actually used."""
+        gateway = make_gateway(FakeClient(), tokens_per_minute=6000)
+
+        gateway.chat_completion(model="gpt-3.5-turbo", messages=[{"role": "user", "content": "x" * 400}],
+                                max_tokens=500)
+
+        assert gateway._tokens.level == pytest.approx(6000 - Usage.total_tokens, abs=5)
@@ -0,0 +1,73 @@
+"""
+Unit tests for unanswered query clustering
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from knowledge_base.processors.query_clusters import IncrementalClusterer, cluster_report, recency_weights
+
+NOW = datetime(2025, 10, 1)
+
+# Topic of each normalized wording, for a fake embedder with one axis per topic
+TOPICS = {"what services do you offer": 0, "which services do you provide": 0,
+          "how much does a website cost": 1, "hello": 2}
+
+
+def embed(texts):
+    vectors = np.zeros((len(texts), 3), dtype=np.float32)
+    for row, text in enumerate(texts):
+        vectors[row, TOPICS[text]] = 1.0
+    return vectors
+
+
+def entry(query, timestamp, reason="low_relevance"):
+    return {"query": query, "reason": reason, "timestamp": timestamp}
+
+
+class TestQueryClusters:
+    """Test cases for cluster_report and its helpers."""
+
+    def test_paraphrases_share_a_cluster(self):
+        """Test that wordings of the same question are counted as one gap."""
+        entries = [
+            entry("What services do you offer?", "2025-09-30T00:00:00"),
+            entry("what services do you offer", "2025-09-30T01:00:00"),
+            entry("Which services do you provide?", "2025-09-30T02:00:00"),
+            entry("How much does a website cost?", "2025-09-30T03:00:00"),
+        ]
+
+        clusters = cluster_report(entries, embed, now=NOW)
+
+        assert [(cluster["query"], cluster["count"]) for cluster in clusters] == [
+            ("what services do you offer", 3), ("How much does a website cost?", 1)
+        ]
+        assert clusters[0]["examples"] == ["Which services do you provide?"]
+        assert clusters[0]["last_seen"] == "2025-09-30T02:00:00"
+
+    def test_recent_gaps_outrank_old_ones(self):
+        """Test that a few recent misses outrank many misses from long ago."""
+        entries = [entry("hello", "2025-01-01T00:00:00") for _ in range(10)]
+        entries += [entry("How much does a website cost?", "2025-09-30T00:00:00") for _ in range(2)]
+
+        clusters = cluster_report(entries, embed, half_life_days=30, now=NOW)
+
+        assert [cluster["query"] for cluster in clusters] == ["How much does a website cost?", "hello"]
+
+    def test_recency_weights_halve_per_half_life(self):
+        """Test the decay of a single entry."""
+        weights = recency_weights([entry("hello", "2025-09-01T00:00:00")], half_life_days=30, now=NOW)
+
+        assert abs(weights["hello"] - 0.5) < 1e-9
+
+    def test_clusterer_starts_new_cluster_below_threshold(self):
+        """Test that dissimilar vectors do not merge and similar ones pull the centroid."""
+        clusterer = IncrementalClusterer(threshold=0.9)
+        a = np.array([1.0, 0.0], dtype=np.float32)
+        b = np.array([0.0, 1.0], dtype=np.float32)
+        near_a = np.array([0.99, 0.141], dtype=np.float32)
+
+        assert [clusterer.add("a", a), clusterer.add("b", b), clusterer.add("near_a", near_a)] == [0, 1, 0]
+        assert clusterer.members == [["a", "near_a"], ["b"]]
+        assert abs(np.linalg.norm(clusterer.centroids[0]) - 1.0) < 1e-6
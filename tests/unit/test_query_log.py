@@ -0,0 +1,73 @@
+"""
+Unit tests for the unanswered query log
+"""
+
+import json
+
+import pytest
+
+from backend.services.query_log import UnansweredQueryLog, aggregate, normalize_query, read_entries
+
+
+class TestUnansweredQueryLog:
+    """Test cases for UnansweredQueryLog and its reader."""
+
+    @pytest.fixture
+    def log_path(self, tmp_path):
+        return tmp_path / "unanswered_queries.jsonl"
+
+    def test_record_queues_until_flush(self, log_path):
+        """Test that record() does no I/O and flush() appends one JSON line per entry."""
+        log = UnansweredQueryLog(log_path, flush_interval=3600)
+        log.record("What services do you offer?", "low_relevance")
+        log.record("Do you build apps?", "no_documents_found")
+
+        assert not log_path.exists()
+        assert log.flush() == 2
+
+        lines = log_path.read_text().splitlines()
+        assert [json.loads(line)["query"] for line in lines] == ["What services do you offer?", "Do you build apps?"]
+
+    def test_rotation_keeps_backups(self, log_path):
+        """Test that the file rotates past max_bytes and the reader returns every file oldest first."""
+        log = UnansweredQueryLog(log_path, max_bytes=200, backup_count=2, batch_size=1, flush_interval=3600)
+        for i in range(12):
+            log.record(f"question {i}", "low_relevance")
+        log.flush()
+
+        assert log_path.with_name(log_path.name + ".1").exists()
+        assert not log_path.with_name(log_path.name + ".3").exists()
+        queries = [entry["query"] for entry in read_entries(log_path, legacy_path=None)]
+        assert queries == sorted(queries, key=lambda q: int(q.split()[1]))
+        assert queries[-1] == "question 11"
+
+    def test_full_queue_drops_entries(self, log_path):
+        """Test that a stalled writer cannot grow memory without bound."""
+        log = UnansweredQueryLog(log_path, max_queue=2, flush_interval=3600)
+        for _ in range(5):
+            log.record("q", "low_relevance")
+
+        assert log.dropped == 3
+        assert log.flush() == 2
+
+    def test_aggregate_counts_normalized_queries(self, log_path, tmp_path):
+        """Test that repeats differing in case and punctuation are counted together, legacy entries included."""
+        legacy = tmp_path / "unanswered_queries.json"
+        legacy.write_text(json.dumps([
+            {"query": "what services do you offer", "reason": "low_relevance", "timestamp": "2025-01-01T00:00:00"}
+        ]))
+        log_path.write_text("\n".join(json.dumps(entry) for entry in [
+            {"query": "What services do you offer?", "reason": "no_documents_found", "timestamp": "2025-02-01T00:00:00"},
+            {"query": "Pricing for SEO", "reason": "low_relevance", "timestamp": "2025-01-15T00:00:00"},
+        ]) + "\n{\"query\": \"trunc")
+
+        rows = aggregate(read_entries(log_path, legacy_path=legacy))
+
+        assert [(row["query"], row["count"]) for row in rows] == [("What services do you offer?", 2),
+                                                                   ("Pricing for SEO", 1)]
+        assert rows[0]["first_seen"] == "2025-01-01T00:00:00"
+        assert rows[0]["reasons"] == {"low_relevance": 1, "no_documents_found": 1}
+
+    def test_normalize_query(self):
+        """Test case, punctuation and whitespace folding."""
+        assert normalize_query("  What's   the PRICE?! ") == "what s the price"
@@ -0,0 +1,195 @@
+"""
+Unit tests for per-client rate limiting
+"""
+
+import asyncio
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from backend.services.metrics import RATE_LIMIT_CHECK
+from backend.services.rate_limit import (
+    InMemoryRateLimitStore,
+    RateLimit,
+    RateLimiter,
+    RateLimitMiddleware,
+    RateLimitStore,
+)
+
+
+class SharedStore(RateLimitStore):
+    """Stand-in for a store shared by several workers: every limiter given the same dict shares buckets."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.clock = 0.0
+
+    async def take(self, key, rate, burst, cost=1.0):
+        tokens, updated = self.buckets.get(key, (burst, self.clock))
+        tokens = min(burst, tokens + (self.clock - updated) * rate)
+        allowed = tokens >= 1
+        self.buckets[key] = (tokens - cost if allowed else tokens, self.clock)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+
+def scope(client="1.2.3.4", headers=(), query=b""):
+    return {"type": "http", "client": (client, 5000), "headers": list(headers), "query_string": query}
+
+
+def chat_limiter(**kwargs):
+    return RateLimiter([RateLimit("chat", ["/api/chat"], per_minute=60, burst=2),
+                        RateLimit("booking", ["/api/calendar/"], per_minute=60, burst=5)], **kwargs)
+
+
+class TestInMemoryRateLimitStore:
+    """Test cases for InMemoryRateLimitStore."""
+
+    def test_burst_then_refill(self):
+        """Test that a bucket allows its burst, rejects with the time to the next token, then refills."""
+        store = InMemoryRateLimitStore()
+
+        results = [store.take_now("k", rate=1.0, burst=2, now=100.0) for _ in range(3)]
+        assert [allowed for allowed, _ in results] == [True, True, False]
+        assert results[-1][1] == 1.0
+
+        assert store.take_now("k", rate=1.0, burst=2, now=101.0)[0] is True
+        assert store.take_now("k", rate=1.0, burst=2, now=101.0)[0] is False
+
+    def test_cost_leaves_bucket_in_debt(self):
+        """Test that a request costing more than the tokens left is allowed, then blocks until they are repaid."""
+        store = InMemoryRateLimitStore()
+
+        assert store.take_now("k", rate=1.0, burst=2, now=0.0, cost=10)[0] is True
+        allowed, retry_after = store.take_now("k", rate=1.0, burst=2, now=5.0)
+        assert allowed is False and retry_after == 4.0
+        assert store.take_now("k", rate=1.0, burst=2, now=9.0)[0] is True
+
+    def test_clients_have_separate_buckets(self):
+        """Test that one client's usage does not affect another's."""
+        store = InMemoryRateLimitStore()
+
+        store.take_now("a", rate=1.0, burst=1, now=0.0)
+
+        assert store.take_now("a", rate=1.0, burst=1, now=0.0)[0] is False
+        assert store.take_now("b", rate=1.0, burst=1, now=0.0)[0] is True
+
+    def test_idle_buckets_swept(self):
+        """Test that cleanup visits every shard within the interval and drops only idle buckets."""
+        store = InMemoryRateLimitStore(shards=4, idle_seconds=10, cleanup_interval=4)
+        start = store._next_sweep
+        for i in range(50):
+            store.take_now(f"client-{i}", rate=1.0, burst=5, now=start - 1)
+        assert len(store) == 50
+
+        for step in range(4):
+            store.take_now("active", rate=1.0, burst=5, now=start + 20 + step)
+
+        assert len(store) == 1
+
+
+class TestRateLimiter:
+    """Test cases for RateLimiter."""
+
+    def test_client_keys(self):
+        """Test keying by address, by forwarded address behind a proxy, and by session with address fallback."""
+        by_ip = chat_limiter()
+        behind_proxy = chat_limiter(trust_proxy=1)
+        behind_two_proxies = chat_limiter(trust_proxy=2)
+        by_session = chat_limiter(key_by="session")
+        # The client sent "6.6.6.6"; the proxy appended the address it saw
+        forwarded = [(b"x-forwarded-for", b"6.6.6.6, 9.9.9.9")]
+
+        assert by_ip.client_key(scope(headers=forwarded)) == "ip:1.2.3.4"
+        assert behind_proxy.client_key(scope(headers=forwarded)) == "ip:9.9.9.9"
+        assert behind_two_proxies.client_key(scope(headers=forwarded)) == "ip:6.6.6.6"
+        assert behind_two_proxies.client_key(scope(headers=[(b"x-forwarded-for", b"9.9.9.9")])) == "ip:1.2.3.4"
+        assert by_session.client_key(scope(headers=[(b"x-session-id", b"abc")])) == "session:abc"
+        assert by_session.client_key(scope(query=b"x=1&session_id=def")) == "session:def"
+        assert by_session.client_key(scope()) == "ip:1.2.3.4"
+
+    def test_rotating_session_ids_capped_by_address(self):
+        """Test that new session ids from one address stop getting fresh buckets at sessions_per_ip times the limit."""
+        limiter = chat_limiter(key_by="session", sessions_per_ip=2)
+        limit = limiter.limit_for("/api/chat")
+
+        async def run():
+            results = []
+            for i in range(6):
+                request = scope(headers=[(b"x-session-id", f"s{i}".encode())])
+                results.append(await limiter.check(limit, limiter.client_key(request), limiter.ip_key(request)))
+            other = scope(client="5.6.7.8", headers=[(b"x-session-id", b"s0")])
+            results.append(await limiter.check(limit, limiter.client_key(other), limiter.ip_key(other)))
+            return results
+
+        results = asyncio.run(run())
+
+        assert results[:4] == [None] * 4
+        assert all(retry_after is not None for retry_after in results[4:6])
+        # Session s0 still had a token, and the other address its own allowance
+        assert results[6] is None
+
+    def test_shared_store_limits_across_workers(self):
+        """Test that limiters sharing a store enforce one limit between them."""
+        buckets = {}
+        workers = [chat_limiter(store=SharedStore(buckets)) for _ in range(2)]
+        limit = workers[0].limit_for("/api/chat")
+
+        async def run():
+            return [await worker.check(limit, "ip:1.2.3.4") for worker in workers * 2]
+
+        assert asyncio.run(run()) == [None, None, 1, 1]
+
+    def test_check_overhead_measured(self):
+        """Test that every check is timed."""
+        limiter = chat_limiter()
+        before = (RATE_LIMIT_CHECK.snapshot() or {"count": 0})["count"]
+
+        asyncio.run(limiter.check(limiter.limit_for("/api/chat"), "ip:1.2.3.4"))
+
+        assert RATE_LIMIT_CHECK.snapshot()["count"] == before + 1
+
+
+class TestRateLimitMiddleware:
+    """Test cases for RateLimitMiddleware."""
+
+    def test_over_limit_gets_429(self):
+        """Test that a client over its limit gets 429 with Retry-After while other routes stay open."""
+        app = FastAPI()
+
+        @app.post("/api/chat")
+        async def chat():
+            return {"answer": "hi"}
+
+        @app.get("/api/pricing")
+        async def pricing():
+            return {"price": 1}
+
+        app.add_middleware(RateLimitMiddleware, limiter=chat_limiter())
+        client = TestClient(app)
+
+        statuses = [client.post("/api/chat").status_code for _ in range(3)]
+        assert statuses == [200, 200, 429]
+        limited = client.post("/api/chat")
+        assert limited.headers["Retry-After"] == "1"
+        assert [client.get("/api/pricing").status_code for _ in range(5)] == [200] * 5
+
+    def test_batch_charged_per_item_by_handler(self):
+        """Test that a handler path skips the per-request charge and is charged by its item count instead."""
+        limiter = RateLimiter([RateLimit("search", ["/api/rag-search"], per_minute=60, burst=10,
+                                         handler_paths=["/api/rag-search/batch"])])
+        app = FastAPI()
+
+        @app.post("/api/rag-search/batch")
+        async def batch(request: Request, size: int):
+            retry_after = await limiter.check_scope(request.scope, cost=size)
+            if retry_after is not None:
+                raise HTTPException(status_code=429, headers={"Retry-After": str(retry_after)})
+            return {"results": size}
+
+        app.add_middleware(RateLimitMiddleware, limiter=limiter)
+        client = TestClient(app)
+
+        assert client.post("/api/rag-search/batch?size=50").status_code == 200
+        limited = client.post("/api/rag-search/batch?size=1")
+        assert limited.status_code == 429
+        assert int(limited.headers["Retry-After"]) >= 40
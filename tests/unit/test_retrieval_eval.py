@@ -0,0 +1,125 @@
+"""
+Unit tests for the offline retrieval evaluation helpers
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from knowledge_base.processors.retrieval_eval import (
+    BM25,
+    EmbeddingCache,
+    HASHING_MODEL,
+    chunk_words,
+    evaluate,
+    faq_queries,
+    load_corpus,
+    reciprocal_rank_fusion,
+)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+@pytest.fixture
+def kb_dir(tmp_path):
+    """Small knowledge base with one FAQ file and one service page."""
+    (tmp_path / "FAQ").mkdir()
+    (tmp_path / "FAQ" / "Pricing_FAQ.md").write_text(
+        "# Pricing FAQ\n\n**Q: How much does a project cost?**  \nA: It depends on scope.\n\n"
+        "**Q: Do you require upfront payment?**  \nA: Usually 30-50%.\n"
+    )
+    (tmp_path / "Services").mkdir()
+    (tmp_path / "Services" / "SEO.md").write_text("# SEO\n\nWe improve search rankings.")
+    (tmp_path / "Internal_Resources").mkdir()
+    (tmp_path / "Internal_Resources" / "Notes.md").write_text("internal only")
+    return tmp_path
+
+
+class TestRetrievalEval:
+    """Test cases for query set building and scoring."""
+
+    def test_faq_questions_labelled_with_source(self, kb_dir):
+        """Test that FAQ questions map to their own file."""
+        queries = faq_queries(kb_dir)
+
+        assert [q["query"] for q in queries] == ["How much does a project cost?", "Do you require upfront payment?"]
+        assert all(q["relevant_files"] == ["FAQ/Pricing_FAQ.md"] for q in queries)
+
+    def test_corpus_skips_internal_categories(self, kb_dir):
+        """Test that internal folders are left out like they are in search."""
+        files = {chunk["file"] for chunk in load_corpus(kb_dir)}
+        assert files == {"FAQ/Pricing_FAQ.md", "Services/SEO.md"}
+
+    def test_corpus_skips_code_and_tooling(self, kb_dir):
+        """Test that processor code, scripts and files at the root are not part of the corpus."""
+        (kb_dir / "processors").mkdir()
+        (kb_dir / "processors" / "ingest.py").write_text("def ingest(): pass")
+        (kb_dir / "Services" / "__pycache__").mkdir()
+        (kb_dir / "Services" / "__pycache__" / "notes.txt").write_text("cache")
+        (kb_dir / "unanswered_queries.json").write_text("[]")
+
+        files = {chunk["file"] for chunk in load_corpus(kb_dir)}
+
+        assert files == {"FAQ/Pricing_FAQ.md", "Services/SEO.md"}
+
+    def test_chunk_words_overlaps(self):
+        """Test overlapping word windows."""
+        chunks = chunk_words(" ".join(str(i) for i in range(10)), size=4, overlap=1)
+        assert chunks == ["0 1 2 3", "3 4 5 6", "6 7 8 9"]
+
+    def test_evaluate_recall_and_mrr(self):
+        """Test recall@k and MRR at the file level."""
+        chunks = [{"id": 0, "file": "a.md"}, {"id": 1, "file": "a.md"}, {"id": 2, "file": "b.md"}]
+        queries = [
+            {"query": "first", "relevant_files": ["b.md"]},
+            {"query": "second", "relevant_files": ["c.md"]},
+        ]
+        rankings = {"first": [0, 1, 2], "second": [2]}
+
+        result = evaluate("fixed", lambda _v, query, _n: rankings[query], queries, np.zeros((2, 1)), chunks, k=2)
+
+        # b.md is the second distinct file for the first query; c.md is never found
+        assert result["recall"] == 0.5
+        assert result["mrr"] == 0.25
+
+    def test_cache_round_trip(self, tmp_path):
+        """Test that cached embeddings are reused offline and misses are reported."""
+        path = tmp_path / "cache.npz"
+        calls = []
+        cache = EmbeddingCache(path, "text-embedding-3-small", 3,
+                               embed_fn=lambda texts: calls.append(texts) or [[1, 0, 0]] * len(texts))
+        first = cache.embed(["hello"])
+        cache.save()
+
+        offline = EmbeddingCache(path, "text-embedding-3-small", 3)
+        assert np.allclose(offline.embed(["hello"]), first)
+        assert calls == [["hello"]]
+        with pytest.raises(LookupError):
+            offline.embed(["not cached"])
+
+    def test_hashing_embedder_is_deterministic(self, tmp_path):
+        """Test the offline embedder gives the same vector across caches."""
+        a = EmbeddingCache(tmp_path / "a.npz", HASHING_MODEL, 64).embed(["seo pricing"])
+        b = EmbeddingCache(tmp_path / "b.npz", HASHING_MODEL, 64).embed(["seo pricing"])
+        assert np.array_equal(a, b)
+
+    def test_bm25_and_fusion(self):
+        """Test lexical ranking and reciprocal rank fusion."""
+        bm25 = BM25(["seo rankings", "logo design", "seo audit and seo rankings"])
+        assert bm25.search("seo rankings", 3)[0] in (0, 2)
+        assert 1 not in bm25.search("seo", 3)
+
+        assert reciprocal_rank_fusion([[1, 2, 3], [3, 1]], n=2) == [1, 3]
+
+    def test_fixture_covers_corpus_and_queries(self):
+        """Test that the committed embedding fixture holds every corpus chunk and labelled query, so the benchmark runs offline."""
+        kb_dir = PROJECT_ROOT / "knowledge_base"
+        queries = faq_queries(kb_dir) + json.loads((PROJECT_ROOT / "scripts" / "retrieval_queries.json").read_text())
+        cache = EmbeddingCache(kb_dir / "embeddings" / "retrieval_benchmark_cache.npz", HASHING_MODEL, 1536)
+
+        cache.embed([chunk["text"] for chunk in load_corpus(kb_dir)] + [q["query"] for q in queries])
+
+        # Refresh with: python scripts/benchmark_retrieval.py --embedder hashing --update-cache
+        assert cache.misses == 0
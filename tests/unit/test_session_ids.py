@@ -0,0 +1,57 @@
+"""
+Unit tests for server-issued chat session ids
+"""
+
+import importlib
+
+import tiktoken
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.services.session_ids import SessionIds
+
+
+class FakeEncoding:
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class TestSessionIds:
+    """Test cases for SessionIds."""
+
+    def test_issued_ids_verify(self):
+        """Test that ids issued with a key verify with the same key, on any worker."""
+        issued = SessionIds("secret").issue()
+
+        assert SessionIds("secret").verify(issued)
+        assert issued != SessionIds("secret").issue()
+
+    def test_unsigned_and_forged_ids_rejected(self):
+        """Test that client-chosen ids, tampered ids and ids signed with another key are rejected."""
+        ids = SessionIds("secret")
+        value, signature = ids.issue().split(".")
+
+        assert not ids.verify(None)
+        assert not ids.verify("abc")
+        assert not ids.verify(f"{value}x.{signature}")
+        assert not ids.verify(SessionIds("other").issue())
+        assert not ids.verify(f"{value}.{signature}.extra")
+
+    def test_chat_rejects_unissued_session(self, monkeypatch):
+        """Test that POST /api/chat refuses a session id the server did not issue, before touching memory."""
+        # The RAG services build a tokenizer on import
+        monkeypatch.setattr(tiktoken, "get_encoding", lambda name: FakeEncoding())
+        chat = importlib.import_module("backend.api.chat")
+
+        async def get(session_id):
+            raise AssertionError("memory read for an unissued session")
+        monkeypatch.setattr(chat.conversation_memory, "get", get)
+        app = FastAPI()
+        app.include_router(chat.router, prefix="/api")
+
+        response = TestClient(app).post("/api/chat", json={"message": "hi", "session_id": "someone-else"})
+
+        assert response.status_code == 400
@@ -0,0 +1,159 @@
+"""
+Unit tests for single-flight request coalescing
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.services.single_flight import SingleFlight
+
+
+class TestSingleFlight:
+    """Test cases for SingleFlight."""
+
+    def test_concurrent_coroutines_share_one_call(self):
+        """Test that callers arriving while a call is in flight get its result without running it again."""
+        flights = SingleFlight("test")
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return ["result"]
+
+        async def run():
+            return await asyncio.gather(*(flights.run("key", work) for _ in range(20)))
+
+        results = asyncio.run(run())
+
+        assert len(calls) == 1
+        assert all(result is results[0] for result in results)
+
+    def test_finished_calls_are_not_cached(self):
+        """Test that a call after the first has finished runs again."""
+        flights = SingleFlight("test")
+        calls = []
+
+        async def work():
+            calls.append(1)
+            return len(calls)
+
+        async def run():
+            return [await flights.run("key", work), await flights.run("key", work)]
+
+        assert asyncio.run(run()) == [1, 2]
+
+    def test_errors_reach_every_waiter(self):
+        """Test that a failed call fails all of its waiters."""
+        flights = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def run():
+            return await asyncio.gather(*(flights.run("key", work) for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(result, ValueError) for result in asyncio.run(run()))
+
+    def test_cancelled_leader_does_not_fail_followers(self):
+        """Test that the work outlives the caller that started it while others still wait."""
+        flights = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        async def run():
+            leader = asyncio.create_task(flights.run("key", work))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(flights.run("key", work))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(run()) == "done"
+
+    def test_blocking_calls_share_one_call(self):
+        """Test that threads calling with the same key share one execution."""
+        flights = SingleFlight("test")
+        calls = []
+        started = threading.Event()
+
+        def work():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return "answer"
+
+        with ThreadPoolExecutor(8) as pool:
+            first = pool.submit(flights.call, "key", work)
+            started.wait()
+            others = [pool.submit(flights.call, "key", work) for _ in range(7)]
+            results = [first.result()] + [future.result() for future in others]
+
+        assert calls == [1]
+        assert results == ["answer"] * 8
+
+    def test_stream_fans_out_to_late_joiners(self):
+        """Test that a subscriber joining mid-stream replays earlier events and then follows live ones."""
+        flights = SingleFlight("test")
+        starts = []
+
+        async def produce():
+            starts.append(1)
+            for word in ("a", "b", "c"):
+                await asyncio.sleep(0.01)
+                yield word
+
+        async def collect():
+            return [event async for event in flights.stream("key", produce)]
+
+        async def run():
+            first = asyncio.create_task(collect())
+            await asyncio.sleep(0.015)
+            second = asyncio.create_task(collect())
+            return await first, await second
+
+        assert asyncio.run(run()) == (["a", "b", "c"], ["a", "b", "c"])
+        assert starts == [1]
+
+    def test_stream_stops_when_every_subscriber_leaves(self):
+        """Test that the producer is closed once nobody is reading."""
+        flights = SingleFlight("test")
+        closed = asyncio.Event()
+
+        async def produce():
+            try:
+                while True:
+                    await asyncio.sleep(0.01)
+                    yield "token"
+            finally:
+                closed.set()
+
+        async def run():
+            events = flights.stream("key", produce)
+            assert await events.__anext__() == "token"
+            await events.aclose()
+            await asyncio.wait_for(closed.wait(), 1)
+            return flights._streams
+
+        assert asyncio.run(run()) == {}
+
+    def test_disabled_runs_every_call(self):
+        """Test that coalescing can be switched off."""
+        flights = SingleFlight("test", enabled=False)
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(*(flights.run("key", work) for _ in range(3)))
+
+        asyncio.run(run())
+
+        assert len(calls) == 3
@@ -0,0 +1,166 @@
+"""
+Unit tests for request tracing
+"""
+
+import asyncio
+import logging
+
+import pytest
+
+from backend.services.tracing import (
+    Tracer,
+    NOOP_SPAN,
+    TraceIdLogFilter,
+    parse_traceparent,
+    traced,
+    tracer as global_tracer,
+)
+
+
+class ListExporter:
+    """Collects exported span records."""
+
+    def __init__(self):
+        self.records = []
+
+    def export(self, record):
+        self.records.append(record)
+
+
+class TestTracer:
+    """Test cases for Tracer and span propagation."""
+
+    @pytest.fixture
+    def exporter(self):
+        return ListExporter()
+
+    @pytest.fixture
+    def tracer(self, exporter):
+        return Tracer(enabled=True, exporter=exporter)
+
+    def test_disabled_tracer_returns_noop(self, exporter):
+        """Test that a disabled tracer records nothing."""
+        tracer = Tracer(enabled=False, exporter=exporter)
+        with tracer.span("request") as span:
+            span.set_attribute("ignored", True)
+
+        assert span is NOOP_SPAN
+        assert exporter.records == []
+
+    def test_child_spans_share_trace(self, tracer, exporter):
+        """Test that nested spans inherit the trace id and point at their parent."""
+        with tracer.span("request") as parent:
+            with tracer.span("search", n_results=5):
+                pass
+
+        child, root = exporter.records
+        assert child["trace_id"] == root["trace_id"] == parent.trace_id
+        assert child["parent_id"] == root["span_id"]
+        assert root["parent_id"] is None
+        assert child["attributes"] == {"n_results": 5}
+
+    def test_exception_marks_span_error(self, tracer, exporter):
+        """Test that an exception is recorded and re-raised."""
+        with pytest.raises(RuntimeError):
+            with tracer.span("completion"):
+                raise RuntimeError("timeout")
+
+        assert exporter.records[0]["status"] == "error"
+        assert exporter.records[0]["attributes"]["exception.message"] == "timeout"
+
+    def test_remote_parent_continues_trace(self, tracer, exporter):
+        """Test continuing a trace from a traceparent header."""
+        trace_id, parent_id = parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")
+        with tracer.span("request", trace_id=trace_id, parent_id=parent_id):
+            pass
+
+        assert exporter.records[0]["trace_id"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+        assert exporter.records[0]["parent_id"] == "00f067aa0ba902b7"
+        assert parse_traceparent("garbage") == (None, None)
+
+    def test_traced_decorator_follows_runtime_switch(self, exporter, monkeypatch):
+        """Test that @traced spans sync and async calls only while enabled."""
+        monkeypatch.setattr(global_tracer, "exporter", exporter)
+        monkeypatch.setattr(global_tracer, "enabled", False)
+
+        @traced("sync_op")
+        def sync_op():
+            return 1
+
+        @traced("async_op")
+        async def async_op():
+            return 2
+
+        assert sync_op() == 1
+        assert exporter.records == []
+
+        global_tracer.enable()
+        assert sync_op() == 1
+        assert asyncio.run(async_op()) == 2
+        assert [r["name"] for r in exporter.records] == ["sync_op", "async_op"]
+
+    def test_log_filter_adds_trace_id(self, tracer):
+        """Test that log records carry the active trace id."""
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, "message", None, None)
+        TraceIdLogFilter().filter(record)
+        assert record.trace_id == "-"
+
+        with tracer.span("request") as span:
+            TraceIdLogFilter().filter(record)
+        assert record.trace_id == span.trace_id
+
+
+class TestTracingEndpoint:
+    """Test cases for the admin endpoints: PUT /tracing and the diagnostic GETs."""
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from backend.api.metrics import router
+
+        monkeypatch.setattr(global_tracer, "enabled", False)
+        monkeypatch.setattr(global_tracer, "exporter", ListExporter())
+        app = FastAPI()
+        app.include_router(router)
+        return TestClient(app)
+
+    def test_requires_admin_token(self, client, monkeypatch):
+        """Test that the endpoint is refused without ADMIN_API_TOKEN and with a wrong token."""
+        monkeypatch.delenv("ADMIN_API_TOKEN", raising=False)
+        assert client.put("/tracing?enabled=true").status_code == 403
+
+        monkeypatch.setenv("ADMIN_API_TOKEN", "secret")
+        assert client.put("/tracing?enabled=true", headers={"X-Admin-Token": "wrong"}).status_code == 401
+        assert global_tracer.enabled is False
+
+        assert client.put("/tracing?enabled=true", headers={"X-Admin-Token": "secret"}).status_code == 200
+        assert global_tracer.enabled is True
+
+    def test_replaced_file_exporter_closed(self, client, monkeypatch, tmp_path):
+        """Test that the file is opened once and closed when the exporter is replaced."""
+        monkeypatch.setenv("ADMIN_API_TOKEN", "secret")
+        monkeypatch.setenv("TRACING_FILE", str(tmp_path / "traces.jsonl"))
+        headers = {"X-Admin-Token": "secret"}
+
+        client.put("/tracing?enabled=true&exporter=file", headers=headers)
+        file_exporter = global_tracer.exporter
+        client.put("/tracing?enabled=true&exporter=file", headers=headers)
+        assert global_tracer.exporter is file_exporter
+
+        client.put("/tracing?enabled=true&exporter=console", headers=headers)
+        assert file_exporter.stream.closed
+
+    def test_diagnostic_gets_require_admin_token(self, client, monkeypatch):
+        """Test that the diagnostic GETs need the admin token while /metrics stays open."""
+        paths = ["/admission", "/cache/warmup", "/tracing"]
+        monkeypatch.delenv("ADMIN_API_TOKEN", raising=False)
+        for path in paths:
+            assert client.get(path).status_code == 403
+
+        monkeypatch.setenv("ADMIN_API_TOKEN", "secret")
+        for path in paths:
+            assert client.get(path).status_code == 401
+            assert client.get(path, headers={"X-Admin-Token": "secret"}).status_code == 200
+
+        assert client.get("/metrics").status_code == 200
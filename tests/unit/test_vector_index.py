@@ -0,0 +1,123 @@
+"""
+Unit tests for the in-process vector index
+"""
+
+import numpy as np
+import pytest
+
+from knowledge_base.processors.vector_index import InMemoryVectorIndex, normalize, truncate_embedding
+
+
+@pytest.fixture
+def corpus():
+    rng = np.random.default_rng(0)
+    return normalize(rng.standard_normal((500, 64)))
+
+
+class TestInMemoryVectorIndex:
+    """Test cases for InMemoryVectorIndex."""
+
+    def test_exact_search_finds_query_vector(self, corpus):
+        """Test that a stored vector is its own nearest neighbour."""
+        index = InMemoryVectorIndex("float32")
+        index.build(range(100, 600), corpus, payloads=[f"chunk {i}" for i in range(500)])
+
+        chunk_id, score, payload = index.search(corpus[42], k=3)[0]
+
+        assert chunk_id == 142
+        assert score == pytest.approx(1.0, abs=1e-5)
+        assert payload == "chunk 42"
+
+    @pytest.mark.parametrize("storage", ["float16", "int8"])
+    def test_quantized_storage_uses_less_memory(self, corpus, storage):
+        """Test that quantized storage shrinks the index."""
+        full = InMemoryVectorIndex("float32")
+        full.build(range(500), corpus)
+        quantized = InMemoryVectorIndex(storage)
+        quantized.build(range(500), corpus)
+
+        assert quantized.memory_bytes() < full.memory_bytes() * 0.6
+
+    def test_int8_rerank_matches_exact_results(self, corpus):
+        """Test that re-ranking with full vectors recovers the exact ranking."""
+        exact = InMemoryVectorIndex("float32")
+        exact.build(range(500), corpus)
+        quantized = InMemoryVectorIndex("int8", rerank_factor=4, full_vector_loader=lambda ids: corpus[ids])
+        quantized.build(range(500), corpus)
+
+        query = normalize(corpus[7] + 0.3 * corpus[8])
+        expected = [row[0] for row in exact.search(query, k=5)]
+        found = quantized.search(query, k=5)
+
+        assert [row[0] for row in found] == expected
+        assert found[0][1] == pytest.approx(exact.search(query, k=1)[0][1], abs=1e-5)
+
+    def test_two_stage_search_reranks_truncated_candidates(self, corpus):
+        """Test that a truncated-prefix index re-ranked with full vectors matches exact search."""
+        exact = InMemoryVectorIndex("float32")
+        exact.build(range(500), corpus)
+        coarse = InMemoryVectorIndex(dimensions=16, rerank_factor=10, full_vector_loader=lambda ids: corpus[ids])
+        coarse.build(range(500), corpus)
+
+        found = coarse.search(corpus[3], k=1)
+
+        assert found[0][0] == exact.search(corpus[3], k=1)[0][0]
+        assert coarse.memory_bytes() < exact.memory_bytes() / 3
+
+    def test_rerank_with_fetched_vectors(self, corpus):
+        """Test re-ranking candidates with full vectors fetched by the caller."""
+        exact = InMemoryVectorIndex("float32")
+        exact.build(range(500), corpus)
+        quantized = InMemoryVectorIndex("int8", rerank_factor=4)
+        quantized.build(range(500), corpus)
+
+        query = normalize(corpus[7] + 0.3 * corpus[8])
+        candidates = quantized.search(query, k=20)
+        found = quantized.rerank(candidates, corpus[[row[0] for row in candidates]], query, k=5)
+
+        assert quantized.is_approximate and not exact.is_approximate
+        assert [row[0] for row in found] == [row[0] for row in exact.search(query, k=5)]
+
+    @pytest.mark.parametrize("storage", ["float32", "int8"])
+    def test_search_batch_matches_single_searches(self, corpus, storage):
+        """Test that a batch search returns the same results as one search per query."""
+        index = InMemoryVectorIndex(storage)
+        index.build(range(500), corpus, labels=["FAQ" if i % 2 else "Services" for i in range(500)])
+        queries = corpus[[1, 2, 3]]
+
+        batch = index.search_batch(queries, k=4, exclude_labels=["Services"])
+
+        assert [[row[0] for row in rows] for rows in batch] == [
+            [row[0] for row in index.search(query, k=4, exclude_labels=["Services"])] for query in queries
+        ]
+        assert index.search_batch(queries[:0], k=4) == []
+
+    def test_truncate_embedding_renormalizes(self):
+        """Test that a truncated embedding keeps its prefix direction with unit length."""
+        shortened = truncate_embedding([3.0, 4.0, 12.0], 2)
+        assert shortened == pytest.approx([0.6, 0.8])
+
+    def test_label_filters(self, corpus):
+        """Test include and exclude label filters, including with re-ranking."""
+        labels = ["FAQ" if i % 2 else "Internal_Resources" for i in range(500)]
+        index = InMemoryVectorIndex("int8", full_vector_loader=lambda ids: corpus[ids])
+        index.build(range(500), corpus, labels=labels)
+
+        excluded = index.search(corpus[10], k=5, exclude_labels=["Internal_Resources"])
+        included = index.search(corpus[10], k=5, include_labels=["Internal_Resources"])
+
+        assert len(excluded) == 5
+        assert all(chunk_id % 2 == 1 for chunk_id, _, _ in excluded)
+        assert included[0][0] == 10
+        assert index.search(corpus[10], k=5, include_labels=["Portfolio"]) == []
+
+    def test_empty_index(self):
+        """Test searching an index with no rows."""
+        index = InMemoryVectorIndex("int8")
+        index.build([], [])
+        assert index.search([0.1, 0.2], k=5) == []
+
+    def test_unknown_storage_mode(self):
+        """Test that an invalid storage mode is rejected."""
+        with pytest.raises(ValueError):
+            InMemoryVectorIndex("int4")
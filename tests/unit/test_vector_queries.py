@@ -0,0 +1,72 @@
+"""
+Unit tests for the prepared pgvector search statements
+"""
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from knowledge_base.processors.vector_queries import batch_search_statement, search_statement, vector_literal
+
+
+def compile_sql(statement, dialect=None):
+    return str(statement.compile(dialect=dialect or postgresql.dialect()))
+
+
+class TestVectorQueries:
+    """Test cases for search_statement."""
+
+    def test_single_pass_selects_lean_columns(self):
+        """Test that the exact search never loads embeddings, joins documents or repeats the distance."""
+        sql = compile_sql(search_statement(1536))
+
+        assert sql.startswith("SELECT id, content, chunk_metadata, content_simhash, embedding <=>")
+        assert sql.count("<=>") == 1
+        assert "ORDER BY distance" in sql
+        assert "documents" not in sql.replace("document_chunks", "")
+
+    @pytest.mark.parametrize("candidate_pass, expected", [
+        ("coarse", "embedding_coarse <=> CAST(%(coarse_embedding)s AS vector(256))"),
+        ("halfvec", "CAST(embedding AS halfvec(1536)) <=> CAST(CAST(%(embedding)s AS vector(1536)) AS halfvec(1536))"),
+    ])
+    def test_two_pass_reranks_candidates(self, candidate_pass, expected):
+        """Test that two-pass searches order candidates by the cheaper index expression."""
+        sql = compile_sql(search_statement(1536, candidate_pass, 256))
+
+        assert expected in sql
+        assert "LIMIT %(candidates)s" in sql
+        assert sql.count("<=>") == 2
+
+    def test_category_filters_are_bound(self):
+        """Test that category filters are array parameters, so the SQL does not vary with them."""
+        sql = compile_sql(search_statement(1536, filter_categories=True, exclude_categories=True),
+                          asyncpg.dialect())
+
+        assert "category = ANY($" in sql
+        assert "category <> ALL($" in sql
+
+    def test_internal_exclusion_matches_partial_index(self):
+        """Test that excluding the internal category repeats the public index predicate instead of binding it."""
+        sql = compile_sql(search_statement(1536, public_only=True), asyncpg.dialect())
+
+        assert "category <> 'Internal_Resources'" in sql
+        assert "ALL(" not in sql
+
+    def test_batch_search_uses_lateral_join(self):
+        """Test that a batch runs the per-query search for each unnested query vector."""
+        sql = compile_sql(batch_search_statement(1536, "coarse", 256), asyncpg.dialect())
+
+        assert "unnest($1::VARCHAR[], $2::VARCHAR[]) WITH ORDINALITY" in sql
+        assert "CROSS JOIN LATERAL" in sql
+        assert "embedding <=> q.embedding AS distance" in sql
+        assert "embedding_coarse <=> q.coarse_embedding" in sql
+        assert sql.endswith("ORDER BY q.ord, results.distance")
+
+    def test_statements_are_reused(self):
+        """Test that each query shape is built once."""
+        assert search_statement(1536, "halfvec") is search_statement(1536, "halfvec")
+        assert search_statement(1536) is not search_statement(1536, exclude_categories=True)
+
+    def test_vector_literal(self):
+        """Test the pgvector text form."""
+        assert vector_literal([1, 0.5, -0.25]) == "[1.0,0.5,-0.25]"
@@ -0,0 +1,138 @@
+"""
+Unit tests for the /ws/chat WebSocket transport
+"""
+
+import asyncio
+import importlib
+
+import pytest
+import tiktoken
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+
+class FakeEncoding:
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture
+def ws_chat(monkeypatch):
+    # The RAG services build a tokenizer on import; these tests never chunk text
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: FakeEncoding())
+    return importlib.import_module("backend.api.ws_chat")
+
+
+@pytest.fixture
+def fake_rag(ws_chat, monkeypatch):
+    """Replace search, generation and intent detection; the first message of a test blocks if it says 'slow'."""
+    async def search(query, n_results=5):
+        return [{"content": "We build websites.", "relevance_score": 0.9,
+                 "metadata": {"file_name": "Services.md", "category": "Services"}}]
+
+    async def stream(query, docs, session_context=None, relevance_threshold=0.7):
+        if "slow" in query:
+            await asyncio.sleep(30)
+        for word in ("We ", "build ", "websites."):
+            yield {"type": "token", "text": word}
+        yield {"type": "answer", "answer": "We build websites.", "confidence": "high", "reason": "success"}
+
+    async def intent(message):
+        return "web-development"
+
+    monkeypatch.setattr(ws_chat.rag_service, "asearch_documents", search)
+    monkeypatch.setattr(ws_chat.rag_service, "astream_answer", stream)
+    monkeypatch.setattr(ws_chat, "detect_intent", intent)
+    # Memory stays in-process and follow-ups are searched as typed
+    monkeypatch.setattr(ws_chat.conversation_memory, "persist", False)
+    monkeypatch.setattr(ws_chat.conversation_memory, "rewrite_queries", False)
+
+
+@pytest.fixture
+def client(ws_chat, fake_rag):
+    app = FastAPI()
+    app.include_router(ws_chat.router)
+    return TestClient(app)
+
+
+def receive_turn(websocket):
+    """Events until the turn's done event."""
+    events = []
+    while not events or events[-1]["type"] != "done":
+        events.append(websocket.receive_json())
+    return events
+
+
+class TestWebSocketChat:
+    """Test cases for the /ws/chat endpoint and its sender."""
+
+    def test_forged_session_id_not_resumed(self, client, ws_chat):
+        """Test that a session id the server did not sign gets a new session instead of the one named."""
+        issued = ws_chat.session_ids.issue()
+        forged = issued.split(".")[0] + "." + "0" * 32
+
+        with client.websocket_connect(f"/ws/chat?session_id={forged}") as websocket:
+            session_id = websocket.receive_json()["session_id"]
+        with client.websocket_connect(f"/ws/chat?session_id={issued}") as websocket:
+            resumed = websocket.receive_json()["session_id"]
+
+        assert session_id != forged and ws_chat.session_ids.verify(session_id)
+        assert resumed == issued
+
+    def test_turn_streams_events(self, client, ws_chat):
+        """Test that a message yields sources, tokens, intent, upsells and done on one connection."""
+        session_id = ws_chat.session_ids.issue()
+        with client.websocket_connect(f"/ws/chat?session_id={session_id}") as websocket:
+            assert websocket.receive_json() == {"type": "session", "session_id": session_id}
+            websocket.send_json({"type": "message", "message": "Do you build websites?"})
+
+            events = receive_turn(websocket)
+
+        types = [event["type"] for event in events]
+        assert types[0] == "sources"
+        assert "text" not in events[0]["documents"][0]
+        assert {"intent", "upsell"} <= set(types)
+        assert "".join(event["text"] for event in events if event["type"] == "token") == "We build websites."
+        assert events[-1]["answer"] == "We build websites."
+        assert len({event["turn_id"] for event in events}) == 1
+
+    def test_new_message_cancels_turn_in_flight(self, client):
+        """Test that typing again stops the previous generation."""
+        with client.websocket_connect("/ws/chat") as websocket:
+            websocket.receive_json()
+            websocket.send_json({"type": "message", "message": "slow question"})
+            first_turn = websocket.receive_json()["turn_id"]
+            websocket.send_json({"type": "message", "message": "Do you build websites?"})
+
+            events = receive_turn(websocket)
+
+        assert {"type": "cancelled", "turn_id": first_turn} in events
+        assert events[-1]["turn_id"] != first_turn
+        assert not any(event["type"] == "done" and event["turn_id"] == first_turn for event in events)
+
+    def test_sender_merges_queued_tokens(self, ws_chat):
+        """Test that tokens queued behind a slow client go out as one event, in order."""
+        class RecordingSocket:
+            def __init__(self):
+                self.sent = []
+
+            async def send_json(self, event):
+                self.sent.append(event)
+
+        async def run():
+            socket = RecordingSocket()
+            connection = ws_chat.ChatConnection(socket, "s")
+            for text in ("a", "b", "c"):
+                await connection.send({"type": "token", "turn_id": "t", "text": text})
+            await connection.send({"type": "done", "turn_id": "t"})
+            sender = asyncio.create_task(connection.sender())
+            while len(socket.sent) < 2:
+                await asyncio.sleep(0)
+            sender.cancel()
+            return socket.sent
+
+        assert asyncio.run(run()) == [{"type": "token", "turn_id": "t", "text": "abc"},
+                                      {"type": "done", "turn_id": "t"}]